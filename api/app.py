@@ -25,9 +25,16 @@ from vrnetlab_routes import vrnetlab_bp
 from container_images_routes import container_images_bp
 from container_labs_routes import container_labs_bp
 from unl_routes import unl_bp
+from host_routes import host_bp
+from fleet_routes import fleet_bp
 from version import get_app_version, check_for_update
 from auth import register_security
 from ws_routes import register_ws
+from fix_scheduler import stats as fix_stats
+from ssh_engine import engine_stats
+from ssh_governor import governor_stats
+from ssh_pool import pool_stats
+from sftp_pool import pool_stats as sftp_pool_stats
 
 
 def create_app() -> Flask:
@@ -51,6 +58,8 @@ def create_app() -> Flask:
     app.register_blueprint(container_images_bp)
     app.register_blueprint(container_labs_bp)
     app.register_blueprint(unl_bp)
+    app.register_blueprint(host_bp)
+    app.register_blueprint(fleet_bp)
 
     # Camada de segurança: login por sessão, CSRF e cabeçalhos (issue #75).
     # Ativa quando APP_PASSWORD está definida; senão roda em modo aberto.
@@ -71,6 +80,22 @@ def create_app() -> Flask:
     def update():
         return jsonify(check_for_update()), 200
 
+    @app.route("/ssh/stats", methods=["GET"])
+    def ssh_stats():
+        # Contadores dos pools de conexão SSH (sshpass/ControlMaster e paramiko),
+        # processos em execução no motor asyncio, filas por host (governor) e
+        # pedidos/execuções de fixpermissions agrupados.
+        return (
+            jsonify(
+                pool=pool_stats(),
+                sftp_pool=sftp_pool_stats(),
+                engine=engine_stats(),
+                governor=governor_stats(),
+                fixpermissions=fix_stats(),
+            ),
+            200,
+        )
+
     @app.after_request
     def add_version_header(response):
         response.headers["X-App-Version"] = get_app_version()
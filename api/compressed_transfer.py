@@ -0,0 +1,229 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Transferência comprimida: zstd (ou gzip) no caminho, descompressão no host.
+
+Os bytes são comprimidos aqui e enviados pela entrada de um
+`zstd -d -c > arquivo` (ou `gzip -d -c`) aberto num canal SSH. qcow2/img
+costumam encolher 2-4x, o que em VPN lenta vira tempo de envio.
+
+O nível é adaptativo: a cada TRANSFER_ADAPT_BYTES de dados, se o envio
+(rede) demorou bem mais que a compressão, sobe um nível; se a compressão
+virou o gargalo, desce. Trocar de nível fecha o frame atual e abre outro;
+zstd e gzip descomprimem frames concatenados normalmente.
+
+O canal de envio só escreve o parcial (.part). Um fluxo cortado na
+fronteira de um frame descomprime sem erro, então o fim do fluxo não prova
+nada: close() roda um segundo comando que confere o tamanho do parcial com
+os bytes crus enviados antes do mv, e abort() apaga o parcial.
+
+Com SFTP_SPARSE ligado, o arquivo descomprimido passa por `fallocate -d`
+no host antes do mv, que transforma os blocos de zeros em buracos.
+
+zstd exige o pacote python `zstandard` aqui e o binário zstd no host; sem um
+dos dois cai para gzip, e sem gzip no host o chamador envia sem compressão.
+"""
+
+from __future__ import annotations
+
+import os
+import shlex
+import time
+import zlib
+
+from sftp_parallel import SPARSE
+
+try:  # dependência opcional
+    import zstandard
+except ImportError:  # pragma: no cover - depende do ambiente
+    zstandard = None
+
+ADAPT_BYTES = int(os.getenv("TRANSFER_ADAPT_BYTES", str(8 * 1024 * 1024)))
+
+# nível inicial, mínimo e máximo por codec
+_LEVELS = {
+    "zstd": (3, 1, 15),
+    "gzip": (3, 1, 9),
+}
+_DECOMPRESS = {
+    "zstd": "zstd -d -q -c",
+    "gzip": "gzip -d -c",
+}
+
+
+def local_codecs() -> list[str]:
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def remote_codecs(ssh) -> set[str]:
+    """Descompressores disponíveis no host."""
+    _stdin, stdout, _stderr = ssh.exec_command(
+        "for c in zstd gzip; do command -v $c >/dev/null 2>&1 && echo $c; done"
+    )
+    stdout.channel.recv_exit_status()
+    return {line.strip() for line in stdout.read().decode(errors="ignore").splitlines() if line.strip()}
+
+
+def pick_codec(ssh, requested: str | None = "auto") -> str | None:
+    """
+    Codec a usar: o pedido, se possível dos dois lados; senão o melhor comum
+    (zstd, depois gzip). None = enviar sem compressão.
+    """
+    available = [c for c in local_codecs() if c in remote_codecs(ssh)]
+    if requested in available:
+        return requested
+    return available[0] if available else None
+
+
+class _Frame:
+    """Um compressor de nível fixo (um frame zstd / membro gzip)."""
+
+    def __init__(self, codec: str, level: int):
+        if codec == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self._flush = lambda: self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = cabeçalho gzip
+            self._flush = self._obj.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def finish(self) -> bytes:
+        return self._flush()
+
+
+class CompressedUpload:
+    """
+    Escreve um arquivo remoto enviando os dados comprimidos. O destino só é
+    substituído (mv) por close(), quando a descompressão terminou sem erro e
+    o parcial tem exatamente raw_bytes.
+    """
+
+    def __init__(self, ssh, remote_path: str, codec: str, level: int | None = None):
+        self.remote_path = remote_path
+        self.codec = codec
+        start, self._min, self._max = _LEVELS[codec]
+        self.level = max(self._min, min(self._max, level or start))
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self._frame = _Frame(codec, self.level)
+        self._comp_time = 0.0
+        self._send_time = 0.0
+        self._win_raw = 0
+        self._started = time.monotonic()
+        self._elapsed = None
+
+        d = os.path.dirname(remote_path)
+        self._ssh = ssh
+        self._tmp = f"{d}/.{os.path.basename(remote_path)}.part"
+        q_tmp = shlex.quote(self._tmp)
+        cmd = f"{_DECOMPRESS[codec]} > {q_tmp} || {{ rc=$?; rm -f {q_tmp}; exit $rc; }}"
+        self._chan = ssh.get_transport().open_session()
+        self._chan.exec_command(cmd)
+
+    def _send(self, data: bytes) -> None:
+        if not data:
+            return
+        t0 = time.monotonic()
+        self._chan.sendall(data)
+        self._send_time += time.monotonic() - t0
+        self.wire_bytes += len(data)
+
+    def write(self, data: bytes) -> None:
+        t0 = time.monotonic()
+        out = self._frame.compress(data)
+        self._comp_time += time.monotonic() - t0
+        self.raw_bytes += len(data)
+        self._win_raw += len(data)
+        self._send(out)
+        if self._win_raw >= ADAPT_BYTES:
+            self._adapt()
+
+    def _adapt(self) -> None:
+        comp, send = self._comp_time, self._send_time
+        self._comp_time = self._send_time = 0.0
+        self._win_raw = 0
+        if send > 2 * comp and self.level < self._max:
+            new_level = self.level + 1  # rede é o gargalo: comprime mais
+        elif comp > 1.5 * send and self.level > self._min:
+            new_level = self.level - 1  # CPU é o gargalo: comprime menos
+        else:
+            return
+        self._send(self._frame.finish())
+        self.level = new_level
+        self._frame = _Frame(self.codec, new_level)
+
+    def close(self) -> dict:
+        """Finaliza e espera o host; levanta IOError se a descompressão falhar."""
+        self._send(self._frame.finish())
+        self._chan.shutdown_write()
+        rc = self._chan.recv_exit_status()
+        err = b""
+        while self._chan.recv_stderr_ready():
+            err += self._chan.recv_stderr(65536)
+        self._chan.close()
+        if rc != 0:
+            self._elapsed = time.monotonic() - self._started
+            raise IOError(err.decode(errors="ignore").strip() or f"{self.codec} rc={rc}")
+        rc, err = self._exec(self._finalize_cmd())
+        self._elapsed = time.monotonic() - self._started
+        if rc != 0:
+            raise IOError(err or f"parcial com tamanho diferente de {self.raw_bytes} bytes")
+        return self.stats()
+
+    def _finalize_cmd(self) -> str:
+        q_tmp = shlex.quote(self._tmp)
+        # fallocate -d é só economia de disco: falha (ex.: sem suporte) não conta.
+        dig = f" && {{ fallocate -d {q_tmp} 2>/dev/null || true; }}" if SPARSE else ""
+        return (
+            f"[ \"$(stat -c %s {q_tmp})\" = {int(self.raw_bytes)} ]{dig}"
+            f" && mv -f {q_tmp} {shlex.quote(self.remote_path)}"
+            f" || {{ rc=$?; rm -f {q_tmp}; exit $rc; }}"
+        )
+
+    def _exec(self, cmd: str) -> tuple[int, str]:
+        _stdin, stdout, stderr = self._ssh.exec_command(cmd)
+        err = stderr.read().decode(errors="ignore").strip()
+        return stdout.channel.recv_exit_status(), err
+
+    def abort(self) -> None:
+        """Encerra o envio sem finalizar e apaga o parcial no host."""
+        try:
+            # EOF e espera (limitada) o descompressor sair antes de apagar.
+            self._chan.shutdown_write()
+            self._chan.status_event.wait(10)
+        except Exception:
+            pass
+        try:
+            self._chan.close()
+        except Exception:
+            pass
+        try:
+            self._exec(f"rm -f {shlex.quote(self._tmp)}")
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        elapsed = self._elapsed if self._elapsed is not None else time.monotonic() - self._started
+        return {
+            "codec": self.codec,
+            "level": self.level,
+            "raw_bytes": self.raw_bytes,
+            "wire_bytes": self.wire_bytes,
+            "ratio": round(self.raw_bytes / self.wire_bytes, 2) if self.wire_bytes else 0.0,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_mbps": round(self.raw_bytes * 8 / elapsed / 1e6, 2) if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,145 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Respostas condicionais (ETag / If-None-Match) para listagens remotas.
+
+As listagens (/images, /templates/list, /icons/list, /container-labs/list e
+/container-labs/files) só mudam quando entradas são criadas, removidas ou
+renomeadas nos diretórios que elas leem, e isso sempre altera o mtime/ctime
+de algum diretório. O validador é então um único `find -type d -printf` com
+o mtime/ctime desses diretórios (até a profundidade que a listagem cobre),
+resumido num hash junto com host, usuário, idioma e o que mais a rota
+informar. Se o cliente manda If-None-Match igual, a rota responde 304 sem
+rodar a listagem; senão roda normalmente e a resposta de sucesso sai com
+ETag.
+
+Campos voláteis (ex.: os recursos do host em /images) não entram no ETag:
+a rota os informa em Validator.volatile e, num 304, eles seguem no
+cabeçalho X-Volatile-Fields (JSON) para o cliente aplicar sobre o corpo que
+já tem em cache.
+
+CONDITIONAL_RESPONSES=0 desliga o mecanismo.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import shlex
+
+from flask import current_app, request
+
+from i18n import get_request_lang
+from utils import run_ssh_command
+
+ENABLED = os.getenv("CONDITIONAL_RESPONSES", "1").strip().lower() not in ("0", "false", "no", "off")
+VALIDATOR_TIMEOUT = int(os.getenv("CONDITIONAL_VALIDATOR_TIMEOUT", "15"))
+
+
+class Validator:
+    """O que define o estado de uma listagem: diretórios, profundidade e extras.
+
+    volatile: campos do corpo que mudam sem mudar a listagem; ficam fora do
+    ETag e vão num cabeçalho do 304.
+    """
+
+    def __init__(self, eve_ip: str, eve_user: str, eve_pass: str, dirs, depth: int = 0, extra: str = "",
+                 volatile: dict | None = None):
+        self.eve_ip = eve_ip
+        self.eve_user = eve_user
+        self.eve_pass = eve_pass
+        self.dirs = list(dirs)
+        self.depth = depth
+        self.extra = extra
+        self.volatile = volatile or {}
+
+
+def _validator_cmd(dirs, depth: int) -> str:
+    paths = " ".join(shlex.quote(d) for d in dirs)
+    return (
+        f"find {paths} -maxdepth {int(depth)} -type d -printf '%p|%T@|%C@\\n' 2>/dev/null "
+        "| LC_ALL=C sort; echo __NCF_VALIDATOR__"
+    )
+
+
+def compute_etag(v: Validator) -> str | None:
+    """Hash do estado remoto (uma chamada SSH), ou None se o host não respondeu."""
+    rc, out, _err = run_ssh_command(
+        v.eve_ip, v.eve_user, v.eve_pass, _validator_cmd(v.dirs, v.depth), timeout=VALIDATOR_TIMEOUT,
+    )
+    state, mark, _ = (out or "").partition("__NCF_VALIDATOR__")
+    if not mark:
+        return None
+    digest = hashlib.sha1()
+    for part in (v.eve_ip.lower(), v.eve_user, get_request_lang(), v.extra, state):
+        digest.update(part.encode("utf-8", "replace") + b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _successful(response) -> bool:
+    if response.status_code != 200:
+        return False
+    data = response.get_json(silent=True) if response.is_json else None
+    return not isinstance(data, dict) or bool(data.get("success", True))
+
+
+def conditional_listing(validator_for):
+    """
+    Decorador de rota: validator_for() lê a requisição e devolve um
+    Validator (ou None para responder sem ETag, ex.: credenciais faltando).
+    Falhas do validador nunca impedem a listagem normal.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = None
+            v = None
+            if ENABLED:
+                try:
+                    v = validator_for()
+                    etag = compute_etag(v) if v is not None else None
+                except Exception as e:
+                    print(f"[API] Validador condicional falhou: {e}", flush=True)
+                    etag = None
+            if etag and request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "private, no-cache"
+                if v.volatile:
+                    response.headers["X-Volatile-Fields"] = json.dumps(v.volatile, separators=(",", ":"))
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if etag and _successful(response):
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def form_creds():
+    """(eve_ip, eve_user, eve_pass) do formulário, ou None se faltar algum."""
+    eve_ip = (request.form.get("eve_ip") or "").strip()
+    eve_user = (request.form.get("eve_user") or "").strip()
+    eve_pass = (request.form.get("eve_pass") or "").strip()
+    if not (eve_ip and eve_user and eve_pass):
+        return None
+    return eve_ip, eve_user, eve_pass
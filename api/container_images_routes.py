@@ -20,8 +20,10 @@ import shlex
 
 from flask import Blueprint, jsonify, request
 
+from host_agent import run_agent
+from host_profile import runtime_for
 from i18n import get_request_lang, translate
-from utils import run_ssh_command
+from utils import PRIORITY_BULK, run_ssh_command
 
 
 container_images_bp = Blueprint("container_images_bp", __name__, url_prefix="/container-images")
@@ -30,7 +32,10 @@ container_images_bp = Blueprint("container_images_bp", __name__, url_prefix="/co
 _IMAGE_REF_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_./:@-]*$")
 
 
-def _runtime_prefix() -> str:
+def _runtime_prefix(runtime: str | None = None) -> str:
+    """Define $runtime: o já resolvido pelo perfil do host ou detecção no shell."""
+    if runtime:
+        return f"runtime={shlex.quote(runtime)}; "
     return (
         "runtime=''; "
         "if command -v docker >/dev/null 2>&1; then runtime='docker'; "
@@ -39,22 +44,8 @@ def _runtime_prefix() -> str:
     )
 
 
-@container_images_bp.route("/list", methods=["POST"])
-def list_container_images():
-    """
-    Lista imagens do runtime de containers (docker/podman) no host ContainerLab.
-    """
-    lang = get_request_lang()
-    eve_ip = (request.form.get("eve_ip") or "").strip()
-    eve_user = (request.form.get("eve_user") or "").strip()
-    eve_pass = (request.form.get("eve_pass") or "").strip()
-
-    if not (eve_ip and eve_user and eve_pass):
-        return (
-            jsonify(success=False, message=translate("container_images.missing_creds", lang)),
-            400,
-        )
-
+def _list_images_shell(eve_ip: str, eve_user: str, eve_pass: str):
+    """Listagem via one-liner de shell (hosts sem o agente python3)."""
     cmd = (
         "runtime=''; "
         "if command -v docker >/dev/null 2>&1; then runtime='docker'; fi; "
@@ -93,6 +84,33 @@ def list_container_images():
             # Inclui linhas inesperadas para depuração.
             images.append({"repository": line, "tag": "", "id": "", "created": "", "size": ""})
 
+    return runtime, images, rc, out, err
+
+
+@container_images_bp.route("/list", methods=["POST"])
+def list_container_images():
+    """
+    Lista imagens do runtime de containers (docker/podman) no host ContainerLab.
+    """
+    lang = get_request_lang()
+    eve_ip = (request.form.get("eve_ip") or "").strip()
+    eve_user = (request.form.get("eve_user") or "").strip()
+    eve_pass = (request.form.get("eve_pass") or "").strip()
+
+    if not (eve_ip and eve_user and eve_pass):
+        return (
+            jsonify(success=False, message=translate("container_images.missing_creds", lang)),
+            400,
+        )
+
+    agent = run_agent(eve_ip, eve_user, eve_pass, "runtime-images")
+    if agent is not None:
+        runtime = agent.get("runtime") or ""
+        images = agent.get("images") or []
+        rc, out, err = agent.get("rc", 0), "", agent.get("stderr") or ""
+    else:
+        runtime, images, rc, out, err = _list_images_shell(eve_ip, eve_user, eve_pass)
+
     success = True
     message = translate("container_images.success", lang)
     if not runtime:
@@ -128,8 +146,8 @@ def pull_container_image():
         return jsonify(success=False, message=translate("container_images.missing_creds", lang)), 400
     if not _IMAGE_REF_RE.match(image):
         return jsonify(success=False, message=translate("container_images.invalid_ref", lang)), 400
-    cmd = _runtime_prefix() + f"$runtime pull {shlex.quote(image)} 2>&1"
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=600)
+    cmd = _runtime_prefix(runtime_for(eve_ip, eve_user, eve_pass)) + f"$runtime pull {shlex.quote(image)} 2>&1"
+    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=600, priority=PRIORITY_BULK)
     combined = (out or "")
     if "__NO_RUNTIME__" in combined or rc == 45:
         return jsonify(success=False, message=translate("container_images.no_runtime", lang), output=combined), 500
@@ -152,7 +170,7 @@ def remove_container_image():
     if not _IMAGE_REF_RE.match(image):
         return jsonify(success=False, message=translate("container_images.invalid_ref", lang)), 400
     flag = "-f " if force else ""
-    cmd = _runtime_prefix() + f"$runtime rmi {flag}{shlex.quote(image)} 2>&1"
+    cmd = _runtime_prefix(runtime_for(eve_ip, eve_user, eve_pass)) + f"$runtime rmi {flag}{shlex.quote(image)} 2>&1"
     rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=120)
     combined = (out or "")
     if "__NO_RUNTIME__" in combined or rc == 45:
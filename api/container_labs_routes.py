@@ -24,10 +24,18 @@ import uuid
 from flask import Blueprint, Response, jsonify, request
 import yaml
 
+from conditional import Validator, conditional_listing, form_creds
+from host_agent import run_agent
+from host_profile import runtime_for
 from i18n import get_request_lang, translate
-from utils import run_ssh_command, run_ssh_stream, run_ssh_binary
+from utils import PRIORITY_BULK, cancel_ssh_job, run_ssh_binary, run_ssh_capture, run_ssh_command, start_ssh_stream
 
 
+# Tetos de leitura: arquivos do lab e logs de node maiores que isso voltam
+# truncados (com truncated=True na resposta).
+_LAB_FILE_MAX_BYTES = 8 * 1024 * 1024
+_NODE_LOGS_MAX_BYTES = 4 * 1024 * 1024
+
 # Jobs assíncronos de deploy/destroy (log ao vivo). Em memória.
 _CLAB_JOBS = {}
 _CLAB_JOBS_LOCK = threading.Lock()
@@ -80,23 +88,29 @@ def _is_safe_container_name(name: str) -> bool:
     return bool(cleaned) and bool(_CONTAINER_NAME_RE.match(cleaned))
 
 
-def _runtime_logs_cmd(container: str, tail: int = 200) -> str:
-    quoted = shlex.quote(container)
+def _runtime_cmd(args: str, runtime: str | None = None) -> str:
+    """
+    `<runtime> <args>` com o runtime já resolvido pelo perfil do host. Sem ele
+    (perfil indisponível), detecta docker/podman no próprio shell remoto.
+    """
+    if runtime:
+        return f"{shlex.quote(runtime)} {args}"
     return (
-        f"if command -v docker >/dev/null 2>&1; then docker logs --tail {int(tail)} {quoted} 2>&1; "
-        f"elif command -v podman >/dev/null 2>&1; then podman logs --tail {int(tail)} {quoted} 2>&1; "
+        f"if command -v docker >/dev/null 2>&1; then docker {args}; "
+        f"elif command -v podman >/dev/null 2>&1; then podman {args}; "
         "else echo '__NO_RUNTIME__'; exit 45; fi"
     )
 
 
-def _runtime_exec_cmd(container: str, command: str) -> str:
+def _runtime_logs_cmd(container: str, tail: int = 200, runtime: str | None = None) -> str:
+    quoted = shlex.quote(container)
+    return _runtime_cmd(f"logs --tail {int(tail)} {quoted} 2>&1", runtime)
+
+
+def _runtime_exec_cmd(container: str, command: str, runtime: str | None = None) -> str:
     quoted = shlex.quote(container)
     inner = shlex.quote(command)
-    return (
-        f"if command -v docker >/dev/null 2>&1; then docker exec {quoted} sh -c {inner} 2>&1; "
-        f"elif command -v podman >/dev/null 2>&1; then podman exec {quoted} sh -c {inner} 2>&1; "
-        "else echo '__NO_RUNTIME__'; exit 45; fi"
-    )
+    return _runtime_cmd(f"exec {quoted} sh -c {inner} 2>&1", runtime)
 
 
 def _normalize_nodes(topology: dict) -> dict:
@@ -264,7 +278,28 @@ def _build_cyto_elements(doc: dict) -> list:
     return elements
 
 
+def _labs_dir_from_form() -> str:
+    return (request.form.get("labs_dir") or "/opt/containerlab/labs").strip() or "/opt/containerlab/labs"
+
+
+def _labs_list_validator():
+    # Um lab aparece quando há *clab*.yml até 2 níveis abaixo dele: basta o
+    # mtime dos diretórios até essa profundidade.
+    creds = form_creds()
+    return Validator(*creds, [_labs_dir_from_form()], depth=2) if creds else None
+
+
+def _lab_files_validator():
+    creds = form_creds()
+    lab_name = (request.form.get("lab_name") or "").strip()
+    if creds is None or not _is_safe_relpath(lab_name):
+        return None
+    # A listagem vai até 5 níveis; entradas do nível 5 moram em diretórios do nível 4.
+    return Validator(*creds, [f"{_labs_dir_from_form().rstrip('/')}/{lab_name}"], depth=4)
+
+
 @container_labs_bp.route("/list", methods=["POST"])
+@conditional_listing(_labs_list_validator)
 def list_container_labs():
     """
     Lista diretórios de labs em /opt/containerlab/labs no host ContainerLab.
@@ -281,29 +316,36 @@ def list_container_labs():
         )
 
     target_dir = (request.form.get("labs_dir") or "/opt/containerlab/labs").strip() or "/opt/containerlab/labs"
-    cmd = (
-        f"target='{target_dir}'; "
-        "if [ ! -d \"$target\" ]; then echo '__MISSING_LABS_DIR__'; exit 44; fi; "
-        "cd \"$target\"; "
-        "for d in *; do "
-        "  [ -d \"$d\" ] || continue; "
-        "  if find \"$d\" -maxdepth 2 -type f -name '*clab*.yml' 2>/dev/null | grep -q .; then "
-        "    echo \"$d\"; "
-        "  fi; "
-        "done"
-    )
+    agent = run_agent(eve_ip, eve_user, eve_pass, "list-labs", target_dir, timeout=45)
+    if agent is not None:
+        labs = list(agent.get("labs") or [])
+        missing_dir = not agent.get("exists", True)
+        rc, err, cleaned_out = (44 if missing_dir else 0), "", ""
+    else:
+        cmd = (
+            f"target='{target_dir}'; "
+            "if [ ! -d \"$target\" ]; then echo '__MISSING_LABS_DIR__'; exit 44; fi; "
+            "cd \"$target\"; "
+            "for d in *; do "
+            "  [ -d \"$d\" ] || continue; "
+            "  if find \"$d\" -maxdepth 2 -type f -name '*clab*.yml' 2>/dev/null | grep -q .; then "
+            "    echo \"$d\"; "
+            "  fi; "
+            "done"
+        )
 
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=45)
-    cleaned_out = (out or "").strip()
-    labs = []
+        rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=45)
+        cleaned_out = (out or "").strip()
+        labs = []
 
-    for line in cleaned_out.splitlines():
-        line = line.strip()
-        if not line or line.startswith("__MISSING_LABS_DIR__"):
-            continue
-        labs.append(line)
+        for line in cleaned_out.splitlines():
+            line = line.strip()
+            if not line or line.startswith("__MISSING_LABS_DIR__"):
+                continue
+            labs.append(line)
+        missing_dir = "__MISSING_LABS_DIR__" in cleaned_out or rc == 44
 
-    if "__MISSING_LABS_DIR__" in cleaned_out or rc == 44:
+    if missing_dir:
         return (
             jsonify(
                 success=False,
@@ -370,6 +412,7 @@ def create_container_labs_dir():
 
 
 @container_labs_bp.route("/files", methods=["POST"])
+@conditional_listing(_lab_files_validator)
 def list_lab_files():
     """
     Lista arquivos dentro de um lab específico, retornando tipo (dir/file) e caminho relativo.
@@ -454,16 +497,28 @@ def get_lab_file():
     if not rel_path.lower().endswith((".yml", ".yaml", ".txt", ".py")):
         return jsonify(success=False, message=translate("container_labs.only_yaml", lang)), 400
 
-    cmd = (
-        f"base='{labs_dir}'; lab='{lab_name}'; file='{rel_path}'; "
-        "target=\"$base/$lab/$file\"; "
-        "if [ ! -f \"$target\" ]; then echo '__FILE_NOT_FOUND__'; exit 44; fi; "
-        "cat \"$target\""
+    agent = run_agent(
+        eve_ip, eve_user, eve_pass, "read-file", f"{labs_dir}/{lab_name}/{rel_path}", _LAB_FILE_MAX_BYTES,
+        timeout=45,
     )
+    if agent is not None:
+        found = bool(agent.get("exists"))
+        rc, err, cleaned_out = (0 if found else 44), "", agent.get("content") or ""
+        truncated = bool(agent.get("truncated"))
+    else:
+        cmd = (
+            f"base='{labs_dir}'; lab='{lab_name}'; file='{rel_path}'; "
+            "target=\"$base/$lab/$file\"; "
+            "if [ ! -f \"$target\" ]; then echo '__FILE_NOT_FOUND__'; exit 44; fi; "
+            "cat \"$target\""
+        )
 
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=45)
-    cleaned_out = (out or "")
-    if "__FILE_NOT_FOUND__" in cleaned_out or rc == 44:
+        rc, out, err, truncated = run_ssh_capture(
+            eve_ip, eve_user, eve_pass, cmd, timeout=45, max_bytes=_LAB_FILE_MAX_BYTES,
+        )
+        cleaned_out = (out or "")
+        found = not ("__FILE_NOT_FOUND__" in cleaned_out or rc == 44)
+    if not found:
         return (
             jsonify(
                 success=False,
@@ -473,7 +528,15 @@ def get_lab_file():
             404,
         )
 
-    return jsonify(success=True, message=translate("container_labs.file_success", lang), content=cleaned_out), 200
+    return (
+        jsonify(
+            success=True,
+            message=translate("container_labs.file_success", lang),
+            content=cleaned_out,
+            truncated=truncated,
+        ),
+        200,
+    )
 
 
 @container_labs_bp.route("/file/save", methods=["POST"])
@@ -1024,11 +1087,7 @@ def check_images():
         return jsonify(success=True, missing=[], present=[], images=[]), 200
 
     # 2) lista imagens do runtime
-    list_cmd = (
-        "if command -v docker >/dev/null 2>&1; then docker images --format '{{.Repository}}:{{.Tag}}'; "
-        "elif command -v podman >/dev/null 2>&1; then podman images --format '{{.Repository}}:{{.Tag}}'; "
-        "else echo '__NO_RUNTIME__'; fi"
-    )
+    list_cmd = _runtime_cmd("images --format '{{.Repository}}:{{.Tag}}'", runtime_for(eve_ip, eve_user, eve_pass))
     rc2, out2, err2 = run_ssh_command(eve_ip, eve_user, eve_pass, list_cmd, timeout=45)
     have = set()
     for line in (out2 or "").splitlines():
@@ -1070,7 +1129,7 @@ def deploy_lab():
 
     action = "deploy --reconfigure" if reconfigure else "deploy"
     cmd = _topology_target_cmd(labs_dir, lab_name, rel_path, action)
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=600)
+    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=600, priority=PRIORITY_BULK)
     combined = (out or "")
 
     if "__FILE_NOT_FOUND__" in combined or rc == 44:
@@ -1104,7 +1163,7 @@ def destroy_lab():
 
     action = "destroy --cleanup" if cleanup else "destroy"
     cmd = _topology_target_cmd(labs_dir, lab_name, rel_path, action)
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=600)
+    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=600, priority=PRIORITY_BULK)
     combined = (out or "")
 
     if "__FILE_NOT_FOUND__" in combined or rc == 44:
@@ -1123,12 +1182,11 @@ def _run_clab_job(job_id, eve_ip, eve_user, eve_pass, labs_dir, lab_name, rel_pa
         f"containerlab {action} -t '{target}' 2>&1"
     )
     _job_append(job_id, f"$ containerlab {action} -t {rel_path}")
-    try:
-        rc = run_ssh_stream(eve_ip, eve_user, eve_pass, cmd, lambda ln: _job_append(job_id, ln), timeout=1200)
-    except Exception as exc:  # pragma: no cover
-        _job_append(job_id, f"erro: {exc}")
-        rc = 1
-    _job_finish(job_id, rc)
+    start_ssh_stream(
+        eve_ip, eve_user, eve_pass, cmd,
+        lambda ln: _job_append(job_id, ln), lambda rc: _job_finish(job_id, rc),
+        timeout=1200, job_id=job_id,
+    )
 
 
 def _start_clab_job(action_label, action_cmd):
@@ -1146,12 +1204,7 @@ def _start_clab_job(action_label, action_cmd):
     if not rel_path.lower().endswith((".yml", ".yaml")):
         return jsonify(success=False, message=translate("container_labs.only_yaml", lang)), 400
     job_id = _job_new()
-    th = threading.Thread(
-        target=_run_clab_job,
-        args=(job_id, eve_ip, eve_user, eve_pass, labs_dir, lab_name, rel_path, action_cmd),
-        daemon=True,
-    )
-    th.start()
+    _run_clab_job(job_id, eve_ip, eve_user, eve_pass, labs_dir, lab_name, rel_path, action_cmd)
     return jsonify(success=True, job_id=job_id), 200
 
 
@@ -1202,6 +1255,17 @@ def clab_job():
         return jsonify(success=True, status=j["status"], log="\n".join(j["lines"]), rc=j["rc"], done=j["status"] != "running"), 200
 
 
+@container_labs_bp.route("/job/cancel", methods=["POST"])
+def clab_job_cancel():
+    """Interrompe um job de deploy/destroy/bulk (mata o ssh; rc=130)."""
+    job_id = (request.form.get("job_id") or "").strip()
+    with _CLAB_JOBS_LOCK:
+        j = _CLAB_JOBS.get(job_id)
+        if not j:
+            return jsonify(success=False, status="unknown"), 404
+    return jsonify(success=cancel_ssh_job(job_id)), 200
+
+
 # ---------------------------------------------------------------------------
 # P6 (#73): operações em massa (deploy/destroy/save) sobre vários labs.
 # ---------------------------------------------------------------------------
@@ -1219,12 +1283,11 @@ def _run_bulk_job(job_id, eve_ip, eve_user, eve_pass, labs_dir, labs, action):
         "done; exit $rc_all"
     )
     _job_append(job_id, f"$ bulk {action}: " + ", ".join(labs))
-    try:
-        rc = run_ssh_stream(eve_ip, eve_user, eve_pass, script, lambda ln: _job_append(job_id, ln), timeout=3600)
-    except Exception as exc:  # pragma: no cover
-        _job_append(job_id, f"erro: {exc}")
-        rc = 1
-    _job_finish(job_id, rc)
+    start_ssh_stream(
+        eve_ip, eve_user, eve_pass, script,
+        lambda ln: _job_append(job_id, ln), lambda rc: _job_finish(job_id, rc),
+        timeout=3600, job_id=job_id,
+    )
 
 
 @container_labs_bp.route("/bulk", methods=["POST"])
@@ -1245,11 +1308,7 @@ def bulk_action():
     if action not in act_map:
         return jsonify(success=False, message=translate("container_labs.tool_bad_input", lang)), 400
     job_id = _job_new()
-    threading.Thread(
-        target=_run_bulk_job,
-        args=(job_id, eve_ip, eve_user, eve_pass, labs_dir, labs, act_map[action]),
-        daemon=True,
-    ).start()
+    _run_bulk_job(job_id, eve_ip, eve_user, eve_pass, labs_dir, labs, act_map[action])
     return jsonify(success=True, job_id=job_id), 200
 
 
@@ -1309,14 +1368,29 @@ def inspect_labs():
     if lab_name and rel_path:
         if not _is_safe_relpath(lab_name) or not _is_safe_relpath(rel_path):
             return jsonify(success=False, message=translate("container_labs.invalid_path", lang)), 400
+        target = f"{labs_dir}/{lab_name}/{rel_path}"
+        agent = run_agent(eve_ip, eve_user, eve_pass, "inspect", target, timeout=45)
         selector = (
             f"base='{labs_dir}'; lab='{lab_name}'; file='{rel_path}'; target=\"$base/$lab/$file\"; "
             "if [ ! -f \"$target\" ]; then echo '__FILE_NOT_FOUND__'; exit 44; fi; "
             "containerlab inspect -t \"$target\" --format json 2>/dev/null"
         )
     else:
+        agent = run_agent(eve_ip, eve_user, eve_pass, "inspect", timeout=45)
         selector = "containerlab inspect --all --format json 2>/dev/null"
 
+    if agent is not None and not agent.get("parse_error"):
+        # O agente já entrega o JSON decodificado; sem sentinelas para procurar.
+        if agent.get("file_missing"):
+            return jsonify(success=False, message=translate("container_labs.file_missing", lang, path=rel_path)), 404
+        rc = agent.get("rc", 46)
+        if not agent.get("clab"):
+            return jsonify(success=False, message=translate("container_labs.inspect_fail", lang, rc=rc), containers=[], raw=""), 200
+        parsed = agent.get("data")
+        if parsed is None:
+            return jsonify(success=True, containers=[], raw="", ssh_rc=rc), 200
+        return jsonify(success=True, containers=_normalize_inspect(parsed), raw=json.dumps(parsed), ssh_rc=rc), 200
+
     cmd = (
         "if ! command -v containerlab >/dev/null 2>&1; then echo '__NO_CONTAINERLAB__'; exit 46; fi; "
         + selector
@@ -1481,11 +1555,13 @@ def node_capture():
         return jsonify(success=False, message=translate("container_labs.invalid_iface", lang)), 400
     q = shlex.quote(container)
     qi = shlex.quote(iface)
-    cmd = (
+    runtime = runtime_for(eve_ip, eve_user, eve_pass)
+    detect_rt = (
+        f"RT={shlex.quote(runtime)}; " if runtime else
         "if command -v docker >/dev/null 2>&1; then RT=docker; "
         "elif command -v podman >/dev/null 2>&1; then RT=podman; else exit 45; fi; "
-        f"$RT exec {q} timeout 60 tcpdump -i {qi} -w - -c {int(count)} 2>/dev/null"
     )
+    cmd = detect_rt + f"$RT exec {q} timeout 60 tcpdump -i {qi} -w - -c {int(count)} 2>/dev/null"
     rc, data, errtxt = run_ssh_binary(eve_ip, eve_user, eve_pass, cmd, timeout=90)
     if not data:
         return jsonify(success=False, message=translate("container_labs.capture_fail", lang)), 200
@@ -1510,10 +1586,9 @@ def node_stats():
     if not _is_safe_container_name(container):
         return jsonify(success=False, message=translate("container_labs.invalid_container", lang)), 400
     q = shlex.quote(container)
-    cmd = (
-        "if command -v docker >/dev/null 2>&1; then docker stats --no-stream --format '{{.CPUPerc}};{{.MemUsage}};{{.MemPerc}}' " + q + " 2>&1; "
-        "elif command -v podman >/dev/null 2>&1; then podman stats --no-stream --format '{{.CPUPerc}};{{.MemUsage}};{{.MemPerc}}' " + q + " 2>&1; "
-        "else echo '__NO_RUNTIME__'; exit 45; fi"
+    cmd = _runtime_cmd(
+        "stats --no-stream --format '{{.CPUPerc}};{{.MemUsage}};{{.MemPerc}}' " + q + " 2>&1",
+        runtime_for(eve_ip, eve_user, eve_pass),
     )
     rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=30)
     combined = (out or "").strip()
@@ -1594,12 +1669,15 @@ def node_logs():
     if not _is_safe_container_name(container):
         return jsonify(success=False, message=translate("container_labs.invalid_container", lang)), 400
 
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, _runtime_logs_cmd(container, tail), timeout=45)
+    cmd = _runtime_logs_cmd(container, tail, runtime_for(eve_ip, eve_user, eve_pass))
+    rc, out, err, truncated = run_ssh_capture(
+        eve_ip, eve_user, eve_pass, cmd, timeout=45, max_bytes=_NODE_LOGS_MAX_BYTES,
+    )
     combined = (out or "")
     if "__NO_RUNTIME__" in combined or rc == 45:
         return jsonify(success=False, message=translate("container_labs.logs_fail", lang, rc=rc), logs=combined), 500
 
-    return jsonify(success=True, logs=combined, ssh_rc=rc, stderr=(err or "").strip()), 200
+    return jsonify(success=True, logs=combined, truncated=truncated, ssh_rc=rc, stderr=(err or "").strip()), 200
 
 
 @container_labs_bp.route("/node/exec", methods=["POST"])
@@ -1619,7 +1697,8 @@ def node_exec():
     if not command:
         return jsonify(success=False, message=translate("container_labs.missing_command", lang)), 400
 
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, _runtime_exec_cmd(container, command), timeout=60)
+    cmd = _runtime_exec_cmd(container, command, runtime_for(eve_ip, eve_user, eve_pass))
+    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=60)
     combined = (out or "")
     if "__NO_RUNTIME__" in combined or rc == 45:
         return jsonify(success=False, message=translate("container_labs.exec_fail", lang, rc=rc), output=combined), 500
@@ -1947,11 +2026,7 @@ def node_inspect():
     if not _is_safe_container_name(container):
         return jsonify(success=False, message=translate("container_labs.invalid_container", lang)), 400
     q = shlex.quote(container)
-    cmd = (
-        "if command -v docker >/dev/null 2>&1; then docker inspect " + q + " 2>&1; "
-        "elif command -v podman >/dev/null 2>&1; then podman inspect " + q + " 2>&1; "
-        "else echo '__NO_RUNTIME__'; exit 45; fi"
-    )
+    cmd = _runtime_cmd("inspect " + q + " 2>&1", runtime_for(eve_ip, eve_user, eve_pass))
     rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=45)
     combined = (out or "")
     if "__NO_RUNTIME__" in combined or rc == 45:
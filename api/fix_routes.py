@@ -18,58 +18,19 @@ from typing import List, Dict, Any
 from flask import Blueprint, request, jsonify
 import paramiko
 
+import fix_scheduler
 from i18n import translate, get_request_lang
+from sftp_pool import ssh_session
 
 fix_bp = Blueprint("fix_bp", __name__)
 
 
-def _ssh_connect(eve_ip: str, eve_user: str, eve_pass: str) -> paramiko.SSHClient:
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(eve_ip, username=eve_user, password=eve_pass, timeout=30)
-    return ssh
-
-
 def _run_fixpermissions(ssh: paramiko.SSHClient, errors: List[Dict[str, Any]]) -> bool:
     """
     Executa o comando fixpermissions no host EVE-NG.
+    Pedidos próximos no mesmo host são agrupados (ver fix_scheduler).
     """
-    cmd = "/opt/unetlab/wrappers/unl_wrapper -a fixpermissions"
-
-    try:
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-        exit_status = stdout.channel.recv_exit_status()
-        out = stdout.read().decode(errors="ignore")
-        err = stderr.read().decode(errors="ignore")
-
-        if exit_status != 0:
-            errors.append(
-                {
-                    "step": "fixpermissions",
-                    "stdout": out,
-                    "stderr": err or f"Exit status {exit_status}",
-                }
-            )
-            return False
-
-        # Se quiser ver stdout como informação adicional:
-        if out.strip():
-            errors.append(
-                {
-                    "step": "fixpermissions_stdout",
-                    "stdout": out.strip(),
-                }
-            )
-
-        return True
-    except Exception as e:
-        errors.append(
-            {
-                "step": "fixpermissions",
-                "stderr": f"Exception: {e}",
-            }
-        )
-        return False
+    return fix_scheduler.fix_with_ssh(ssh, errors)
 
 
 @fix_bp.route("/fixpermissions", methods=["POST"])
@@ -96,10 +57,9 @@ def fix_permissions():
             400,
         )
 
-    ssh = None
     try:
-        ssh = _ssh_connect(eve_ip, eve_user, eve_pass)
-        ok = _run_fixpermissions(ssh, errors)
+        with ssh_session(eve_ip, eve_user, eve_pass) as ssh:
+            ok = _run_fixpermissions(ssh, errors)
 
         if ok:
             msg = translate("fix.success", lang)
@@ -132,6 +92,3 @@ def fix_permissions():
             ),
             500,
         )
-    finally:
-        if ssh is not None:
-            ssh.close()
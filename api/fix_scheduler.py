@@ -0,0 +1,271 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Agrupamento de fixpermissions por host.
+
+`unl_wrapper -a fixpermissions` percorre toda a árvore /opt/unetlab; vários
+uploads terminando juntos não precisam de uma passada cada. Cada pedido entra
+no lote aberto do host; o primeiro pedido do lote (o líder) espera
+FIXPERMISSIONS_WINDOW segundos (padrão 1) e também a execução anterior do
+mesmo host terminar, e então roda o comando uma vez, com a sua própria
+sessão. Quem chegou nesse meio tempo só espera o resultado compartilhado,
+que informa quantos pedidos foram atendidos (merged).
+
+Pedidos que chegam com uma execução já em andamento vão para o lote
+seguinte: a passada em curso pode já ter passado pelos arquivos deles.
+
+Ninguém espera para sempre: seguidores (e o líder, pela execução anterior)
+desistem após FIXPERMISSIONS_WAIT_TIMEOUT segundos (padrão 600) e recebem
+rc=None, que as rotas tratam como falha do fixpermissions. O comando via
+paramiko usa o mesmo limite como timeout do canal.
+
+Modo direcionado (FIXPERMISSIONS_MODE=targeted, opcional): quando o
+chamador informa o diretório que acabou de escrever e ele fica sob um dos
+diretórios de imagens de TARGET_RULES, só ele recebe dono e modos, na hora e
+sem passar pelo lote. Fora dessas regras, ou se o comando falhar, vale o
+wrapper global. O padrão (FIXPERMISSIONS_MODE=global) continua sendo sempre
+o wrapper: TARGET_RULES ainda não foi conferido contra o que o
+unl_wrapper de cada versão do EVE aplica, e uma regra errada deixaria
+imagens inutilizáveis sem erro visível.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import os
+import posixpath
+import shlex
+import socket
+import threading
+import time
+
+FIX_CMD = "/opt/unetlab/wrappers/unl_wrapper -a fixpermissions"
+WINDOW = float(os.getenv("FIXPERMISSIONS_WINDOW", "1.0"))
+WAIT_TIMEOUT = float(os.getenv("FIXPERMISSIONS_WAIT_TIMEOUT", "600"))
+MODE = os.getenv("FIXPERMISSIONS_MODE", "global").strip().lower()
+
+# Dono e modos esperados nos diretórios de imagens, usados só no modo
+# direcionado: (diretório base, dono, modo dos diretórios, modo dos arquivos).
+# Confira contra `unl_wrapper -a fixpermissions` do host antes de ligar.
+TARGET_RULES = (
+    ("/opt/unetlab/addons/qemu", "root:root", "755", "644"),
+    ("/opt/unetlab/addons/iol/bin", "root:root", "755", "755"),
+    ("/opt/unetlab/addons/dynamips", "root:root", "755", "644"),
+)
+
+_LOCK = threading.Lock()
+_PENDING: dict[tuple, "_Batch"] = {}
+_RUN_LOCKS: dict[tuple, threading.Lock] = {}
+_STATS = {"requests": 0, "runs": 0, "targeted": 0}
+
+
+class _Batch:
+    def __init__(self):
+        self.opened = time.monotonic()
+        self.requests = 1
+        self.done = threading.Event()
+        self.result: dict | None = None
+
+
+def _address(host: str) -> str:
+    """
+    Endereço IP normalizado do host, para que o nome digitado no formulário
+    e o peer de uma sessão já aberta caiam na mesma chave. Sem resolução,
+    fica o próprio nome.
+    """
+    host = (host or "").strip().lower()
+    try:
+        addr = ipaddress.ip_address(host)
+    except ValueError:
+        try:
+            addr = ipaddress.ip_address(socket.getaddrinfo(host, 22, type=socket.SOCK_STREAM)[0][4][0])
+        except (OSError, ValueError, IndexError):
+            return host
+    mapped = getattr(addr, "ipv4_mapped", None)
+    return str(mapped or addr)
+
+
+def host_key(eve_ip: str, eve_user: str) -> tuple[str, str]:
+    return (_address(eve_ip), (eve_user or "").strip())
+
+
+def ssh_host_key(ssh) -> tuple:
+    """Chave do host a partir de uma sessão paramiko (peer + usuário)."""
+    try:
+        transport = ssh.get_transport()
+        peer, user = str(transport.getpeername()[0]), str(transport.get_username())
+    except Exception:
+        return ("ssh", id(ssh))  # sem como identificar: não agrupa
+    return host_key(peer, user)
+
+
+def _timed_out(batch: _Batch, what: str) -> dict:
+    return {"rc": None, "stdout": "", "stderr": f"fixpermissions: timeout aguardando {what}",
+            "merged": batch.requests, "run_ms": 0}
+
+
+def run(key: tuple, runner, timeout: float | None = None) -> dict:
+    """
+    Pede um fixpermissions no host `key` e espera o lote terminar. runner()
+    executa o comando e retorna (rc, stdout, stderr); só o do líder é usado.
+
+    Retorna {rc, stdout, stderr, merged, leader, waited_ms, run_ms}; rc=None
+    se o lote (ou a execução anterior) não terminou dentro de timeout
+    (padrão WAIT_TIMEOUT).
+    """
+    timeout = WAIT_TIMEOUT if timeout is None else timeout
+    started = time.monotonic()
+    with _LOCK:
+        _STATS["requests"] += 1
+        batch = _PENDING.get(key)
+        leader = batch is None
+        if leader:
+            batch = _PENDING[key] = _Batch()
+        else:
+            batch.requests += 1
+        run_lock = _RUN_LOCKS.setdefault(key, threading.Lock())
+
+    if not leader:
+        finished = batch.done.wait(timeout)
+        result = dict(batch.result) if finished and batch.result else _timed_out(batch, "o lote")
+        result.update(leader=False, waited_ms=int((time.monotonic() - started) * 1000))
+        return result
+
+    try:
+        delay = batch.opened + WINDOW - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if not run_lock.acquire(timeout=max(0.0, timeout - (time.monotonic() - started))):
+            batch.result = _timed_out(batch, "a execução anterior")
+        else:
+            try:
+                with _LOCK:
+                    # Fecha o lote: quem chegar agora abre o próximo.
+                    if _PENDING.get(key) is batch:
+                        del _PENDING[key]
+                    merged = batch.requests
+                    _STATS["runs"] += 1
+                run_started = time.monotonic()
+                try:
+                    rc, out, err = runner()
+                except Exception as e:
+                    rc, out, err = -1, "", f"Exception: {e}"
+                batch.result = {
+                    "rc": rc,
+                    "stdout": out or "",
+                    "stderr": err or "",
+                    "merged": merged,
+                    "run_ms": int((time.monotonic() - run_started) * 1000),
+                }
+            finally:
+                run_lock.release()
+    finally:
+        with _LOCK:
+            if _PENDING.get(key) is batch:
+                del _PENDING[key]
+        if batch.result is None:
+            batch.result = {"rc": -1, "stdout": "", "stderr": "fixpermissions não executado", "merged": batch.requests,
+                            "run_ms": 0}
+        batch.done.set()
+    result = dict(batch.result)
+    if result["merged"] > 1:
+        print(f"[API] fixpermissions em {key[0]}: {result['merged']} pedidos atendidos por uma execução", flush=True)
+    result.update(leader=True, waited_ms=int((time.monotonic() - started) * 1000))
+    return result
+
+
+def _exec_paramiko(ssh, cmd: str = FIX_CMD):
+    """Lê stdout e stderr (numa thread) antes do status, com WAIT_TIMEOUT no canal."""
+    _stdin, stdout, stderr = ssh.exec_command(cmd, timeout=WAIT_TIMEOUT)
+    err: list[bytes] = []
+    reader = threading.Thread(target=lambda: err.append(stderr.read()), daemon=True)
+    reader.start()
+    out = stdout.read()
+    reader.join(WAIT_TIMEOUT)
+    rc = stdout.channel.recv_exit_status()
+    return rc, out.decode(errors="ignore"), b"".join(err).decode(errors="ignore")
+
+
+def _target_rule(path: str):
+    """Regra de TARGET_RULES para um diretório estritamente abaixo da base, ou None."""
+    path = posixpath.normpath(path or "")
+    if not path.startswith("/"):
+        return None
+    for rule in TARGET_RULES:
+        if path.startswith(rule[0].rstrip("/") + "/"):
+            return rule
+    return None
+
+
+def targeted_cmd(paths) -> str | None:
+    """Comando que aplica as regras só nos diretórios dados; None se algum não tem regra."""
+    parts = []
+    for path in paths:
+        rule = _target_rule(path)
+        if rule is None:
+            return None
+        _base, owner, dir_mode, file_mode = rule
+        p = shlex.quote(posixpath.normpath(path))
+        parts.append(
+            f"chown -R {owner} {p} && "
+            f"find {p} -type d -exec chmod {dir_mode} {{}} + && "
+            f"find {p} -type f -exec chmod {file_mode} {{}} +"
+        )
+    return " && ".join(parts) if parts else None
+
+
+def fix_with_ssh(ssh, errors: list, paths=None) -> bool:
+    """
+    Corrige permissões após uma escrita. Com paths (diretórios escritos) e o
+    modo direcionado, aplica as regras só neles; senão, fixpermissions
+    agrupado, usando a sessão paramiko do chamador se ele for o líder.
+    Mantém o formato de erros das rotas (step fixpermissions /
+    fixpermissions_stdout) e registra fixpermissions_merged quando o
+    resultado foi compartilhado.
+    """
+    cmd = targeted_cmd(paths) if MODE == "targeted" and paths else None
+    if cmd is not None:
+        try:
+            rc, _out, err = _exec_paramiko(ssh, cmd)
+        except Exception as e:
+            rc, err = -1, str(e)
+        if rc == 0:
+            with _LOCK:
+                _STATS["targeted"] += 1
+            return True
+        print(f"[API] Permissões direcionadas falharam (rc={rc}): {err.strip()}; usando o fixpermissions global",
+              flush=True)
+
+    result = run(ssh_host_key(ssh), lambda: _exec_paramiko(ssh))
+    out, err, rc = result["stdout"], result["stderr"], result["rc"]
+    if rc != 0:
+        errors.append(
+            {
+                "step": "fixpermissions",
+                "stdout": out,
+                "stderr": err or f"Exit status {rc}",
+            }
+        )
+        return False
+    if out.strip():
+        errors.append({"step": "fixpermissions_stdout", "stdout": out.strip()})
+    if result["merged"] > 1:
+        errors.append({"step": "fixpermissions_merged", "merged": result["merged"]})
+    return True
+
+
+def stats() -> dict:
+    with _LOCK:
+        return {**_STATS, "pending_hosts": len(_PENDING)}
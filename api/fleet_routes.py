@@ -0,0 +1,220 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Modo frota: a mesma consulta em vários hosts, em paralelo.
+
+POST /fleet/query recebe uma lista de hosts e o nome da consulta (images,
+container_images, inspect, resources, profile). Um pool limitado
+(FLEET_MAX_WORKERS, padrão 8) consulta os hosts e a resposta é NDJSON: uma
+linha por host assim que ele termina, com tempo e erro isolados, e uma linha
+final de resumo. Host que não responde em FLEET_TIMEOUT segundos sai como
+timeout sem segurar os demais.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import Blueprint, Response, jsonify, request
+
+from container_images_routes import _list_images_shell
+from container_labs_routes import _normalize_inspect
+from host_agent import run_agent
+from host_profile import get_profile, public_view
+from i18n import get_request_lang, translate
+from image_routes import collect_images
+import resource_sampler
+from utils import FLEET_MAX_HOSTS, get_resource_usage, parse_hosts, run_ssh_command
+
+fleet_bp = Blueprint("fleet_bp", __name__, url_prefix="/fleet")
+
+FLEET_MAX_WORKERS = max(1, int(os.getenv("FLEET_MAX_WORKERS", "8")))
+FLEET_TIMEOUT = max(1, int(os.getenv("FLEET_TIMEOUT", "120")))
+
+
+class FleetError(Exception):
+    """Falha de consulta em um host (vira a linha de erro daquele host)."""
+
+
+def _q_profile(eve_ip, eve_user, eve_pass):
+    profile = get_profile(eve_ip, eve_user, eve_pass)
+    if profile is None:
+        raise FleetError("perfil indisponível")
+    return {"profile": public_view(profile)}
+
+
+def _q_resources(eve_ip, eve_user, eve_pass):
+    resource_sampler.register(eve_ip, eve_user, eve_pass)
+    resources = resource_sampler.latest(eve_ip, eve_user, eve_pass)
+    if resources is None:
+        resources = get_resource_usage(eve_ip, eve_user, eve_pass)
+        resources["source"] = "ssh"
+    return {"resources": resources}
+
+
+def _q_images(eve_ip, eve_user, eve_pass):
+    images, errors, (name, raw, source), resources = collect_images(eve_ip, eve_user, eve_pass)
+    return {
+        "images": images,
+        "errors": errors,
+        "platform": {"name": name, "raw": raw, "source": source},
+        "resources": resources,
+    }
+
+
+def _q_container_images(eve_ip, eve_user, eve_pass):
+    agent = run_agent(eve_ip, eve_user, eve_pass, "runtime-images")
+    if agent is not None:
+        runtime, images, rc = agent.get("runtime") or "", agent.get("images") or [], agent.get("rc", 0)
+    else:
+        runtime, images, rc, _out, _err = _list_images_shell(eve_ip, eve_user, eve_pass)
+    if not runtime:
+        raise FleetError("sem docker/podman")
+    if rc != 0 and not images:
+        raise FleetError(f"rc={rc}")
+    return {"runtime": runtime, "images": images}
+
+
+def _q_inspect(eve_ip, eve_user, eve_pass):
+    """`containerlab inspect --all` (agente, ou one-liner se não houver python3)."""
+    agent = run_agent(eve_ip, eve_user, eve_pass, "inspect", timeout=45)
+    if agent is not None and not agent.get("parse_error"):
+        if not agent.get("clab"):
+            raise FleetError("containerlab não encontrado")
+        parsed = agent.get("data")
+        return {"containers": _normalize_inspect(parsed) if parsed is not None else []}
+
+    cmd = (
+        "if ! command -v containerlab >/dev/null 2>&1; then echo '__NO_CONTAINERLAB__'; exit 46; fi; "
+        "containerlab inspect --all --format json 2>/dev/null"
+    )
+    rc, out, _err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=45)
+    combined = (out or "").strip()
+    if "__NO_CONTAINERLAB__" in combined or rc == 46:
+        raise FleetError("containerlab não encontrado")
+    if not combined:
+        return {"containers": []}
+    try:
+        return {"containers": _normalize_inspect(json.loads(combined))}
+    except (ValueError, TypeError):
+        raise FleetError("saída do inspect não é JSON")
+
+
+QUERIES = {
+    "profile": _q_profile,
+    "resources": _q_resources,
+    "images": _q_images,
+    "container_images": _q_container_images,
+    "inspect": _q_inspect,
+}
+
+
+def _run_one(fn, host: dict) -> dict:
+    """Executa a consulta num host; exceções viram resultado de erro."""
+    started = time.monotonic()
+    try:
+        data = fn(host["eve_ip"], host["eve_user"], host["eve_pass"])
+        result = {"ok": True, "data": data}
+    except Exception as exc:
+        result = {"ok": False, "error": str(exc) or exc.__class__.__name__}
+    result["elapsed_ms"] = round(1000 * (time.monotonic() - started), 1)
+    return result
+
+
+def fan_out(query: str, hosts: list[dict], timeout: float = FLEET_TIMEOUT, workers: int = FLEET_MAX_WORKERS):
+    """
+    Gera um dict por host na ordem em que terminam e, por último, o resumo
+    {"done": True, ...}. Hosts que estouram o timeout geral saem com
+    error="timeout"; suas threads terminam sozinhas (os comandos ssh têm
+    timeout próprio) e não seguram a resposta.
+    """
+    fn = QUERIES[query]
+    started = time.monotonic()
+    deadline = started + timeout
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(hosts))), thread_name_prefix="fleet")
+    pending = {pool.submit(_run_one, fn, host): host for host in hosts}
+    counts = {"ok": 0, "failed": 0}
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                host = pending.pop(fut)
+                result = fut.result()
+                counts["ok" if result["ok"] else "failed"] += 1
+                yield {"host": host["eve_ip"], "name": host["name"], "query": query, **result}
+        for fut, host in pending.items():
+            fut.cancel()
+            counts["failed"] += 1
+            yield {
+                "host": host["eve_ip"],
+                "name": host["name"],
+                "query": query,
+                "ok": False,
+                "error": "timeout",
+                "elapsed_ms": round(1000 * (time.monotonic() - started), 1),
+            }
+    finally:
+        # Também roda se o cliente desconectar no meio do stream.
+        pool.shutdown(wait=False, cancel_futures=True)
+    yield {
+        "done": True,
+        "query": query,
+        "total": len(hosts),
+        "elapsed_ms": round(1000 * (time.monotonic() - started), 1),
+        **counts,
+    }
+
+
+@fleet_bp.route("/query", methods=["POST"])
+def fleet_query():
+    """
+    Corpo JSON: {"query": "images", "hosts": [{"eve_ip", "eve_user", "eve_pass",
+    "name"?}, ...], "timeout"?: s}. Também aceita formulário com `hosts` em
+    JSON. Resposta em NDJSON (application/x-ndjson), uma linha por host.
+    """
+    lang = get_request_lang()
+    body = request.get_json(silent=True) or request.form
+    query = str(body.get("query") or "").strip().lower()
+    if query not in QUERIES:
+        return jsonify(success=False, message=translate("fleet.unknown_query", lang, queries=", ".join(QUERIES))), 400
+
+    hosts = parse_hosts(body.get("hosts"))
+    if hosts is None:
+        return jsonify(success=False, message=translate("fleet.bad_hosts", lang)), 400
+    if len(hosts) > FLEET_MAX_HOSTS:
+        return jsonify(success=False, message=translate("fleet.too_many_hosts", lang, max=FLEET_MAX_HOSTS)), 400
+
+    try:
+        timeout = float(body.get("timeout") or FLEET_TIMEOUT)
+    except (TypeError, ValueError):
+        return jsonify(success=False, message=translate("host.bad_params", lang)), 400
+    timeout = max(1.0, min(timeout, FLEET_TIMEOUT))
+
+    print(f"[API] Frota: {query} em {len(hosts)} host(s)", flush=True)
+
+    def generate():
+        for item in fan_out(query, hosts, timeout=timeout):
+            yield json.dumps(item) + "\n"
+
+    return Response(
+        generate(),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
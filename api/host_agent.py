@@ -0,0 +1,334 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Agente auxiliar no host remoto (python3) que responde consultas em JSON.
+
+Em vez de one-liners de shell com sentinelas (__NOT_FOUND__, RUNTIME=...), a API
+envia o script uma única vez para AGENT_DIR, com o hash do conteúdo no nome, e
+depois só o chama com um verbo:
+
+    list-images    listagem dos diretórios base (qemu/iol/dynamips)
+    list-labs      labs ContainerLab (diretórios com *clab*.yml)
+    read-file      conteúdo de um arquivo (com limite de bytes)
+    runtime-images imagens do docker/podman (JSON nativo do runtime)
+    inspect        `containerlab inspect --format json`
+    resources      CPU/memória/disco
+
+Opcional: se o host não tiver python3 (ou HOST_AGENT=0), run_agent devolve None
+e as rotas usam o comando de shell de antes.
+
+O agente roda como o usuário do SSH (em geral root), então o arquivo não pode
+ser de mais ninguém: AGENT_DIR fica no $HOME do usuário, e antes do `exec` o
+lançador exige diretório e arquivo do próprio usuário, sem symlink, com modos
+700/600 e sha256 igual ao de AGENT_SOURCE. Qualquer divergência conta como
+agente ausente e leva a uma reinstalação.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import shlex
+import threading
+import time
+
+from utils import run_ssh_command
+
+AGENT_ENABLED = os.getenv("HOST_AGENT", "1").strip().lower() not in ("0", "false", "no")
+# Expandido pelo shell remoto (entre aspas duplas).
+AGENT_DIR = "${HOME:?}/.cache/ncf-agent"
+_FRAME = "__NCF_AGENT__"
+# rc reservados pelo lançador (não colidem com os rc 44-46 das rotas).
+_RC_MISSING = 98
+_RC_NO_PYTHON = 97
+# Host sem python3: não tenta de novo por este tempo.
+_UNSUPPORTED_TTL = 600
+
+# Compatível com python3.5+ (EVE-NG antigo em Ubuntu 16.04): sem f-strings.
+AGENT_SOURCE = r'''
+import glob, json, os, shutil, subprocess, sys, time
+
+FRAME = "__NCF_AGENT__"
+
+
+def out(doc):
+    sys.stdout.write(FRAME + " " + json.dumps(doc, separators=(",", ":")) + "\n")
+
+
+def run(argv, timeout=None):
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        data, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        data, err = proc.communicate()
+        return 124, data.decode("utf-8", "replace"), "timeout"
+    return proc.returncode, data.decode("utf-8", "replace"), err.decode("utf-8", "replace")
+
+
+def runtime():
+    for name in ("docker", "podman"):
+        if shutil.which(name):
+            return name
+    return ""
+
+
+def subdirs(path):
+    try:
+        return sorted(e for e in os.listdir(path) if os.path.isdir(os.path.join(path, e)))
+    except OSError:
+        return []
+
+
+def v_list_images(args):
+    dirs = json.loads(args[0]) if args else {}
+    return {"dirs": dict((kind, subdirs(path)) for kind, path in dirs.items())}
+
+
+def v_list_labs(args):
+    base = args[0]
+    if not os.path.isdir(base):
+        return {"exists": False, "labs": []}
+    labs = []
+    for name in subdirs(base):
+        lab = os.path.join(base, name)
+        if glob.glob(os.path.join(lab, "*clab*.yml")) or glob.glob(os.path.join(lab, "*", "*clab*.yml")):
+            labs.append(name)
+    return {"exists": True, "labs": labs}
+
+
+def v_read_file(args):
+    path = args[0]
+    limit = int(args[1]) if len(args) > 1 else 8 * 1024 * 1024
+    if not os.path.isfile(path):
+        return {"exists": False}
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        data = fh.read(limit)
+    return {
+        "exists": True,
+        "size": size,
+        "truncated": size > limit,
+        "content": data.decode("utf-8", "replace"),
+    }
+
+
+def v_runtime_images(args):
+    match = ""
+    check_dir = ""
+    it = iter(args)
+    for a in it:
+        if a == "--match":
+            match = next(it, "").lower()
+        elif a == "--check-dir":
+            check_dir = next(it, "")
+    rt = runtime()
+    doc = {"runtime": rt, "images": []}
+    if check_dir:
+        doc["dir_present"] = os.path.isdir(check_dir)
+    if not rt:
+        return doc
+    rc, data, err = run([rt, "images", "--format", "{{json .}}"], timeout=60)
+    doc["rc"] = rc
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        item = {
+            "repository": str(row.get("Repository") or ""),
+            "tag": str(row.get("Tag") or ""),
+            "id": str(row.get("ID") or row.get("Id") or ""),
+            "created": str(row.get("CreatedSince") or row.get("CreatedAt") or ""),
+            "size": str(row.get("Size") or ""),
+        }
+        if match and match not in item["repository"].lower():
+            continue
+        doc["images"].append(item)
+    if rc != 0:
+        doc["stderr"] = err.strip()
+    return doc
+
+
+def v_inspect(args):
+    if not shutil.which("containerlab"):
+        return {"clab": False}
+    argv = ["containerlab", "inspect", "--format", "json"]
+    if args:
+        if not os.path.isfile(args[0]):
+            return {"clab": True, "file_missing": True}
+        argv += ["-t", args[0]]
+    else:
+        argv.append("--all")
+    rc, data, err = run(argv, timeout=40)
+    data = data.strip()
+    doc = {"clab": True, "rc": rc, "data": None}
+    if data:
+        try:
+            doc["data"] = json.loads(data)
+        except ValueError:
+            doc["parse_error"] = True
+    return doc
+
+
+def cpu_times():
+    with open("/proc/stat") as fh:
+        f = [int(x) for x in fh.readline().split()[1:9]]
+    idle = f[3] + f[4]
+    return idle, sum(f) - idle
+
+
+def v_resources(args):
+    interval = float(args[0]) if args else 1.0
+    i1, n1 = cpu_times()
+    time.sleep(interval)
+    i2, n2 = cpu_times()
+    total = (i2 - i1) + (n2 - n1)
+    doc = {"cpu_percent": (100 * (n2 - n1) // total) if total > 0 else 0}
+    mem = {}
+    with open("/proc/meminfo") as fh:
+        for line in fh:
+            k, _, v = line.partition(":")
+            mem[k] = int(v.split()[0]) // 1024
+    doc["mem_total_mb"] = mem.get("MemTotal")
+    doc["mem_free_mb"] = mem.get("MemFree")
+    if doc["mem_total_mb"] is not None:
+        avail = mem.get("MemAvailable", mem.get("MemFree", 0))
+        doc["mem_used_mb"] = doc["mem_total_mb"] - avail
+    st = os.statvfs("/")
+    total_kb = st.f_blocks * st.f_frsize // 1024
+    free_kb = st.f_bavail * st.f_frsize // 1024
+    used_kb = (st.f_blocks - st.f_bfree) * st.f_frsize // 1024
+    doc["disk_total_kb"] = total_kb
+    doc["disk_used_kb"] = used_kb
+    doc["disk_free_kb"] = free_kb
+    denom = used_kb + free_kb
+    doc["disk_percent"] = (100 * used_kb + denom - 1) // denom if denom else None
+    return doc
+
+
+VERBS = {
+    "list-images": v_list_images,
+    "list-labs": v_list_labs,
+    "read-file": v_read_file,
+    "runtime-images": v_runtime_images,
+    "inspect": v_inspect,
+    "resources": v_resources,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in VERBS:
+        out({"error": "unknown verb"})
+        return 2
+    try:
+        out(VERBS[sys.argv[1]](sys.argv[2:]))
+    except Exception as exc:
+        out({"error": str(exc)})
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+'''.lstrip()
+
+AGENT_SHA256 = hashlib.sha256(AGENT_SOURCE.encode("utf-8")).hexdigest()
+AGENT_VERSION = AGENT_SHA256[:12]
+AGENT_PATH = f"{AGENT_DIR}/agent-{AGENT_VERSION}.py"
+
+_LOCK = threading.Lock()
+# (host, user) -> monotonic até quando o host fica marcado como sem suporte.
+_UNSUPPORTED: dict[tuple[str, str], float] = {}
+
+
+def _key(eve_ip: str, eve_user: str) -> tuple[str, str]:
+    return ((eve_ip or "").strip().lower(), (eve_user or "").strip())
+
+
+def _launch_cmd(verb: str, args) -> str:
+    quoted = " ".join(shlex.quote(str(a)) for a in (verb, *args))
+    return (
+        f"d=\"{AGENT_DIR}\"; f=\"{AGENT_PATH}\"; "
+        f"command -v python3 >/dev/null 2>&1 || exit {_RC_NO_PYTHON}; "
+        "[ -f \"$f\" ] && [ ! -L \"$d\" ] && [ ! -L \"$f\" ] && [ -O \"$d\" ] && [ -O \"$f\" ] "
+        "&& [ \"$(stat -c %a \"$d\")\" = 700 ] && [ \"$(stat -c %a \"$f\")\" = 600 ] "
+        f"&& [ \"$(sha256sum < \"$f\" | cut -d' ' -f1)\" = {AGENT_SHA256} ] || exit {_RC_MISSING}; "
+        f"exec python3 \"$f\" {quoted}"
+    )
+
+
+def _install_cmd() -> str:
+    payload = base64.b64encode(AGENT_SOURCE.encode("utf-8")).decode("ascii")
+    return (
+        f"umask 077; d=\"{AGENT_DIR}\"; f=\"{AGENT_PATH}\"; "
+        "mkdir -p \"$d\" && [ ! -L \"$d\" ] && [ -O \"$d\" ] && chmod 700 \"$d\" && "
+        f"printf '%s' '{payload}' | base64 -d > \"$f.tmp.$$\" && chmod 600 \"$f.tmp.$$\" && "
+        "rm -f \"$d\"/agent-*.py && mv \"$f.tmp.$$\" \"$f\""
+    )
+
+
+def _parse(out: str):
+    for line in reversed((out or "").splitlines()):
+        if line.startswith(_FRAME + " "):
+            try:
+                doc = json.loads(line[len(_FRAME) + 1:])
+            except ValueError:
+                return None
+            return doc if isinstance(doc, dict) else None
+    return None
+
+
+def install(eve_ip: str, eve_user: str, eve_pass: str) -> bool:
+    rc, _out, err = run_ssh_command(eve_ip, eve_user, eve_pass, _install_cmd(), timeout=30)
+    if rc != 0:
+        print(f"[API] Falha ao instalar agente em {eve_ip}: rc={rc} {(err or '').strip()}", flush=True)
+    return rc == 0
+
+
+def run_agent(eve_ip: str, eve_user: str, eve_pass: str, verb: str, *args, timeout: int = 60):
+    """
+    Executa um verbo do agente e devolve o dict JSON da resposta, ou None se o
+    agente não estiver disponível (o chamador usa o caminho em shell).
+    Instala o agente na primeira chamada (ou após mudança de versão).
+    """
+    if not AGENT_ENABLED:
+        return None
+    key = _key(eve_ip, eve_user)
+    with _LOCK:
+        until = _UNSUPPORTED.get(key)
+        if until and until > time.monotonic():
+            return None
+
+    cmd = _launch_cmd(verb, args)
+    rc, out, _err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=timeout)
+    if rc == _RC_MISSING:
+        if not install(eve_ip, eve_user, eve_pass):
+            return None
+        rc, out, _err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=timeout)
+    if rc == _RC_NO_PYTHON:
+        with _LOCK:
+            _UNSUPPORTED[key] = time.monotonic() + _UNSUPPORTED_TTL
+        return None
+
+    doc = _parse(out)
+    if doc is None or "error" in doc:
+        return None
+    return doc
@@ -0,0 +1,201 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Perfil de capacidades por host (plataforma, runtime, containerlab, caminhos).
+
+Uma sessão SSH descobre tudo de uma vez e o resultado fica em cache por
+HOST_PROFILE_TTL segundos. Os montadores de comando usam o runtime já
+resolvido em vez de repetir `command -v docker / podman` em cada shell remoto;
+enquanto não há perfil (ou a detecção falhou) eles mantêm o fallback antigo.
+
+Como em ssh_pool/sftp_pool, a chave inclui uma impressão digital da senha:
+um perfil detectado com uma senha nunca é servido a quem chega com outra.
+Falhas também ficam em cache, por HOST_PROFILE_FAILURE_TTL segundos (padrão
+15): um host fora do ar ou uma senha errada não abre uma sessão SSH a cada
+requisição.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+
+from utils import _DETECT_PLATFORM_CMD, _classify_platform, run_ssh_command
+
+PROFILE_TTL = int(os.getenv("HOST_PROFILE_TTL", "600"))
+FAILURE_TTL = int(os.getenv("HOST_PROFILE_FAILURE_TTL", "15"))
+
+VRNETLAB_DIR = "/opt/containerlab/vrnetlab"
+PROFILE_DIRS = {
+    "qemu": "/opt/unetlab/addons/qemu",
+    "iol": "/opt/unetlab/addons/iol/bin",
+    "dynamips": "/opt/unetlab/addons/dynamips",
+    "containerlab_labs": "/opt/containerlab/labs",
+    "vrnetlab": VRNETLAB_DIR,
+}
+_PLATFORM_MARK = "---NCF-PLATFORM---"
+
+_LOCK = threading.Lock()
+_PROFILES: dict[tuple[str, str, str], dict] = {}
+# Instante (monotônico) da última detecção que falhou, por chave.
+_FAILURES: dict[tuple[str, str, str], float] = {}
+# Um lock por host evita que várias requisições simultâneas detectem em paralelo.
+_DETECT_LOCKS: dict[tuple[str, str, str], threading.Lock] = {}
+
+
+def _fingerprint(eve_pass: str) -> str:
+    return hashlib.sha256(("ncf-profile:" + (eve_pass or "")).encode("utf-8")).hexdigest()[:16]
+
+
+def _key(eve_ip: str, eve_user: str, eve_pass: str) -> tuple[str, str, str]:
+    return ((eve_ip or "").strip().lower(), (eve_user or "").strip(), _fingerprint(eve_pass))
+
+
+def _profile_cmd() -> str:
+    parts = [
+        "rt=''; if command -v docker >/dev/null 2>&1; then rt=docker; "
+        "elif command -v podman >/dev/null 2>&1; then rt=podman; fi; ",
+        "echo \"RUNTIME=$rt\"; ",
+        "cl=$(command -v containerlab 2>/dev/null); echo \"CLAB_PATH=$cl\"; ",
+        "if [ -n \"$cl\" ]; then "
+        "echo \"CLAB_VERSION=$(containerlab version 2>/dev/null | sed -n 's/^ *version: *//p' | head -1)\"; fi; ",
+    ]
+    for kind, path in PROFILE_DIRS.items():
+        parts.append(f"if [ -d '{path}' ]; then echo 'DIR:{kind}=1'; else echo 'DIR:{kind}=0'; fi; ")
+    parts.append(f"echo '{_PLATFORM_MARK}'; {{ {_DETECT_PLATFORM_CMD}; }} 2>/dev/null")
+    return "".join(parts)
+
+
+def _parse_profile(out: str) -> dict | None:
+    head, mark, raw = (out or "").partition(_PLATFORM_MARK)
+    if not mark:
+        return None
+    values = {}
+    dirs = {}
+    for line in head.splitlines():
+        line = line.strip()
+        if line.startswith("DIR:") and "=" in line:
+            kind, _, flag = line[4:].partition("=")
+            dirs[kind] = flag.strip() == "1"
+        elif "=" in line:
+            k, _, v = line.partition("=")
+            values[k.strip()] = v.strip()
+    name, platform_raw, source = _classify_platform(raw.strip())
+    runtime = values.get("RUNTIME", "")
+    return {
+        "platform": {"name": name, "raw": platform_raw, "source": source},
+        "runtime": runtime if runtime in ("docker", "podman") else "",
+        "containerlab": {
+            "path": values.get("CLAB_PATH", ""),
+            "version": values.get("CLAB_VERSION", ""),
+        },
+        "vrnetlab_present": bool(dirs.get("vrnetlab")),
+        "dirs": {kind: {"path": path, "present": bool(dirs.get(kind))} for kind, path in PROFILE_DIRS.items()},
+    }
+
+
+def _fresh(profile: dict | None, now: float) -> bool:
+    return bool(profile) and now - profile["_detected_mono"] < PROFILE_TTL
+
+
+def _recently_failed(key: tuple, now: float) -> bool:
+    failed = _FAILURES.get(key)
+    return failed is not None and now - failed < FAILURE_TTL
+
+
+def detect(eve_ip: str, eve_user: str, eve_pass: str) -> dict | None:
+    """Força a detecção (uma sessão SSH) e atualiza o cache. None se falhar."""
+    key = _key(eve_ip, eve_user, eve_pass)
+    rc, out, _err = run_ssh_command(eve_ip, eve_user, eve_pass, _profile_cmd(), timeout=30)
+    profile = _parse_profile(out)
+    if profile is None:
+        print(f"[API] Perfil de {eve_ip} indisponível (rc={rc})", flush=True)
+        with _LOCK:
+            _FAILURES[key] = time.monotonic()
+        return None
+    profile["_detected_mono"] = time.monotonic()
+    profile["detected_at"] = int(time.time())
+    with _LOCK:
+        _PROFILES[key] = profile
+        _FAILURES.pop(key, None)
+    return profile
+
+
+def get_profile(eve_ip: str, eve_user: str, eve_pass: str, refresh: bool = False) -> dict | None:
+    """
+    Perfil do host, do cache se ainda válido; detecta se expirou ou refresh.
+    Após uma falha recente retorna None sem nova sessão (exceto com refresh).
+    """
+    key = _key(eve_ip, eve_user, eve_pass)
+    with _LOCK:
+        profile = _PROFILES.get(key)
+        failed = _recently_failed(key, time.monotonic())
+        lock = _DETECT_LOCKS.setdefault(key, threading.Lock())
+    if not refresh and _fresh(profile, time.monotonic()):
+        return profile
+    if not refresh and failed:
+        return None
+    with lock:
+        # Outra requisição pode ter detectado (ou falhado) enquanto esperávamos o lock.
+        with _LOCK:
+            profile = _PROFILES.get(key)
+            failed = _recently_failed(key, time.monotonic())
+        if not refresh and _fresh(profile, time.monotonic()):
+            return profile
+        if not refresh and failed:
+            return None
+        return detect(eve_ip, eve_user, eve_pass)
+
+
+def cached_profile(eve_ip: str, eve_user: str, eve_pass: str) -> dict | None:
+    """Perfil em cache e ainda válido, sem abrir sessão SSH."""
+    with _LOCK:
+        profile = _PROFILES.get(_key(eve_ip, eve_user, eve_pass))
+    return profile if _fresh(profile, time.monotonic()) else None
+
+
+def runtime_for(eve_ip: str, eve_user: str, eve_pass: str) -> str | None:
+    """docker/podman resolvido para o host, ou None (desconhecido: o montador
+    de comando usa a detecção no shell)."""
+    profile = get_profile(eve_ip, eve_user, eve_pass)
+    return (profile or {}).get("runtime") or None
+
+
+def remember_platform(eve_ip: str, eve_user: str, eve_pass: str, platform: tuple) -> None:
+    """Atualiza a plataforma de um perfil existente (ex.: vinda do probe de /images)."""
+    with _LOCK:
+        profile = _PROFILES.get(_key(eve_ip, eve_user, eve_pass))
+        if profile:
+            name, raw, source = platform
+            profile["platform"] = {"name": name, "raw": raw, "source": source}
+
+
+def invalidate(eve_ip: str, eve_user: str) -> None:
+    """Descarta perfis e falhas do par host/usuário, com qualquer senha."""
+    host_user = _key(eve_ip, eve_user, "")[:2]
+    with _LOCK:
+        for cache in (_PROFILES, _FAILURES):
+            for key in [k for k in cache if k[:2] == host_user]:
+                cache.pop(key, None)
+
+
+def public_view(profile: dict) -> dict:
+    """Perfil para a resposta HTTP (sem campos internos)."""
+    view = {k: v for k, v in profile.items() if not k.startswith("_")}
+    view["age_s"] = round(time.monotonic() - profile["_detected_mono"], 1)
+    view["ttl"] = PROFILE_TTL
+    return view
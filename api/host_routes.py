@@ -0,0 +1,93 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Rotas de informação por host: perfil de capacidades (cache com TTL) e
+recursos amostrados em background (último valor e histórico)."""
+
+from __future__ import annotations
+
+from flask import Blueprint, jsonify, request
+
+from host_profile import get_profile, public_view
+from i18n import get_request_lang, translate
+import resource_sampler
+from utils import get_resource_usage
+
+host_bp = Blueprint("host_bp", __name__, url_prefix="/host")
+
+
+@host_bp.route("/profile", methods=["POST"])
+def host_profile():
+    """
+    Perfil do host (plataforma, runtime, containerlab, vrnetlab, diretórios).
+    refresh=1 ignora o cache e detecta de novo.
+    """
+    lang = get_request_lang()
+    eve_ip = (request.form.get("eve_ip") or "").strip()
+    eve_user = (request.form.get("eve_user") or "").strip()
+    eve_pass = (request.form.get("eve_pass") or "").strip()
+    refresh = str(request.form.get("refresh") or "").strip().lower() in {"1", "true", "yes", "on"}
+
+    if not (eve_ip and eve_user and eve_pass):
+        return jsonify(success=False, message=translate("host.missing_creds", lang)), 400
+
+    profile = get_profile(eve_ip, eve_user, eve_pass, refresh=refresh)
+    if profile is None:
+        return jsonify(success=False, message=translate("host.profile_fail", lang)), 502
+    return jsonify(success=True, profile=public_view(profile)), 200
+
+
+def _creds():
+    return (
+        (request.form.get("eve_ip") or "").strip(),
+        (request.form.get("eve_user") or "").strip(),
+        (request.form.get("eve_pass") or "").strip(),
+    )
+
+
+@host_bp.route("/resources", methods=["POST"])
+def host_resources():
+    """Último uso de CPU/memória/disco. Sem amostra recente, mede na hora."""
+    lang = get_request_lang()
+    eve_ip, eve_user, eve_pass = _creds()
+    if not (eve_ip and eve_user and eve_pass):
+        return jsonify(success=False, message=translate("host.missing_creds", lang)), 400
+    resource_sampler.register(eve_ip, eve_user, eve_pass)
+    resources = resource_sampler.latest(eve_ip, eve_user, eve_pass)
+    if resources is None:
+        resources = get_resource_usage(eve_ip, eve_user, eve_pass)
+        resources["source"] = "ssh"
+    return jsonify(success=True, resources=resources), 200
+
+
+@host_bp.route("/resources/history", methods=["POST"])
+def host_resources_history():
+    """
+    Histórico amostrado (para gráficos). window = segundos para trás (padrão:
+    tudo); points = máximo de pontos devolvidos (média por balde, padrão 120).
+    """
+    lang = get_request_lang()
+    eve_ip, eve_user, eve_pass = _creds()
+    if not (eve_ip and eve_user and eve_pass):
+        return jsonify(success=False, message=translate("host.missing_creds", lang)), 400
+    try:
+        window = float(request.form.get("window") or 0) or None
+        points = int(request.form.get("points") or 120)
+    except (TypeError, ValueError):
+        return jsonify(success=False, message=translate("host.bad_params", lang)), 400
+    points = max(2, min(points, resource_sampler.HISTORY_POINTS))
+    resource_sampler.register(eve_ip, eve_user, eve_pass)
+    hist = resource_sampler.history(eve_ip, eve_user, eve_pass, window=window, max_points=points)
+    return jsonify(success=True, **hist), 200
@@ -22,6 +22,7 @@ TRANSLATIONS = {
         "errors.no_images": "Nenhuma imagem foi enviada.",
         "errors.disallowed_extension": "Extensão não permitida",
         "errors.sftp_failed": "Falha ao enviar via SFTP para o EVE",
+        "errors.mkdir_failed": "Falha ao criar o diretório de destino no EVE",
         "errors.none_sent": "Nenhuma imagem foi efetivamente enviada para o EVE.",
         "upload.success": "Upload concluído e fixpermissions executado com sucesso.",
         "upload.fix_failed": "Imagens enviadas, mas o comando fixpermissions retornou erro. Verifique os detalhes.",
@@ -154,6 +155,28 @@ TRANSLATIONS = {
         "unl.api_login_fail": "Falha no login da API do UNetLab (verifique IP/usuário/senha e se a API REST está acessível).",
         "unl.api_nodes_fail": "Falha ao consultar nós via API ({error}).",
         "unl.no_lab_id": "Não foi possível ler o id do lab no .unl (status indisponível).",
+        "host.missing_creds": "Informe IP, usuário e senha do host.",
+        "host.profile_fail": "Não foi possível detectar as capacidades do host.",
+        "host.bad_params": "Parâmetros inválidos.",
+        "fleet.unknown_query": "Consulta inválida. Use uma de: {queries}.",
+        "fleet.bad_hosts": "Informe uma lista de hosts, cada um com IP, usuário e senha.",
+        "fleet.too_many_hosts": "Máximo de {max} hosts por consulta.",
+        "upload.session_not_found": "Sessão de upload não encontrada ou expirada.",
+        "upload.bad_session_params": "Parâmetros da sessão de upload inválidos.",
+        "upload.bad_offset": "Offset fora de ordem; continue a partir de {committed}.",
+        "upload.chunk_interrupted": "Parte interrompida; retome a partir do offset confirmado.",
+        "upload.incomplete": "Upload incompleto: {committed} de {size} bytes confirmados.",
+        "upload.dedupe_mismatch": "O conteúdo recebido não confere com o sha256 informado; arquivo não gravado.",
+        "upload.job_not_found": "Job de upload não encontrado ou expirado.",
+        "upload.job_no_space": "Sem espaço em disco na API para receber o upload em segundo plano (UPLOAD_JOB_DIR).",
+        "upload.fanout_partial": "Imagens enviadas com sucesso para {ok} de {total} hosts. Veja os detalhes por host.",
+        "upload.bad_url": "URL inválida: use http:// ou https://.",
+        "upload.checksum_mismatch": "sha256 não confere (esperado {expected}, obtido {got}); arquivo descartado.",
+        "icons.invalid_png": "O arquivo não é um PNG válido.",
+        "images.bulk_invalid": "Informe em items uma lista JSON de objetos com type e name.",
+        "images.bulk_too_many": "No máximo {max} imagens por remoção em lote.",
+        "images.bulk_delete_done": "{deleted} de {total} imagens removidas.",
+        "images.bulk_delete_partial": " Algumas não foram removidas, veja os detalhes.",
     },
     "en": {
         "errors.missing_credentials": "Provide EVE-NG IP, user and password.",
@@ -161,6 +184,7 @@ TRANSLATIONS = {
         "errors.no_images": "No image was sent.",
         "errors.disallowed_extension": "Extension not allowed",
         "errors.sftp_failed": "Failed to send via SFTP to EVE",
+        "errors.mkdir_failed": "Failed to create the target directory on EVE",
         "errors.none_sent": "No image was effectively sent to EVE.",
         "upload.success": "Upload completed and fixpermissions executed successfully.",
         "upload.fix_failed": "Images were sent, but the fixpermissions command returned an error. Check the details.",
@@ -293,6 +317,28 @@ TRANSLATIONS = {
         "unl.api_login_fail": "UNetLab API login failed (check IP/user/password and that the REST API is reachable).",
         "unl.api_nodes_fail": "Failed to query nodes via API ({error}).",
         "unl.no_lab_id": "Could not read the lab id from the .unl (status unavailable).",
+        "host.missing_creds": "Provide the host IP, user and password.",
+        "host.profile_fail": "Could not detect the host capabilities.",
+        "host.bad_params": "Invalid parameters.",
+        "fleet.unknown_query": "Invalid query. Use one of: {queries}.",
+        "fleet.bad_hosts": "Provide a list of hosts, each with IP, user and password.",
+        "fleet.too_many_hosts": "At most {max} hosts per query.",
+        "upload.session_not_found": "Upload session not found or expired.",
+        "upload.bad_session_params": "Invalid upload session parameters.",
+        "upload.bad_offset": "Out-of-order offset; resume from {committed}.",
+        "upload.chunk_interrupted": "Chunk interrupted; resume from the committed offset.",
+        "upload.incomplete": "Upload incomplete: {committed} of {size} bytes committed.",
+        "upload.dedupe_mismatch": "Received content does not match the declared sha256; file not stored.",
+        "upload.job_not_found": "Upload job not found or expired.",
+        "upload.job_no_space": "Not enough disk space on the API to receive the background upload (UPLOAD_JOB_DIR).",
+        "upload.fanout_partial": "Images sent successfully to {ok} of {total} hosts. See the per-host details.",
+        "upload.bad_url": "Invalid URL: use http:// or https://.",
+        "upload.checksum_mismatch": "sha256 mismatch (expected {expected}, got {got}); file discarded.",
+        "icons.invalid_png": "The file is not a valid PNG.",
+        "images.bulk_invalid": "Send in items a JSON list of objects with type and name.",
+        "images.bulk_too_many": "At most {max} images per bulk delete.",
+        "images.bulk_delete_done": "{deleted} of {total} images removed.",
+        "images.bulk_delete_partial": " Some were not removed, see details.",
     },
     "es": {
         "errors.missing_credentials": "Informa IP, usuario y contraseña del EVE-NG.",
@@ -300,6 +346,7 @@ TRANSLATIONS = {
         "errors.no_images": "Ninguna imagen fue enviada.",
         "errors.disallowed_extension": "Extensión no permitida",
         "errors.sftp_failed": "Fallo al enviar vía SFTP al EVE",
+        "errors.mkdir_failed": "Fallo al crear el directorio de destino en el EVE",
         "errors.none_sent": "Ninguna imagen fue enviada efectivamente al EVE.",
         "upload.success": "Carga finalizada y fixpermissions ejecutado con éxito.",
         "upload.fix_failed": "Imágenes enviadas, pero el comando fixpermissions devolvió error. Revisa los detalles.",
@@ -432,6 +479,28 @@ TRANSLATIONS = {
         "unl.api_login_fail": "Fallo en el login de la API de UNetLab (verifica IP/usuario/contraseña y que la API REST esté accesible).",
         "unl.api_nodes_fail": "Fallo al consultar nodos vía API ({error}).",
         "unl.no_lab_id": "No se pudo leer el id del lab en el .unl (estado no disponible).",
+        "host.missing_creds": "Indica IP, usuario y contraseña del host.",
+        "host.profile_fail": "No se pudieron detectar las capacidades del host.",
+        "host.bad_params": "Parámetros inválidos.",
+        "fleet.unknown_query": "Consulta no válida. Usa una de: {queries}.",
+        "fleet.bad_hosts": "Indica una lista de hosts, cada uno con IP, usuario y contraseña.",
+        "fleet.too_many_hosts": "Máximo de {max} hosts por consulta.",
+        "upload.session_not_found": "Sesión de carga no encontrada o expirada.",
+        "upload.bad_session_params": "Parámetros de la sesión de carga no válidos.",
+        "upload.bad_offset": "Offset fuera de orden; continúa desde {committed}.",
+        "upload.chunk_interrupted": "Parte interrumpida; reanuda desde el offset confirmado.",
+        "upload.incomplete": "Carga incompleta: {committed} de {size} bytes confirmados.",
+        "upload.dedupe_mismatch": "El contenido recibido no coincide con el sha256 informado; archivo no guardado.",
+        "upload.job_not_found": "Trabajo de carga no encontrado o caducado.",
+        "upload.job_no_space": "Sin espacio en disco en la API para recibir la carga en segundo plano (UPLOAD_JOB_DIR).",
+        "upload.fanout_partial": "Imágenes enviadas con éxito a {ok} de {total} hosts. Vea los detalles por host.",
+        "upload.bad_url": "URL inválida: use http:// o https://.",
+        "upload.checksum_mismatch": "El sha256 no coincide (esperado {expected}, obtenido {got}); archivo descartado.",
+        "icons.invalid_png": "El archivo no es un PNG válido.",
+        "images.bulk_invalid": "Envía en items una lista JSON de objetos con type y name.",
+        "images.bulk_too_many": "Como máximo {max} imágenes por eliminación en lote.",
+        "images.bulk_delete_done": "{deleted} de {total} imágenes removidas.",
+        "images.bulk_delete_partial": " Algunas no se removieron, revisa los detalles.",
     },
 }
 
@@ -449,7 +518,9 @@ def _normalize_lang(lang: str | None) -> str:
     return "en"
 
 
-def get_request_lang() -> str:
+def get_request_lang(read_form: bool = True) -> str:
+    # read_form=False olha só a query string: rotas que leem o corpo em
+    # streaming não podem deixar o Flask consumir o formulário antes.
     # Import local para permitir que este módulo seja importado em contextos
     # fora do Flask (ex.: testes unitários), sem exigir a dependência instalada.
     try:
@@ -458,7 +529,7 @@ def get_request_lang() -> str:
         return "pt"
 
     header = request.headers.get("X-Language") or request.headers.get("Accept-Language") or ""
-    param = request.values.get("lang") or ""
+    param = (request.values if read_form else request.args).get("lang") or ""
     candidate = param or header
     return _normalize_lang(candidate)
 
@@ -16,23 +16,80 @@
 from flask import Blueprint, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 import io
-import paramiko
+import os
+import tarfile
+import time
 
+from conditional import Validator, conditional_listing, form_creds
 from config import ICONS_DIR, ICON_ALLOWED_EXT
 from i18n import translate, get_request_lang
+from sftp_pool import sftp_session
 
 icons_bp = Blueprint("icons_bp", __name__)
 
+# A partir de quantos ícones o upload vai num tar único.
+ICON_BATCH_MIN = max(1, int(os.getenv("ICON_BATCH_MIN", "2")))
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
 
-def _get_ssh_client(eve_ip: str, eve_user: str, eve_pass: str) -> paramiko.SSHClient:
-  client = paramiko.SSHClient()
-  client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-  client.connect(eve_ip, username=eve_user, password=eve_pass, look_for_keys=False)
-  return client
+
+def _icon_size(stream) -> int:
+  stream.seek(0, 2)
+  size = stream.tell()
+  stream.seek(0)
+  return size
+
+
+def _put_each(sftp, items, uploaded, errors) -> None:
+  """Um putfo por ícone (modo antigo; também o fallback do lote)."""
+  for filename, f in items:
+    remote_path = f"{ICONS_DIR}/{filename}"
+    try:
+      # faz upload direto do arquivo em memória
+      f.stream.seek(0)
+      file_data = f.read()
+      file_obj = io.BytesIO(file_data)
+      sftp.putfo(file_obj, remote_path)
+      uploaded.append(filename)
+    except Exception as e:
+      errors.append(
+        {
+          "filename": filename,
+          "context": "Falha ao enviar para o EVE.",
+          "stderr": str(e),
+        }
+      )
+
+
+def _put_batch(client, items):
+  """
+  Envia todos os ícones num tar em streaming para um único
+  `tar -x` remoto em ICONS_DIR. Retorna (nomes extraídos, stderr).
+  """
+  cmd = f"mkdir -p '{ICONS_DIR}' && tar -C '{ICONS_DIR}' -xvf - --no-same-owner"
+  stdin, stdout, stderr = client.exec_command(cmd)
+  now = time.time()
+  with tarfile.open(fileobj=stdin, mode="w|") as tar:
+    for filename, f in items:
+      info = tarfile.TarInfo(filename)
+      info.size = _icon_size(f.stream)
+      info.mode = 0o644
+      info.mtime = now
+      tar.addfile(info, f.stream)
+  stdin.flush()
+  stdin.channel.shutdown_write()
+  stdout.channel.recv_exit_status()
+  extracted = {os.path.basename(line.strip()) for line in stdout.read().decode(errors="ignore").splitlines()}
+  return extracted, stderr.read().decode(errors="ignore").strip()
 
 
 @icons_bp.route("/icons/upload", methods=["POST"])
 def upload_icons():
+  """
+  Envia ícones PNG para ICONS_DIR. Com ICON_BATCH_MIN ou mais arquivos
+  (padrão 2) vai tudo num tar só, extraído no EVE com um único comando, em
+  vez de um open/write/close SFTP por ícone. `batch=0` força o modo antigo.
+  O resultado continua por arquivo.
+  """
   lang = get_request_lang()
   eve_ip = request.form.get("eve_ip", "").strip()
   eve_user = request.form.get("eve_user", "").strip()
@@ -47,44 +104,47 @@ def upload_icons():
 
   errors = []
   uploaded = []
-
+  items = []
+  seen = set()
+  for f in files:
+    if not f.filename:
+      continue
+
+    filename = secure_filename(f.filename)
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in ICON_ALLOWED_EXT:
+      errors.append(
+        {
+          "filename": filename,
+          "context": translate("icons.invalid_ext", lang),
+        }
+      )
+      continue
+    if f.stream.read(len(_PNG_SIGNATURE)) != _PNG_SIGNATURE:
+      errors.append({"filename": filename, "context": translate("icons.invalid_png", lang)})
+      continue
+    f.stream.seek(0)
+    if filename in seen:
+      continue
+    seen.add(filename)
+    items.append((filename, f))
+
+  batch = request.form.get("batch", "1").strip().lower() not in ("0", "false", "no", "off")
   try:
-    client = _get_ssh_client(eve_ip, eve_user, eve_pass)
-    sftp = client.open_sftp()
-
-    for f in files:
-      if not f.filename:
-        continue
-
-      filename = secure_filename(f.filename)
-      ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-      if ext not in ICON_ALLOWED_EXT:
-        errors.append(
-          {
-            "filename": filename,
-            "context": translate("icons.invalid_ext", lang),
-          }
-        )
-        continue
-
-      remote_path = f"{ICONS_DIR}/{filename}"
-      try:
-        # faz upload direto do arquivo em memória
-        file_data = f.read()
-        file_obj = io.BytesIO(file_data)
-        sftp.putfo(file_obj, remote_path)
-        uploaded.append(filename)
-      except Exception as e:
-        errors.append(
-          {
-            "filename": filename,
-            "context": "Falha ao enviar para o EVE.",
-            "stderr": str(e),
-          }
-        )
-
-    sftp.close()
-    client.close()
+    with sftp_session(eve_ip, eve_user, eve_pass) as (client, sftp):
+      if batch and len(items) >= ICON_BATCH_MIN:
+        pending = items
+        try:
+          extracted, err = _put_batch(client, items)
+          uploaded.extend(name for name, _f in items if name in extracted)
+          pending = [(name, f) for name, f in items if name not in extracted]
+          if pending:
+            print(f"[API] Lote de ícones: {len(pending)} não extraídos ({err}); enviando um a um", flush=True)
+        except Exception as e:
+          print(f"[API] Lote de ícones falhou ({e}); enviando um a um", flush=True)
+        _put_each(sftp, pending, uploaded, errors)
+      else:
+        _put_each(sftp, items, uploaded, errors)
   except Exception as e:
     return jsonify(
       success=False,
@@ -103,7 +163,13 @@ def upload_icons():
     ), 400
 
 
+def _icons_validator():
+  creds = form_creds()
+  return Validator(*creds, [ICONS_DIR]) if creds else None
+
+
 @icons_bp.route("/icons/list", methods=["POST"])
+@conditional_listing(_icons_validator)
 def list_icons():
   lang = get_request_lang()
   eve_ip = request.form.get("eve_ip", "").strip()
@@ -114,20 +180,15 @@ def list_icons():
     return jsonify(success=False, message=translate("icons.missing_creds", lang)), 400
 
   try:
-    client = _get_ssh_client(eve_ip, eve_user, eve_pass)
-    sftp = client.open_sftp()
-
     icons = []
-    try:
-      for entry in sftp.listdir(ICONS_DIR):
-        if entry.lower().endswith(".png"):
-          icons.append(entry)
-    except IOError:
-      # diretório pode não existir
-      icons = []
-
-    sftp.close()
-    client.close()
+    with sftp_session(eve_ip, eve_user, eve_pass) as (_client, sftp):
+      try:
+        for entry in sftp.listdir(ICONS_DIR):
+          if entry.lower().endswith(".png"):
+            icons.append(entry)
+      except IOError:
+        # diretório pode não existir
+        icons = []
   except Exception as e:
     return jsonify(
       success=False,
@@ -159,15 +220,10 @@ def get_icon_raw(icon_name: str):
   remote_path = f"{ICONS_DIR}/{safe_name}"
 
   try:
-    client = _get_ssh_client(eve_ip, eve_user, eve_pass)
-    sftp = client.open_sftp()
-
     buf = io.BytesIO()
-    sftp.getfo(remote_path, buf)
+    with sftp_session(eve_ip, eve_user, eve_pass) as (_client, sftp):
+      sftp.getfo(remote_path, buf)
     buf.seek(0)
-
-    sftp.close()
-    client.close()
   except Exception as e:
     return jsonify(
       success=False,
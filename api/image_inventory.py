@@ -0,0 +1,454 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Inventário de imagens por host (SQLite local), atualizado incrementalmente.
+
+Para cada host o índice guarda, por diretório de imagem (qemu/iol/dynamips):
+mtime do diretório, tamanho total, número de arquivos e, por arquivo,
+tamanho, mtime e sha256 (quando já calculado). O banco fica em
+IMAGE_INVENTORY_DB (padrão UPLOAD_FOLDER/inventory.sqlite3).
+
+Atualização: uma listagem barata traz o mtime de cada diretório; só os
+diretórios novos ou com mtime diferente são varridos de novo (um `find` por
+tipo), e os que sumiram saem do índice. O mtime do diretório muda quando
+arquivos entram, saem ou são renomeados, mas não quando um arquivo é
+reescrito no lugar; para esses casos há invalidate() e refresh(full=True).
+Listagens com menos de IMAGE_INVENTORY_TTL segundos (padrão 30) são reusadas.
+
+O índice é por (host, usuário), e reusar uma listagem não dispensa a
+credencial: dentro do TTL, refresh() ainda roda um `true` no host (um canal
+a mais na sessão do ssh_pool, cujo socket já depende da senha) e só então o
+chamador pode consultar query(). Senha errada falha aí, como falharia a
+listagem.
+
+Checksums são opcionais e preguiçosos: schedule_checksums() enfileira os
+arquivos ainda sem hash e uma thread os calcula no host com `nice`/`ionice
+-c3`, um diretório por vez, na prioridade de fundo do ssh_governor. Os hashes
+também alimentam o manifesto de deduplicação (upload_dedupe). A fila usa as
+credenciais do último pedido (já conferidas pela refresh() que o precede),
+então uma senha antiga ou errada não prende o diretório.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import os
+import re
+import shlex
+import sqlite3
+import threading
+import time
+
+import upload_dedupe
+from config import UPLOAD_FOLDER
+from utils import PRIORITY_BACKGROUND, run_ssh_command
+
+DB_PATH = os.getenv("IMAGE_INVENTORY_DB", os.path.join(UPLOAD_FOLDER, "inventory.sqlite3"))
+REFRESH_TTL = int(os.getenv("IMAGE_INVENTORY_TTL", "30"))
+
+SORT_COLUMNS = {"name": "name", "kind": "kind", "size": "size", "files": "files", "mtime": "CAST(mtime AS REAL)"}
+_KIND_MARK = "::NCF-KIND "
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    host TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    files INTEGER NOT NULL DEFAULT 0,
+    scanned_at REAL NOT NULL,
+    PRIMARY KEY (host, kind, name)
+);
+CREATE TABLE IF NOT EXISTS files (
+    host TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime TEXT NOT NULL,
+    sha256 TEXT,
+    PRIMARY KEY (host, kind, name, path)
+);
+"""
+
+_LOCK = threading.Lock()
+_SCHEMA_READY: set[str] = set()
+
+# Fila de checksums: (host, kind, name) -> credenciais e diretório base.
+_HASH_QUEUE: "collections.OrderedDict[tuple[str, str, str], dict]" = collections.OrderedDict()
+_HASH_COND = threading.Condition()
+_HASH_THREAD: threading.Thread | None = None
+
+
+def _host_key(eve_ip: str, eve_user: str) -> str:
+    """Chave do índice: "ip usuário" (nenhum dos dois tem espaço)."""
+    return f"{(eve_ip or '').strip().lower()} {(eve_user or '').strip()}"
+
+
+def _ip_prefix(eve_ip: str) -> str:
+    return f"{(eve_ip or '').strip().lower()} "
+
+
+@contextlib.contextmanager
+def _connect():
+    """Conexão curta por operação (commit ao sair sem erro)."""
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if DB_PATH not in _SCHEMA_READY:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _SCHEMA_READY.add(DB_PATH)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+# ---- leitura remota ---------------------------------------------------------
+
+def _list_cmd(base_dirs: dict) -> str:
+    parts = []
+    for kind, base_dir in base_dirs.items():
+        base = shlex.quote(base_dir)
+        parts.append(
+            f"echo '{_KIND_MARK}{kind}'; "
+            f"[ -d {base} ] && find {base} -mindepth 1 -maxdepth 1 -type d -printf '%T@ %f\\n' 2>/dev/null; "
+        )
+    return "".join(parts)
+
+
+def _parse_list(out: str, base_dirs: dict) -> dict[str, dict[str, str]]:
+    """{tipo: {nome: mtime}}; tipos cujo marcador não veio ficam de fora."""
+    listing: dict[str, dict[str, str]] = {}
+    current = None
+    for line in (out or "").splitlines():
+        if line.startswith(_KIND_MARK):
+            kind = line[len(_KIND_MARK):].strip()
+            current = listing.setdefault(kind, {}) if kind in base_dirs else None
+            continue
+        mtime, sep, name = line.partition(" ")
+        if current is not None and sep and name and re.match(r"^\d+(\.\d+)?$", mtime):
+            current[name] = mtime
+    return listing
+
+
+def _scan_cmd(base_dirs: dict, changed: dict[str, list[str]]) -> str:
+    """Um `find` por tipo com os diretórios alterados; %p sai como ./nome/arquivo."""
+    parts = []
+    for kind, names in changed.items():
+        if not names:
+            continue
+        paths = " ".join(shlex.quote(f"./{n}") for n in names)
+        parts.append(
+            f"echo '{_KIND_MARK}{kind}'; "
+            f"cd {shlex.quote(base_dirs[kind])} 2>/dev/null && "
+            f"find {paths} -type f -printf '%s %T@ %p\\n' 2>/dev/null; "
+        )
+    return "".join(parts)
+
+
+def _parse_scan(out: str) -> dict[tuple[str, str], list[tuple[str, int, str]]]:
+    """{(tipo, nome): [(caminho relativo, tamanho, mtime)]}."""
+    found: dict[tuple[str, str], list[tuple[str, int, str]]] = collections.defaultdict(list)
+    kind = None
+    for line in (out or "").splitlines():
+        if line.startswith(_KIND_MARK):
+            kind = line[len(_KIND_MARK):].strip()
+            continue
+        parts = line.split(" ", 2)
+        if kind is None or len(parts) != 3 or not parts[0].isdigit() or not parts[2].startswith("./"):
+            continue
+        name, _, rel = parts[2][2:].partition("/")
+        if name and rel:
+            found[(kind, name)].append((rel, int(parts[0]), parts[1]))
+    return found
+
+
+# ---- índice -----------------------------------------------------------------
+
+def refresh(eve_ip: str, eve_user: str, eve_pass: str, base_dirs: dict,
+            full: bool = False, max_age: float | None = None) -> dict:
+    """
+    Atualiza o índice do host. Retorna estatísticas da passada:
+    {skipped, dirs_total, dirs_scanned, dirs_removed, elapsed_ms, stderr}.
+
+    Levanta RuntimeError se o host não responder, inclusive quando a
+    listagem em cache seria reusada (credencial conferida mesmo assim).
+    """
+    host = _host_key(eve_ip, eve_user)
+    max_age = REFRESH_TTL if max_age is None else max_age
+    started = time.monotonic()
+    stats = {"skipped": False, "dirs_total": 0, "dirs_scanned": 0, "dirs_removed": 0, "elapsed_ms": 0, "stderr": ""}
+
+    with _connect() as conn:
+        row = conn.execute("SELECT refreshed_at FROM hosts WHERE host=?", (host,)).fetchone()
+        known = {
+            (r["kind"], r["name"]): r["mtime"]
+            for r in conn.execute("SELECT kind, name, mtime FROM dirs WHERE host=?", (host,))
+        }
+    if not full and row is not None and time.time() - row["refreshed_at"] < max_age:
+        rc, _out, err = run_ssh_command(eve_ip, eve_user, eve_pass, "true", timeout=15)
+        if rc != 0:
+            raise RuntimeError((err or "").strip() or f"credencial recusada (rc={rc})")
+        stats.update(skipped=True, dirs_total=len(known),
+                     elapsed_ms=int((time.monotonic() - started) * 1000))
+        return stats
+
+    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, _list_cmd(base_dirs), timeout=60)
+    listing = _parse_list(out, base_dirs)
+    if not listing:
+        raise RuntimeError((err or "").strip() or f"listagem sem resposta (rc={rc})")
+
+    changed: dict[str, list[str]] = collections.defaultdict(list)
+    for kind, names in listing.items():
+        for name, mtime in names.items():
+            if full or known.get((kind, name)) != mtime:
+                changed[kind].append(name)
+    # Só remove diretórios de tipos que vieram na listagem.
+    removed = [(k, n) for (k, n) in known if k in listing and n not in listing[k]]
+
+    scanned = {}
+    if changed:
+        rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, _scan_cmd(base_dirs, changed), timeout=120)
+        scanned = _parse_scan(out)
+        stats["stderr"] = (err or "").strip()
+
+    now = time.time()
+    with _LOCK, _connect() as conn:
+        for kind, name in removed:
+            conn.execute("DELETE FROM dirs WHERE host=? AND kind=? AND name=?", (host, kind, name))
+            conn.execute("DELETE FROM files WHERE host=? AND kind=? AND name=?", (host, kind, name))
+        for kind, names in changed.items():
+            for name in names:
+                _store_dir(conn, host, kind, name, listing[kind][name], scanned.get((kind, name), []), now)
+        conn.execute(
+            "INSERT INTO hosts (host, refreshed_at) VALUES (?, ?) "
+            "ON CONFLICT(host) DO UPDATE SET refreshed_at=excluded.refreshed_at",
+            (host, now),
+        )
+
+    stats.update(
+        dirs_total=sum(len(n) for n in listing.values()),
+        dirs_scanned=sum(len(n) for n in changed.values()),
+        dirs_removed=len(removed),
+        elapsed_ms=int((time.monotonic() - started) * 1000),
+    )
+    return stats
+
+
+def _store_dir(conn, host: str, kind: str, name: str, mtime: str, files: list, now: float) -> None:
+    # Hashes de arquivos que não mudaram (mesmo tamanho e mtime) são mantidos.
+    old = {
+        r["path"]: r
+        for r in conn.execute("SELECT path, size, mtime, sha256 FROM files WHERE host=? AND kind=? AND name=?",
+                              (host, kind, name))
+    }
+    conn.execute("DELETE FROM files WHERE host=? AND kind=? AND name=?", (host, kind, name))
+    rows = []
+    for path, size, fmtime in files:
+        prev = old.get(path)
+        sha = prev["sha256"] if prev and prev["size"] == size and prev["mtime"] == fmtime else None
+        rows.append((host, kind, name, path, size, fmtime, sha))
+    conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.execute(
+        "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (host, kind, name, mtime, sum(f[1] for f in files), len(files), now),
+    )
+
+
+def invalidate(eve_ip: str, kind: str | None = None, name: str | None = None) -> None:
+    """
+    Força a próxima refresh() a revarrer o diretório (ou o host inteiro), no
+    índice de todos os usuários do host: o disco mudou para todos.
+    """
+    prefix = _ip_prefix(eve_ip)
+    match = "substr(host, 1, ?)=?"
+    with _LOCK, _connect() as conn:
+        if kind and name:
+            conn.execute(f"UPDATE dirs SET mtime='' WHERE {match} AND kind=? AND name=?",
+                         (len(prefix), prefix, kind, name))
+        conn.execute(f"DELETE FROM hosts WHERE {match}", (len(prefix), prefix))
+
+
+def query(eve_ip: str, eve_user: str, kinds=None, search: str = "", sort: str = "name", order: str = "asc",
+          page: int = 1, per_page: int = 50, with_files: bool = False) -> dict:
+    """
+    Consulta paginada do índice: {items, total, page, per_page}. Não fala com
+    o host: chame depois de uma refresh() bem-sucedida com a mesma credencial.
+    """
+    host = _host_key(eve_ip, eve_user)
+    where = ["d.host=?"]
+    args: list = [host]
+    if kinds:
+        where.append(f"d.kind IN ({','.join('?' * len(kinds))})")
+        args += list(kinds)
+    if search:
+        where.append("d.name LIKE ? ESCAPE '\\'")
+        args.append("%" + re.sub(r"([%_\\])", r"\\\1", search) + "%")
+    column = SORT_COLUMNS.get(sort, "name")
+    direction = "DESC" if str(order).lower() == "desc" else "ASC"
+    page = max(1, int(page))
+    per_page = max(1, min(int(per_page), 500))
+    clause = " AND ".join(where)
+
+    with _connect() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM dirs d WHERE {clause}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT d.kind, d.name, d.mtime, d.size, d.files, d.scanned_at, "
+            f"(SELECT COUNT(*) FROM files f WHERE f.host=d.host AND f.kind=d.kind AND f.name=d.name "
+            f"AND f.sha256 IS NULL) AS unhashed "
+            f"FROM dirs d WHERE {clause} ORDER BY {column} {direction}, d.kind, d.name LIMIT ? OFFSET ?",
+            args + [per_page, (page - 1) * per_page],
+        ).fetchall()
+        items = []
+        for r in rows:
+            item = {
+                "kind": r["kind"],
+                "name": r["name"],
+                "size": r["size"],
+                "files": r["files"],
+                "mtime": float(r["mtime"]) if r["mtime"] else None,
+                "scanned_at": r["scanned_at"],
+                "checksums": "complete" if not r["unhashed"] else ("pending" if _queued(host, r) else "missing"),
+            }
+            if with_files:
+                item["file_list"] = [
+                    {"path": f["path"], "size": f["size"], "mtime": float(f["mtime"]), "sha256": f["sha256"]}
+                    for f in conn.execute(
+                        "SELECT path, size, mtime, sha256 FROM files WHERE host=? AND kind=? AND name=? ORDER BY path",
+                        (host, r["kind"], r["name"]),
+                    )
+                ]
+            items.append(item)
+    return {"items": items, "total": total, "page": page, "per_page": per_page}
+
+
+# ---- checksums em background ------------------------------------------------
+
+def _queued(host: str, row) -> bool:
+    with _HASH_COND:
+        return (host, row["kind"], row["name"]) in _HASH_QUEUE
+
+
+def _hash_cmd(base_dir: str, name: str, paths: list[str]) -> str:
+    quoted = " ".join(shlex.quote(p) for p in paths)
+    target = f"{base_dir.rstrip('/')}/{name}"
+    return (
+        f"cd {shlex.quote(target)} && "
+        "if command -v ionice >/dev/null 2>&1; then io='ionice -c3'; else io=''; fi; "
+        f"$io nice -n 19 sha256sum -- {quoted} 2>/dev/null"
+    )
+
+
+def schedule_checksums(eve_ip: str, eve_user: str, eve_pass: str, base_dirs: dict, kinds=None) -> int:
+    """
+    Enfileira os diretórios com arquivos sem hash; retorna quantos entraram.
+    Os já enfileirados passam a usar estas credenciais.
+    """
+    host = _host_key(eve_ip, eve_user)
+    with _connect() as conn:
+        rows = conn.execute("SELECT DISTINCT kind, name FROM files WHERE host=? AND sha256 IS NULL", (host,)).fetchall()
+    added = 0
+    with _HASH_COND:
+        for r in rows:
+            if (kinds and r["kind"] not in kinds) or r["kind"] not in base_dirs:
+                continue
+            key = (host, r["kind"], r["name"])
+            job = {"eve_ip": eve_ip, "eve_user": eve_user, "eve_pass": eve_pass, "base_dir": base_dirs[r["kind"]]}
+            if key in _HASH_QUEUE:
+                _HASH_QUEUE[key].update(job)
+            else:
+                _HASH_QUEUE[key] = job
+                added += 1
+        _HASH_COND.notify()
+    if added:
+        _ensure_hash_thread()
+    return added
+
+
+def hash_dir(key: tuple[str, str, str], job: dict) -> int:
+    """Calcula os hashes que faltam num diretório; retorna quantos gravou."""
+    host, kind, name = key
+    with _connect() as conn:
+        pending = {
+            r["path"]: (r["size"], r["mtime"])
+            for r in conn.execute(
+                "SELECT path, size, mtime FROM files WHERE host=? AND kind=? AND name=? AND sha256 IS NULL",
+                (host, kind, name),
+            )
+        }
+    if not pending:
+        return 0
+    rc, out, err = run_ssh_command(
+        job["eve_ip"], job["eve_user"], job["eve_pass"], _hash_cmd(job["base_dir"], name, sorted(pending)),
+        priority=PRIORITY_BACKGROUND,
+    )
+    digests = {}
+    for line in (out or "").splitlines():
+        digest, _, path = line.partition("  ")
+        if upload_dedupe.normalize_sha(digest) and path in pending:
+            digests[path] = digest
+    with _LOCK, _connect() as conn:
+        for path, digest in digests.items():
+            size, mtime = pending[path]
+            # Só grava se o arquivo não mudou desde a varredura.
+            conn.execute(
+                "UPDATE files SET sha256=? WHERE host=? AND kind=? AND name=? AND path=? AND size=? AND mtime=?",
+                (digest, host, kind, name, path, size, mtime),
+            )
+    base = job["base_dir"].rstrip("/")
+    for path, digest in digests.items():
+        size, mtime = pending[path]
+        upload_dedupe.record(job["eve_ip"], f"{base}/{name}/{path}", size, mtime, digest)
+    return len(digests)
+
+
+def _hash_loop() -> None:
+    while True:
+        with _HASH_COND:
+            while not _HASH_QUEUE:
+                _HASH_COND.wait()
+            key, job = next(iter(_HASH_QUEUE.items()))
+            job = dict(job)
+        try:
+            hash_dir(key, job)
+        except Exception as exc:
+            print(f"[API] image_inventory: checksum de {key[1]}/{key[2]} falhou: {exc}", flush=True)
+        finally:
+            with _HASH_COND:
+                _HASH_QUEUE.pop(key, None)
+
+
+def _ensure_hash_thread() -> None:
+    global _HASH_THREAD
+    with _HASH_COND:
+        if _HASH_THREAD is not None and _HASH_THREAD.is_alive():
+            return
+        _HASH_THREAD = threading.Thread(target=_hash_loop, name="image-inventory-hash", daemon=True)
+        _HASH_THREAD.start()
+
+
+def pending_checksums(eve_ip: str, eve_user: str) -> int:
+    host = _host_key(eve_ip, eve_user)
+    with _HASH_COND:
+        return sum(1 for key in _HASH_QUEUE if key[0] == host)
@@ -13,11 +13,19 @@
 # You should have received a copy of the GNU General Public License
 # along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
 
+import json
+import os
 import re
+import shlex
 import traceback
 from flask import Blueprint, request, jsonify
 
-from utils import run_ssh_command, detect_platform, get_resource_usage
+from utils import PRIORITY_BULK, run_ssh_command, detect_platform, get_resource_usage, probe_images_host
+from host_profile import cached_profile, get_profile
+from conditional import Validator, conditional_listing, form_creds
+import fix_scheduler
+import image_inventory
+import resource_sampler
 from i18n import translate, get_request_lang
 
 images_bp = Blueprint("images_bp", __name__)
@@ -29,6 +37,9 @@ BASE_DIRS = {
 }
 
 SAFE_TEMPLATE_RE = re.compile(r"^[A-Za-z0-9._+-]+$")
+BULK_DELETE_MAX = int(os.getenv("IMAGES_BULK_DELETE_MAX", "200"))
+BULK_DELETE_TIMEOUT = int(os.getenv("IMAGES_BULK_DELETE_TIMEOUT", "600"))
+FIXPERMISSIONS_CMD = fix_scheduler.FIX_CMD
 
 
 def _sanitize_template_name(name: str) -> str:
@@ -46,7 +57,114 @@ def _sanitize_template_name(name: str) -> str:
     return cleaned
 
 
+def _relevant_stderr(err: str) -> str:
+    """stderr sem o aviso "Permanently added ..." do ssh (vazio se só houver ele)."""
+    cleaned_err = (err or "").strip()
+    if not cleaned_err:
+        return ""
+    warning_phrase = "Permanently added"
+    only_warning = (
+        warning_phrase in cleaned_err
+        and all(
+            (not line.strip()) or (warning_phrase in line)
+            for line in cleaned_err.splitlines()
+        )
+    )
+    return "" if only_warning else cleaned_err
+
+
+def _profile_platform(profile):
+    """Tupla (nome, raw, fonte) da plataforma do perfil do host, ou None."""
+    if not profile:
+        return None
+    plat = profile.get("platform") or {}
+    return plat.get("name"), plat.get("raw", ""), plat.get("source", "")
+
+
+def _list_images_sequential(eve_ip: str, eve_user: str, eve_pass: str, platform=None):
+    """Caminho antigo (uma sessão por consulta), usado se o probe em lote falhar."""
+    images = {}
+    errors = []
+
+    if platform is None:
+        platform = detect_platform(eve_ip, eve_user, eve_pass)
+    resources = get_resource_usage(eve_ip, eve_user, eve_pass)
+
+    for kind, base_dir in BASE_DIRS.items():
+        cmd = (
+            f"if [ -d '{base_dir}' ]; then "
+            f"cd '{base_dir}' && for d in *; do [ -d \"$d\" ] && echo \"$d\"; done; "
+            f"fi"
+        )
+        print(f"[API] Listando {kind} em {base_dir}", flush=True)
+        rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd)
+
+        entries = [line.strip() for line in out.splitlines() if line.strip()]
+        images[kind] = entries
+
+        cleaned_err = _relevant_stderr(err)
+        if cleaned_err:
+            errors.append(
+                {
+                    "context": kind,
+                    "stderr": cleaned_err,
+                }
+            )
+
+    return images, errors, platform, resources
+
+
+def collect_images(eve_ip: str, eve_user: str, eve_pass: str):
+    """
+    Listagem de imagens do host: (images, errors, (nome, raw, fonte) da
+    plataforma, resources). Usada por /images e pelo modo frota.
+    """
+    # Plataforma vem do perfil do host (cache com TTL); se não houver
+    # perfil, o probe detecta junto.
+    known_platform = _profile_platform(get_profile(eve_ip, eve_user, eve_pass))
+
+    # Recursos: última amostra do sampler em background, se recente; a
+    # primeira chamada para o host ainda amostra no probe.
+    resource_sampler.register(eve_ip, eve_user, eve_pass)
+    sampled = resource_sampler.latest(eve_ip, eve_user, eve_pass)
+
+    # Uma sessão só: plataforma + recursos + listagens (ver utils.probe_images_host).
+    probe = probe_images_host(
+        eve_ip, eve_user, eve_pass, BASE_DIRS, platform=known_platform, resources=sampled,
+    )
+    if probe is not None:
+        images = probe["images"]
+        errors = []
+        cleaned_err = _relevant_stderr(probe["stderr"])
+        if cleaned_err:
+            errors.append({"context": "probe", "stderr": cleaned_err})
+        platform = probe["platform"]
+        resources = probe["resources"]
+    else:
+        print("[API] Probe em lote sem resposta válida; usando consultas separadas", flush=True)
+        images, errors, platform, resources = _list_images_sequential(eve_ip, eve_user, eve_pass, known_platform)
+    return images, errors, platform, resources
+
+
+def _images_validator():
+    # A plataforma entra no corpo de /images: sem perfil em cache a resposta
+    # não é reproduzível, então fica sem ETag. Os recursos mudam a cada
+    # amostra e ficam fora do ETag; um 304 leva a amostra atual no cabeçalho.
+    creds = form_creds()
+    if creds is None:
+        return None
+    profile = cached_profile(creds[0], creds[1], creds[2])
+    if not profile:
+        return None
+    sample = resource_sampler.latest(creds[0], creds[1], creds[2])
+    return Validator(
+        *creds, BASE_DIRS.values(), depth=0, extra=str(_profile_platform(profile)),
+        volatile={"resources": sample} if sample else None,
+    )
+
+
 @images_bp.route("/images", methods=["POST"])
+@conditional_listing(_images_validator)
 def list_images():
     lang = get_request_lang()
     try:
@@ -61,41 +179,9 @@ def list_images():
         if not (eve_ip and eve_user and eve_pass):
             return jsonify(success=False, message=translate("images.missing_creds", lang)), 400
 
-        images = {}
-        errors = []
-
-        platform_name, platform_raw, platform_source = detect_platform(eve_ip, eve_user, eve_pass)
-        resources = get_resource_usage(eve_ip, eve_user, eve_pass)
-
-        for kind, base_dir in BASE_DIRS.items():
-            cmd = (
-                f"if [ -d '{base_dir}' ]; then "
-                f"cd '{base_dir}' && for d in *; do [ -d \"$d\" ] && echo \"$d\"; done; "
-                f"fi"
-            )
-            print(f"[API] Listando {kind} em {base_dir}", flush=True)
-            rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd)
-
-            entries = [line.strip() for line in out.splitlines() if line.strip()]
-            images[kind] = entries
-
-            cleaned_err = (err or "").strip()
-            if cleaned_err:
-                warning_phrase = "Permanently added"
-                only_warning = (
-                    warning_phrase in cleaned_err
-                    and all(
-                        (not line.strip()) or (warning_phrase in line)
-                        for line in cleaned_err.splitlines()
-                    )
-                )
-                if not only_warning:
-                    errors.append(
-                        {
-                            "context": kind,
-                            "stderr": cleaned_err,
-                        }
-                    )
+        images, errors, (platform_name, platform_raw, platform_source), resources = collect_images(
+            eve_ip, eve_user, eve_pass
+        )
 
         msg_ok = translate("images.success", lang)
         if errors:
@@ -123,6 +209,89 @@ def list_images():
         ), 500
 
 
+def _form_int(name: str, default: int) -> int:
+    try:
+        return int(request.form.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _form_flag(name: str) -> bool:
+    return (request.form.get(name) or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+@images_bp.route("/images/inventory", methods=["POST"])
+def images_inventory():
+    """
+    Inventário detalhado (tamanho, arquivos, mtime, checksums) a partir do
+    índice local do host (ver image_inventory), com filtro, ordenação e
+    paginação no servidor.
+
+    Campos opcionais: kind (qemu/iol/dynamips, separados por vírgula), q
+    (trecho do nome), sort (name/kind/size/files/mtime), order (asc/desc),
+    page, per_page (máx. 500), files=1 (lista de arquivos de cada item),
+    checksums=1 (agenda o cálculo dos hashes que faltam) e refresh=full
+    (revarre todos os diretórios).
+    """
+    lang = get_request_lang()
+    try:
+        eve_ip = request.form.get("eve_ip", "").strip()
+        eve_user = request.form.get("eve_user", "").strip()
+        eve_pass = request.form.get("eve_pass", "").strip()
+
+        if not (eve_ip and eve_user and eve_pass):
+            return jsonify(success=False, message=translate("images.missing_creds", lang)), 400
+
+        kinds = [k.strip().lower() for k in (request.form.get("kind") or "").split(",") if k.strip()]
+        if any(k not in BASE_DIRS for k in kinds):
+            return jsonify(success=False, message=translate("images.invalid_type", lang)), 400
+
+        refresh_mode = (request.form.get("refresh") or "").strip().lower()
+        scan = image_inventory.refresh(
+            eve_ip, eve_user, eve_pass, BASE_DIRS,
+            full=refresh_mode == "full",
+            max_age=0 if refresh_mode in ("1", "true", "full") else None,
+        )
+        if _form_flag("checksums"):
+            image_inventory.schedule_checksums(eve_ip, eve_user, eve_pass, BASE_DIRS, kinds or None)
+
+        result = image_inventory.query(
+            eve_ip,
+            eve_user,
+            kinds=kinds or None,
+            search=(request.form.get("q") or "").strip(),
+            sort=(request.form.get("sort") or "name").strip().lower(),
+            order=(request.form.get("order") or "asc").strip().lower(),
+            page=_form_int("page", 1),
+            per_page=_form_int("per_page", 50),
+            with_files=_form_flag("files"),
+        )
+
+        errors = []
+        cleaned_err = _relevant_stderr(scan.pop("stderr", ""))
+        if cleaned_err:
+            errors.append({"context": "inventory", "stderr": cleaned_err})
+        msg_ok = translate("images.success", lang)
+        if errors:
+            msg_ok += translate("images.partial_warning", lang)
+
+        return jsonify(
+            success=not errors,
+            message=msg_ok,
+            errors=errors,
+            scan=scan,
+            checksums_pending=image_inventory.pending_checksums(eve_ip, eve_user),
+            **result,
+        ), 200
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(
+            success=False,
+            message=translate("images.internal_error", lang, error=str(e)),
+        ), 500
+
+
 @images_bp.route("/images/delete", methods=["POST"])
 def delete_image():
     lang = get_request_lang()
@@ -205,12 +374,15 @@ def delete_image():
                 500,
             )
 
-        fix_rc, fix_out, fix_err = run_ssh_command(
-            eve_ip,
-            eve_user,
-            eve_pass,
-            "/opt/unetlab/wrappers/unl_wrapper -a fixpermissions",
+        image_inventory.invalidate(eve_ip, image_type, safe_template)
+
+        fix = fix_scheduler.run(
+            fix_scheduler.host_key(eve_ip, eve_user),
+            lambda: run_ssh_command(
+                eve_ip, eve_user, eve_pass, FIXPERMISSIONS_CMD, timeout=fix_scheduler.WAIT_TIMEOUT
+            ),
         )
+        fix_rc, fix_out, fix_err = fix["rc"], fix["stdout"], fix["stderr"]
 
         warnings = []
         if fix_rc != 0:
@@ -233,6 +405,7 @@ def delete_image():
                 message=msg,
                 deleted={"type": image_type, "name": safe_template},
                 warnings=warnings,
+                fixpermissions_merged=fix["merged"],
             ),
             200,
         )
@@ -245,3 +418,138 @@ def delete_image():
             ),
             500,
         )
+
+
+def _parse_bulk_items(raw: str):
+    """
+    Campo `items`: JSON [{"type": "qemu", "name": "vios"}, ...] (ou pares
+    [tipo, nome]). Retorna a lista de itens com base_dir/name já validados
+    (error preenchido nos inválidos), ou None se o JSON não for uma lista.
+    """
+    try:
+        data = json.loads(raw or "")
+    except ValueError:
+        return None
+    if not isinstance(data, list):
+        return None
+    items = []
+    for entry in data:
+        if isinstance(entry, dict):
+            image_type, name = entry.get("type"), entry.get("name")
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            image_type, name = entry
+        else:
+            image_type, name = None, None
+        image_type = str(image_type or "").strip().lower()
+        safe = _sanitize_template_name(str(name or ""))
+        item = {"type": image_type, "name": safe or str(name or ""), "status": "pending"}
+        if image_type not in BASE_DIRS:
+            item.update(status="invalid", error="invalid_type")
+        elif not safe:
+            item.update(status="invalid", error="invalid_template")
+        items.append(item)
+    return items
+
+
+def _bulk_delete_script(items) -> str:
+    """Um script só: remove cada item e imprime NCF_DEL|índice|estado|erro."""
+    parts = []
+    for idx, item in enumerate(items):
+        if item["status"] != "pending":
+            continue
+        target = shlex.quote(f"{BASE_DIRS[item['type']].rstrip('/')}/{item['name']}")
+        parts.append(
+            f"t={target}; "
+            f"if [ ! -e \"$t\" ]; then echo 'NCF_DEL|{idx}|not_found|'; "
+            f"elif err=$(rm -rf -- \"$t\" 2>&1); then echo 'NCF_DEL|{idx}|deleted|'; "
+            f"else printf 'NCF_DEL|{idx}|error|%s\\n' \"$(printf '%s' \"$err\" | tr '\\n' ' ')\"; fi; "
+        )
+    return "".join(parts)
+
+
+@images_bp.route("/images/delete/bulk", methods=["POST"])
+def delete_images_bulk():
+    """
+    Remove várias imagens numa única sessão SSH, com estado por item
+    (deleted / not_found / error / invalid). Remoções não pedem
+    fixpermissions; com fixpermissions=1 ele roda uma vez, no fim, pelo
+    fix_scheduler (agrupado com outros pedidos do host e com tempo limite).
+    """
+    lang = get_request_lang()
+    try:
+        eve_ip = request.form.get("eve_ip", "").strip()
+        eve_user = request.form.get("eve_user", "").strip()
+        eve_pass = request.form.get("eve_pass", "").strip()
+
+        if not (eve_ip and eve_user and eve_pass):
+            return jsonify(success=False, message=translate("images.missing_creds", lang)), 400
+
+        items = _parse_bulk_items(request.form.get("items"))
+        if not items:
+            return jsonify(success=False, message=translate("images.bulk_invalid", lang)), 400
+        if len(items) > BULK_DELETE_MAX:
+            return jsonify(success=False, message=translate("images.bulk_too_many", lang, max=BULK_DELETE_MAX)), 400
+
+        fixpermissions = _form_flag("fixpermissions")
+        warnings = []
+        merged = None
+        script = _bulk_delete_script(items)
+        if script:
+            rc, out, err = run_ssh_command(
+                eve_ip, eve_user, eve_pass, script, timeout=BULK_DELETE_TIMEOUT, priority=PRIORITY_BULK
+            )
+            for line in (out or "").splitlines():
+                tag, _, rest = line.partition("|")
+                if tag == "NCF_DEL":
+                    idx, _, rest = rest.partition("|")
+                    status, _, error = rest.partition("|")
+                    if idx.isdigit() and int(idx) < len(items):
+                        items[int(idx)].update(status=status, error=error.strip() or None)
+            # Sem linha de estado: a sessão caiu antes de chegar ao item.
+            for item in items:
+                if item["status"] == "pending":
+                    item.update(status="error", error=_relevant_stderr(err) or f"rc={rc}")
+
+        if fixpermissions and any(item["status"] == "deleted" for item in items):
+            fix = fix_scheduler.run(
+                fix_scheduler.host_key(eve_ip, eve_user),
+                lambda: run_ssh_command(
+                    eve_ip, eve_user, eve_pass, FIXPERMISSIONS_CMD, timeout=fix_scheduler.WAIT_TIMEOUT
+                ),
+            )
+            merged = fix["merged"]
+            if fix["rc"] != 0:
+                warnings.append({
+                    "context": "fixpermissions",
+                    "stdout": (fix["stdout"] or "").strip(),
+                    "stderr": _relevant_stderr(fix["stderr"]),
+                    "rc": fix["rc"],
+                })
+
+        for item in items:
+            if item["status"] == "deleted":
+                image_inventory.invalidate(eve_ip, item["type"], item["name"])
+            if not item.get("error"):
+                item.pop("error", None)
+
+        deleted = sum(1 for item in items if item["status"] == "deleted")
+        msg = translate("images.bulk_delete_done", lang, deleted=deleted, total=len(items))
+        if deleted < len(items):
+            msg += translate("images.bulk_delete_partial", lang)
+        if warnings:
+            msg += translate("images.delete_fix_warning", lang)
+
+        return jsonify(
+            success=deleted == len(items),
+            message=msg,
+            deleted=deleted,
+            items=items,
+            warnings=warnings,
+            fixpermissions_merged=merged,
+        ), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(
+            success=False,
+            message=translate("images.delete_internal_error", lang, error=str(e)),
+        ), 500
@@ -0,0 +1,300 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Amostragem de CPU/memória/disco em background, com histórico por host.
+
+Cada host consultado pela interface passa a ser amostrado a cada
+RESOURCE_SAMPLE_INTERVAL segundos (padrão 5) por um comando sem `sleep`: a CPU
+sai da diferença entre duas leituras consecutivas de /proc/stat. As amostras
+ficam num buffer circular de arrays (RESOURCE_HISTORY_POINTS pontos, padrão
+720 = 1 h), então /images lê o último valor sem latência remota e o histórico
+alimenta gráficos.
+
+Hosts que ninguém consulta há RESOURCE_SAMPLER_IDLE_TTL segundos deixam de ser
+amostrados (e o histórico é descartado).
+
+A chave inclui a impressão digital da senha (como ssh_pool/sftp_pool): quem
+chega com outra senha ganha uma entrada própria, não troca a credencial de
+quem já amostra e só lê amostras colhidas com a senha que apresentou. Uma
+entrada de senha errada só acumula falhas (backoff) e sai por ociosidade.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import threading
+import time
+from array import array
+
+from utils import PRIORITY_BACKGROUND, submit_ssh_capture
+
+SAMPLE_INTERVAL = max(1, int(os.getenv("RESOURCE_SAMPLE_INTERVAL", "5")))
+HISTORY_POINTS = max(2, int(os.getenv("RESOURCE_HISTORY_POINTS", "720")))
+IDLE_TTL = int(os.getenv("RESOURCE_SAMPLER_IDLE_TTL", "900"))
+# Após falhas seguidas o intervalo dobra (até este teto).
+_MAX_BACKOFF = 120
+
+FIELDS = (
+    "t",
+    "cpu_percent",
+    "mem_total_mb",
+    "mem_used_mb",
+    "mem_free_mb",
+    "mem_percent",
+    "disk_total_kb",
+    "disk_used_kb",
+    "disk_free_kb",
+    "disk_percent",
+)
+
+_SAMPLE_CMD = (
+    "read _ u n s i w q sq st _ < /proc/stat; "
+    "echo \"STAT=$u $n $s $i $w $q $sq $st\"; "
+    "free -m 2>/dev/null | awk '/Mem:/ {print \"MEM=\" $2 \" \" $3 \" \" $4}'; "
+    "df -k / 2>/dev/null | tail -1 | awk '{print \"DISK=\" $2 \" \" $3 \" \" $4 \" \" $5}' | tr -d '%'"
+)
+
+_LOCK = threading.Lock()
+_HOSTS: dict[tuple[str, str, str], "_Host"] = {}
+_THREAD: threading.Thread | None = None
+
+
+class _Ring:
+    """Buffer circular com um array('d') por campo (NaN = sem valor)."""
+
+    def __init__(self, size: int = HISTORY_POINTS):
+        self.size = size
+        self.cols = {f: array("d", [math.nan]) * size for f in FIELDS}
+        self.head = 0  # próxima posição a escrever
+        self.count = 0
+
+    def append(self, sample: dict) -> None:
+        for f in FIELDS:
+            v = sample.get(f)
+            self.cols[f][self.head] = math.nan if v is None else float(v)
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _order(self):
+        start = (self.head - self.count) % self.size
+        return [(start + i) % self.size for i in range(self.count)]
+
+    def latest(self) -> dict | None:
+        if not self.count:
+            return None
+        idx = (self.head - 1) % self.size
+        return {f: _num(self.cols[f][idx]) for f in FIELDS}
+
+    def series(self, since: float | None = None, max_points: int | None = None) -> list[dict]:
+        """Pontos em ordem cronológica; com max_points, média por balde."""
+        idxs = [i for i in self._order() if since is None or self.cols["t"][i] >= since]
+        if not max_points or len(idxs) <= max_points:
+            return [{f: _num(self.cols[f][i]) for f in FIELDS} for i in idxs]
+        bucket = math.ceil(len(idxs) / max_points)
+        points = []
+        for b in range(0, len(idxs), bucket):
+            chunk = idxs[b:b + bucket]
+            point = {"t": self.cols["t"][chunk[-1]]}
+            for f in FIELDS[1:]:
+                vals = [self.cols[f][i] for i in chunk if not math.isnan(self.cols[f][i])]
+                point[f] = round(sum(vals) / len(vals), 2) if vals else None
+            points.append(point)
+        return points
+
+
+def _num(v: float):
+    return None if math.isnan(v) else v
+
+
+class _Host:
+    def __init__(self, eve_ip: str, eve_user: str, eve_pass: str):
+        self.eve_ip = eve_ip
+        self.eve_user = eve_user
+        self.eve_pass = eve_pass
+        self.ring = _Ring()
+        self.prev_stat: tuple[int, int] | None = None  # (idle, total)
+        self.next_due = 0.0
+        self.inflight = False
+        self.failures = 0
+        self.last_error = ""
+        self.last_read = time.monotonic()
+
+
+def _fingerprint(eve_pass: str) -> str:
+    return hashlib.sha256(("ncf-sampler:" + (eve_pass or "")).encode("utf-8")).hexdigest()[:16]
+
+
+def _key(eve_ip: str, eve_user: str, eve_pass: str) -> tuple[str, str, str]:
+    return ((eve_ip or "").strip().lower(), (eve_user or "").strip(), _fingerprint(eve_pass))
+
+
+def _parse_sample(out: str):
+    """Retorna ((idle, total) de /proc/stat, dict de memória/disco) ou None."""
+    stat = None
+    values = {}
+    for line in (out or "").splitlines():
+        name, sep, rest = line.strip().partition("=")
+        if not sep:
+            continue
+        nums = rest.split()
+        try:
+            if name == "STAT" and len(nums) >= 8:
+                u, n, s, i, w, q, sq, st = (int(x) for x in nums[:8])
+                idle = i + w
+                stat = (idle, idle + u + n + s + q + sq + st)
+            elif name == "MEM" and len(nums) >= 3:
+                values["mem_total_mb"], values["mem_used_mb"], values["mem_free_mb"] = (float(x) for x in nums[:3])
+            elif name == "DISK" and len(nums) >= 4:
+                (values["disk_total_kb"], values["disk_used_kb"],
+                 values["disk_free_kb"], values["disk_percent"]) = (float(x) for x in nums[:4])
+        except ValueError:
+            continue
+    if stat is None:
+        return None
+    if values.get("mem_total_mb"):
+        values["mem_percent"] = values["mem_used_mb"] / values["mem_total_mb"] * 100
+    return stat, values
+
+
+def _record(host: _Host, out: str, now: float) -> bool:
+    parsed = _parse_sample(out)
+    if parsed is None:
+        return False
+    stat, values = parsed
+    cpu = None
+    if host.prev_stat is not None:
+        d_idle = stat[0] - host.prev_stat[0]
+        d_total = stat[1] - host.prev_stat[1]
+        if d_total > 0:
+            cpu = 100 * (d_total - d_idle) // d_total
+    host.prev_stat = stat
+    values["t"] = now
+    values["cpu_percent"] = cpu
+    host.ring.append(values)
+    return True
+
+
+def _on_done(host: _Host, fut) -> None:
+    now = time.time()
+    try:
+        rc, out, err, _truncated = fut.result()
+        with _LOCK:
+            ok = _record(host, out, now)
+        error = "" if ok else ((err or "").strip() or f"rc={rc}")
+    except Exception as exc:  # cancelado ou erro no motor
+        ok, error = False, str(exc)
+    with _LOCK:
+        host.inflight = False
+        if ok:
+            host.failures = 0
+            host.last_error = ""
+            host.next_due = time.monotonic() + SAMPLE_INTERVAL
+        else:
+            host.failures += 1
+            host.last_error = error
+            host.next_due = time.monotonic() + min(_MAX_BACKOFF, SAMPLE_INTERVAL * 2 ** host.failures)
+
+
+def _tick(now: float) -> None:
+    due = []
+    with _LOCK:
+        for key, host in list(_HOSTS.items()):
+            if now - host.last_read > IDLE_TTL:
+                _HOSTS.pop(key, None)
+                continue
+            if not host.inflight and now >= host.next_due:
+                host.inflight = True
+                due.append(host)
+    for host in due:
+        try:
+            fut = submit_ssh_capture(
+                host.eve_ip, host.eve_user, host.eve_pass, _SAMPLE_CMD,
+                timeout=max(10, SAMPLE_INTERVAL * 2), priority=PRIORITY_BACKGROUND,
+            )
+        except Exception as exc:
+            with _LOCK:
+                host.inflight = False
+                host.failures += 1
+                host.last_error = str(exc)
+                host.next_due = now + _MAX_BACKOFF
+            continue
+        fut.add_done_callback(lambda f, h=host: _on_done(h, f))
+
+
+def _loop() -> None:
+    while True:
+        time.sleep(1)
+        try:
+            _tick(time.monotonic())
+        except Exception as exc:  # pragma: no cover
+            print(f"[API] resource_sampler: {exc}", flush=True)
+
+
+def _ensure_thread() -> None:
+    global _THREAD
+    if _THREAD is not None and _THREAD.is_alive():
+        return
+    _THREAD = threading.Thread(target=_loop, name="resource-sampler", daemon=True)
+    _THREAD.start()
+
+
+def register(eve_ip: str, eve_user: str, eve_pass: str) -> None:
+    """Passa a amostrar o host (ou renova o interesse nele)."""
+    key = _key(eve_ip, eve_user, eve_pass)
+    with _LOCK:
+        host = _HOSTS.get(key)
+        if host is None:
+            host = _HOSTS[key] = _Host(eve_ip, eve_user, eve_pass)
+        host.last_read = time.monotonic()
+    _ensure_thread()
+
+
+def latest(eve_ip: str, eve_user: str, eve_pass: str, max_age: float | None = None) -> dict | None:
+    """
+    Última amostra completa (com CPU) no formato de utils.get_resource_usage,
+    ou None se ainda não há uma recente o bastante (max_age padrão: 3 intervalos).
+    """
+    max_age = SAMPLE_INTERVAL * 3 if max_age is None else max_age
+    with _LOCK:
+        host = _HOSTS.get(_key(eve_ip, eve_user, eve_pass))
+        if host is None:
+            return None
+        host.last_read = time.monotonic()
+        sample = host.ring.latest()
+    if not sample or sample["cpu_percent"] is None or time.time() - sample["t"] > max_age:
+        return None
+    result = {f: sample[f] for f in FIELDS if f != "t"}
+    result.update(raw="", err="", ssh_rc=0, sampled_at=sample["t"], source="sampler")
+    return result
+
+
+def history(eve_ip: str, eve_user: str, eve_pass: str, window: float | None = None, max_points: int | None = 120) -> dict | None:
+    """Série (reduzida a max_points por média) das últimas `window` segundos."""
+    with _LOCK:
+        host = _HOSTS.get(_key(eve_ip, eve_user, eve_pass))
+        if host is None:
+            return None
+        host.last_read = time.monotonic()
+        since = time.time() - window if window else None
+        points = host.ring.series(since=since, max_points=max_points)
+        error = host.last_error
+    return {
+        "interval": SAMPLE_INTERVAL,
+        "capacity": HISTORY_POINTS,
+        "points": points,
+        "last_error": error,
+    }
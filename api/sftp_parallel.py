@@ -0,0 +1,364 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Envio paralelo de arquivos por vários canais SFTP.
+
+Os dados são quebrados em blocos de SFTP_PARALLEL_BLOCK bytes (padrão 4 MiB)
+e cada bloco é gravado no seu offset por qualquer canal livre. Assim vários
+arquivos andam ao mesmo tempo e um arquivo grande ocupa todos os canais, o
+que enche links com latência alta.
+
+Começa com SFTP_PARALLEL_MIN canais e abre mais (até SFTP_PARALLEL_CHANNELS)
+enquanto cada canal novo aumentar a vazão medida em pelo menos 10%.
+A fila entre quem produz os blocos e os canais é limitada: a memória usada
+fica em torno de 2 x canais x bloco.
+
+Imagens raw e qcow2 recém-convertidos são quase só zeros. Com SFTP_SPARSE
+(padrão ligado), trechos de SFTP_SPARSE_BLOCK bytes nulos não são enviados:
+o arquivo remoto é criado vazio, recebe só as escritas posicionadas dos
+trechos com dados e no fim é estendido (truncate) até o tamanho real, o que
+deixa buracos no host. Arquivos locais usam SEEK_DATA/SEEK_HOLE para pular
+os buracos sem nem lê-los.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import shlex
+import threading
+import time
+
+from sftp_pool import sftp_session
+
+CHANNELS_MAX = max(1, int(os.getenv("SFTP_PARALLEL_CHANNELS", "4")))
+CHANNELS_MIN = max(1, min(CHANNELS_MAX, int(os.getenv("SFTP_PARALLEL_MIN", "2"))))
+BLOCK_SIZE = max(64 * 1024, int(os.getenv("SFTP_PARALLEL_BLOCK", str(4 * 1024 * 1024))))
+# Janela de medição da vazão e ganho mínimo para abrir mais um canal.
+_ADAPT_WINDOW = 1.0
+_ADAPT_GAIN = 1.10
+SPARSE = os.getenv("SFTP_SPARSE", "1").strip().lower() not in ("0", "false", "no", "off")
+SPARSE_BLOCK = max(4096, int(os.getenv("SFTP_SPARSE_BLOCK", str(64 * 1024))))
+
+
+def remote_mkdir(ssh, path: str) -> tuple[bool, str]:
+    """`mkdir -p` do diretório remoto (caminho citado); retorna (ok, stderr)."""
+    _stdin, stdout, stderr = ssh.exec_command(f"mkdir -p -- {shlex.quote(path)}")
+    err = stderr.read().decode(errors="ignore").strip()
+    return stdout.channel.recv_exit_status() == 0, err
+
+
+def data_extents(data: bytes, block: int | None = None) -> list[tuple[int, bytes]]:
+    """
+    Trechos com dados de `data` como (offset relativo, bytes), olhando blocos
+    de `block` bytes: blocos todo nulos ficam de fora, vizinhos são unidos.
+    """
+    block = block or SPARSE_BLOCK
+    zeros = bytes(block)
+    extents: list[tuple[int, bytes]] = []
+    start = None
+    n = len(data)
+    for i in range(0, n, block):
+        j = min(i + block, n)
+        if data[i:j] == zeros[:j - i]:
+            if start is not None:
+                extents.append((start, data[start:i]))
+                start = None
+        elif start is None:
+            start = i
+    if start is not None:
+        extents.append((start, data[start:]))
+    return extents
+
+
+def file_extents(fd: int, size: int) -> list[tuple[int, int]]:
+    """(início, fim) dos trechos com dados de um arquivo local via SEEK_DATA/SEEK_HOLE."""
+    if not SPARSE or not hasattr(os, "SEEK_DATA"):
+        return [(0, size)] if size else []
+    extents = []
+    pos = 0
+    try:
+        while pos < size:
+            try:
+                start = os.lseek(fd, pos, os.SEEK_DATA)
+            except OSError:  # ENXIO: só buraco até o fim
+                break
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+            extents.append((start, min(end, size)))
+            pos = end
+    except OSError:
+        # Sistema de arquivos sem suporte: trata como um trecho só.
+        return [(0, size)] if size else []
+    return extents
+
+
+class Target:
+    """Um arquivo remoto em envio."""
+
+    def __init__(self, remote_path: str, label: str):
+        self.remote_path = remote_path
+        self.label = label
+        self.offset = 0  # próximo byte a enfileirar
+        self.written = 0  # bytes confirmados pelo servidor
+        self.queued = 0  # bytes enfileirados (offset - queued = zeros pulados)
+        self.error: str | None = None
+        self._buf: list[bytes] = []
+        self._buf_len = 0
+
+    @property
+    def done(self) -> int:
+        """Bytes já resolvidos: confirmados pelo servidor mais zeros pulados."""
+        return self.written + max(0, self.offset - self.queued)
+
+
+class ParallelUpload:
+    """
+    Uso:
+        with ParallelUpload(ip, user, pw) as up:
+            t = up.open("/opt/.../a.qcow2", "a.qcow2")
+            up.feed(t, bloco); ...; up.finish(t)
+        up.stats(), t.error
+
+    feed() bloqueia quando a fila está cheia (contrapressão para quem lê a
+    origem). Erros de um arquivo ficam em target.error e não derrubam os
+    outros.
+    """
+
+    def __init__(self, eve_ip: str, eve_user: str, eve_pass: str,
+                 channels: int | None = None, min_channels: int | None = None,
+                 session_factory=None):
+        self._creds = (eve_ip, eve_user, eve_pass)
+        self._session_factory = session_factory or sftp_session
+        self.max_channels = max(1, channels or CHANNELS_MAX)
+        self._min_channels = max(1, min(self.max_channels, min_channels or CHANNELS_MIN))
+        self._queue: queue.Queue = queue.Queue(maxsize=2 * self.max_channels)
+        self._lock = threading.Lock()
+        self._workers: list[tuple[threading.Thread, object]] = []
+        self._control = None
+        self.ssh = None
+        self.sftp = None
+        self.targets: list[Target] = []
+        self._bytes = 0
+        self._started = None
+        self._finished = None
+        self._growing = True
+        self._win_start = 0.0
+        self._win_bytes = 0
+        self._last_rate: float | None = None
+        self._closed = False
+
+    # ---- ciclo de vida ---------------------------------------------------
+
+    def __enter__(self):
+        # Canal de controle: cria/remove arquivos e fica disponível para
+        # comandos (self.ssh) como o fixpermissions.
+        self._control = self._session_factory(*self._creds)
+        self.ssh, self.sftp = self._control.__enter__()
+        try:
+            for _ in range(self._min_channels):
+                if not self._add_channel() and not self._workers:
+                    raise RuntimeError("nenhum canal SFTP disponível")
+        except BaseException:
+            self._control.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(abort=exc_type is not None)
+        self._control.__exit__(exc_type, exc, tb)
+        return False
+
+    def _add_channel(self) -> bool:
+        cm = self._session_factory(*self._creds)
+        try:
+            _ssh, sftp = cm.__enter__()
+        except Exception as e:
+            print(f"[API] SFTP paralelo: canal extra indisponível ({e})", flush=True)
+            self._growing = False
+            return False
+        thread = threading.Thread(target=self._worker, args=(sftp,), name="sftp-parallel", daemon=True)
+        with self._lock:
+            self._workers.append((thread, cm))
+        thread.start()
+        return True
+
+    def close(self, abort: bool = False) -> dict:
+        """Espera os blocos pendentes (ou descarta, com abort) e fecha os canais."""
+        if self._closed:
+            return self.stats()
+        self._closed = True
+        if abort:
+            for t in self.targets:
+                t.error = t.error or "interrompido"
+        for t in self.targets:
+            self._flush(t)
+        self._queue.join()
+        for _ in self._workers:
+            self._queue.put(None)
+        for thread, cm in self._workers:
+            thread.join()
+            try:
+                cm.__exit__(None, None, None)
+            except Exception:
+                pass
+        self._finished = time.monotonic()
+        return self.stats()
+
+    # ---- produção de blocos ----------------------------------------------
+
+    def open(self, remote_path: str, label: str | None = None) -> Target:
+        """Cria (ou zera) o arquivo remoto e o registra para envio."""
+        target = Target(remote_path, label or os.path.basename(remote_path))
+        # Remove antes de criar: se o destino for hardlink de outra imagem
+        # (ver upload_dedupe), truncar o inode estragaria as duas.
+        try:
+            self.sftp.remove(remote_path)
+        except IOError:
+            pass
+        self.sftp.open(remote_path, "wb").close()
+        self.targets.append(target)
+        return target
+
+    def feed(self, target: Target, data: bytes) -> None:
+        if target.error is not None or not data:
+            return
+        target._buf.append(data)
+        target._buf_len += len(data)
+        if target._buf_len >= BLOCK_SIZE:
+            self._flush(target)
+
+    def finish(self, target: Target) -> None:
+        self._flush(target)
+        if target.error is None and target.queued < target.offset:
+            # Zeros no fim não foram escritos: estende até o tamanho real.
+            try:
+                self.sftp.truncate(target.remote_path, target.offset)
+            except Exception as e:
+                target.error = str(e) or e.__class__.__name__
+
+    def abort(self, target: Target, reason: str) -> None:
+        target.error = target.error or reason
+        target._buf, target._buf_len = [], 0
+
+    def put_file(self, local_path: str, remote_path: str, label: str | None = None) -> Target:
+        """Enfileira um arquivo local inteiro, pulando os buracos."""
+        target = self.open(remote_path, label)
+        self.send_file(target, local_path)
+        return target
+
+    def send_file(self, target: Target, local_path: str) -> None:
+        """Como put_file, para um Target já aberto (progresso visível desde o início)."""
+        with open(local_path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            for start, end in file_extents(fh.fileno(), size):
+                fh.seek(start)
+                pos = start
+                while pos < end and target.error is None:
+                    block = fh.read(min(BLOCK_SIZE, end - pos))
+                    if not block:
+                        break
+                    self._start_clock()
+                    self._enqueue(target, pos, block)
+                    pos += len(block)
+                    target.offset = pos
+                    self._adapt()
+            target.offset = size
+        self.finish(target)
+
+    def _flush(self, target: Target) -> None:
+        if not target._buf_len:
+            return
+        data = b"".join(target._buf)
+        target._buf, target._buf_len = [], 0
+        if target.error is not None:
+            return
+        self._start_clock()
+        # Blocos maiores que BLOCK_SIZE (feed com pedaço grande) são divididos.
+        for start in range(0, len(data), BLOCK_SIZE):
+            piece = data[start:start + BLOCK_SIZE]
+            self._enqueue(target, target.offset, piece)
+            target.offset += len(piece)
+        self._adapt()
+
+    def _start_clock(self) -> None:
+        if self._started is None:
+            self._started = self._win_start = time.monotonic()
+
+    def _enqueue(self, target: Target, offset: int, piece: bytes) -> None:
+        extents = data_extents(piece) if SPARSE else [(0, piece)]
+        for rel, data in extents:
+            self._queue.put((target, offset + rel, data))
+            target.queued += len(data)
+
+    def _adapt(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._win_start
+        if elapsed < _ADAPT_WINDOW:
+            return
+        with self._lock:
+            done = self._bytes
+        rate = (done - self._win_bytes) / elapsed
+        self._win_start, self._win_bytes = now, done
+        if self._growing and len(self._workers) < self.max_channels:
+            if self._last_rate is None or rate > self._last_rate * _ADAPT_GAIN:
+                self._add_channel()
+            else:
+                # O último canal não trouxe ganho: mantém o número atual.
+                self._growing = False
+        self._last_rate = rate
+
+    # ---- canais -----------------------------------------------------------
+
+    def _worker(self, sftp) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                target, offset, data = item
+                if target.error is not None:
+                    continue
+                try:
+                    fh = sftp.open(target.remote_path, "r+b")
+                    try:
+                        fh.seek(offset)
+                        fh.set_pipelined(True)
+                        fh.write(data)
+                    finally:
+                        # close espera os acks: só então o bloco conta.
+                        fh.close()
+                except Exception as e:
+                    target.error = target.error or (str(e) or e.__class__.__name__)
+                    continue
+                with self._lock:
+                    target.written += len(data)
+                    self._bytes += len(data)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        end = self._finished or time.monotonic()
+        elapsed = (end - self._started) if self._started else 0.0
+        with self._lock:
+            total = self._bytes
+            channels = len(self._workers)
+        return {
+            "bytes": total,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_mbps": round(total * 8 / elapsed / 1e6, 2) if elapsed > 0 else 0.0,
+            "channels": channels,
+            "files": len(self.targets),
+            "sparse_bytes": sum(max(0, t.offset - t.queued) for t in self.targets),
+        }
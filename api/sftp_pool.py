@@ -0,0 +1,252 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Registro compartilhado de clientes paramiko (SSH + SFTP) por host.
+
+Os blueprints de upload, templates, ícones e fixpermissions pegam emprestada a
+mesma sessão autenticada em vez de abrir um SSHClient novo por requisição:
+carregar 200 ícones custa um handshake, não 200.
+
+- Um transporte por (host, usuário, senha); canais SFTP ociosos são guardados
+  e reaproveitados.
+- Health check ao emprestar: transporte inativo (ou que não responde a um
+  pacote "ignore" após um tempo parado) é descartado e reconectado.
+- Conexões sem uso por SFTP_POOL_IDLE_TTL segundos são fechadas por um
+  "reaper" em background.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import paramiko
+
+IDLE_TTL = int(os.getenv("SFTP_POOL_IDLE_TTL", "300"))
+CONNECT_TIMEOUT = 30
+# Parado há mais que isso, o transporte é testado antes de ser reutilizado.
+_HEALTH_CHECK_AFTER = 30
+_MAX_IDLE_SFTP = 4
+
+_LOCK = threading.Lock()
+_ENTRIES: dict[tuple[str, str, str], "_Entry"] = {}
+_STATS = {"hits": 0, "misses": 0, "evictions": 0, "health_failures": 0}
+_REAPER: threading.Thread | None = None
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()  # serializa o connect do mesmo host
+        self.client: paramiko.SSHClient | None = None
+        self.idle_sftp: list[paramiko.SFTPClient] = []
+        self.in_use = 0
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    def alive(self) -> bool:
+        transport = self.client.get_transport() if self.client else None
+        return bool(transport and transport.is_active())
+
+    def close(self) -> None:
+        for sftp in self.idle_sftp:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+        self.idle_sftp = []
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+        self.client = None
+
+
+def _key(eve_ip: str, eve_user: str, eve_pass: str) -> tuple[str, str, str]:
+    fp = hashlib.sha256(("ncf-sftp:" + (eve_pass or "")).encode("utf-8")).hexdigest()[:16]
+    return ((eve_ip or "").strip().lower(), (eve_user or "").strip(), fp)
+
+
+def _connect(eve_ip: str, eve_user: str, eve_pass: str) -> paramiko.SSHClient:
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        eve_ip,
+        username=eve_user,
+        password=eve_pass,
+        timeout=CONNECT_TIMEOUT,
+        look_for_keys=False,
+        allow_agent=False,
+    )
+    transport = client.get_transport()
+    if transport is not None:
+        transport.set_keepalive(30)
+    return client
+
+
+def _healthy(entry: _Entry) -> bool:
+    if not entry.alive():
+        return False
+    if time.monotonic() - entry.last_used < _HEALTH_CHECK_AFTER:
+        return True
+    try:
+        entry.client.get_transport().send_ignore()
+        return True
+    except Exception:
+        return False
+
+
+def _ensure_reaper() -> None:
+    global _REAPER
+    if _REAPER is not None and _REAPER.is_alive():
+        return
+    _REAPER = threading.Thread(target=_reap_loop, name="sftp-pool-reaper", daemon=True)
+    _REAPER.start()
+
+
+def _reap_loop() -> None:
+    while True:
+        time.sleep(max(5, min(IDLE_TTL // 4, 60)))
+        evict_idle()
+
+
+def evict_idle(now: float | None = None) -> int:
+    """Fecha conexões sem uso há mais de IDLE_TTL. Retorna quantas fechou."""
+    now = time.monotonic() if now is None else now
+    stale = []
+    with _LOCK:
+        for key, entry in list(_ENTRIES.items()):
+            if entry.in_use == 0 and now - entry.last_used >= IDLE_TTL:
+                stale.append(_ENTRIES.pop(key))
+                _STATS["evictions"] += 1
+    for entry in stale:
+        entry.close()
+    return len(stale)
+
+
+def _checkout(eve_ip: str, eve_user: str, eve_pass: str) -> _Entry:
+    key = _key(eve_ip, eve_user, eve_pass)
+    with _LOCK:
+        entry = _ENTRIES.get(key)
+        if entry is None:
+            entry = _Entry()
+            _ENTRIES[key] = entry
+        entry.in_use += 1
+    _ensure_reaper()
+    try:
+        with entry.lock:
+            if entry.client is not None and _healthy(entry):
+                hit = True
+            else:
+                if entry.client is not None:
+                    with _LOCK:
+                        _STATS["health_failures"] += 1
+                    entry.close()
+                entry.client = _connect(eve_ip, eve_user, eve_pass)
+                entry.created = time.monotonic()
+                hit = False
+            entry.last_used = time.monotonic()
+    except Exception:
+        with _LOCK:
+            entry.in_use -= 1
+            if entry.client is None and entry.in_use == 0 and _ENTRIES.get(key) is entry:
+                _ENTRIES.pop(key, None)
+        raise
+    with _LOCK:
+        _STATS["hits" if hit else "misses"] += 1
+    return entry
+
+
+def _release(entry: _Entry) -> None:
+    with _LOCK:
+        entry.in_use = max(0, entry.in_use - 1)
+        entry.last_used = time.monotonic()
+
+
+@contextmanager
+def ssh_session(eve_ip: str, eve_user: str, eve_pass: str):
+    """Empresta o SSHClient do pool. Não feche o cliente: ele volta ao pool."""
+    entry = _checkout(eve_ip, eve_user, eve_pass)
+    try:
+        yield entry.client
+    finally:
+        _release(entry)
+
+
+@contextmanager
+def sftp_session(eve_ip: str, eve_user: str, eve_pass: str):
+    """Empresta (SSHClient, SFTPClient). O canal SFTP volta ao pool ao final;
+    se a operação levantar exceção, ele é descartado (o transporte fica)."""
+    entry = _checkout(eve_ip, eve_user, eve_pass)
+    sftp = None
+    try:
+        with entry.lock:
+            sftp = entry.idle_sftp.pop() if entry.idle_sftp else None
+        if sftp is None or sftp.get_channel() is None or sftp.get_channel().closed:
+            sftp = entry.client.open_sftp()
+        yield entry.client, sftp
+    except BaseException:
+        if sftp is not None:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+            sftp = None
+        raise
+    finally:
+        if sftp is not None:
+            with entry.lock:
+                if len(entry.idle_sftp) < _MAX_IDLE_SFTP and entry.alive():
+                    entry.idle_sftp.append(sftp)
+                    sftp = None
+            if sftp is not None:
+                try:
+                    sftp.close()
+                except Exception:
+                    pass
+        _release(entry)
+
+
+def close_all() -> None:
+    with _LOCK:
+        entries = list(_ENTRIES.values())
+        _ENTRIES.clear()
+    for entry in entries:
+        entry.close()
+
+
+def pool_stats() -> dict:
+    now = time.monotonic()
+    with _LOCK:
+        hosts = [
+            {
+                "host": host,
+                "user": user,
+                "in_use": e.in_use,
+                "idle_sftp": len(e.idle_sftp),
+                "idle_s": round(now - e.last_used, 1),
+                "age_s": round(now - e.created, 1),
+            }
+            for (host, user, _fp), e in _ENTRIES.items()
+        ]
+        stats = dict(_STATS)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / total, 3) if total else None
+    stats["idle_ttl"] = IDLE_TTL
+    stats["connections"] = hosts
+    return stats
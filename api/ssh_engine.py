@@ -0,0 +1,287 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Motor asyncio para os processos ssh/scp.
+
+Um único event loop (thread "ssh-engine") lê os pipes de todos os processos
+remotos. Jobs longos (deploy/destroy/build) deixam de ocupar uma thread cada:
+são tarefas no loop, com timeout total e cancelamento por chave (job_id).
+
+As funções síncronas (run/stream) continuam disponíveis para as rotas Flask:
+bloqueiam apenas quem chama, esperando o resultado da tarefa no loop.
+
+Com host, cada processo passa antes pelo ssh_governor (vagas por host).
+
+Callbacks on_line/on_done rodam na thread do loop: devem ser rápidos e não
+bloquear (ex.: anexar a linha ao job sob um lock).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import subprocess
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import NamedTuple
+
+from ssh_governor import PRIORITY_BULK, PRIORITY_INTERACTIVE, slot
+
+RC_TIMEOUT = 124
+RC_CANCELLED = 130
+_READ_CHUNK = 64 * 1024
+# Linha sem "\n" maior que isso é entregue em pedaços ao on_line.
+_MAX_LINE = 64 * 1024
+
+_START_LOCK = threading.Lock()
+_LOOP: asyncio.AbstractEventLoop | None = None
+_TASKS_LOCK = threading.Lock()
+_TASKS: dict[str, Future] = {}
+_STATS = {"started": 0, "finished": 0, "timeouts": 0, "cancelled": 0, "truncated": 0}
+
+
+class Capture(NamedTuple):
+    rc: int
+    stdout: bytes | str
+    stderr: bytes | str
+    truncated: bool
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    with _START_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ssh-engine", daemon=True).start()
+            _LOOP = loop
+        return _LOOP
+
+
+def _kill(proc) -> None:
+    if proc is not None and proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def _pump_lines(stream, on_line) -> None:
+    """Entrega a saída linha a linha (sem limite de tamanho de linha)."""
+    pending = b""
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            _safe_call(on_line, line.decode("utf-8", "replace").rstrip("\r"))
+        while len(pending) > _MAX_LINE:
+            _safe_call(on_line, pending[:_MAX_LINE].decode("utf-8", "replace"))
+            pending = pending[_MAX_LINE:]
+    if pending:
+        _safe_call(on_line, pending.decode("utf-8", "replace").rstrip("\r"))
+
+
+def _safe_call(fn, *args) -> None:
+    try:
+        fn(*args)
+    except Exception:
+        pass
+
+
+class _Sink:
+    """Acumula um pipe até max_bytes; o excedente é lido e descartado (o
+    processo nunca trava com o pipe cheio). Com encoding, decodifica de forma
+    incremental e guarda só texto."""
+
+    def __init__(self, max_bytes: int | None, encoding: str | None):
+        self.max_bytes = max_bytes
+        self.decoder = codecs.getincrementaldecoder(encoding)("replace") if encoding else None
+        self.parts: list = []
+        self.kept = 0
+        self.truncated = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self.max_bytes is not None:
+            room = self.max_bytes - self.kept
+            if room <= 0:
+                self.truncated = True
+                return
+            if len(chunk) > room:
+                chunk = chunk[:room]
+                self.truncated = True
+        self.kept += len(chunk)
+        self.parts.append(self.decoder.decode(chunk) if self.decoder else chunk)
+
+    def value(self):
+        if self.decoder:
+            return "".join(self.parts) + self.decoder.decode(b"", final=True)
+        return b"".join(self.parts)
+
+
+async def _drain(stream, sink: _Sink) -> None:
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            return
+        sink.feed(chunk)
+
+
+async def _exec(argv, timeout, on_line, max_bytes=None, encoding=None,
+                host=None, priority=PRIORITY_INTERACTIVE) -> Capture:
+    """Executa argv. Sem on_line: stdout/stderr capturados (limitados a
+    max_bytes cada). Com on_line: stderr vai junto com stdout, linha a linha.
+    Com host, espera vaga no governor antes de abrir o processo; o timeout
+    conta desde a entrada na fila."""
+    _STATS["started"] += 1
+    out = _Sink(max_bytes, encoding)
+    err = _Sink(max_bytes, encoding)
+    state = {"proc": None}
+
+    async def body():
+        async with slot(host, priority):
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT if on_line else subprocess.PIPE,
+            )
+            state["proc"] = proc
+            try:
+                if on_line:
+                    await _pump_lines(proc.stdout, on_line)
+                else:
+                    await asyncio.gather(_drain(proc.stdout, out), _drain(proc.stderr, err))
+                await proc.wait()
+            except BaseException:
+                _kill(proc)
+                raise
+
+    try:
+        await asyncio.wait_for(body(), timeout)
+    except asyncio.TimeoutError:
+        _STATS["timeouts"] += 1
+        if state["proc"] is not None:
+            await state["proc"].wait()
+        # Saída parcial lida até o timeout é preservada.
+        return Capture(RC_TIMEOUT, out.value(), err.value(), out.truncated or err.truncated)
+    except asyncio.CancelledError:
+        _STATS["cancelled"] += 1
+        raise
+    finally:
+        _STATS["finished"] += 1
+    if out.truncated or err.truncated:
+        _STATS["truncated"] += 1
+    return Capture(state["proc"].returncode, out.value(), err.value(), out.truncated or err.truncated)
+
+
+def submit(argv, timeout: float | None = None, max_bytes: int | None = None, encoding: str | None = None,
+           host: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> Future:
+    """Como capture, sem esperar: retorna um Future com o Capture."""
+    coro = _exec(argv, timeout, None, max_bytes, encoding, host, priority)
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def capture(argv, timeout: float | None = None, max_bytes: int | None = None, encoding: str | None = None,
+            host: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> Capture:
+    """
+    Executa e espera. Retorna Capture(rc, stdout, stderr, truncated): bytes, ou
+    str se encoding for dado. rc=124 em timeout (com a saída parcial).
+    """
+    fut = submit(argv, timeout, max_bytes, encoding, host, priority)
+    try:
+        return fut.result()
+    except BaseException:
+        fut.cancel()
+        raise
+
+
+def run(argv, timeout: float | None = None, host: str | None = None, priority: int = PRIORITY_INTERACTIVE):
+    """Executa e espera: (rc, stdout_bytes, stderr_bytes), sem limite de tamanho."""
+    rc, out, err, _truncated = capture(argv, timeout=timeout, host=host, priority=priority)
+    return rc, out, err
+
+
+def stream(argv, on_line, timeout: float | None = None, host: str | None = None,
+           priority: int = PRIORITY_BULK) -> int:
+    """Executa transmitindo cada linha (stdout+stderr) para on_line; retorna o rc."""
+    coro = _exec(argv, timeout, on_line, host=host, priority=priority)
+    fut = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    try:
+        return fut.result().rc
+    except BaseException:
+        fut.cancel()
+        raise
+
+
+def start(argv, on_line, on_done, timeout: float | None = None, key: str | None = None,
+          host: str | None = None, priority: int = PRIORITY_BULK) -> Future:
+    """
+    Inicia em background, sem thread própria: as linhas vão para on_line e o rc
+    final para on_done(rc). Com key, o job pode ser cancelado por cancel(key).
+    """
+
+    async def job():
+        try:
+            rc = (await _exec(argv, timeout, on_line, host=host, priority=priority)).rc
+            if rc == RC_TIMEOUT:
+                _safe_call(on_line, f"[timeout após {timeout}s]")
+        except asyncio.CancelledError:
+            _safe_call(on_line, "[cancelado]")
+            _safe_call(on_done, RC_CANCELLED)
+            raise
+        except Exception as exc:
+            _safe_call(on_line, f"erro: {exc}")
+            rc = 1
+        _safe_call(on_done, rc)
+        return rc
+
+    fut = asyncio.run_coroutine_threadsafe(job(), _get_loop())
+    if key:
+        with _TASKS_LOCK:
+            _TASKS[key] = fut
+        fut.add_done_callback(lambda _f: _forget(key, _f))
+    return fut
+
+
+def _forget(key: str, fut: Future) -> None:
+    with _TASKS_LOCK:
+        if _TASKS.get(key) is fut:
+            _TASKS.pop(key, None)
+
+
+def cancel(key: str) -> bool:
+    """Cancela o job iniciado com start(key=...). O processo ssh é morto."""
+    with _TASKS_LOCK:
+        fut = _TASKS.get(key)
+    return bool(fut and fut.cancel())
+
+
+def wait(fut: Future, timeout: float | None = None):
+    """Espera um job de start(); retorna o rc (RC_CANCELLED se cancelado)."""
+    try:
+        return fut.result(timeout)
+    except CancelledError:
+        return RC_CANCELLED
+
+
+def engine_stats() -> dict:
+    with _TASKS_LOCK:
+        jobs = len(_TASKS)
+    stats = dict(_STATS)
+    stats["running"] = stats["started"] - stats["finished"]
+    stats["jobs"] = jobs
+    return stats
@@ -0,0 +1,161 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Limite de processos ssh simultâneos por host, com fila e prioridades.
+
+Várias abas consultando /node/stats, /inspect e /node/logs disparam dezenas de
+sshpass contra o mesmo host e o MaxStartups do sshd passa a recusar conexões.
+Cada host tem no máximo SSH_HOST_MAX_CONCURRENCY comandos em execução; o resto
+espera numa fila:
+
+- prioridade: leituras interativas passam na frente de jobs longos (bulk);
+- FIFO dentro da mesma prioridade (sem "furar fila");
+- SSH_HOST_BULK_RESERVE vagas ficam reservadas para leituras interativas, de
+  modo que deploys/builds em andamento não travam a interface.
+
+Roda dentro do loop do ssh_engine: esperar na fila não ocupa thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+# Amostragem periódica (resource_sampler): atrás de tudo, conta como bulk.
+PRIORITY_BACKGROUND = 2
+
+MAX_PER_HOST = max(1, int(os.getenv("SSH_HOST_MAX_CONCURRENCY", "6")))
+BULK_RESERVE = max(0, int(os.getenv("SSH_HOST_BULK_RESERVE", "2")))
+BULK_MAX = max(1, MAX_PER_HOST - BULK_RESERVE)
+
+_LOCK = threading.Lock()  # protege _GATES para leitura das métricas fora do loop
+_GATES: dict[str, "_Gate"] = {}
+_SEQ = itertools.count()
+
+
+class _Gate:
+    def __init__(self):
+        self.active = 0
+        self.active_bulk = 0
+        self.waiters: list[tuple[int, int, asyncio.Future, bool]] = []
+        self.acquired = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.max_depth = 0
+
+    def can_admit(self, bulk: bool) -> bool:
+        if self.active >= MAX_PER_HOST:
+            return False
+        return not bulk or self.active_bulk < BULK_MAX
+
+    def admit(self, bulk: bool) -> None:
+        self.active += 1
+        if bulk:
+            self.active_bulk += 1
+
+    def release(self, bulk: bool) -> None:
+        self.active = max(0, self.active - 1)
+        if bulk:
+            self.active_bulk = max(0, self.active_bulk - 1)
+        self.wake()
+
+    def wake(self) -> None:
+        while self.waiters:
+            _prio, _seq, fut, bulk = self.waiters[0]
+            if fut.done():  # cancelado enquanto esperava
+                heapq.heappop(self.waiters)
+                continue
+            if not self.can_admit(bulk):
+                # Só há bulk na frente quando não existe interativo esperando.
+                return
+            heapq.heappop(self.waiters)
+            self.admit(bulk)
+            fut.set_result(None)
+
+
+def _gate(host: str) -> _Gate:
+    key = (host or "").strip().lower()
+    with _LOCK:
+        gate = _GATES.get(key)
+        if gate is None:
+            gate = _GATES[key] = _Gate()
+        return gate
+
+
+@asynccontextmanager
+async def slot(host: str | None, priority: int = PRIORITY_INTERACTIVE):
+    """Ocupa uma vaga do host durante o bloco (sem host: não limita)."""
+    if not host:
+        yield
+        return
+    gate = _gate(host)
+    bulk = priority >= PRIORITY_BULK
+    started = time.monotonic()
+    if not gate.waiters and gate.can_admit(bulk):
+        gate.admit(bulk)
+    else:
+        fut = asyncio.get_running_loop().create_future()
+        with _LOCK:
+            heapq.heappush(gate.waiters, (priority, next(_SEQ), fut, bulk))
+            gate.max_depth = max(gate.max_depth, len(gate.waiters))
+        gate.wake()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                gate.release(bulk)  # a vaga chegou junto com o cancelamento
+            raise
+        waited = time.monotonic() - started
+        with _LOCK:
+            gate.waited += 1
+            gate.wait_total += waited
+            gate.wait_max = max(gate.wait_max, waited)
+    with _LOCK:
+        gate.acquired += 1
+    try:
+        yield
+    finally:
+        gate.release(bulk)
+
+
+def governor_stats() -> dict:
+    """Vagas em uso, profundidade da fila e tempos de espera por host."""
+    with _LOCK:
+        hosts = []
+        for host, g in _GATES.items():
+            pending = [w for w in g.waiters if not w[2].done()]
+            hosts.append(
+                {
+                    "host": host,
+                    "active": g.active,
+                    "active_bulk": g.active_bulk,
+                    "queued": len(pending),
+                    "queued_bulk": sum(1 for w in pending if w[3]),
+                    "max_queue_depth": g.max_depth,
+                    "acquired": g.acquired,
+                    "waited": g.waited,
+                    "wait_avg_ms": round(1000 * g.wait_total / g.waited, 1) if g.waited else 0.0,
+                    "wait_max_ms": round(1000 * g.wait_max, 1),
+                }
+            )
+    return {"max_per_host": MAX_PER_HOST, "bulk_max": BULK_MAX, "hosts": hosts}
@@ -0,0 +1,154 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Pool de conexões SSH multiplexadas (OpenSSH ControlMaster).
+
+Cada par (host, usuário) ganha um socket de controle: a primeira chamada faz o
+handshake completo (TCP + troca de chaves + senha) e vira "master"; as seguintes
+abrem apenas um canal novo sobre a sessão já autenticada. O master se encerra
+sozinho após SSH_POOL_IDLE_TTL segundos sem uso (ControlPersist).
+
+O caminho do socket inclui uma impressão digital da senha: uma requisição com
+senha diferente nunca reaproveita uma sessão autenticada por outra.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import subprocess
+import threading
+import time
+
+CONTROL_DIR = os.getenv("SSH_CONTROL_DIR", "/tmp/ncf-ssh")
+IDLE_TTL = int(os.getenv("SSH_POOL_IDLE_TTL", "300"))
+
+_LOCK = threading.Lock()
+_ENTRIES: dict[tuple[str, str], dict] = {}
+_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _key(eve_ip: str, eve_user: str) -> tuple[str, str]:
+    return ((eve_ip or "").strip().lower(), (eve_user or "").strip())
+
+
+def _fingerprint(eve_pass: str) -> str:
+    return hashlib.sha256(("ncf-pool:" + (eve_pass or "")).encode("utf-8")).hexdigest()[:16]
+
+
+def control_path(eve_ip: str, eve_user: str, eve_pass: str) -> str:
+    """Caminho curto (limite de ~104 bytes para sockets Unix) e estável."""
+    host, user = _key(eve_ip, eve_user)
+    digest = hashlib.sha1(f"{user}@{host}#{_fingerprint(eve_pass)}".encode("utf-8")).hexdigest()[:20]
+    return os.path.join(CONTROL_DIR, digest)
+
+
+def _stop_master(path: str) -> None:
+    """Pede ao master para não aceitar novos canais. Sessões em andamento
+    terminam normalmente; o socket é removido pelo próprio ssh."""
+    try:
+        subprocess.run(
+            ["ssh", "-o", f"ControlPath={path}", "-O", "stop", "ncf-pool"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=5,
+        )
+    except Exception:
+        pass
+
+
+def _evict_idle_locked(now: float) -> None:
+    for key in [k for k, e in _ENTRIES.items() if now - e["last_used"] >= IDLE_TTL]:
+        _ENTRIES.pop(key, None)
+        _STATS["evictions"] += 1
+
+
+def mux_options(eve_ip: str, eve_user: str, eve_pass: str) -> list[str]:
+    """
+    Retorna as opções `-o` de multiplexação para a conexão e contabiliza o uso
+    no pool (hit = já existe master vivo para o par host/usuário).
+    """
+    path = control_path(eve_ip, eve_user, eve_pass)
+    key = _key(eve_ip, eve_user)
+    now = time.monotonic()
+    retired = None
+    with _LOCK:
+        _evict_idle_locked(now)
+        entry = _ENTRIES.get(key)
+        if entry and entry["path"] != path:
+            # Senha mudou para o mesmo host/usuário: aposenta o master antigo.
+            retired = entry["path"]
+            entry = None
+        if entry and os.path.exists(path):
+            _STATS["hits"] += 1
+        else:
+            _STATS["misses"] += 1
+            entry = {"path": path, "created": now, "uses": 0}
+            _ENTRIES[key] = entry
+        entry["last_used"] = now
+        entry["uses"] += 1
+    if retired:
+        _stop_master(retired)
+    try:
+        os.makedirs(CONTROL_DIR, mode=0o700, exist_ok=True)
+    except OSError:
+        pass
+    return [
+        "-o", "ControlMaster=auto",
+        "-o", f"ControlPath={path}",
+        "-o", f"ControlPersist={IDLE_TTL}",
+    ]
+
+
+def evict(eve_ip: str, eve_user: str) -> bool:
+    """Remove o par do pool e encerra o master (ex.: após troca de senha)."""
+    with _LOCK:
+        entry = _ENTRIES.pop(_key(eve_ip, eve_user), None)
+        if entry:
+            _STATS["evictions"] += 1
+    if entry:
+        _stop_master(entry["path"])
+    return entry is not None
+
+
+def close_all() -> None:
+    with _LOCK:
+        paths = [e["path"] for e in _ENTRIES.values()]
+        _ENTRIES.clear()
+    for path in paths:
+        _stop_master(path)
+
+
+def pool_stats() -> dict:
+    """Contadores de hit/miss/evictions e conexões ativas (sem credenciais)."""
+    now = time.monotonic()
+    with _LOCK:
+        _evict_idle_locked(now)
+        hosts = [
+            {
+                "host": host,
+                "user": user,
+                "uses": e["uses"],
+                "idle_s": round(now - e["last_used"], 1),
+                "age_s": round(now - e["created"], 1),
+            }
+            for (host, user), e in _ENTRIES.items()
+        ]
+        stats = dict(_STATS)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / total, 3) if total else None
+    stats["idle_ttl"] = IDLE_TTL
+    stats["connections"] = hosts
+    return stats
@@ -21,55 +21,18 @@ from typing import Dict, Any, List
 from flask import Blueprint, request, jsonify
 import paramiko
 
+from conditional import Validator, conditional_listing, form_creds
+import fix_scheduler
 from config import TEMPLATES_AMD_DIR, TEMPLATES_INTEL_DIR, TEMPLATE_ALLOWED_EXT
 from i18n import translate, get_request_lang
+from sftp_pool import sftp_session
 
 templates_bp = Blueprint("templates_bp", __name__, url_prefix="/templates")
 
 
-def _ssh_connect(eve_ip: str, eve_user: str, eve_pass: str) -> paramiko.SSHClient:
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(eve_ip, username=eve_user, password=eve_pass, timeout=30)
-    return ssh
-
-
 def _run_fixpermissions(ssh: paramiko.SSHClient, errors: List[Dict[str, Any]]) -> bool:
-    cmd = "/opt/unetlab/wrappers/unl_wrapper -a fixpermissions"
-
-    try:
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-        exit_status = stdout.channel.recv_exit_status()
-        out = stdout.read().decode(errors="ignore")
-        err = stderr.read().decode(errors="ignore")
-
-        if exit_status != 0:
-            errors.append(
-                {
-                    "step": "fixpermissions",
-                    "stdout": out,
-                    "stderr": err or f"Exit status {exit_status}",
-                }
-            )
-            return False
-
-        if out.strip():
-            errors.append(
-                {
-                    "step": "fixpermissions_stdout",
-                    "stdout": out.strip(),
-                }
-            )
-
-        return True
-    except Exception as e:
-        errors.append(
-            {
-                "step": "fixpermissions",
-                "stderr": f"Exception: {e}",
-            }
-        )
-        return False
+    """fixpermissions agrupado por host (ver fix_scheduler)."""
+    return fix_scheduler.fix_with_ssh(ssh, errors)
 
 
 def _normalize_template_name(name: str) -> str:
@@ -91,7 +54,13 @@ def _normalize_template_name(name: str) -> str:
     return base + "." + ext
 
 
+def _templates_validator():
+    creds = form_creds()
+    return Validator(*creds, [TEMPLATES_AMD_DIR, TEMPLATES_INTEL_DIR]) if creds else None
+
+
 @templates_bp.route("/list", methods=["POST"])
+@conditional_listing(_templates_validator)
 def list_templates():
     lang = get_request_lang()
     eve_ip = (request.form.get("eve_ip") or "").strip()
@@ -108,25 +77,21 @@ def list_templates():
             400,
         )
 
-    ssh = None
     try:
-        ssh = _ssh_connect(eve_ip, eve_user, eve_pass)
-        sftp = ssh.open_sftp()
+        with sftp_session(eve_ip, eve_user, eve_pass) as (_ssh, sftp):
 
-        def list_dir(path: str) -> List[str]:
-            try:
-                files = sftp.listdir(path)
-                return sorted(f for f in files if f.endswith((".yml", ".yaml")))
-            except IOError:
-                return []
+            def list_dir(path: str) -> List[str]:
+                try:
+                    files = sftp.listdir(path)
+                    return sorted(f for f in files if f.endswith((".yml", ".yaml")))
+                except IOError:
+                    return []
 
-        amd_list = list_dir(TEMPLATES_AMD_DIR)
-        intel_list = list_dir(TEMPLATES_INTEL_DIR)
+            amd_list = list_dir(TEMPLATES_AMD_DIR)
+            intel_list = list_dir(TEMPLATES_INTEL_DIR)
 
         all_set = sorted(set(amd_list) | set(intel_list))
 
-        sftp.close()
-
         return (
             jsonify(
                 success=True,
@@ -148,9 +113,6 @@ def list_templates():
             ),
             500,
         )
-    finally:
-        if ssh is not None:
-            ssh.close()
 
 
 @templates_bp.route("/get", methods=["POST"])
@@ -183,11 +145,7 @@ def get_template():
 
     template_name = _normalize_template_name(template_name)
 
-    ssh = None
     try:
-        ssh = _ssh_connect(eve_ip, eve_user, eve_pass)
-        sftp = ssh.open_sftp()
-
         # tenta primeiro em amd, depois em intel
         paths = [
             f"{TEMPLATES_AMD_DIR}/{template_name}",
@@ -197,15 +155,14 @@ def get_template():
         content = None
         last_error = None
 
-        for p in paths:
-            try:
-                with sftp.open(p, "r") as f:
-                    content = f.read().decode("utf-8", errors="ignore")
-                break
-            except Exception as e:
-                last_error = e
-
-        sftp.close()
+        with sftp_session(eve_ip, eve_user, eve_pass) as (_ssh, sftp):
+            for p in paths:
+                try:
+                    with sftp.open(p, "r") as f:
+                        content = f.read().decode("utf-8", errors="ignore")
+                    break
+                except Exception as e:
+                    last_error = e
 
         if content is None:
             return (
@@ -234,9 +191,6 @@ def get_template():
             ),
             500,
         )
-    finally:
-        if ssh is not None:
-            ssh.close()
 
 
 @templates_bp.route("/upload", methods=["POST"])
@@ -282,35 +236,31 @@ def upload_template():
 
     template_name = _normalize_template_name(template_name)
 
-    ssh = None
     try:
-        ssh = _ssh_connect(eve_ip, eve_user, eve_pass)
-        sftp = ssh.open_sftp()
-
-        for base_dir in (TEMPLATES_AMD_DIR, TEMPLATES_INTEL_DIR):
-            try:
-                # garante diretório (normalmente já existe, mas não custa)
+        with sftp_session(eve_ip, eve_user, eve_pass) as (ssh, sftp):
+            for base_dir in (TEMPLATES_AMD_DIR, TEMPLATES_INTEL_DIR):
                 try:
-                    sftp.listdir(base_dir)
-                except IOError:
-                    ssh.exec_command(f"mkdir -p '{base_dir}'")
-
-                remote_path = f"{base_dir}/{template_name}"
-
-                with sftp.open(remote_path, "w") as f:
-                    f.write(template_content)
-            except Exception as e:
-                errors.append(
-                    {
-                        "target": base_dir,
-                        "step": "write_template",
-                        "stderr": str(e),
-                    }
-                )
-
-        sftp.close()
-
-        fix_ok = _run_fixpermissions(ssh, errors)
+                    # garante diretório (normalmente já existe, mas não custa)
+                    try:
+                        sftp.listdir(base_dir)
+                    except IOError:
+                        _, mkdir_out, _ = ssh.exec_command(f"mkdir -p '{base_dir}'")
+                        mkdir_out.channel.recv_exit_status()
+
+                    remote_path = f"{base_dir}/{template_name}"
+
+                    with sftp.open(remote_path, "w") as f:
+                        f.write(template_content)
+                except Exception as e:
+                    errors.append(
+                        {
+                            "target": base_dir,
+                            "step": "write_template",
+                            "stderr": str(e),
+                        }
+                    )
+
+            fix_ok = _run_fixpermissions(ssh, errors)
 
         success = fix_ok and not errors
         if success:
@@ -344,6 +294,3 @@ def upload_template():
             ),
             500,
         )
-    finally:
-        if ssh is not None:
-            ssh.close()
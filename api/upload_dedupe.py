@@ -0,0 +1,212 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Deduplicação de uploads por conteúdo (sha256).
+
+Para cada host há um manifesto local (UPLOAD_MANIFEST_DIR, padrão
+UPLOAD_FOLDER/manifests) com caminho -> tamanho, mtime e sha256 dos arquivos
+já vistos sob DEFAULT_EVE_BASE_DIR. Ele é alimentado pelos próprios uploads
+(o hash é calculado enquanto os bytes passam) e, sob demanda, por sha256sum
+remoto apenas nos arquivos com o mesmo tamanho do procurado.
+
+Quando o cliente informa o sha256 (e o tamanho) de um arquivo que já existe
+no host, o destino é criado por hardlink (ou `cp --reflink=auto`, se o
+hardlink não for possível) em vez de transferir os bytes de novo.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shlex
+import threading
+
+from config import DEFAULT_EVE_BASE_DIR, UPLOAD_FOLDER
+
+MANIFEST_DIR = os.getenv("UPLOAD_MANIFEST_DIR", os.path.join(UPLOAD_FOLDER, "manifests"))
+# Máximo de candidatos (mesmo tamanho, sem hash conhecido) a hashear por busca.
+MAX_HASH_CANDIDATES = int(os.getenv("UPLOAD_DEDUPE_MAX_CANDIDATES", "8"))
+
+_SHA_RE = re.compile(r"^[0-9a-f]{64}$")
+_LOCK = threading.Lock()
+
+
+def normalize_sha(value) -> str | None:
+    value = str(value or "").strip().lower()
+    return value if _SHA_RE.match(value) else None
+
+
+def parse_declared(raw: str | None) -> dict[str, dict]:
+    """
+    Campo `sha256` do formulário: JSON {"arquivo": "hex"} ou
+    {"arquivo": {"sha256": "hex", "size": n}}. Entradas inválidas são ignoradas.
+    """
+    try:
+        data = json.loads(raw or "{}")
+    except ValueError:
+        return {}
+    declared = {}
+    if not isinstance(data, dict):
+        return declared
+    for name, value in data.items():
+        if isinstance(value, dict):
+            sha, size = normalize_sha(value.get("sha256")), value.get("size")
+        else:
+            sha, size = normalize_sha(value), None
+        if not sha:
+            continue
+        try:
+            size = int(size) if size is not None else None
+        except (TypeError, ValueError):
+            size = None
+        declared[os.path.basename(str(name))] = {"sha256": sha, "size": size}
+    return declared
+
+
+def _manifest_path(eve_ip: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", (eve_ip or "").strip().lower())
+    return os.path.join(MANIFEST_DIR, f"{safe}.json")
+
+
+def load_manifest(eve_ip: str) -> dict:
+    try:
+        with open(_manifest_path(eve_ip), encoding="utf-8") as fh:
+            data = json.load(fh)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(eve_ip: str, manifest: dict) -> None:
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = _manifest_path(eve_ip)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    os.replace(path + ".tmp", path)
+
+
+def record(eve_ip: str, path: str, size: int, mtime, sha256: str) -> None:
+    with _LOCK:
+        manifest = load_manifest(eve_ip)
+        manifest[path] = {"size": int(size), "mtime": str(mtime), "sha256": sha256}
+        _save_manifest(eve_ip, manifest)
+
+
+def forget(eve_ip: str, path: str) -> None:
+    with _LOCK:
+        manifest = load_manifest(eve_ip)
+        if manifest.pop(path, None) is not None:
+            _save_manifest(eve_ip, manifest)
+
+
+def _exec(ssh, cmd: str):
+    """
+    (rc, stdout, stderr) de um comando. Lê stdout e stderr (este numa thread)
+    até o fim antes de pegar o status: esperar o status primeiro trava quando
+    a saída passa da janela do canal.
+    """
+    _stdin, stdout, stderr = ssh.exec_command(cmd)
+    err: list[bytes] = []
+    reader = threading.Thread(target=lambda: err.append(stderr.read()), daemon=True)
+    reader.start()
+    out = stdout.read()
+    reader.join()
+    rc = stdout.channel.recv_exit_status()
+    return rc, out.decode(errors="ignore"), b"".join(err).decode(errors="ignore")
+
+
+def _parse_find(out: str) -> dict[str, tuple[int, str]]:
+    found = {}
+    for line in out.splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) == 3 and parts[0].isdigit():
+            found[parts[2]] = (int(parts[0]), parts[1])
+    return found
+
+
+def stat_remote(ssh, paths) -> dict[str, tuple[int, str]]:
+    """caminho -> (tamanho, mtime) no mesmo formato usado pelo manifesto."""
+    if not paths:
+        return {}
+    quoted = " ".join(shlex.quote(p) for p in paths)
+    _rc, out, _err = _exec(ssh, f"find {quoted} -maxdepth 0 -type f -printf '%s %T@ %p\\n' 2>/dev/null")
+    return _parse_find(out)
+
+
+def _list_same_size(ssh, base_dirs, size: int) -> dict[str, str]:
+    """Arquivos remotos com exatamente `size` bytes -> mtime (texto do find)."""
+    roots = " ".join(shlex.quote(d) for d in base_dirs)
+    cmd = f"find {roots} -type f -size {int(size)}c -printf '%s %T@ %p\\n' 2>/dev/null"
+    _rc, out, _err = _exec(ssh, cmd)
+    return {path: mtime for path, (n, mtime) in _parse_find(out).items() if n == size}
+
+
+def find_match(ssh, eve_ip: str, sha256: str, size: int | None = None,
+               base_dirs=(DEFAULT_EVE_BASE_DIR,)) -> str | None:
+    """
+    Caminho remoto com o mesmo conteúdo, ou None. Sem size só o manifesto é
+    consultado (entradas ainda conferidas no host); com size, arquivos do
+    mesmo tamanho sem hash conhecido são hasheados no host.
+    """
+    manifest = load_manifest(eve_ip)
+    if size is None:
+        known = [p for p, e in manifest.items() if e.get("sha256") == sha256]
+        if not known:
+            return None
+        size = manifest[known[0]]["size"]
+
+    current = _list_same_size(ssh, base_dirs, size)
+    to_hash = []
+    for path, mtime in current.items():
+        entry = manifest.get(path)
+        if entry and entry.get("size") == size and entry.get("mtime") == mtime:
+            if entry.get("sha256") == sha256:
+                return path
+        else:
+            to_hash.append(path)
+
+    match = None
+    if to_hash:
+        quoted = " ".join(shlex.quote(p) for p in to_hash[:MAX_HASH_CANDIDATES])
+        _rc, out, _err = _exec(ssh, f"sha256sum -- {quoted} 2>/dev/null")
+        for line in out.splitlines():
+            digest, _, path = line.partition("  ")
+            if not (digest and path) or path not in current:
+                continue
+            record(eve_ip, path, size, current[path], digest)
+            if digest == sha256 and match is None:
+                match = path
+    # Entradas do manifesto que sumiram do host (mesmo tamanho) são descartadas.
+    for path, entry in manifest.items():
+        if entry.get("size") == size and path not in current:
+            forget(eve_ip, path)
+    return match
+
+
+def link_remote(ssh, src: str, dst: str):
+    """Cria dst com o conteúdo de src sem transferir bytes. Retorna (ok, método|erro)."""
+    if src == dst:
+        return True, "same"
+    s, d = shlex.quote(src), shlex.quote(dst)
+    cmd = (
+        f"mkdir -p {shlex.quote(os.path.dirname(dst))} && "
+        f"if ln -f {s} {d} 2>/dev/null; then echo link; "
+        f"else cp --reflink=auto -f {s} {d} && echo copy; fi"
+    )
+    rc, out, err = _exec(ssh, cmd)
+    if rc != 0:
+        return False, (err or out or f"rc={rc}").strip()
+    return True, out.strip() or "copy"
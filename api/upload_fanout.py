@@ -0,0 +1,218 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Fan-out de upload: o mesmo corpo recebido vai para vários hosts.
+
+Cada host tem uma thread própria com o seu envio paralelo (sftp_parallel) e
+uma fila de eventos (abrir arquivo, dados, fim). A fila fica em memória até
+UPLOAD_FANOUT_MEM_BUFFER bytes por host (padrão 64 MiB); passando disso, os
+eventos seguintes vão para um arquivo local (UPLOAD_FANOUT_SPILL_DIR) e o host
+lento os lê de lá no seu ritmo. Assim quem recebe o corpo nunca espera por
+um host específico e um host lento só atrasa a si mesmo.
+
+Quando um host termina os seus arquivos, o fixpermissions roda nele na
+mesma thread, sem esperar os demais.
+"""
+
+from __future__ import annotations
+
+import collections
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from config import UPLOAD_FOLDER
+from sftp_parallel import ParallelUpload, remote_mkdir
+
+MEM_BUFFER = int(os.getenv("UPLOAD_FANOUT_MEM_BUFFER", str(64 * 1024 * 1024)))
+SPILL_DIR = os.getenv("UPLOAD_FANOUT_SPILL_DIR", os.path.join(UPLOAD_FOLDER, "fanout"))
+
+_OPEN, _DATA, _FINISH, _ABORT, _END = b"o", b"d", b"f", b"a", b"e"
+_HEADER = struct.Struct("!cI")
+
+
+class SpillQueue:
+    """
+    Fila FIFO de (tipo, payload) com limite de memória. Estourado o limite,
+    os itens seguintes vão para um arquivo temporário até o consumidor
+    alcançá-los; a ordem é sempre preservada.
+    """
+
+    def __init__(self, mem_limit: int = MEM_BUFFER, spill_dir: str | None = None):
+        self._mem_limit = mem_limit
+        self._spill_dir = spill_dir or SPILL_DIR
+        self._items: collections.deque = collections.deque()
+        self._mem_bytes = 0
+        self._cond = threading.Condition()
+        self._spill = None  # arquivo aberto enquanto há itens em disco
+        self._write_pos = 0
+        self._read_pos = 0
+        self.spilled_bytes = 0
+
+    def put(self, kind: bytes, payload: bytes = b"") -> None:
+        with self._cond:
+            if self._spill is None and self._mem_bytes + len(payload) <= self._mem_limit:
+                self._items.append((kind, payload))
+                self._mem_bytes += len(payload)
+            else:
+                if self._spill is None:
+                    os.makedirs(self._spill_dir, exist_ok=True)
+                    self._spill = tempfile.TemporaryFile(dir=self._spill_dir)
+                    self._write_pos = self._read_pos = 0
+                self._spill.seek(self._write_pos)
+                self._spill.write(_HEADER.pack(kind, len(payload)) + payload)
+                self._write_pos = self._spill.tell()
+                self.spilled_bytes += len(payload)
+            self._cond.notify()
+
+    def get(self) -> tuple[bytes, bytes]:
+        with self._cond:
+            while not self._items and self._spill is None:
+                self._cond.wait()
+            if self._items:
+                kind, payload = self._items.popleft()
+                self._mem_bytes -= len(payload)
+                return kind, payload
+            # Memória vazia: lê o próximo item do disco.
+            self._spill.seek(self._read_pos)
+            kind, size = _HEADER.unpack(self._spill.read(_HEADER.size))
+            payload = self._spill.read(size)
+            self._read_pos = self._spill.tell()
+            if self._read_pos >= self._write_pos:
+                # Alcançou quem escreve: volta a usar a memória.
+                self._spill.close()
+                self._spill = None
+            return kind, payload
+
+    def close(self) -> None:
+        with self._cond:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            self._items.clear()
+            self._mem_bytes = 0
+
+
+class HostWriter:
+    """Envio de um host: consome a sua fila numa thread própria."""
+
+    def __init__(self, host: dict, remote_dir: str, on_done=None, mem_limit: int | None = None):
+        self.host = host
+        self.remote_dir = remote_dir
+        self._on_done = on_done  # on_done(writer, up) ao fim dos arquivos, ainda conectado
+        self.queue = SpillQueue(mem_limit if mem_limit is not None else MEM_BUFFER)
+        self.targets = []
+        self.errors: list[dict] = []
+        self.transfer: dict | None = None
+        self.result: dict | None = None
+        self.fatal: str | None = None
+        self._ended = False
+        self._started = time.monotonic()
+        self._finished: float | None = None
+        self._thread = threading.Thread(target=self._run, name=f"fanout-{host['eve_ip']}", daemon=True)
+        self._thread.start()
+
+    # ---- lado de quem recebe o corpo (nunca bloqueia) ---------------------
+
+    def open(self, filename: str) -> None:
+        self.queue.put(_OPEN, filename.encode())
+
+    def feed(self, data: bytes) -> None:
+        if self.fatal is None:
+            self.queue.put(_DATA, data)
+
+    def finish(self) -> None:
+        self.queue.put(_FINISH)
+
+    def abort(self, reason: str) -> None:
+        self.queue.put(_ABORT, reason.encode())
+
+    def end(self) -> None:
+        self.queue.put(_END)
+
+    def join(self, timeout: float | None = None) -> None:
+        self._thread.join(timeout)
+
+    # ---- thread do host ---------------------------------------------------
+
+    def _run(self) -> None:
+        try:
+            with ParallelUpload(self.host["eve_ip"], self.host["eve_user"], self.host["eve_pass"]) as up:
+                ok, err = remote_mkdir(up.ssh, self.remote_dir)
+                if not ok:
+                    raise RuntimeError(f"mkdir {self.remote_dir}: {err or 'falhou'}")
+                self._consume(up)
+                self.transfer = up.close()
+                if self._on_done is not None:
+                    self._on_done(self, up)
+        except Exception as e:
+            self.fatal = str(e) or e.__class__.__name__
+            # Esvazia a fila para não acumular o resto do corpo em disco.
+            self._drain()
+        finally:
+            self._finished = time.monotonic()
+            self.queue.close()
+
+    def _consume(self, up) -> None:
+        current = None
+        while True:
+            kind, payload = self.queue.get()
+            if kind == _END:
+                self._ended = True
+                return
+            if kind == _OPEN:
+                filename = payload.decode()
+                try:
+                    current = up.open(f"{self.remote_dir}/{filename}", filename)
+                    self.targets.append(current)
+                except Exception as e:
+                    current = None
+                    self.errors.append({"filename": filename, "stderr": str(e)})
+            elif current is None:
+                continue
+            elif kind == _DATA:
+                up.feed(current, payload)
+            elif kind == _FINISH:
+                up.finish(current)
+                current = None
+            elif kind == _ABORT:
+                up.abort(current, payload.decode())
+                current = None
+
+    def _drain(self) -> None:
+        while not self._ended:
+            kind, _payload = self.queue.get()
+            self._ended = kind == _END
+
+    def elapsed(self) -> float:
+        return (self._finished or time.monotonic()) - self._started
+
+
+def remote_dir_for(eve_base_dir: str, template_name: str) -> str:
+    return f"{eve_base_dir.rstrip('/')}/{template_name}"
+
+
+def describe(writer: HostWriter) -> dict:
+    """Resumo por host para a resposta (sem credenciais)."""
+    return {
+        "host": writer.host["eve_ip"],
+        "name": writer.host.get("name") or writer.host["eve_ip"],
+        "spilled_bytes": writer.queue.spilled_bytes,
+        "elapsed_ms": int(writer.elapsed() * 1000),
+        **(writer.result or {}),
+    }
+
@@ -0,0 +1,212 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Jobs de upload assíncronos (em memória, como os jobs do ContainerLab).
+
+POST /upload/job grava os arquivos em UPLOAD_JOB_DIR (padrão
+UPLOAD_FOLDER/jobs/<job_id>) e devolve o job_id; o envio ao host roda numa
+thread e o progresso (bytes, MB/s, ETA e estado por arquivo) é lido por
+snapshot(), via GET /upload/job/<id> ou /ws/upload/<id>. POST /upload/url
+usa os mesmos jobs, com o arquivo vindo de uma URL em vez do disco.
+
+O preço de responder antes do envio ao host é uma cópia local de cada
+imagem: disco e escrita em dobro (o /upload síncrono transmite direto, sem
+cópia). Por isso o job só começa se, somados os bytes anunciados, ainda
+sobrarem UPLOAD_JOB_MIN_FREE bytes livres em JOB_DIR (padrão 1 GiB), e a
+gravação confere o espaço de novo a cada SPACE_CHECK_EVERY bytes.
+
+O progresso de um arquivo em envio vem de uma função registrada com
+track(); assim o snapshot reflete o que os canais já confirmaram sem que a
+thread de envio precise publicar cada bloco. Jobs terminados ficam
+disponíveis por UPLOAD_JOB_TTL segundos (padrão 1 h).
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from config import UPLOAD_FOLDER
+
+JOB_DIR = os.getenv("UPLOAD_JOB_DIR", os.path.join(UPLOAD_FOLDER, "jobs"))
+JOB_TTL = int(os.getenv("UPLOAD_JOB_TTL", "3600"))
+MIN_FREE = int(os.getenv("UPLOAD_JOB_MIN_FREE", str(1024 * 1024 * 1024)))
+SPACE_CHECK_EVERY = 64 * 1024 * 1024
+
+_UPLOAD_JOBS: dict[str, dict] = {}
+_UPLOAD_JOBS_LOCK = threading.Lock()
+
+
+def staging_dir(job_id: str) -> str:
+    return os.path.join(JOB_DIR, job_id)
+
+
+def has_room(incoming: int = 0) -> bool:
+    """JOB_DIR comporta mais `incoming` bytes e ainda fica com MIN_FREE livres?"""
+    os.makedirs(JOB_DIR, exist_ok=True)
+    return shutil.disk_usage(JOB_DIR).free - max(0, incoming) >= MIN_FREE
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+
+def create(job_id: str, params: dict, files: list[dict]) -> dict:
+    """
+    Registra o job. files: [{"filename", "path", "size", "sha256"}] já
+    gravados em staging_dir(job_id). params guarda credenciais e opções e
+    nunca aparece no snapshot.
+    """
+    purge_finished()
+    job = {
+        "id": job_id,
+        "status": "running",  # running | success | error
+        "phase": "queued",  # queued | transfer | fix | done
+        "message": "",
+        "errors": [],
+        "params": params,
+        "files": [
+            {
+                "filename": f["filename"],
+                "path": f["path"],
+                "size": f["size"],
+                "sha256": f.get("sha256"),
+                "status": "pending",  # pending | sending | done | deduplicated | error
+                "sent": 0,
+                "_progress": None,
+            }
+            for f in files
+        ],
+        "transfer": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+    with _UPLOAD_JOBS_LOCK:
+        _UPLOAD_JOBS[job_id] = job
+    return job
+
+
+def get(job_id: str) -> dict | None:
+    with _UPLOAD_JOBS_LOCK:
+        return _UPLOAD_JOBS.get(job_id)
+
+
+def update(job_id: str, **fields) -> None:
+    with _UPLOAD_JOBS_LOCK:
+        job = _UPLOAD_JOBS.get(job_id)
+        if job:
+            if fields.get("phase") == "transfer" and job["started_at"] is None:
+                job["started_at"] = time.time()
+            job.update(fields)
+
+
+def track(job_id: str, index: int, progress) -> None:
+    """Marca o arquivo como em envio; progress() devolve os bytes já enviados."""
+    with _UPLOAD_JOBS_LOCK:
+        job = _UPLOAD_JOBS.get(job_id)
+        if job:
+            job["files"][index].update(status="sending", _progress=progress)
+
+
+def update_file(job_id: str, index: int, **fields) -> None:
+    with _UPLOAD_JOBS_LOCK:
+        job = _UPLOAD_JOBS.get(job_id)
+        if job:
+            job["files"][index].update(fields)
+
+
+def file_done(job_id: str, index: int, status: str, **extra) -> None:
+    with _UPLOAD_JOBS_LOCK:
+        job = _UPLOAD_JOBS.get(job_id)
+        if not job:
+            return
+        f = job["files"][index]
+        if status in ("done", "deduplicated") and f["size"]:
+            f["sent"] = f["size"]
+        elif f["_progress"] is not None:
+            f["sent"] = f["_progress"]()
+        f.update(status=status, _progress=None, **extra)
+
+
+def finish(job_id: str, status: str, message: str, errors: list) -> None:
+    with _UPLOAD_JOBS_LOCK:
+        job = _UPLOAD_JOBS.get(job_id)
+        if job:
+            job.update(status=status, phase="done", message=message, errors=errors, finished_at=time.time())
+            job["params"] = {}  # descarta as credenciais
+    shutil.rmtree(staging_dir(job_id), ignore_errors=True)
+
+
+def snapshot(job_id: str) -> dict | None:
+    """Visão pública do job, com progresso agregado, vazão e ETA."""
+    with _UPLOAD_JOBS_LOCK:
+        job = _UPLOAD_JOBS.get(job_id)
+        if not job:
+            return None
+        files = []
+        for f in job["files"]:
+            sent = f["sent"]
+            if f["_progress"] is not None:
+                try:
+                    sent = f["_progress"]()
+                except Exception:
+                    pass
+            view = {k: v for k, v in f.items() if k not in ("path", "_progress")}
+            # size 0 = ainda desconhecido (ex.: URL sem Content-Length)
+            view["sent"] = min(int(sent), f["size"]) if f["size"] else int(sent)
+            files.append(view)
+        started, finished = job["started_at"], job["finished_at"]
+        status, phase = job["status"], job["phase"]
+        message, errors, transfer = job["message"], list(job["errors"]), job["transfer"]
+
+    total = sum(f["size"] for f in files)
+    sent = sum(f["sent"] for f in files)
+    elapsed = ((finished or time.time()) - started) if started else 0.0
+    rate = sent / elapsed if elapsed > 0 else 0.0
+    eta = (total - sent) / rate if rate > 0 and total >= sent and status == "running" else None
+    return {
+        "job_id": job_id,
+        "status": status,
+        "phase": phase,
+        "message": message,
+        "errors": errors,
+        "files": files,
+        "bytes_total": total,
+        "bytes_sent": sent,
+        "percent": round(100.0 * sent / total, 1) if total else (0.0 if status == "running" else 100.0),
+        "elapsed_s": round(elapsed, 1),
+        "bytes_per_s": int(rate),
+        "throughput_mbps": round(rate * 8 / 1e6, 2),
+        "eta_s": round(eta, 1) if eta is not None else None,
+        "transfer": transfer,
+        "done": status != "running",
+    }
+
+
+def purge_finished(now: float | None = None) -> int:
+    """Remove jobs terminados há mais de JOB_TTL segundos."""
+    now = now or time.time()
+    with _UPLOAD_JOBS_LOCK:
+        old = [
+            jid for jid, j in _UPLOAD_JOBS.items()
+            if j["finished_at"] is not None and now - j["finished_at"] > JOB_TTL
+        ]
+        for jid in old:
+            del _UPLOAD_JOBS[jid]
+    return len(old)
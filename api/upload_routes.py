@@ -13,14 +13,30 @@
 # You should have received a copy of the GNU General Public License
 # along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
 
+import hashlib
 import os
+import shutil
+import threading
+from contextlib import ExitStack
 from typing import List, Dict, Any
 
 from flask import Blueprint, request, jsonify
 import paramiko
 
-from config import UPLOAD_FOLDER, DEFAULT_EVE_BASE_DIR, ALLOWED_EXTENSIONS
+from compressed_transfer import CompressedUpload, pick_codec
+from config import DEFAULT_EVE_BASE_DIR, ALLOWED_EXTENSIONS
+import fix_scheduler
 from i18n import translate, get_request_lang
+import sftp_parallel
+from sftp_parallel import ParallelUpload
+from sftp_pool import sftp_session
+import upload_dedupe
+import upload_fanout
+import upload_jobs
+import upload_sessions
+import url_fetch
+from upload_stream import STREAM_CHUNK, MultipartError, boundary_of, iter_multipart
+from utils import FLEET_MAX_HOSTS, parse_hosts
 
 upload_bp = Blueprint("upload_bp", __name__)
 
@@ -29,54 +45,190 @@ def _allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def _ssh_connect(eve_ip: str, eve_user: str, eve_pass: str) -> paramiko.SSHClient:
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(eve_ip, username=eve_user, password=eve_pass, timeout=30)
-    return ssh
+def _run_fixpermissions(ssh: paramiko.SSHClient, errors: List[Dict[str, Any]], paths=None) -> bool:
+    """
+    Corrige permissões após o upload: só nos diretórios em paths, se houver
+    regra para eles, ou com o comando oficial do EVE-NG
+    (/opt/unetlab/wrappers/unl_wrapper -a fixpermissions), agrupado por host.
+    Ver fix_scheduler.
+    """
+    return fix_scheduler.fix_with_ssh(ssh, errors, paths)
 
 
-def _run_fixpermissions(ssh: paramiko.SSHClient, errors: List[Dict[str, Any]]) -> bool:
+def _start_dedup(up, eve_ip, eve_base_dir, filename, remote_path, want):
     """
-    Executa o comando oficial do EVE-NG para corrigir permissões após o upload.
-    /opt/unetlab/wrappers/unl_wrapper -a fixpermissions
+    Se o cliente declarou o sha256 e o conteúdo já existe no host, cria o
+    destino remotamente e devolve o estado da deduplicação (os bytes que
+    chegarem serão só hasheados). None = enviar normalmente.
     """
-    cmd = "/opt/unetlab/wrappers/unl_wrapper -a fixpermissions"
+    if not want:
+        return None
+    try:
+        base_dirs = sorted({DEFAULT_EVE_BASE_DIR.rstrip("/"), eve_base_dir.rstrip("/")})
+        source = upload_dedupe.find_match(up.ssh, eve_ip, want["sha256"], want["size"], base_dirs)
+        if source is None:
+            return None
+        ok, method = upload_dedupe.link_remote(up.ssh, source, remote_path)
+    except Exception as e:
+        print(f"[API] Dedupe de {filename} indisponível: {e}", flush=True)
+        return None
+    if not ok:
+        print(f"[API] Dedupe de {filename} falhou ({method}); enviando", flush=True)
+        return None
+    return {
+        "filename": filename,
+        "source": source,
+        "remote_path": remote_path,
+        "method": method,
+        "sha256": want["sha256"],
+        "bytes_saved": 0,
+    }
+
 
+def _finish_dedup(up, dedup, digest, deduplicated, errors, lang) -> None:
+    """Confere o hash dos bytes recebidos com o declarado; se divergir, desfaz."""
+    if digest == dedup["sha256"]:
+        deduplicated.append(
+            {k: dedup[k] for k in ("filename", "source", "method", "bytes_saved")}
+        )
+        return
+    if dedup["method"] != "same":
+        try:
+            up.sftp.remove(dedup["remote_path"])
+        except Exception:
+            pass
+    errors.append(
+        {
+            "filename": dedup["filename"],
+            "context": translate("upload.dedupe_mismatch", lang),
+        }
+    )
+
+
+def _compressed_failed(zcurrent, exc, errors, lang) -> None:
+    errors.append(
+        {
+            "filename": zcurrent[0],
+            "context": translate("errors.sftp_failed", lang),
+            "stderr": str(exc),
+        }
+    )
+
+
+def _record_manifest(up, eve_ip, sent) -> None:
+    """Anota no manifesto de dedupe o hash dos arquivos recém-enviados
+    (lista de (caminho remoto, sha256))."""
     try:
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-        exit_status = stdout.channel.recv_exit_status()
-        out = stdout.read().decode(errors="ignore")
-        err = stderr.read().decode(errors="ignore")
-
-        if exit_status != 0:
-            errors.append(
-                {
-                    "step": "fixpermissions",
-                    "stdout": out,
-                    "stderr": err or f"Exit status {exit_status}",
-                }
-            )
-            return False
-
-        # Apenas para debug se precisar no futuro:
-        if out.strip():
-            errors.append(
-                {
-                    "step": "fixpermissions_stdout",
-                    "stdout": out.strip(),
-                }
-            )
-
-        return True
+        stats = upload_dedupe.stat_remote(up.ssh, [path for path, _digest in sent])
+        for path, digest in sent:
+            if path in stats and digest:
+                size, mtime = stats[path]
+                upload_dedupe.record(eve_ip, path, size, mtime, digest)
     except Exception as e:
-        errors.append(
-            {
-                "step": "fixpermissions",
-                "stderr": f"Exception: {e}",
+        print(f"[API] Manifesto de dedupe não atualizado: {e}", flush=True)
+
+
+def _fanout_done(writer, up) -> None:
+    """Chamado na thread do host quando os arquivos dele terminam."""
+    errors: List[Dict[str, Any]] = list(writer.errors)
+    uploaded = []
+    for target in writer.targets:
+        if target.error is None:
+            uploaded.append(target.label)
+            continue
+        errors.append({"filename": target.label, "stderr": target.error})
+        try:
+            up.sftp.remove(target.remote_path)
+        except Exception:
+            pass
+    fix_ok = _run_fixpermissions(up.ssh, errors, paths=[writer.remote_dir]) if uploaded else False
+    writer.result = {
+        "ok": bool(uploaded) and fix_ok and len(uploaded) == len(writer.targets),
+        "uploaded": uploaded,
+        "errors": errors,
+        "fixpermissions": fix_ok,
+        "transfer": writer.transfer,
+    }
+
+
+def _upload_fanout(events, event, fields: Dict[str, str], lang: str):
+    """
+    /upload com o campo `hosts` (lista JSON como no /fleet/query): cada
+    arquivo do corpo é repassado a todos os hosts ao mesmo tempo
+    (upload_fanout) e o resultado volta por host. Continua consumindo
+    `events` a partir de `event`, o primeiro arquivo.
+    """
+    hosts = parse_hosts(fields.get("hosts"))
+    if hosts is None:
+        return jsonify(success=False, message=translate("fleet.bad_hosts", lang), errors=[]), 400
+    if len(hosts) > FLEET_MAX_HOSTS:
+        return jsonify(success=False, message=translate("fleet.too_many_hosts", lang, max=FLEET_MAX_HOSTS), errors=[]), 400
+    template_name = (fields.get("template_name") or "").strip()
+    if not template_name:
+        return jsonify(success=False, message=translate("errors.missing_template_dir", lang), errors=[]), 400
+
+    remote_dir = upload_fanout.remote_dir_for(fields.get("eve_base_dir") or DEFAULT_EVE_BASE_DIR, template_name)
+    writers = [upload_fanout.HostWriter(h, remote_dir, on_done=_fanout_done) for h in hosts]
+    errors: List[Dict[str, Any]] = []
+    receiving = False
+    try:
+        while event is not None:
+            kind = event[0]
+            if kind == "file":
+                filename = os.path.basename(event[2] or "")
+                if event[1] != "image" or not filename:
+                    pass
+                elif not _allowed_file(filename):
+                    errors.append({"filename": filename, "context": translate("errors.disallowed_extension", lang)})
+                else:
+                    for w in writers:
+                        w.open(filename)
+                    receiving = True
+            elif kind == "data" and receiving:
+                for w in writers:
+                    w.feed(event[1])
+            elif kind == "end" and receiving:
+                for w in writers:
+                    w.finish()
+                receiving = False
+            event = next(events, None)
+    except MultipartError as e:
+        if receiving:
+            for w in writers:
+                w.abort(str(e))
+        errors.append({"step": "upload", "stderr": str(e)})
+    finally:
+        for w in writers:
+            w.end()
+
+    for w in writers:
+        w.join()
+        if w.result is None:
+            w.result = {
+                "ok": False,
+                "uploaded": [],
+                "errors": [{"step": "upload_exception", "stderr": w.fatal or "?"}],
+                "fixpermissions": False,
+                "transfer": w.transfer,
             }
-        )
-        return False
+    results = [upload_fanout.describe(w) for w in writers]
+    ok = sum(1 for r in results if r["ok"])
+    any_uploaded = any(r["uploaded"] for r in results)
+    if ok == len(results):
+        msg = translate("upload.success", lang)
+    elif any_uploaded:
+        msg = translate("upload.fanout_partial", lang, ok=ok, total=len(results))
+    else:
+        msg = translate("upload.failed", lang)
+    return (
+        jsonify(
+            success=ok == len(results),
+            message=msg,
+            errors=errors,
+            hosts=results,
+        ),
+        200 if any_uploaded else 500,
+    )
 
 
 @upload_bp.route("/upload", methods=["POST"])
@@ -84,38 +236,36 @@ def upload_images():
     """
     Recebe imagens via HTTP, envia para o EVE-NG via SSH/SFTP e
     ao final executa o fixpermissions no host de destino.
-    """
-    lang = get_request_lang()
-    eve_ip = (request.form.get("eve_ip") or "").strip()
-    eve_user = (request.form.get("eve_user") or "").strip()
-    eve_pass = (request.form.get("eve_pass") or "").strip()
-    eve_base_dir = request.form.get("eve_base_dir") or DEFAULT_EVE_BASE_DIR
-    template_name = (request.form.get("template_name") or "").strip()
 
-    errors: List[Dict[str, Any]] = []
+    O corpo é lido em streaming (upload_stream) e os blocos vão direto para
+    o envio paralelo (sftp_parallel), sem cópia em disco local: vários
+    arquivos seguem juntos por vários canais SFTP. Por isso
+    eve_ip/eve_user/eve_pass/template_name precisam vir antes dos arquivos
+    no formulário.
 
-    if not eve_ip or not eve_user or not eve_pass:
-        return (
-            jsonify(
-                success=False,
-                message=translate("errors.missing_credentials", lang),
-                errors=[],
-            ),
-            400,
-        )
+    Campo opcional `sha256` (JSON, ver upload_dedupe.parse_declared): arquivo
+    cujo conteúdo já existe no host vira hardlink/cópia remota e os bytes
+    recebidos só são conferidos, sem trafegar até o EVE.
 
-    if not template_name:
-        return (
-            jsonify(
-                success=False,
-                message=translate("errors.missing_template_dir", lang),
-                errors=[],
-            ),
-            400,
-        )
+    Campo opcional `compress` (auto/zstd/gzip): os arquivos seguem
+    comprimidos por um canal SSH e são descomprimidos no host
+    (compressed_transfer). Sem descompressor no host, envia normalmente.
 
-    files = request.files.getlist("image")
-    if not files or all(not f.filename for f in files):
+    Campo opcional `hosts` (antes dos arquivos): envia para vários hosts de
+    uma vez, ver _upload_fanout.
+    """
+    # Não usar request.form/request.files aqui: isso faria o Werkzeug
+    # gravar o corpo inteiro em temporário antes de seguir.
+    lang = get_request_lang(read_form=False)
+    fields: Dict[str, str] = {}
+    errors: List[Dict[str, Any]] = []
+    uploaded_any = False
+    fix_ok = False
+    transfer = None
+    deduplicated: List[Dict[str, Any]] = []
+    compression: Dict[str, Any] | None = None
+
+    if boundary_of(request.content_type) is None:
         return (
             jsonify(
                 success=False,
@@ -125,72 +275,212 @@ def upload_images():
             400,
         )
 
-    ssh = None
-    sftp = None
-
     try:
-        ssh = _ssh_connect(eve_ip, eve_user, eve_pass)
-        sftp = ssh.open_sftp()
+        with ExitStack() as stack:
+            up = None
+            remote_dir = ""
+            current = None  # Target do arquivo em recebimento
+            hasher = None  # sha256 do arquivo em recebimento
+            dedup = None  # arquivo em recebimento que já existe no host
+            declared: Dict[str, Dict[str, Any]] = {}
+            digests: Dict[int, str] = {}  # id(Target) -> sha256 calculado
+            codec = None
+            zcurrent = None  # (nome, CompressedUpload) em recebimento
+            zsent: List[tuple] = []  # (caminho remoto, sha256) enviados comprimidos
+
+            try:
+                events = iter_multipart(request.stream, request.content_type)
+                for event in events:
+                    kind = event[0]
+                    if kind == "field":
+                        fields[event[1]] = event[2]
+                        continue
 
-        # Diretório final no EVE: ex: /opt/unetlab/addons/qemu/mikrotik-6.38.4
-        remote_dir = f"{eve_base_dir.rstrip('/')}/{template_name}"
-        ssh.exec_command(f"mkdir -p '{remote_dir}'")
+                    if kind == "data":
+                        if hasher is not None:
+                            hasher.update(event[1])
+                        if current is not None:
+                            up.feed(current, event[1])
+                        elif zcurrent is not None:
+                            try:
+                                zcurrent[1].write(event[1])
+                            except Exception as e:
+                                zcurrent[1].abort()
+                                _compressed_failed(zcurrent, e, errors, lang)
+                                zcurrent = None
+                        elif dedup is not None:
+                            dedup["bytes_saved"] += len(event[1])
+                        continue
 
-        uploaded_any = False
+                    if kind == "end":
+                        if current is not None:
+                            up.finish(current)
+                            digests[id(current)] = hasher.hexdigest()
+                            current = None
+                        elif zcurrent is not None:
+                            try:
+                                stats = zcurrent[1].close()
+                                compression["files"].append({"filename": zcurrent[0], **stats})
+                                zsent.append((zcurrent[1].remote_path, hasher.hexdigest()))
+                            except Exception as e:
+                                _compressed_failed(zcurrent, e, errors, lang)
+                            zcurrent = None
+                        elif dedup is not None:
+                            _finish_dedup(up, dedup, hasher.hexdigest(), deduplicated, errors, lang)
+                            dedup = None
+                        hasher = None
+                        continue
 
-        for f in files:
-            if not f or not f.filename:
-                continue
+                    # kind == "file"
+                    _, field_name, raw_name = event
+                    if field_name != "image" or not raw_name:
+                        continue
 
-            filename = os.path.basename(f.filename)
-            if not _allowed_file(filename):
-                errors.append(
-                    {
-                        "filename": filename,
-                        "context": translate("errors.disallowed_extension", lang),
-                    }
-                )
-                continue
+                    if up is None and fields.get("hosts"):
+                        return _upload_fanout(events, event, fields, lang)
+                    if up is None:
+                        eve_ip = (fields.get("eve_ip") or "").strip()
+                        eve_user = (fields.get("eve_user") or "").strip()
+                        eve_pass = (fields.get("eve_pass") or "").strip()
+                        eve_base_dir = fields.get("eve_base_dir") or DEFAULT_EVE_BASE_DIR
+                        template_name = (fields.get("template_name") or "").strip()
+                        if not eve_ip or not eve_user or not eve_pass:
+                            return (
+                                jsonify(
+                                    success=False,
+                                    message=translate("errors.missing_credentials", lang),
+                                    errors=[],
+                                ),
+                                400,
+                            )
+                        if not template_name:
+                            return (
+                                jsonify(
+                                    success=False,
+                                    message=translate("errors.missing_template_dir", lang),
+                                    errors=[],
+                                ),
+                                400,
+                            )
+                        up = stack.enter_context(ParallelUpload(eve_ip, eve_user, eve_pass))
+                        declared = upload_dedupe.parse_declared(fields.get("sha256"))
+                        # Diretório final no EVE: ex: /opt/unetlab/addons/qemu/mikrotik-6.38.4
+                        remote_dir = f"{eve_base_dir.rstrip('/')}/{template_name}"
+                        mkdir_ok, mkdir_err = sftp_parallel.remote_mkdir(up.ssh, remote_dir)
+                        if not mkdir_ok:
+                            return (
+                                jsonify(
+                                    success=False,
+                                    message=translate("errors.mkdir_failed", lang),
+                                    errors=[{"context": remote_dir, "stderr": mkdir_err}],
+                                ),
+                                500,
+                            )
+                        requested = (fields.get("compress") or "").strip().lower()
+                        if requested and requested not in ("0", "false", "no", "off"):
+                            codec = pick_codec(up.ssh, requested)
+                            compression = {"requested": requested, "codec": codec, "files": []}
 
-            local_path = os.path.join(UPLOAD_FOLDER, filename)
+                    filename = os.path.basename(raw_name)
+                    if not _allowed_file(filename):
+                        errors.append(
+                            {
+                                "filename": filename,
+                                "context": translate("errors.disallowed_extension", lang),
+                            }
+                        )
+                        continue
 
-            try:
-                # Salva temporariamente no container
-                f.save(local_path)
+                    remote_path = f"{remote_dir}/{filename}"
+                    hasher = hashlib.sha256()
+                    dedup = _start_dedup(up, eve_ip, eve_base_dir, filename, remote_path, declared.get(filename))
+                    if dedup is not None:
+                        continue
+                    if codec is not None:
+                        try:
+                            zcurrent = (filename, CompressedUpload(up.ssh, remote_path, codec))
+                        except Exception as e:
+                            errors.append(
+                                {
+                                    "filename": filename,
+                                    "context": translate("errors.sftp_failed", lang),
+                                    "stderr": str(e),
+                                }
+                            )
+                        continue
+                    try:
+                        current = up.open(remote_path, filename)
+                    except Exception as e:
+                        errors.append(
+                            {
+                                "filename": filename,
+                                "context": translate("errors.sftp_failed", lang),
+                                "stderr": str(e),
+                            }
+                        )
+            except MultipartError as e:
+                # Conexão do navegador caiu no meio do envio (ou corpo inválido).
+                if current is not None:
+                    up.abort(current, str(e))
+                elif zcurrent is not None:
+                    zcurrent[1].abort()
+                    _compressed_failed(zcurrent, e, errors, lang)
+                elif dedup is not None:
+                    # Conteúdo não pôde ser conferido: desfaz o link.
+                    _finish_dedup(up, dedup, None, deduplicated, errors, lang)
+                else:
+                    errors.append({"step": "upload", "stderr": str(e)})
 
-                # Envia via SFTP para o EVE
-                remote_path = f"{remote_dir}/{filename}"
-                sftp.put(local_path, remote_path)
+            if up is None:
+                # Nenhum arquivo no corpo: mesmas validações do formulário.
+                if not all((fields.get(k) or "").strip() for k in ("eve_ip", "eve_user", "eve_pass")):
+                    key = "errors.missing_credentials"
+                elif not (fields.get("template_name") or "").strip():
+                    key = "errors.missing_template_dir"
+                else:
+                    key = "errors.no_images"
+                return (
+                    jsonify(
+                        success=False,
+                        message=translate(key, lang),
+                        errors=errors,
+                    ),
+                    400,
+                )
+
+            transfer = up.close()
+            if deduplicated or zsent:
                 uploaded_any = True
-            except Exception as e:
+            sent = [(t.remote_path, digests.get(id(t))) for t in up.targets if t.error is None] + zsent
+            if sent:
+                _record_manifest(up, eve_ip, sent)
+            for target in up.targets:
+                if target.error is None:
+                    uploaded_any = True
+                    continue
                 errors.append(
                     {
-                        "filename": filename,
+                        "filename": target.label,
                         "context": translate("errors.sftp_failed", lang),
-                        "stderr": str(e),
+                        "stderr": target.error,
                     }
                 )
-            finally:
+                # Não deixa arquivo pela metade no EVE.
                 try:
-                    if os.path.exists(local_path):
-                        os.remove(local_path)
-                except OSError:
+                    up.sftp.remove(target.remote_path)
+                except Exception:
                     pass
 
-        if sftp is not None:
-            sftp.close()
-
-        # Só roda fixpermissions se pelo menos uma imagem foi enviada com sucesso
-        fix_ok = False
-        if uploaded_any:
-            fix_ok = _run_fixpermissions(ssh, errors)
-        else:
-            errors.append(
-                {
-                    "step": "upload",
-                    "stderr": translate("errors.none_sent", lang),
-                }
-            )
+            # Só roda fixpermissions se pelo menos uma imagem foi enviada com sucesso
+            if uploaded_any:
+                fix_ok = _run_fixpermissions(up.ssh, errors, paths=[remote_dir])
+            else:
+                errors.append(
+                    {
+                        "step": "upload",
+                        "stderr": translate("errors.none_sent", lang),
+                    }
+                )
 
         # Decide sucesso geral
         success = uploaded_any and fix_ok
@@ -206,6 +496,10 @@ def upload_images():
                 success=success,
                 message=msg,
                 errors=errors,
+                transfer=transfer,
+                deduplicated=deduplicated,
+                bytes_saved=sum(d["bytes_saved"] for d in deduplicated),
+                compression=compression,
             ),
             200 if uploaded_any else 500,
         )
@@ -225,6 +519,637 @@ def upload_images():
             ),
             500,
         )
+
+
+# ---------------------------------------------------------------------------
+# Upload assíncrono (job)
+#
+#   POST /upload/job         mesmo formulário do /upload; responde 202 + job_id
+#   POST /upload/url         idem, com a imagem vindo de uma URL (url_fetch)
+#   GET  /upload/job/<id>    progresso (ou /ws/upload/<id> ao vivo)
+#
+# O corpo é gravado em disco local enquanto chega (a thread da requisição só
+# fica presa pelo trecho navegador -> API) e o envio ao host roda numa thread
+# própria. Com o sha256 calculado na gravação, arquivos já presentes no host
+# viram hardlink sem o cliente precisar declarar o hash. A cópia local custa
+# disco do tamanho das imagens e I/O em dobro; sem espaço (ver
+# upload_jobs.has_room) o job é recusado com 507 e o /upload síncrono, que
+# transmite direto ao host, continua disponível.
+# ---------------------------------------------------------------------------
+
+
+def _spool_body(job_dir: str, lang: str):
+    """
+    Grava os arquivos do multipart em job_dir. Retorna (campos, arquivos,
+    erros, resposta_de_erro); a resposta de erro vem preenchida quando o
+    formulário é inválido.
+    """
+    fields: Dict[str, str] = {}
+    files: Dict[str, Dict[str, Any]] = {}
+    errors: List[Dict[str, Any]] = []
+    fh = None
+    hasher = None
+    entry = None
+    unchecked = 0
+    try:
+        for event in iter_multipart(request.stream, request.content_type):
+            kind = event[0]
+            if kind == "field":
+                fields[event[1]] = event[2]
+            elif kind == "data":
+                if fh is not None:
+                    fh.write(event[1])
+                    hasher.update(event[1])
+                    entry["size"] += len(event[1])
+                    unchecked += len(event[1])
+                    if unchecked >= upload_jobs.SPACE_CHECK_EVERY:
+                        unchecked = 0
+                        if not upload_jobs.has_room():
+                            return fields, [], errors, _no_space(lang)
+            elif kind == "end":
+                if fh is not None:
+                    fh.close()
+                    entry["sha256"] = hasher.hexdigest()
+                    files[entry["filename"]] = entry
+                    fh = hasher = entry = None
+            else:
+                _, field_name, raw_name = event
+                if field_name != "image" or not raw_name:
+                    continue
+                if not all((fields.get(k) or "").strip() for k in ("eve_ip", "eve_user", "eve_pass")):
+                    return fields, [], errors, (
+                        jsonify(success=False, message=translate("errors.missing_credentials", lang), errors=[]), 400
+                    )
+                if not (fields.get("template_name") or "").strip():
+                    return fields, [], errors, (
+                        jsonify(success=False, message=translate("errors.missing_template_dir", lang), errors=[]), 400
+                    )
+                filename = os.path.basename(raw_name)
+                if not _allowed_file(filename):
+                    errors.append({"filename": filename, "context": translate("errors.disallowed_extension", lang)})
+                    continue
+                os.makedirs(job_dir, exist_ok=True)
+                path = os.path.join(job_dir, filename)
+                fh = open(path, "wb")
+                hasher = hashlib.sha256()
+                entry = {"filename": filename, "path": path, "size": 0}
+    except MultipartError as e:
+        errors.append({"step": "upload", "stderr": str(e)})
     finally:
-        if ssh is not None:
-            ssh.close()
+        if fh is not None:
+            # Arquivo interrompido no meio: não vai para o job.
+            fh.close()
+            os.remove(entry["path"])
+    return fields, list(files.values()), errors, None
+
+
+def _no_space(lang: str):
+    return jsonify(success=False, message=translate("upload.job_no_space", lang), errors=[]), 507
+
+
+@upload_bp.route("/upload/job", methods=["POST"])
+def upload_job_create():
+    """
+    Versão assíncrona do /upload: mesmos campos (incluindo `compress`),
+    responde assim que o corpo foi recebido.
+    """
+    lang = get_request_lang(read_form=False)
+    if boundary_of(request.content_type) is None:
+        return jsonify(success=False, message=translate("errors.no_images", lang), errors=[]), 400
+    if not upload_jobs.has_room(request.content_length or 0):
+        return _no_space(lang)
+
+    job_id = upload_jobs.new_id()
+    job_dir = upload_jobs.staging_dir(job_id)
+    try:
+        fields, files, errors, failure = _spool_body(job_dir, lang)
+    except Exception as e:  # ex.: disco local cheio
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return jsonify(
+            success=False,
+            message=translate("upload.unexpected_error", lang),
+            errors=[{"step": "upload_job", "stderr": str(e)}],
+        ), 500
+    if failure is not None or not files:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        if failure is not None:
+            return failure
+        if not all((fields.get(k) or "").strip() for k in ("eve_ip", "eve_user", "eve_pass")):
+            key = "errors.missing_credentials"
+        elif not (fields.get("template_name") or "").strip():
+            key = "errors.missing_template_dir"
+        else:
+            key = "errors.no_images"
+        return jsonify(success=False, message=translate(key, lang), errors=errors), 400
+
+    params = {
+        "eve_ip": fields["eve_ip"].strip(),
+        "eve_user": fields["eve_user"].strip(),
+        "eve_pass": fields["eve_pass"].strip(),
+        "eve_base_dir": fields.get("eve_base_dir") or DEFAULT_EVE_BASE_DIR,
+        "template_name": fields["template_name"].strip(),
+        "compress": (fields.get("compress") or "").strip().lower(),
+        "lang": lang,
+    }
+    upload_jobs.create(job_id, params, files)
+    if errors:
+        upload_jobs.update(job_id, errors=errors)
+    threading.Thread(target=_run_upload_job, args=(job_id,), name="upload-job", daemon=True).start()
+    return jsonify(success=True, job_id=job_id, ws=f"/ws/upload/{job_id}"), 202
+
+
+@upload_bp.route("/upload/job/<job_id>", methods=["GET"])
+def upload_job_status(job_id: str):
+    snap = upload_jobs.snapshot(job_id)
+    if snap is None:
+        lang = get_request_lang(read_form=False)
+        return jsonify(success=False, status="unknown", message=translate("upload.job_not_found", lang)), 404
+    return jsonify(success=snap["status"] != "error", **snap), 200
+
+
+def _send_compressed(up, job_id, index, f, remote_path, codec):
+    z = CompressedUpload(up.ssh, remote_path, codec)
+    upload_jobs.track(job_id, index, lambda: z.raw_bytes)
+    try:
+        with open(f["path"], "rb") as fh:
+            for block in iter(lambda: fh.read(STREAM_CHUNK), b""):
+                z.write(block)
+    except BaseException:
+        z.abort()
+        raise
+    return z.close()
+
+
+def _run_upload_job(job_id: str) -> None:
+    """Thread do job: envia os arquivos gravados e roda o fixpermissions."""
+    job = upload_jobs.get(job_id)
+    p = dict(job["params"])
+    lang = p["lang"]
+    errors: List[Dict[str, Any]] = list(job["errors"])
+    uploaded_any = False
+    fix_ok = False
+    try:
+        with ParallelUpload(p["eve_ip"], p["eve_user"], p["eve_pass"]) as up:
+            upload_jobs.update(job_id, phase="transfer")
+            remote_dir = f"{p['eve_base_dir'].rstrip('/')}/{p['template_name']}"
+            mkdir_ok, mkdir_err = sftp_parallel.remote_mkdir(up.ssh, remote_dir)
+            if not mkdir_ok:
+                errors.append({"step": "mkdir", "context": remote_dir, "stderr": mkdir_err})
+                upload_jobs.finish(job_id, "error", translate("errors.mkdir_failed", lang), errors)
+                return
+            codec = None
+            if p["compress"] and p["compress"] not in ("0", "false", "no", "off"):
+                codec = pick_codec(up.ssh, p["compress"])
+
+            targets = []  # (índice, Target, sha256)
+            sent = []  # (caminho remoto, sha256)
+            for index, f in enumerate(job["files"]):
+                remote_path = f"{remote_dir}/{f['filename']}"
+                want = {"sha256": f["sha256"], "size": f["size"]}
+                dedup = _start_dedup(up, p["eve_ip"], p["eve_base_dir"], f["filename"], remote_path, want)
+                if dedup is not None:
+                    upload_jobs.file_done(job_id, index, "deduplicated", source=dedup["source"])
+                    uploaded_any = True
+                    continue
+                try:
+                    if codec is not None:
+                        stats = _send_compressed(up, job_id, index, f, remote_path, codec)
+                        upload_jobs.file_done(job_id, index, "done", compression=stats)
+                        sent.append((remote_path, f["sha256"]))
+                        uploaded_any = True
+                        continue
+                    target = up.open(remote_path, f["filename"])
+                    upload_jobs.track(job_id, index, lambda t=target: t.done)
+                    up.send_file(target, f["path"])
+                    targets.append((index, target, f["sha256"]))
+                except Exception as e:
+                    upload_jobs.file_done(job_id, index, "error", error=str(e))
+                    errors.append(
+                        {"filename": f["filename"], "context": translate("errors.sftp_failed", lang), "stderr": str(e)}
+                    )
+
+            upload_jobs.update(job_id, transfer=up.close())
+            for index, target, digest in targets:
+                if target.error is None:
+                    upload_jobs.file_done(job_id, index, "done")
+                    sent.append((target.remote_path, digest))
+                    uploaded_any = True
+                    continue
+                upload_jobs.file_done(job_id, index, "error", error=target.error)
+                errors.append(
+                    {"filename": target.label, "context": translate("errors.sftp_failed", lang), "stderr": target.error}
+                )
+                try:
+                    up.sftp.remove(target.remote_path)
+                except Exception:
+                    pass
+            if sent:
+                _record_manifest(up, p["eve_ip"], sent)
+
+            if uploaded_any:
+                upload_jobs.update(job_id, phase="fix")
+                fix_ok = _run_fixpermissions(up.ssh, errors, paths=[remote_dir])
+            else:
+                errors.append({"step": "upload", "stderr": translate("errors.none_sent", lang)})
+    except Exception as e:
+        errors.append({"step": "upload_exception", "stderr": str(e)})
+
+    if uploaded_any and fix_ok:
+        status, msg = "success", translate("upload.success", lang)
+    elif uploaded_any:
+        status, msg = "error", translate("upload.fix_failed", lang)
+    else:
+        status, msg = "error", translate("upload.failed", lang)
+    upload_jobs.finish(job_id, status, msg, errors)
+
+
+@upload_bp.route("/upload/url", methods=["POST"])
+def upload_url_create():
+    """
+    Baixa uma imagem de uma URL (HTTP/HTTPS) direto para o diretório do
+    template no host, sem passar pelo navegador. JSON ou formulário com
+    eve_ip/eve_user/eve_pass/template_name/url e, opcionais, eve_base_dir,
+    filename e sha256 (conferido no fim). Responde 202 + job_id; o
+    progresso sai em /upload/job/<id> e /ws/upload/<id>.
+    """
+    lang = get_request_lang()
+    data = request.get_json(silent=True) or request.form
+    eve_ip = str(data.get("eve_ip") or "").strip()
+    eve_user = str(data.get("eve_user") or "").strip()
+    eve_pass = str(data.get("eve_pass") or "").strip()
+    template_name = str(data.get("template_name") or "").strip()
+    url = str(data.get("url") or "").strip()
+    if not eve_ip or not eve_user or not eve_pass:
+        return jsonify(success=False, message=translate("errors.missing_credentials", lang)), 400
+    if not template_name:
+        return jsonify(success=False, message=translate("errors.missing_template_dir", lang)), 400
+    if not url_fetch.validate_url(url):
+        return jsonify(success=False, message=translate("upload.bad_url", lang)), 400
+    filename = os.path.basename(str(data.get("filename") or "").strip()) or url_fetch.filename_from_url(url)
+    if not filename or not _allowed_file(filename):
+        return jsonify(success=False, message=translate("errors.disallowed_extension", lang)), 400
+    sha256 = None
+    if data.get("sha256"):
+        sha256 = upload_dedupe.normalize_sha(data.get("sha256"))
+        if sha256 is None:
+            return jsonify(success=False, message=translate("upload.bad_session_params", lang)), 400
+
+    job_id = upload_jobs.new_id()
+    params = {
+        "eve_ip": eve_ip,
+        "eve_user": eve_user,
+        "eve_pass": eve_pass,
+        "eve_base_dir": str(data.get("eve_base_dir") or DEFAULT_EVE_BASE_DIR),
+        "template_name": template_name,
+        "url": url,
+        "sha256": sha256,
+        "lang": lang,
+    }
+    upload_jobs.create(job_id, params, [{"filename": filename, "path": "", "size": 0, "sha256": sha256}])
+    threading.Thread(target=_run_url_job, args=(job_id,), name="upload-url", daemon=True).start()
+    return jsonify(success=True, job_id=job_id, ws=f"/ws/upload/{job_id}"), 202
+
+
+def _run_url_job(job_id: str) -> None:
+    """Thread do job de URL: baixa, envia em paralelo, confere o sha256."""
+    job = upload_jobs.get(job_id)
+    p = dict(job["params"])
+    lang = p["lang"]
+    filename = job["files"][0]["filename"]
+    errors: List[Dict[str, Any]] = []
+    uploaded = False
+    fix_ok = False
+    try:
+        with ParallelUpload(p["eve_ip"], p["eve_user"], p["eve_pass"]) as up:
+            upload_jobs.update(job_id, phase="transfer")
+            remote_dir = f"{p['eve_base_dir'].rstrip('/')}/{p['template_name']}"
+            remote_path = f"{remote_dir}/{filename}"
+            mkdir_ok, mkdir_err = sftp_parallel.remote_mkdir(up.ssh, remote_dir)
+            if not mkdir_ok:
+                upload_jobs.file_done(job_id, 0, "error", error=mkdir_err)
+                errors.append({"step": "mkdir", "context": remote_dir, "stderr": mkdir_err})
+                upload_jobs.finish(job_id, "error", translate("errors.mkdir_failed", lang), errors)
+                return
+
+            want = {"sha256": p["sha256"], "size": None} if p["sha256"] else None
+            dedup = _start_dedup(up, p["eve_ip"], p["eve_base_dir"], filename, remote_path, want)
+            if dedup is not None:
+                # Conteúdo já está no host: nem baixa.
+                upload_jobs.file_done(job_id, 0, "deduplicated", source=dedup["source"])
+                uploaded = True
+            else:
+                stream = url_fetch.UrlStream(p["url"])
+                target = up.open(remote_path, filename)
+                upload_jobs.track(job_id, 0, lambda: target.done)
+                hasher = hashlib.sha256()
+                sized = False
+                try:
+                    for chunk in stream:
+                        if not sized and stream.total:
+                            upload_jobs.update_file(job_id, 0, size=stream.total)
+                            sized = True
+                        hasher.update(chunk)
+                        up.feed(target, chunk)
+                        if target.error is not None:
+                            break
+                except Exception as e:
+                    up.abort(target, str(e) or e.__class__.__name__)
+                up.finish(target)
+                transfer = up.close()
+                transfer["resumes"] = stream.resumes
+                upload_jobs.update(job_id, transfer=transfer)
+
+                digest = hasher.hexdigest()
+                if target.error is None and p["sha256"] and digest != p["sha256"]:
+                    target.error = translate("upload.checksum_mismatch", lang, expected=p["sha256"], got=digest)
+                if target.error is None:
+                    upload_jobs.update_file(job_id, 0, size=stream.offset, sha256=digest)
+                    upload_jobs.file_done(job_id, 0, "done")
+                    _record_manifest(up, p["eve_ip"], [(remote_path, digest)])
+                    uploaded = True
+                else:
+                    upload_jobs.file_done(job_id, 0, "error", error=target.error)
+                    errors.append(
+                        {"filename": filename, "context": translate("errors.sftp_failed", lang), "stderr": target.error}
+                    )
+                    try:
+                        up.sftp.remove(remote_path)
+                    except Exception:
+                        pass
+
+            if uploaded:
+                upload_jobs.update(job_id, phase="fix")
+                fix_ok = _run_fixpermissions(up.ssh, errors, paths=[remote_dir])
+    except Exception as e:
+        errors.append({"step": "upload_exception", "stderr": str(e)})
+
+    if uploaded and fix_ok:
+        status, msg = "success", translate("upload.success", lang)
+    elif uploaded:
+        status, msg = "error", translate("upload.fix_failed", lang)
+    else:
+        status, msg = "error", translate("upload.failed", lang)
+    upload_jobs.finish(job_id, status, msg, errors)
+
+
+# ---------------------------------------------------------------------------
+# Upload em partes, retomável
+#
+#   POST   /upload/session                  cria (credenciais, template, filename, size)
+#   GET    /upload/session/<id>             offset confirmado
+#   PUT    /upload/session/<id>?offset=N    corpo = bytes da parte (X-Eve-Pass)
+#   POST   /upload/session/<id>/finalize    renomeia e roda o fixpermissions
+#   DELETE /upload/session/<id>             cancela e apaga o parcial
+#
+# As partes são gravadas no offset indicado em "<dir>/.<arquivo>.part". Uma
+# parte pode repetir bytes já confirmados (offset <= committed), mas não pode
+# deixar buraco (offset > committed responde 409 com o offset correto).
+# ---------------------------------------------------------------------------
+
+
+def _session_pass() -> str:
+    pw = request.headers.get("X-Eve-Pass") or ""
+    if not pw and request.mimetype in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        pw = request.form.get("eve_pass") or ""
+    return pw.strip()
+
+
+def _session_or_404(session_id: str, lang: str):
+    state = upload_sessions.load(session_id)
+    if state is None:
+        return None, (jsonify(success=False, message=translate("upload.session_not_found", lang)), 404)
+    return state, None
+
+
+@upload_bp.route("/upload/session", methods=["POST"])
+def upload_session_create():
+    lang = get_request_lang()
+    eve_ip = (request.form.get("eve_ip") or "").strip()
+    eve_user = (request.form.get("eve_user") or "").strip()
+    eve_pass = (request.form.get("eve_pass") or "").strip()
+    eve_base_dir = request.form.get("eve_base_dir") or DEFAULT_EVE_BASE_DIR
+    template_name = (request.form.get("template_name") or "").strip()
+    filename = os.path.basename((request.form.get("filename") or "").strip())
+
+    if not eve_ip or not eve_user or not eve_pass:
+        return jsonify(success=False, message=translate("errors.missing_credentials", lang)), 400
+    if not template_name:
+        return jsonify(success=False, message=translate("errors.missing_template_dir", lang)), 400
+    if not filename or not _allowed_file(filename):
+        return jsonify(success=False, message=translate("errors.disallowed_extension", lang)), 400
+    try:
+        size = int(request.form.get("size") or 0)
+    except (TypeError, ValueError):
+        size = 0
+    if size <= 0:
+        return jsonify(success=False, message=translate("upload.bad_session_params", lang)), 400
+
+    upload_sessions.purge_expired()
+    remote_dir = f"{eve_base_dir.rstrip('/')}/{template_name}"
+    sha256 = upload_dedupe.normalize_sha(request.form.get("sha256"))
+    try:
+        with sftp_session(eve_ip, eve_user, eve_pass) as (ssh, sftp):
+            mkdir_ok, mkdir_err = sftp_parallel.remote_mkdir(ssh, remote_dir)
+            if not mkdir_ok:
+                return jsonify(
+                    success=False,
+                    message=translate("errors.mkdir_failed", lang),
+                    errors=[{"step": "upload_session", "stderr": mkdir_err}],
+                ), 500
+            if sha256:
+                # Conteúdo já existe no host: nada a enviar.
+                base_dirs = sorted({DEFAULT_EVE_BASE_DIR.rstrip("/"), eve_base_dir.rstrip("/")})
+                source = upload_dedupe.find_match(ssh, eve_ip, sha256, size, base_dirs)
+                if source is not None:
+                    remote_path = f"{remote_dir}/{filename}"
+                    ok, method = upload_dedupe.link_remote(ssh, source, remote_path)
+                    if ok:
+                        errors: List[Dict[str, Any]] = []
+                        fix_ok = _run_fixpermissions(ssh, errors, paths=[remote_dir])
+                        return jsonify(
+                            success=fix_ok,
+                            message=translate("upload.success" if fix_ok else "upload.fix_failed", lang),
+                            errors=errors,
+                            remote_path=remote_path,
+                            deduplicated=[{"filename": filename, "source": source, "method": method, "bytes_saved": size}],
+                            bytes_saved=size,
+                        ), 200
+            state = upload_sessions.create(eve_ip, eve_user, remote_dir, filename, size)
+            # Cria (ou zera) o parcial remoto.
+            sftp.open(upload_sessions.part_path(state), "wb").close()
+    except Exception as e:
+        return jsonify(
+            success=False,
+            message=translate("upload.unexpected_error", lang),
+            errors=[{"step": "upload_session", "stderr": str(e)}],
+        ), 500
+
+    return jsonify(success=True, chunk_size=STREAM_CHUNK, **upload_sessions.public_view(state)), 200
+
+
+@upload_bp.route("/upload/session/<session_id>", methods=["GET"])
+def upload_session_status(session_id: str):
+    lang = get_request_lang(read_form=False)
+    state, error = _session_or_404(session_id, lang)
+    if error:
+        return error
+    return jsonify(success=True, **upload_sessions.public_view(state)), 200
+
+
+@upload_bp.route("/upload/session/<session_id>", methods=["PUT"])
+def upload_session_chunk(session_id: str):
+    """Grava o corpo da requisição a partir de ?offset=N no parcial remoto."""
+    lang = get_request_lang(read_form=False)
+    eve_pass = (request.headers.get("X-Eve-Pass") or "").strip()
+    if not eve_pass:
+        return jsonify(success=False, message=translate("errors.missing_credentials", lang)), 400
+    try:
+        offset = int(request.args.get("offset", ""))
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        return jsonify(success=False, message=translate("upload.bad_session_params", lang)), 400
+
+    with upload_sessions.lock_for(session_id):
+        state, error = _session_or_404(session_id, lang)
+        if error:
+            return error
+        if offset > state["committed"]:
+            return jsonify(
+                success=False,
+                message=translate("upload.bad_offset", lang, committed=state["committed"]),
+                committed=state["committed"],
+            ), 409
+        length = request.content_length
+        if length is not None and offset + length > state["size"]:
+            return jsonify(success=False, message=translate("upload.bad_session_params", lang)), 400
+
+        written = 0
+        failure = None
+        try:
+            with sftp_session(state["eve_ip"], state["eve_user"], eve_pass) as (_ssh, sftp):
+                fh = sftp.open(upload_sessions.part_path(state), "r+b")
+                try:
+                    fh.seek(offset)
+                    fh.set_pipelined(True)
+                    while True:
+                        try:
+                            chunk = request.stream.read(STREAM_CHUNK)
+                        except Exception as e:  # navegador caiu no meio da parte
+                            failure = str(e) or e.__class__.__name__
+                            break
+                        if not chunk:
+                            break
+                        if offset + written + len(chunk) > state["size"]:
+                            failure = translate("upload.bad_session_params", lang)
+                            break
+                        if sftp_parallel.SPARSE:
+                            # Só os trechos com dados; zeros viram buraco no parcial.
+                            for rel, data in sftp_parallel.data_extents(chunk):
+                                fh.seek(offset + written + rel)
+                                fh.write(data)
+                        else:
+                            fh.write(chunk)
+                        written += len(chunk)
+                    if sftp_parallel.SPARSE and offset + written > state["committed"]:
+                        # O parcial tem exatamente `committed` bytes: estende até
+                        # o fim da parte caso ela termine em zeros não escritos.
+                        fh.truncate(offset + written)
+                finally:
+                    # close espera os acks pendentes: só então os bytes contam.
+                    fh.close()
+        except Exception as e:
+            return jsonify(
+                success=False,
+                message=translate("errors.sftp_failed", lang),
+                errors=[{"step": "upload_chunk", "stderr": str(e)}],
+                committed=state["committed"],
+            ), 500
+
+        # O que chegou até a falha também fica confirmado: a retomada parte dali.
+        state["committed"] = max(state["committed"], offset + written)
+        upload_sessions.save(state)
+
+    if failure:
+        return jsonify(
+            success=False,
+            message=translate("upload.chunk_interrupted", lang),
+            errors=[{"step": "upload_chunk", "stderr": failure}],
+            **upload_sessions.public_view(state),
+        ), 400
+    return jsonify(success=True, **upload_sessions.public_view(state)), 200
+
+
+@upload_bp.route("/upload/session/<session_id>/finalize", methods=["POST"])
+def upload_session_finalize(session_id: str):
+    """Confere o tamanho, renomeia para o nome final e roda o fixpermissions."""
+    lang = get_request_lang()
+    eve_pass = _session_pass()
+    if not eve_pass:
+        return jsonify(success=False, message=translate("errors.missing_credentials", lang)), 400
+
+    errors: List[Dict[str, Any]] = []
+    with upload_sessions.lock_for(session_id):
+        state, error = _session_or_404(session_id, lang)
+        if error:
+            return error
+        if state["committed"] < state["size"]:
+            return jsonify(
+                success=False,
+                message=translate("upload.incomplete", lang, committed=state["committed"], size=state["size"]),
+                **upload_sessions.public_view(state),
+            ), 409
+        try:
+            with sftp_session(state["eve_ip"], state["eve_user"], eve_pass) as (ssh, sftp):
+                part = upload_sessions.part_path(state)
+                remote_size = sftp.stat(part).st_size
+                if remote_size != state["size"]:
+                    # Parcial mexido fora da API: volta a aceitar partes dali.
+                    state["committed"] = min(remote_size, state["size"])
+                    upload_sessions.save(state)
+                    return jsonify(
+                        success=False,
+                        message=translate("upload.incomplete", lang, committed=state["committed"], size=state["size"]),
+                        **upload_sessions.public_view(state),
+                    ), 409
+                final = upload_sessions.final_path(state)
+                try:
+                    sftp.posix_rename(part, final)
+                except IOError:
+                    # Servidor sem a extensão posix-rename: rename não sobrescreve.
+                    try:
+                        sftp.remove(final)
+                    except IOError:
+                        pass
+                    sftp.rename(part, final)
+                upload_sessions.delete(session_id)
+                fix_ok = _run_fixpermissions(ssh, errors, paths=[final.rsplit("/", 1)[0]])
+        except Exception as e:
+            errors.append({"step": "upload_finalize", "stderr": str(e)})
+            return jsonify(success=False, message=translate("upload.unexpected_error", lang), errors=errors), 500
+
+    msg = translate("upload.success" if fix_ok else "upload.fix_failed", lang)
+    return jsonify(
+        success=fix_ok,
+        message=msg,
+        errors=errors,
+        remote_path=upload_sessions.final_path(state),
+    ), 200
+
+
+@upload_bp.route("/upload/session/<session_id>", methods=["DELETE"])
+def upload_session_abort(session_id: str):
+    lang = get_request_lang()
+    with upload_sessions.lock_for(session_id):
+        state, error = _session_or_404(session_id, lang)
+        if error:
+            return error
+        eve_pass = _session_pass()
+        if eve_pass:
+            try:
+                with sftp_session(state["eve_ip"], state["eve_user"], eve_pass) as (_ssh, sftp):
+                    sftp.remove(upload_sessions.part_path(state))
+            except Exception:
+                pass
+        upload_sessions.delete(session_id)
+    return jsonify(success=True), 200
@@ -0,0 +1,134 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Estado das sessões de upload em partes (retomáveis).
+
+Cada sessão é um JSON em UPLOAD_SESSION_DIR (padrão UPLOAD_FOLDER/sessions),
+regravado de forma atômica a cada parte confirmada; assim o offset confirmado
+sobrevive a um restart da API. A senha do host nunca é gravada: cada
+requisição da sessão envia a sua.
+
+Sessões sem atividade há UPLOAD_SESSION_TTL segundos (padrão 24 h) são
+descartadas na próxima criação de sessão.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from config import UPLOAD_FOLDER
+
+SESSION_DIR = os.getenv("UPLOAD_SESSION_DIR", os.path.join(UPLOAD_FOLDER, "sessions"))
+SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_LOCK = threading.Lock()
+_SESSION_LOCKS: dict[str, threading.Lock] = {}
+
+
+def _path(session_id: str) -> str:
+    return os.path.join(SESSION_DIR, f"{session_id}.json")
+
+
+def part_path(state: dict) -> str:
+    """Arquivo remoto temporário; vira o nome final só no finalize."""
+    return f"{state['remote_dir']}/.{state['filename']}.part"
+
+
+def final_path(state: dict) -> str:
+    return f"{state['remote_dir']}/{state['filename']}"
+
+
+def save(state: dict) -> None:
+    state["updated_at"] = time.time()
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    tmp = _path(state["id"]) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, _path(state["id"]))
+
+
+def create(eve_ip: str, eve_user: str, remote_dir: str, filename: str, size: int) -> dict:
+    state = {
+        "id": uuid.uuid4().hex,
+        "eve_ip": eve_ip,
+        "eve_user": eve_user,
+        "remote_dir": remote_dir,
+        "filename": filename,
+        "size": size,
+        "committed": 0,
+        "created_at": time.time(),
+    }
+    save(state)
+    return state
+
+
+def load(session_id: str) -> dict | None:
+    if not _ID_RE.match(session_id or ""):
+        return None
+    try:
+        with open(_path(session_id), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def delete(session_id: str) -> None:
+    if not _ID_RE.match(session_id or ""):
+        return
+    try:
+        os.remove(_path(session_id))
+    except OSError:
+        pass
+    with _LOCK:
+        _SESSION_LOCKS.pop(session_id, None)
+
+
+def lock_for(session_id: str) -> threading.Lock:
+    """Serializa as partes de uma mesma sessão (duas abas retomando juntas)."""
+    with _LOCK:
+        return _SESSION_LOCKS.setdefault(session_id, threading.Lock())
+
+
+def purge_expired(now: float | None = None) -> int:
+    """Remove sessões paradas há mais de SESSION_TTL. Retorna quantas."""
+    now = time.time() if now is None else now
+    removed = 0
+    try:
+        names = os.listdir(SESSION_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        session_id = name[:-5] if name.endswith(".json") else ""
+        state = load(session_id)
+        if state and now - state.get("updated_at", 0) > SESSION_TTL:
+            delete(session_id)
+            removed += 1
+    return removed
+
+
+def public_view(state: dict) -> dict:
+    return {
+        "session_id": state["id"],
+        "filename": state["filename"],
+        "remote_path": final_path(state),
+        "size": state["size"],
+        "committed": state["committed"],
+    }
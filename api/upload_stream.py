@@ -0,0 +1,96 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Leitura incremental de corpos multipart/form-data.
+
+O parser padrão do Werkzeug grava cada arquivo num temporário antes da rota
+ver o primeiro byte. Aqui o corpo é lido do socket em blocos e os eventos saem
+na ordem em que chegam, de modo que a rota pode repassar cada bloco direto
+para o destino (ex.: um arquivo SFTP) enquanto o navegador ainda envia.
+
+Campos de texto precisam vir antes dos arquivos (o FormData do navegador
+segue a ordem do formulário).
+"""
+
+from __future__ import annotations
+
+import os
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+STREAM_CHUNK = max(64 * 1024, int(os.getenv("UPLOAD_STREAM_CHUNK", str(1024 * 1024))))
+# Limite para campos de texto (não se aplica aos arquivos).
+FIELD_MAX_BYTES = 1024 * 1024
+
+
+class MultipartError(ValueError):
+    """Corpo que não é multipart/form-data válido."""
+
+
+def boundary_of(content_type: str | None) -> bytes | None:
+    mimetype, options = parse_options_header(content_type or "")
+    if mimetype != "multipart/form-data" or not options.get("boundary"):
+        return None
+    return options["boundary"].encode("latin-1")
+
+
+def iter_multipart(stream, content_type: str | None, chunk_size: int = STREAM_CHUNK):
+    """
+    Gera, na ordem do corpo:
+      ("field", nome, valor)         campo de texto completo
+      ("file", nome, nome_arquivo)   início de um arquivo
+      ("data", bytes)                bloco do arquivo corrente
+      ("end", nome, nome_arquivo)    fim do arquivo corrente
+    """
+    boundary = boundary_of(content_type)
+    if boundary is None:
+        raise MultipartError("content-type não é multipart/form-data")
+    # O limite do decoder vale para o buffer interno inteiro (inclusive blocos
+    # de arquivo ainda não consumidos), por isso soma o tamanho do bloco.
+    decoder = MultipartDecoder(boundary, FIELD_MAX_BYTES + chunk_size)
+    current = None
+    field_buf: list[bytes] = []
+    while True:
+        try:
+            event = decoder.next_event()
+        except ValueError as exc:  # corpo truncado ou malformado
+            raise MultipartError(str(exc)) from exc
+        if isinstance(event, NeedData):
+            chunk = stream.read(chunk_size)
+            decoder.receive_data(chunk or None)
+            continue
+        if isinstance(event, Epilogue):
+            return
+        if isinstance(event, File):
+            current = event
+            yield ("file", event.name, event.filename)
+        elif isinstance(event, Field):
+            current = event
+            field_buf = []
+        elif isinstance(event, Data):
+            if isinstance(current, File):
+                if event.data:
+                    yield ("data", event.data)
+                if not event.more_data:
+                    yield ("end", current.name, current.filename)
+                    current = None
+            elif isinstance(current, Field):
+                field_buf.append(event.data)
+                if sum(len(b) for b in field_buf) > FIELD_MAX_BYTES:
+                    raise MultipartError(f"campo '{current.name}' grande demais")
+                if not event.more_data:
+                    yield ("field", current.name, b"".join(field_buf).decode("utf-8", "replace"))
+                    current = None
@@ -0,0 +1,126 @@
+# This file is part of NetConfig Lab Image Manager.
+#
+# NetConfig Lab Image Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NetConfig Lab Image Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Leitura de imagens por URL (HTTP/HTTPS) com retomada.
+
+UrlStream entrega o corpo em blocos. Se a conexão cair no meio, reconecta
+(até URL_FETCH_RETRIES vezes seguidas sem progresso, com espera crescente)
+pedindo `Range: bytes=<offset>-`; se o servidor ignorar o Range e responder
+200, os bytes já entregues são descartados na releitura. Quem consome não
+percebe a queda: os blocos continuam de onde pararam.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+import urllib.parse
+
+import requests
+
+from upload_stream import STREAM_CHUNK
+
+URL_TIMEOUT = float(os.getenv("URL_FETCH_TIMEOUT", "30"))
+URL_RETRIES = int(os.getenv("URL_FETCH_RETRIES", "5"))
+_RETRY_MAX_WAIT = 30.0
+_RANGE_TOTAL_RE = re.compile(r"/(\d+)\s*$")
+
+
+class FetchError(Exception):
+    """Falha definitiva ao baixar a URL."""
+
+
+class _ShortRead(Exception):
+    pass
+
+
+def validate_url(url: str) -> bool:
+    try:
+        parts = urllib.parse.urlsplit(url)
+    except ValueError:
+        return False
+    return parts.scheme in ("http", "https") and bool(parts.netloc)
+
+
+def filename_from_url(url: str) -> str:
+    path = urllib.parse.urlsplit(url).path
+    return os.path.basename(urllib.parse.unquote(path))
+
+
+class UrlStream:
+    """
+    Iterável de blocos da URL, com retomada. Atributos úteis durante a
+    leitura: total (None se o servidor não disser), offset e resumes.
+    """
+
+    def __init__(self, url: str, chunk_size: int = STREAM_CHUNK, retries: int = URL_RETRIES):
+        self.url = url
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.total: int | None = None
+        self.offset = 0
+        self.resumes = 0
+
+    def _learn_total(self, resp) -> None:
+        if self.total is not None:
+            return
+        if resp.status_code == 206:
+            m = _RANGE_TOTAL_RE.search(resp.headers.get("Content-Range", ""))
+            if m:
+                self.total = int(m.group(1))
+        else:
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit():
+                self.total = int(length)
+
+    def __iter__(self):
+        failures = 0
+        while True:
+            # identity: offsets contam bytes do arquivo, não do corpo comprimido.
+            headers = {"Accept-Encoding": "identity"}
+            if self.offset:
+                headers["Range"] = f"bytes={self.offset}-"
+            try:
+                with requests.get(self.url, headers=headers, stream=True, timeout=URL_TIMEOUT) as resp:
+                    if resp.status_code == 416 and self.total is not None and self.offset >= self.total:
+                        return
+                    if resp.status_code not in (200, 206):
+                        raise FetchError(f"HTTP {resp.status_code}")
+                    self._learn_total(resp)
+                    # Servidor sem suporte a Range: descarta o que já foi entregue.
+                    skip = self.offset if resp.status_code == 200 else 0
+                    for chunk in resp.iter_content(self.chunk_size):
+                        if skip:
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk, skip = chunk[skip:], 0
+                        self.offset += len(chunk)
+                        failures = 0
+                        yield chunk
+                    if skip:
+                        raise _ShortRead("resposta menor que o já recebido")
+                if self.total is None or self.offset >= self.total:
+                    return
+                raise _ShortRead(f"conexão encerrada em {self.offset} de {self.total} bytes")
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, _ShortRead) as e:
+                failures += 1
+                if failures > self.retries:
+                    raise FetchError(str(e) or e.__class__.__name__) from e
+                self.resumes += 1
+                print(f"[API] URL interrompida em {self.offset} bytes ({e}); retomando", flush=True)
+                time.sleep(min(2.0 ** (failures - 1), _RETRY_MAX_WAIT))
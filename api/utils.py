@@ -13,10 +13,98 @@
 # You should have received a copy of the GNU General Public License
 # along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
 
-import subprocess
+import json
+import os
+import threading
+import time
 
+import ssh_engine
+from ssh_governor import PRIORITY_BACKGROUND, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from ssh_pool import mux_options
 
-def run_ssh_command(eve_ip: str, eve_user: str, eve_pass: str, command: str, timeout: int | None = None):
+
+# Teto de bytes guardados por stream (stdout/stderr) de cada comando; o
+# excedente é lido e descartado e a resposta sai marcada como truncada.
+OUTPUT_MAX_BYTES = int(os.getenv("SSH_OUTPUT_MAX_BYTES", str(16 * 1024 * 1024)))
+# Quanto da saída vai para o log (0 desliga) e quantos logs de saída por janela.
+LOG_PREVIEW_BYTES = int(os.getenv("SSH_LOG_PREVIEW", "2048"))
+_LOG_BURST = 20
+_LOG_WINDOW = 10.0
+_LOG_LOCK = threading.Lock()
+_LOG_STATE = {"window_start": 0.0, "count": 0, "suppressed": 0}
+
+
+def _log_output(label: str, text: str) -> None:
+    """Log de depuração da saída: só um trecho inicial e no máximo _LOG_BURST
+    registros a cada _LOG_WINDOW segundos (o resto é contado e resumido)."""
+    if LOG_PREVIEW_BYTES <= 0 or not text:
+        return
+    now = time.monotonic()
+    with _LOG_LOCK:
+        if now - _LOG_STATE["window_start"] >= _LOG_WINDOW:
+            suppressed = _LOG_STATE["suppressed"]
+            _LOG_STATE.update(window_start=now, count=0, suppressed=0)
+            if suppressed:
+                print(f"[API] ({suppressed} logs de saída SSH omitidos)", flush=True)
+        if _LOG_STATE["count"] >= _LOG_BURST:
+            _LOG_STATE["suppressed"] += 1
+            return
+        _LOG_STATE["count"] += 1
+    preview = text[:LOG_PREVIEW_BYTES]
+    more = f"\n... (+{len(text) - len(preview)} caracteres)" if len(text) > len(preview) else ""
+    print(f"[API] {label}:\n{preview}{more}", flush=True)
+
+
+def _redact(cmd: list) -> str:
+    """Linha de comando para log, sem a senha do sshpass."""
+    shown = list(cmd)
+    if len(shown) > 2 and shown[0] == "sshpass" and shown[1] == "-p":
+        shown[2] = "***"
+    return " ".join(shown)
+
+
+def run_ssh_capture(eve_ip: str, eve_user: str, eve_pass: str, command: str,
+                    timeout: int | None = None, max_bytes: int | None = None,
+                    priority: int = PRIORITY_INTERACTIVE):
+    """
+    Como run_ssh_command, mas retorna ssh_engine.Capture(rc, stdout, stderr,
+    truncated). A saída é lida em streaming e decodificada incrementalmente;
+    acima de max_bytes (padrão OUTPUT_MAX_BYTES) o restante é descartado e
+    truncated=True. priority define a posição na fila do host (ssh_governor).
+    """
+    cmd = _ssh_base_cmd(eve_ip, eve_user, eve_pass) + [f"{eve_user}@{eve_ip}", command]
+    print(f"[API] Executando SSH (timeout={timeout}): {_redact(cmd)}", flush=True)
+    cap = ssh_engine.capture(
+        cmd,
+        timeout=timeout,
+        max_bytes=OUTPUT_MAX_BYTES if max_bytes is None else max_bytes,
+        encoding="utf-8",
+        host=eve_ip,
+        priority=priority,
+    )
+    if cap.rc == ssh_engine.RC_TIMEOUT:
+        print(f"[API] SSH TIMEOUT após {timeout}s", flush=True)
+        return cap._replace(stderr=(cap.stderr or "") + f"\nSSH timeout após {timeout}s.")
+    if cap.truncated:
+        print(f"[API] SSH saída truncada em {max_bytes or OUTPUT_MAX_BYTES} bytes", flush=True)
+    _log_output("SSH STDOUT", cap.stdout)
+    _log_output("SSH STDERR", cap.stderr)
+    return cap
+
+
+def submit_ssh_capture(eve_ip: str, eve_user: str, eve_pass: str, command: str,
+                       timeout: int | None = None, priority: int = PRIORITY_BACKGROUND):
+    """Dispara o comando sem bloquear; retorna Future de ssh_engine.Capture
+    (texto). Para tarefas de fundo que não podem segurar uma thread."""
+    cmd = _ssh_base_cmd(eve_ip, eve_user, eve_pass) + [f"{eve_user}@{eve_ip}", command]
+    return ssh_engine.submit(
+        cmd, timeout=timeout, max_bytes=OUTPUT_MAX_BYTES, encoding="utf-8", host=eve_ip, priority=priority,
+    )
+
+
+def run_ssh_command(eve_ip: str, eve_user: str, eve_pass: str, command: str,
+                    timeout: int | None = None, max_bytes: int | None = None,
+                    priority: int = PRIORITY_INTERACTIVE):
     """
     Executa um comando via SSH no host remoto.
 
@@ -27,49 +115,25 @@ def run_ssh_command(eve_ip: str, eve_user: str, eve_pass: str, command: str, tim
     - timeout (opcional) impõe um teto total para operações rápidas (leituras);
       ao estourar, o processo é morto e retorna rc=124. Não use em comandos
       longos (deploy/destroy) — deixe None.
+    - max_bytes limita a saída guardada (ver run_ssh_capture); se truncada, o
+      stderr ganha uma linha avisando.
+    - priority: PRIORITY_BULK para operações longas (pull, destroy), que então
+      não ocupam as vagas reservadas às leituras interativas.
+
+    O processo roda no loop do ssh_engine; só a thread chamadora espera.
     """
-    cmd = [
-        "sshpass",
-        "-p",
-        eve_pass,
-        "ssh",
-        "-o",
-        "StrictHostKeyChecking=no",
-        "-o",
-        "UserKnownHostsFile=/dev/null",
-        "-o",
-        "PreferredAuthentications=password",
-        "-o",
-        "PubkeyAuthentication=no",
-        "-o",
-        "ConnectTimeout=15",
-        "-o",
-        "ServerAliveInterval=15",
-        "-o",
-        "ServerAliveCountMax=4",
-        f"{eve_user}@{eve_ip}",
-        command,
-    ]
-    print(f"[API] Executando SSH (timeout={timeout}): {' '.join(cmd)}", flush=True)
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
+    rc, stdout, stderr, truncated = run_ssh_capture(
+        eve_ip, eve_user, eve_pass, command, timeout, max_bytes, priority,
     )
-    try:
-        stdout, stderr = proc.communicate(timeout=timeout)
-    except subprocess.TimeoutExpired:
-        proc.kill()
-        stdout, stderr = proc.communicate()
-        print(f"[API] SSH TIMEOUT após {timeout}s", flush=True)
-        return 124, stdout or "", (stderr or "") + f"\nSSH timeout após {timeout}s."
-    print(f"[API] SSH STDOUT:\n{stdout}", flush=True)
-    print(f"[API] SSH STDERR:\n{stderr}", flush=True)
-    return proc.returncode, stdout, stderr
+    if truncated:
+        stderr += f"\n[saída truncada em {max_bytes or OUTPUT_MAX_BYTES} bytes]"
+    return rc, stdout, stderr
 
 
-def _ssh_base_cmd(eve_ip: str, eve_pass: str):
+def _ssh_base_cmd(eve_ip: str, eve_user: str, eve_pass: str):
+    """Argumentos comuns do ssh. As opções de multiplexação vêm do pool
+    (ssh_pool): chamadas seguidas ao mesmo host/usuário reaproveitam a sessão
+    autenticada em vez de refazer o handshake."""
     return [
         "sshpass", "-p", eve_pass, "ssh",
         "-o", "StrictHostKeyChecking=no",
@@ -79,86 +143,75 @@ def _ssh_base_cmd(eve_ip: str, eve_pass: str):
         "-o", "ConnectTimeout=15",
         "-o", "ServerAliveInterval=15",
         "-o", "ServerAliveCountMax=4",
-    ]
+    ] + mux_options(eve_ip, eve_user, eve_pass)
 
 
 def run_ssh_stream(eve_ip: str, eve_user: str, eve_pass: str, command: str, on_line, timeout: int | None = None):
     """
     Executa um comando SSH transmitindo a saída (stdout+stderr) linha a linha
-    via callback on_line(str). Retorna o returncode. Usado por jobs assíncronos
-    (deploy/destroy) para log ao vivo.
+    via callback on_line(str). Retorna o returncode (124 em timeout).
     """
-    cmd = _ssh_base_cmd(eve_ip, eve_pass) + [f"{eve_user}@{eve_ip}", command]
-    proc = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
-    )
-    try:
-        for line in iter(proc.stdout.readline, ""):
-            if line == "":
-                break
-            try:
-                on_line(line.rstrip("\n"))
-            except Exception:
-                pass
-        proc.wait(timeout=timeout)
-    except subprocess.TimeoutExpired:
-        proc.kill()
+    cmd = _ssh_base_cmd(eve_ip, eve_user, eve_pass) + [f"{eve_user}@{eve_ip}", command]
+    rc = ssh_engine.stream(cmd, on_line, timeout=timeout, host=eve_ip, priority=PRIORITY_BULK)
+    if rc == ssh_engine.RC_TIMEOUT:
         try:
             on_line(f"[timeout após {timeout}s]")
         except Exception:
             pass
-        return 124
-    finally:
-        try:
-            if proc.stdout:
-                proc.stdout.close()
-        except Exception:
-            pass
-    return proc.returncode if proc.returncode is not None else 0
+    return rc
+
+
+def start_ssh_stream(eve_ip: str, eve_user: str, eve_pass: str, command: str, on_line, on_done,
+                     timeout: int | None = None, job_id: str | None = None):
+    """
+    Versão não bloqueante de run_ssh_stream para jobs (deploy/destroy/build):
+    nenhuma thread por job; on_done(rc) é chamado ao final. Com job_id, o job
+    pode ser interrompido por cancel_ssh_job(job_id).
+    """
+    cmd = _ssh_base_cmd(eve_ip, eve_user, eve_pass) + [f"{eve_user}@{eve_ip}", command]
+    return ssh_engine.start(cmd, on_line, on_done, timeout=timeout, key=job_id, host=eve_ip, priority=PRIORITY_BULK)
+
+
+def cancel_ssh_job(job_id: str) -> bool:
+    return ssh_engine.cancel(job_id)
 
 
 def run_ssh_binary(eve_ip: str, eve_user: str, eve_pass: str, command: str, timeout: int | None = 60):
     """Executa SSH e retorna (returncode, stdout_bytes, stderr_text). Para
     saída binária (ex.: pcap do tcpdump)."""
-    cmd = _ssh_base_cmd(eve_ip, eve_pass) + [f"{eve_user}@{eve_ip}", command]
-    try:
-        proc = subprocess.run(cmd, capture_output=True, timeout=timeout)
-    except subprocess.TimeoutExpired as exc:
-        return 124, (exc.stdout or b""), "timeout"
-    return proc.returncode, (proc.stdout or b""), (proc.stderr or b"").decode("utf-8", "ignore")
+    cmd = _ssh_base_cmd(eve_ip, eve_user, eve_pass) + [f"{eve_user}@{eve_ip}", command]
+    rc, out, err = ssh_engine.run(cmd, timeout=timeout, host=eve_ip)
+    if rc == ssh_engine.RC_TIMEOUT:
+        return rc, out, "timeout"
+    return rc, out, err.decode("utf-8", "ignore")
 
 
-def detect_platform(eve_ip: str, eve_user: str, eve_pass: str):
-    """
-    Detecta se o host é EVE-NG, PNETLab ou ContainerLab lendo /etc/issue
-    (ou arquivos/comandos relacionados).
-    Retorna (name, raw_output, source_file).
-    name: "eve-ng" | "pnetlab" | "containerlab" | "unknown"
-    """
-    detect_cmd = (
-        "if [ -f /etc/issue ]; then "
-        "echo '---FILE:/etc/issue---'; cat /etc/issue; "
-        "fi; "
-        "if [ -f /etc/pnetlab-release ]; then "
-        "echo '---FILE:/etc/pnetlab-release---'; cat /etc/pnetlab-release; "
-        "fi"
-        "; "
-        # ContainerLab (https://containerlab.dev/) costuma instalar um binário `containerlab`
-        # em /usr/bin ou /usr/local/bin, e pode ter service unit em systemd.
-        "if command -v containerlab >/dev/null 2>&1; then "
-        "echo '---BIN:containerlab---'; command -v containerlab; "
-        "echo '---CMD:containerlab version---'; containerlab version 2>/dev/null || true; "
-        "fi; "
-        "if [ -f /etc/containerlab/version ]; then "
-        "echo '---FILE:/etc/containerlab/version---'; cat /etc/containerlab/version; "
-        "fi; "
-        "if [ -f /etc/systemd/system/containerlab.service ] || [ -f /lib/systemd/system/containerlab.service ]; then "
-        "echo '---UNIT:containerlab.service---'; "
-        "fi"
-    )
-    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, detect_cmd)
-    raw = (out or "").strip()
-    content_lower = raw.lower()
+# Comando de detecção de plataforma (reutilizado pelo probe em lote de /images).
+_DETECT_PLATFORM_CMD = (
+    "if [ -f /etc/issue ]; then "
+    "echo '---FILE:/etc/issue---'; cat /etc/issue; "
+    "fi; "
+    "if [ -f /etc/pnetlab-release ]; then "
+    "echo '---FILE:/etc/pnetlab-release---'; cat /etc/pnetlab-release; "
+    "fi"
+    "; "
+    # ContainerLab (https://containerlab.dev/) costuma instalar um binário `containerlab`
+    # em /usr/bin ou /usr/local/bin, e pode ter service unit em systemd.
+    "if command -v containerlab >/dev/null 2>&1; then "
+    "echo '---BIN:containerlab---'; command -v containerlab; "
+    "echo '---CMD:containerlab version---'; containerlab version 2>/dev/null || true; "
+    "fi; "
+    "if [ -f /etc/containerlab/version ]; then "
+    "echo '---FILE:/etc/containerlab/version---'; cat /etc/containerlab/version; "
+    "fi; "
+    "if [ -f /etc/systemd/system/containerlab.service ] || [ -f /lib/systemd/system/containerlab.service ]; then "
+    "echo '---UNIT:containerlab.service---'; "
+    "fi"
+)
+
+
+def _classify_platform(raw: str):
+    content_lower = (raw or "").lower()
 
     if "eve-ng" in content_lower or "eve ng" in content_lower:
         return "eve-ng", raw, "/etc/issue"
@@ -174,6 +227,65 @@ def detect_platform(eve_ip: str, eve_user: str, eve_pass: str):
     return "unknown", raw, "/etc/issue"
 
 
+def detect_platform(eve_ip: str, eve_user: str, eve_pass: str):
+    """
+    Detecta se o host é EVE-NG, PNETLab ou ContainerLab lendo /etc/issue
+    (ou arquivos/comandos relacionados).
+    Retorna (name, raw_output, source_file).
+    name: "eve-ng" | "pnetlab" | "containerlab" | "unknown"
+    """
+    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, _DETECT_PLATFORM_CMD)
+    return _classify_platform((out or "").strip())
+
+
+# Prefixo da linha KEY=VALUE -> chave do dict de recursos.
+_RESOURCE_FIELDS = {
+    "CPU": "cpu_percent",
+    "MEM_TOTAL_MB": "mem_total_mb",
+    "MEM_USED_MB": "mem_used_mb",
+    "MEM_FREE_MB": "mem_free_mb",
+    "DISK_TOTAL_KB": "disk_total_kb",
+    "DISK_USED_KB": "disk_used_kb",
+    "DISK_FREE_KB": "disk_free_kb",
+    "DISK_PCT": "disk_percent",
+}
+
+
+def _resource_result(values: dict, raw: str, err: str, rc: int) -> dict:
+    """Monta o dict de recursos no formato de get_resource_usage."""
+    result = {
+        "cpu_percent": None,
+        "mem_total_mb": None,
+        "mem_used_mb": None,
+        "mem_free_mb": None,
+        "mem_percent": None,
+        "disk_total_kb": None,
+        "disk_used_kb": None,
+        "disk_free_kb": None,
+        "disk_percent": None,
+        "raw": raw,
+        "err": err,
+    }
+    for key in _RESOURCE_FIELDS.values():
+        value = values.get(key)
+        if value in (None, ""):
+            continue
+        try:
+            result[key] = float(value)
+        except (TypeError, ValueError):
+            pass
+
+    # Calcula mem_percent se possível
+    try:
+        if result["mem_total_mb"] and result["mem_used_mb"] is not None:
+            result["mem_percent"] = (result["mem_used_mb"] / result["mem_total_mb"]) * 100
+    except Exception:
+        pass
+
+    result["ssh_rc"] = rc
+    return result
+
+
 def get_resource_usage(eve_ip: str, eve_user: str, eve_pass: str):
     """
     Captura uso de CPU, RAM e disco no host remoto.
@@ -207,71 +319,121 @@ def get_resource_usage(eve_ip: str, eve_user: str, eve_pass: str):
         " echo \"DISK_PCT=$dp\";"
     )
     rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd)
-    result = {
-        "cpu_percent": None,
-        "mem_total_mb": None,
-        "mem_used_mb": None,
-        "mem_free_mb": None,
-        "mem_percent": None,
-        "disk_total_kb": None,
-        "disk_used_kb": None,
-        "disk_free_kb": None,
-        "disk_percent": None,
-        "raw": out.strip(),
-        "err": err.strip(),
-    }
+    values = {}
     for line in out.splitlines():
-        line = line.strip()
-        if line.startswith("CPU="):
-            try:
-                result["cpu_percent"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
-        if line.startswith("MEM_TOTAL_MB="):
-            try:
-                result["mem_total_mb"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
-        if line.startswith("MEM_USED_MB="):
-            try:
-                result["mem_used_mb"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
-        if line.startswith("MEM_FREE_MB="):
-            try:
-                result["mem_free_mb"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
-        if line.startswith("DISK_TOTAL_KB="):
-            try:
-                result["disk_total_kb"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
-        if line.startswith("DISK_USED_KB="):
-            try:
-                result["disk_used_kb"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
-        if line.startswith("DISK_FREE_KB="):
-            try:
-                result["disk_free_kb"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
-        if line.startswith("DISK_PCT="):
-            try:
-                result["disk_percent"] = float(line.split("=", 1)[1])
-            except Exception:
-                pass
+        name, sep, value = line.strip().partition("=")
+        if sep and name in _RESOURCE_FIELDS:
+            values[_RESOURCE_FIELDS[name]] = value.strip()
+    return _resource_result(values, out.strip(), err.strip(), rc)
 
-    # Calcula mem_percent se possível
+
+_PROBE_FRAME = "__NCF_PROBE__"
+
+
+def _host_probe_cmd(base_dirs: dict, with_platform: bool = True, with_resources: bool = True) -> str:
+    """
+    Script único para /images: plataforma, recursos e a listagem de cada
+    diretório base, devolvidos como um documento JSON entre marcadores
+    (_PROBE_FRAME), imune a banners/MOTD no stdout. with_platform=False omite a
+    detecção de plataforma (já conhecida pelo perfil do host) e
+    with_resources=False omite a amostragem (já feita pelo resource_sampler).
+
+    A janela de 1s da amostragem de CPU roda em background enquanto a
+    detecção e as listagens acontecem, em vez de bloquear antes delas.
+    """
+    parts = [
+        # Strings JSON: escapa \ e ". Controles ficam crus (json.loads strict=False).
+        "_j() { printf '%s' \"$1\" | sed -e 's/\\\\/\\\\\\\\/g' -e 's/\"/\\\\\"/g'; }; ",
+        "_n() { case \"$1\" in ''|*[!0-9.]*) printf null;; *) printf '%s' \"$1\";; esac; }; ",
+    ]
+    if with_resources:
+        parts += [
+            "read _ u1 n1 s1 i1 w1 q1 sq1 st1 _ < /proc/stat; ",
+            "sleep 1 & sp=$!; ",
+        ]
+    parts += [
+        f"echo '{_PROBE_FRAME}'; ",
+        "printf '{\"dirs\":{'; ",
+    ]
+    for idx, (kind, base_dir) in enumerate(base_dirs.items()):
+        parts.append(
+            ("printf ','; " if idx else "")
+            + f"printf '\"%s\":[' '{kind}'; sep=''; "
+            f"if [ -d '{base_dir}' ]; then for d in '{base_dir}'/*; do "
+            "[ -d \"$d\" ] || continue; "
+            "printf '%s\"%s\"' \"$sep\" \"$(_j \"${d##*/}\")\"; sep=','; "
+            "done; fi; printf ']'; "
+        )
+    parts.append("printf '}'; ")
+    if with_platform:
+        parts += [
+            f"plat=$({{ {_DETECT_PLATFORM_CMD}; }} 2>/dev/null); ",
+            "printf ',\"platform_raw\":\"%s\"' \"$(_j \"$plat\")\"; ",
+        ]
+    if not with_resources:
+        parts += ["printf '}\\n'; ", f"echo '{_PROBE_FRAME}'"]
+        return "".join(parts)
+    parts += [
+        "wait $sp; ",
+        "read _ u2 n2 s2 i2 w2 q2 sq2 st2 _ < /proc/stat; ",
+        "idle=$(( (i2 + w2) - (i1 + w1) )); ",
+        "nonidle=$(( (u2 - u1) + (n2 - n1) + (s2 - s1) + (q2 - q1) + (sq2 - sq1) + (st2 - st1) )); ",
+        "total=$(( idle + nonidle )); cpu=0; ",
+        "if [ $total -gt 0 ]; then cpu=$(( 100 * nonidle / total )); fi; ",
+        "set -- $(free -m 2>/dev/null | awk '/Mem:/ {print $2, $3, $4}'); mt=$1 mu=$2 ma=$3; ",
+        "set -- $(df -k / 2>/dev/null | tail -1 | awk '{print $2, $3, $4, $5}' | tr -d '%'); ",
+        "printf ',\"resources\":{\"cpu_percent\":%s,\"mem_total_mb\":%s,\"mem_used_mb\":%s,"
+        "\"mem_free_mb\":%s,\"disk_total_kb\":%s,\"disk_used_kb\":%s,\"disk_free_kb\":%s,"
+        "\"disk_percent\":%s}}\\n' "
+        "\"$(_n \"$cpu\")\" \"$(_n \"$mt\")\" \"$(_n \"$mu\")\" \"$(_n \"$ma\")\" "
+        "\"$(_n \"$1\")\" \"$(_n \"$2\")\" \"$(_n \"$3\")\" \"$(_n \"$4\")\"; ",
+        f"echo '{_PROBE_FRAME}'",
+    ]
+    return "".join(parts)
+
+
+def _extract_probe_doc(out: str):
+    """Retorna o JSON entre os marcadores do probe, ou None."""
+    chunks = (out or "").split(_PROBE_FRAME)
+    if len(chunks) < 3:
+        return None
     try:
-        if result["mem_total_mb"] and result["mem_used_mb"] is not None:
-            result["mem_percent"] = (result["mem_used_mb"] / result["mem_total_mb"]) * 100
-    except Exception:
-        pass
+        doc = json.loads(chunks[1].strip(), strict=False)
+    except ValueError:
+        return None
+    return doc if isinstance(doc, dict) else None
 
-    result["ssh_rc"] = rc
-    return result
+
+def probe_images_host(eve_ip: str, eve_user: str, eve_pass: str, base_dirs: dict, platform=None, resources=None):
+    """
+    Uma única sessão SSH para /images: equivale a detect_platform +
+    get_resource_usage + uma listagem por diretório de base_dirs. Se platform
+    (tupla de _classify_platform) ou resources (amostra recente) já forem
+    conhecidos, a parte correspondente é pulada.
+
+    Retorna dict {platform, resources, images, stderr, ssh_rc} ou None se o
+    host não devolveu um documento válido (o chamador cai no caminho antigo).
+    """
+    cmd = _host_probe_cmd(base_dirs, with_platform=platform is None, with_resources=resources is None)
+    rc, out, err = run_ssh_command(eve_ip, eve_user, eve_pass, cmd, timeout=60)
+    doc = _extract_probe_doc(out)
+    if doc is None:
+        return None
+    dirs = doc.get("dirs") if isinstance(doc.get("dirs"), dict) else {}
+    images = {
+        kind: [str(name) for name in (dirs.get(kind) or []) if str(name).strip()]
+        for kind in base_dirs
+    }
+    if resources is None:
+        sampled = doc.get("resources") if isinstance(doc.get("resources"), dict) else {}
+        resources = _resource_result(sampled, "", (err or "").strip(), rc)
+    return {
+        "platform": platform or _classify_platform(str(doc.get("platform_raw") or "").strip()),
+        "resources": resources,
+        "images": images,
+        "stderr": (err or "").strip(),
+        "ssh_rc": rc,
+    }
 
 
 def scp_upload(eve_ip: str, eve_user: str, eve_pass: str, local_path: str, remote_path: str):
@@ -288,17 +450,52 @@ def scp_upload(eve_ip: str, eve_user: str, eve_pass: str, local_path: str, remot
         "PreferredAuthentications=password",
         "-o",
         "PubkeyAuthentication=no",
+        *mux_options(eve_ip, eve_user, eve_pass),
         local_path,
         f"{eve_user}@{eve_ip}:{remote_path}",
     ]
-    print(f"[API] Executando SCP: {' '.join(cmd)}", flush=True)
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
+    print(f"[API] Executando SCP: {_redact(cmd)}", flush=True)
+    rc, stdout, stderr, _truncated = ssh_engine.capture(
+        cmd, max_bytes=OUTPUT_MAX_BYTES, encoding="utf-8", host=eve_ip, priority=PRIORITY_BULK,
     )
-    stdout, stderr = proc.communicate()
-    print(f"[API] SCP STDOUT:\n{stdout}", flush=True)
-    print(f"[API] SCP STDERR:\n{stderr}", flush=True)
-    return proc.returncode, stdout, stderr
+    _log_output("SCP STDOUT", stdout)
+    _log_output("SCP STDERR", stderr)
+    return rc, stdout, stderr
+
+
+# Listas de hosts (modo frota e upload para vários hosts).
+FLEET_MAX_HOSTS = max(1, int(os.getenv("FLEET_MAX_HOSTS", "64")))
+
+
+def parse_hosts(raw) -> list[dict] | None:
+    """Lista de hosts válida e sem repetição (ip+usuário), ou None."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return None
+    if not isinstance(raw, list) or not raw:
+        return None
+    hosts = []
+    seen = set()
+    for item in raw:
+        if not isinstance(item, dict):
+            return None
+        eve_ip = str(item.get("eve_ip") or "").strip()
+        eve_user = str(item.get("eve_user") or "").strip()
+        eve_pass = str(item.get("eve_pass") or "").strip()
+        if not (eve_ip and eve_user and eve_pass):
+            return None
+        key = (eve_ip.lower(), eve_user)
+        if key in seen:
+            continue
+        seen.add(key)
+        hosts.append(
+            {
+                "eve_ip": eve_ip,
+                "eve_user": eve_user,
+                "eve_pass": eve_pass,
+                "name": str(item.get("name") or eve_ip),
+            }
+        )
+    return hosts
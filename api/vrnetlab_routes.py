@@ -22,8 +22,9 @@ import uuid
 
 from flask import Blueprint, jsonify, request
 
+from host_agent import run_agent
 from i18n import get_request_lang, translate
-from utils import run_ssh_command, run_ssh_stream
+from utils import cancel_ssh_job, run_ssh_command, start_ssh_stream
 
 
 vrnetlab_bp = Blueprint("vrnetlab_bp", __name__, url_prefix="/vrnetlab")
@@ -60,24 +61,8 @@ def _vrl_job_finish(jid, rc):
             j["status"] = "success" if rc == 0 else "error"
 
 
-@vrnetlab_bp.route("/status", methods=["POST"])
-def vrnetlab_status():
-    """
-    Coleta informações básicas sobre o ambiente VRNETLAB em um host ContainerLab.
-    Retorna runtime (docker/podman), caminho do repositório local e imagens
-    que contenham "vrnetlab" no nome.
-    """
-    lang = get_request_lang()
-    eve_ip = (request.form.get("eve_ip") or "").strip()
-    eve_user = (request.form.get("eve_user") or "").strip()
-    eve_pass = (request.form.get("eve_pass") or "").strip()
-
-    if not (eve_ip and eve_user and eve_pass):
-        return (
-            jsonify(success=False, message=translate("vrnetlab.missing_creds", lang)),
-            400,
-        )
-
+def _vrnetlab_status_shell(eve_ip: str, eve_user: str, eve_pass: str):
+    """Coleta via one-liner de shell (hosts sem o agente python3)."""
     cmd = (
         "runtime=''; "
         "if command -v docker >/dev/null 2>&1; then runtime='docker'; fi; "
@@ -121,6 +106,43 @@ def vrnetlab_status():
         else:
             extra_lines.append(line)
 
+    return runtime, repo_path, images, extra_lines, rc, out, err
+
+
+@vrnetlab_bp.route("/status", methods=["POST"])
+def vrnetlab_status():
+    """
+    Coleta informações básicas sobre o ambiente VRNETLAB em um host ContainerLab.
+    Retorna runtime (docker/podman), caminho do repositório local e imagens
+    que contenham "vrnetlab" no nome.
+    """
+    lang = get_request_lang()
+    eve_ip = (request.form.get("eve_ip") or "").strip()
+    eve_user = (request.form.get("eve_user") or "").strip()
+    eve_pass = (request.form.get("eve_pass") or "").strip()
+
+    if not (eve_ip and eve_user and eve_pass):
+        return (
+            jsonify(success=False, message=translate("vrnetlab.missing_creds", lang)),
+            400,
+        )
+
+    agent = run_agent(
+        eve_ip, eve_user, eve_pass, "runtime-images",
+        "--match", "vrnetlab", "--check-dir", "/opt/containerlab/vrnetlab",
+    )
+    if agent is not None:
+        runtime = agent.get("runtime") or ""
+        repo_path = "/opt/containerlab/vrnetlab" if agent.get("dir_present") else ""
+        images = [
+            {"repository": i.get("repository", ""), "tag": i.get("tag", ""), "size": i.get("size", "")}
+            for i in agent.get("images") or []
+        ]
+        extra_lines = []
+        rc, out, err = agent.get("rc", 0), "", agent.get("stderr") or ""
+    else:
+        runtime, repo_path, images, extra_lines, rc, out, err = _vrnetlab_status_shell(eve_ip, eve_user, eve_pass)
+
     success = True
     message = translate("vrnetlab.status.ok", lang)
 
@@ -265,18 +287,11 @@ def vrnetlab_build():
         "make docker-image 2>&1"
     )
     jid = _vrl_job_new()
-
-    def worker():
-        rc_box = {"rc": 1}
-
-        def on_line(line):
-            _vrl_job_append(jid, line)
-
-        rc = run_ssh_stream(eve_ip, eve_user, eve_pass, cmd, on_line, timeout=3600)
-        rc_box["rc"] = rc
-        _vrl_job_finish(jid, rc)
-
-    threading.Thread(target=worker, daemon=True).start()
+    start_ssh_stream(
+        eve_ip, eve_user, eve_pass, cmd,
+        lambda line: _vrl_job_append(jid, line), lambda rc: _vrl_job_finish(jid, rc),
+        timeout=3600, job_id=jid,
+    )
     return jsonify(success=True, job_id=jid), 200
 
 
@@ -289,3 +304,13 @@ def vrnetlab_build_job():
         if not j:
             return jsonify(success=False, status="unknown", lines=[], rc=None), 404
         return jsonify(success=True, status=j["status"], lines=list(j["lines"]), rc=j["rc"]), 200
+
+
+@vrnetlab_bp.route("/build/cancel", methods=["POST"])
+def vrnetlab_build_cancel():
+    """Interrompe o build (mata o ssh; rc=130)."""
+    jid = (request.form.get("job_id") or "").strip()
+    with _VRL_LOCK:
+        if jid not in _VRL_JOBS:
+            return jsonify(success=False, status="unknown"), 404
+    return jsonify(success=cancel_ssh_job(jid)), 200
@@ -13,7 +13,8 @@
 # You should have received a copy of the GNU General Public License
 # along with NetConfig Lab Image Manager.  If not, see <https://www.gnu.org/licenses/>.
 
-"""WebSocket: streaming de log de jobs em tempo real e terminal (PTY) por nó.
+"""WebSocket: streaming de log de jobs em tempo real, progresso de uploads e
+terminal (PTY) por nó.
 
 Usa flask-sock. Os endpoints respeitam a mesma autenticação por sessão da API
 (quando ativada via APP_PASSWORD).
@@ -31,6 +32,7 @@ from flask import session
 from flask_sock import Sock
 
 from auth import auth_enabled
+import upload_jobs
 
 sock = Sock()
 
@@ -99,6 +101,36 @@ def ws_vrljob(ws, job_id):
     _stream_job(ws, _VRL_JOBS, _VRL_LOCK, job_id)
 
 
+@sock.route("/ws/upload/<job_id>")
+def ws_upload(ws, job_id):
+    """Progresso ao vivo de um job de upload (bytes, vazão, ETA, arquivos).
+
+    Envia {"progress": {...}} a cada 0,5 s e, no fim, {"done": true,
+    "status": ..., "progress": {...}}."""
+    if not _authed():
+        return
+
+    while True:
+        snap = upload_jobs.snapshot(job_id)
+        if snap is None:
+            try:
+                ws.send(json.dumps({"error": "unknown"}))
+            except Exception:
+                pass
+            return
+        if snap["done"]:
+            try:
+                ws.send(json.dumps({"done": True, "status": snap["status"], "progress": snap}))
+            except Exception:
+                pass
+            return
+        try:
+            ws.send(json.dumps({"progress": snap}))
+        except Exception:
+            return
+        time.sleep(0.5)
+
+
 @sock.route("/ws/terminal")
 def ws_terminal(ws):
     """Terminal interativo (PTY) para um nó via SSH + docker exec.
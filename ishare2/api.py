@@ -11,6 +11,7 @@ import tempfile
 import threading
 import uuid
 import json
+import shutil
 import time
 import urllib.error
 import urllib.parse
@@ -35,6 +36,9 @@ _NETCONFIG_REPO_HOST = "repo.netconfig.com.br"
 _NETCONFIG_REPO_PREFIX = "/api/raw?path="
 _NETCONFIG_REPO_ID = "repo.netconfig.com.br"
 _REPO_PROBE_TIMEOUT = 2.0
+# Cópia comprimida para o EVE ("zstd", "gzip", "auto"; vazio = scp). O campo
+# "compress" do pedido tem precedência.
+ISHARE2_COMPRESS = os.getenv("ISHARE2_COMPRESS", "")
 _LABHUB_DEFAULT_PREFIXES = ["/0:"]
 _LABHUB_USEFUL_PATHS = [
   "addons/dynamips",
@@ -1241,10 +1245,156 @@ def _create_job() -> str:
     "fallback_prefix": "",
     "latency_ms": {},
     "attempt_details": [],
+    "compress": "",
+    "transfer": None,
   }
   return job_id
 
 
+def _compress_codec(base_ssh: List[str], target_ssh: str, requested: str) -> str | None:
+  """
+  Codec para a cópia comprimida: o pedido (zstd/gzip) ou, em 'auto', zstd e
+  depois gzip. Precisa do binário aqui e no EVE; None = usar scp puro.
+  """
+  requested = (requested or "").strip().lower()
+  if requested in ("", "0", "off", "false", "no"):
+    return None
+  local = [c for c in ("zstd", "gzip") if shutil.which(c)]
+  try:
+    probe = subprocess.run(
+      base_ssh + [target_ssh, "for c in zstd gzip; do command -v $c >/dev/null 2>&1 && echo $c; done"],
+      check=False,
+      text=True,
+      stdout=subprocess.PIPE,
+      stderr=subprocess.PIPE,
+      timeout=30,
+    )
+  except (OSError, subprocess.TimeoutExpired):
+    return None
+  remote = set((probe.stdout or "").split())
+  available = [c for c in local if c in remote]
+  if requested in available:
+    return requested
+  return available[0] if available else None
+
+
+def _dir_size(path: str) -> tuple[int, int]:
+  """(tamanho aparente, bytes alocados) dos arquivos sob path."""
+  total = 0
+  allocated = 0
+  for root, _dirs, files in os.walk(path):
+    for name in files:
+      try:
+        st = os.stat(os.path.join(root, name))
+      except OSError:
+        continue
+      total += st.st_size
+      allocated += getattr(st, "st_blocks", 0) * 512 or st.st_size
+  return total, allocated
+
+
+def _pump(src, dst, counter: List[int]) -> bool:
+  """Copia src -> dst em blocos de 1 MiB somando em counter[0]; False se dst fechou."""
+  try:
+    while True:
+      chunk = src.read(1024 * 1024)
+      if not chunk:
+        return True
+      dst.write(chunk)
+      counter[0] += len(chunk)
+  except (BrokenPipeError, OSError, ValueError):
+    return False
+  finally:
+    try:
+      dst.close()
+    except (BrokenPipeError, OSError):
+      pass
+
+
+def _compressed_copy(
+  install_path: str, target_install_path: str, base_ssh: List[str], target_ssh: str, codec: str,
+  on_progress: Callable[[int], None] | None = None,
+) -> tuple[bool, Dict[str, Any], str]:
+  """
+  tar -S | zstd --adapt (ou gzip -3) | ssh 'zstd -d | tar -x'. O --adapt do zstd
+  ajusta o nível conforme a vazão do link. Retorna (ok, estatísticas, stderr).
+
+  Os dois trechos do pipeline passam por aqui: tar -> compressor (conta os
+  bytes crus, base do progresso) e compressor -> ssh (numa thread, conta os
+  bytes na rede). Os stderr vão para arquivos temporários e o stdout do ssh
+  para /dev/null, para nenhum pipe sem leitor travar a cópia.
+  """
+  raw_bytes, allocated = _dir_size(install_path)
+  comp_cmd = [codec, "-c", "-q", "-T0", "--adapt"] if codec == "zstd" else [codec, "-c", "-3"]
+  remote_cmd = f"{codec} -d -c | tar -C '{target_install_path}' -xf -"
+  started = time.monotonic()
+  tar_bytes = [0]
+  wire_bytes = [0]
+  with tempfile.TemporaryFile() as tar_err, tempfile.TemporaryFile() as comp_err, \
+      tempfile.TemporaryFile() as ssh_err:
+    # -S: buracos dos discos raw/qcow2 não viajam e são recriados no EVE.
+    tar = subprocess.Popen(["tar", "-S", "-C", install_path, "-cf", "-", "."], stdout=subprocess.PIPE, stderr=tar_err)
+    comp = subprocess.Popen(comp_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=comp_err)
+    ssh = subprocess.Popen(
+      base_ssh + [target_ssh, remote_cmd], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=ssh_err,
+    )
+    sent = {}
+
+    def _send() -> None:
+      sent["ok"] = _pump(comp.stdout, ssh.stdin, wire_bytes)
+      if not sent["ok"]:
+        comp.kill()  # ssh caiu: derruba o compressor e, com ele, o laço do tar
+
+    sender = threading.Thread(target=_send, daemon=True)
+    sender.start()
+
+    broken = False
+    try:
+      while True:
+        chunk = tar.stdout.read(1024 * 1024)
+        if not chunk:
+          break
+        comp.stdin.write(chunk)
+        tar_bytes[0] += len(chunk)
+        if on_progress and allocated:
+          # O tar com -S lê só os blocos alocados (mais cabeçalhos).
+          on_progress(min(99, int(100 * tar_bytes[0] / allocated)))
+    except (BrokenPipeError, OSError):
+      broken = True
+      tar.kill()
+    finally:
+      try:
+        comp.stdin.close()
+      except (BrokenPipeError, OSError):
+        pass
+    tar.wait()
+    comp.wait()
+    sender.join()
+    if not sent.get("ok"):
+      broken = True
+    ssh.wait()
+    comp.stdout.close()
+    tar.stdout.close()
+
+    err_text = b""
+    for f in (ssh_err, comp_err, tar_err):
+      f.seek(0)
+      err_text += f.read()
+
+  elapsed = time.monotonic() - started
+  stats = {
+    "codec": codec,
+    "raw_bytes": raw_bytes,
+    "tar_bytes": tar_bytes[0],
+    "wire_bytes": wire_bytes[0],
+    "ratio": round(raw_bytes / wire_bytes[0], 2) if wire_bytes[0] else 0.0,
+    "elapsed_s": round(elapsed, 3),
+    "throughput_mbps": round(raw_bytes * 8 / elapsed / 1e6, 2) if elapsed > 0 else 0.0,
+  }
+  ok = not broken and tar.returncode == 0 and comp.returncode == 0 and ssh.returncode == 0
+  return ok, stats, _strip_ansi(err_text.decode(errors="ignore"))
+
+
 def _copy_to_eve(job_id: str, install_path: str, target_install_path: str, eve_ip: str, eve_user: str, eve_pass: str) -> None:
   base_ssh = _base_ssh_cmd(eve_ip, eve_pass)
   base_scp = _base_scp_cmd(eve_ip, eve_pass)
@@ -1287,55 +1437,70 @@ def _copy_to_eve(job_id: str, install_path: str, target_install_path: str, eve_i
       )
       return
 
-    # Copia conteúdo do diretório local para o mesmo caminho no EVE
-    _update_job(
-      job_id,
-      phase="copy",
-      progress=0,
-      message="Copiando arquivos para o EVE...",
-    )
-    scp_cmd = base_scp + [
-      "-r",
-      f"{install_path}/.",
-      f"{target_scp}:{target_install_path}",
-    ]
-    proc = subprocess.Popen(
-      scp_cmd,
-      stdout=subprocess.PIPE,
-      stderr=subprocess.PIPE,
-      text=True,
-    )
+    # Modo comprimido (opcional): cai para o scp se falhar ou não houver codec.
+    job = JOBS.get(job_id) or {}
+    codec = _compress_codec(base_ssh, target_ssh, job.get("compress") or ISHARE2_COMPRESS)
+    ok = False
+    if codec:
+      _update_job(job_id, phase="copy", progress=0, message=f"Copiando arquivos para o EVE ({codec})...")
+      ok, stats, err = _compressed_copy(
+        install_path, target_install_path, base_ssh, target_ssh, codec,
+        on_progress=lambda pct: _update_job(job_id, progress=pct),
+      )
+      _update_job(job_id, transfer=stats)
+      if not ok:
+        _append_job_logs(job_id, stderr=f"[image-manager] cópia {codec} falhou, usando scp: {err}\n")
 
-    # Lê stderr em fluxo para tentar extrair porcentagem real (padrão 'NN%')
-    while True:
-      line = proc.stderr.readline()
-      if not line:
-        break
-      clean_line = _strip_ansi(line)
-      _append_job_logs(job_id, stderr=clean_line)
-      m = re.search(r"(\d+)%", clean_line)
-      if m:
-        try:
-          pct = int(m.group(1))
-        except ValueError:
-          pct = None
-        if pct is not None and 0 <= pct <= 100:
-          _update_job(
-            job_id,
-            progress=pct,
-          )
-
-    proc.wait()
-    if proc.returncode != 0:
+    if not ok:
+      # Copia conteúdo do diretório local para o mesmo caminho no EVE
       _update_job(
         job_id,
-        status="error",
-        phase="done",
+        phase="copy",
         progress=0,
-        message="Falha ao copiar arquivos para o EVE via SCP.",
-        error="Falha ao copiar arquivos para o EVE via SCP.",
+        message="Copiando arquivos para o EVE...",
       )
-      return
+      scp_cmd = base_scp + [
+        "-r",
+        f"{install_path}/.",
+        f"{target_scp}:{target_install_path}",
+      ]
+      proc = subprocess.Popen(
+        scp_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+      )
+
+      # Lê stderr em fluxo para tentar extrair porcentagem real (padrão 'NN%')
+      while True:
+        line = proc.stderr.readline()
+        if not line:
+          break
+        clean_line = _strip_ansi(line)
+        _append_job_logs(job_id, stderr=clean_line)
+        m = re.search(r"(\d+)%", clean_line)
+        if m:
+          try:
+            pct = int(m.group(1))
+          except ValueError:
+            pct = None
+          if pct is not None and 0 <= pct <= 100:
+            _update_job(
+              job_id,
+              progress=pct,
+            )
+
+      proc.wait()
+      if proc.returncode != 0:
+        _update_job(
+          job_id,
+          status="error",
+          phase="done",
+          progress=0,
+          message="Falha ao copiar arquivos para o EVE via SCP.",
+          error="Falha ao copiar arquivos para o EVE via SCP.",
+        )
+        return
 
     # Executa fixpermissions no EVE
     _update_job(
@@ -1861,6 +2026,7 @@ def install():
   # copiamos os arquivos baixados para o host EVE.
   copy_ok = True
   copy_err = ""
+  transfer = None
   target_install_path = install_path
   if eve_ip and eve_user and eve_pass and install_path:
     target_install_path, adjust_note = _adjust_install_path(install_path, image_name)
@@ -1879,22 +2045,30 @@ def install():
       ]
       subprocess.run(mkdir_cmd, check=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-      # Copia conteúdo do diretório local para o mesmo caminho no EVE
-      scp_cmd = base_scp + [
-        "-r",
-        f"{install_path}/.",
-        f"{target_scp}:{target_install_path}",
-      ]
-      scp_proc = subprocess.run(
-        scp_cmd,
-        check=False,
-        text=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-      )
-      if scp_proc.returncode != 0:
-        copy_ok = False
-        copy_err = f"SCP failed: {scp_proc.stderr}"
+      codec = _compress_codec(base_ssh, target_ssh, str(data.get("compress") or ISHARE2_COMPRESS))
+      compressed_ok = False
+      if codec:
+        compressed_ok, transfer, err = _compressed_copy(install_path, target_install_path, base_ssh, target_ssh, codec)
+        if not compressed_ok:
+          clean_out = (clean_out + "\n" if clean_out else "") + f"[image-manager] cópia {codec} falhou, usando scp: {err}\n"
+
+      if not compressed_ok:
+        # Copia conteúdo do diretório local para o mesmo caminho no EVE
+        scp_cmd = base_scp + [
+          "-r",
+          f"{install_path}/.",
+          f"{target_scp}:{target_install_path}",
+        ]
+        scp_proc = subprocess.run(
+          scp_cmd,
+          check=False,
+          text=True,
+          stdout=subprocess.PIPE,
+          stderr=subprocess.PIPE,
+        )
+        if scp_proc.returncode != 0:
+          copy_ok = False
+          copy_err = f"SCP failed: {scp_proc.stderr}"
 
       # Executa fixpermissions no EVE
       if copy_ok:
@@ -1928,6 +2102,7 @@ def install():
       output=clean_out,
       stderr=(clean_err + ("\n" + copy_err if copy_err else "")) if (clean_err or copy_err) else "",
       install_path=target_install_path or "",
+      transfer=transfer,
       fallback_used=fallback_used,
       fallback_prefix=fallback_prefix,
       fallback_prefixes=fallback_prefixes,
@@ -2120,6 +2295,7 @@ def install_async():
     )
 
   job_id = _create_job()
+  _update_job(job_id, compress=str(data.get("compress") or ""))
 
   thread = threading.Thread(
     target=_run_install_job,
@@ -2292,6 +2468,7 @@ def install_progress():
       fallback_prefix=job.get("fallback_prefix", ""),
       latency_ms=job.get("latency_ms", {}),
       attempt_details=job.get("attempt_details", []),
+      transfer=job.get("transfer"),
     ),
     200,
   )
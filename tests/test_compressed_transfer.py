@@ -0,0 +1,150 @@
+import gzip
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class _Chan:
+    """Canal SSH falso: guarda o que foi enviado e o comando executado."""
+
+    def __init__(self, rc=0):
+        self.sent = io.BytesIO()
+        self.command = None
+        self.rc = rc
+        self.closed = False
+
+    def exec_command(self, cmd):
+        self.command = cmd
+
+    def sendall(self, data):
+        self.sent.write(data)
+
+    def shutdown_write(self):
+        pass
+
+    def recv_exit_status(self):
+        return self.rc
+
+    def recv_stderr_ready(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+def _ssh(chan, remote="zstd\ngzip\n", rc=0):
+    ssh = MagicMock()
+    ssh.get_transport.return_value.open_session.return_value = chan
+    out = MagicMock()
+    out.read.return_value = remote.encode()
+    out.channel.recv_exit_status.return_value = rc
+    err = MagicMock()
+    err.read.return_value = b""
+    ssh.exec_command.return_value = (None, out, err)
+    return ssh
+
+
+class TestCompressedTransfer(unittest.TestCase):
+    def setUp(self):
+        self.ct = _import("compressed_transfer")
+
+    def test_gzip_round_trip(self):
+        chan = _Chan()
+        payload = b"qcow2 header " * 50000
+        up = self.ct.CompressedUpload(_ssh(chan), "/opt/unetlab/addons/qemu/a/virtioa.qcow2", "gzip")
+        for i in range(0, len(payload), 7000):
+            up.write(payload[i:i + 7000])
+        stats = up.close()
+        self.assertEqual(gzip.decompress(chan.sent.getvalue()), payload)
+        self.assertIn("gzip -d -c > /opt/unetlab/addons/qemu/a/.virtioa.qcow2.part", chan.command)
+        self.assertEqual(stats["raw_bytes"], len(payload))
+        self.assertGreater(stats["ratio"], 2)
+
+    def test_level_change_starts_new_frame(self):
+        chan = _Chan()
+        payload = bytes(range(256)) * 2000
+        with patch.object(self.ct, "ADAPT_BYTES", 64 * 1024):
+            up = self.ct.CompressedUpload(_ssh(chan), "/tmp/x.img", "gzip")
+            orig_send = up._send
+
+            def slow_send(data):
+                orig_send(data)
+                up._send_time += 1.0  # rede "lenta": deve subir o nível
+
+            up._send = slow_send
+            for i in range(0, len(payload), 32 * 1024):
+                up.write(payload[i:i + 32 * 1024])
+            up.close()
+        self.assertGreater(up.level, 3)
+        self.assertEqual(gzip.decompress(chan.sent.getvalue()), payload)
+
+    def test_remote_failure_raises(self):
+        up = self.ct.CompressedUpload(_ssh(_Chan(rc=1)), "/tmp/x.img", "gzip")
+        up.write(b"abc")
+        with self.assertRaises(IOError):
+            up.close()
+
+    def test_close_checks_size_before_mv_and_abort_removes_part(self):
+        chan = _Chan()
+        ssh = _ssh(chan)
+        up = self.ct.CompressedUpload(ssh, "/tmp/x.img", "gzip")
+        self.assertNotIn("mv", chan.command)
+        up.write(b"a" * 1000)
+        up.close()
+        finalize = ssh.exec_command.call_args[0][0]
+        self.assertIn('= 1000 ]', finalize)
+        self.assertIn("mv -f /tmp/.x.img.part /tmp/x.img", finalize)
+
+        ssh = _ssh(_Chan(), rc=1)
+        up = self.ct.CompressedUpload(ssh, "/tmp/x.img", "gzip")
+        up.write(b"abc")
+        with self.assertRaises(IOError):
+            up.close()
+
+        ssh = _ssh(_Chan())
+        up = self.ct.CompressedUpload(ssh, "/tmp/x.img", "gzip")
+        up.write(b"abc")
+        up.abort()
+        ssh.exec_command.assert_called_once_with("rm -f /tmp/.x.img.part")
+
+    def test_truncated_part_never_replaces_destination(self):
+        with tempfile.TemporaryDirectory() as d:
+            dest = os.path.join(d, "hda.qcow2")
+            with open(dest, "wb") as fh:
+                fh.write(b"imagem boa")
+            with open(os.path.join(d, ".hda.qcow2.part"), "wb") as fh:
+                fh.write(b"x" * 10)  # fluxo cortado num fim de frame: rc=0, mas curto
+            up = self.ct.CompressedUpload(_ssh(_Chan()), dest, "gzip")
+            up.raw_bytes = 20
+            proc = subprocess.run(["bash", "-c", up._finalize_cmd()], capture_output=True)
+            self.assertNotEqual(proc.returncode, 0)
+            with open(dest, "rb") as fh:
+                self.assertEqual(fh.read(), b"imagem boa")
+            self.assertFalse(os.path.exists(os.path.join(d, ".hda.qcow2.part")))
+
+            with open(os.path.join(d, ".hda.qcow2.part"), "wb") as fh:
+                fh.write(b"y" * 20)
+            self.assertEqual(subprocess.run(["bash", "-c", up._finalize_cmd()]).returncode, 0)
+            with open(dest, "rb") as fh:
+                self.assertEqual(fh.read(), b"y" * 20)
+
+    def test_pick_codec(self):
+        with patch.object(self.ct, "zstandard", None):
+            self.assertEqual(self.ct.pick_codec(_ssh(_Chan()), "zstd"), "gzip")
+        self.assertIsNone(self.ct.pick_codec(_ssh(_Chan(), remote=""), "auto"))
+
+
+if __name__ == "__main__":
+    unittest.main()
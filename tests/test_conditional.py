@@ -0,0 +1,123 @@
+import json
+import sys
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class TestConditionalListing(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("templates_routes")
+        self.conditional = sys.modules["conditional"]
+        self.state = "/opt/unetlab/html/templates/amd|1700000000.1|1700000000.1\n"
+        self.validator_calls = []
+
+        def fake_ssh(ip, user, pw, cmd, timeout=None):
+            self.validator_calls.append(cmd)
+            return 0, self.state + "__NCF_VALIDATOR__\n", ""
+
+        self.sftp = MagicMock()
+        self.sftp.listdir.return_value = ["vios.yml", "notes.txt"]
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            yield MagicMock(), self.sftp
+
+        patch.object(self.conditional, "run_ssh_command", fake_ssh).start()
+        patch.object(self.routes, "sftp_session", fake_session).start()
+        self.addCleanup(patch.stopall)
+
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.templates_bp)
+        self.client = app.test_client()
+        self.form = {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x"}
+
+    def _list(self, etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.post("/templates/list", data=self.form, headers=headers)
+
+    def test_304_skips_listing_until_state_changes(self):
+        first = self._list()
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+        self.assertIn("-maxdepth 0 -type d", self.validator_calls[0])
+        self.assertEqual(self.sftp.listdir.call_count, 2)
+
+        again = self._list(etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.headers["ETag"], etag)
+        self.assertEqual(again.data, b"")
+        self.assertEqual(self.sftp.listdir.call_count, 2)
+
+        # Proxies com gzip enfraquecem o ETag; a comparação é fraca.
+        self.assertEqual(self._list("W/" + etag).status_code, 304)
+
+        self.state = self.state.replace("0.1|", "9.9|")
+        changed = self._list(etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+
+    def test_unreachable_validator_falls_back_to_full_listing(self):
+        with patch.object(self.conditional, "run_ssh_command", return_value=(255, "", "timeout")):
+            resp = self._list('"anything"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("ETag", resp.headers)
+        self.assertEqual(resp.get_json()["templates"]["amd"], ["vios.yml"])
+
+    def test_error_responses_are_not_tagged(self):
+        with patch.object(self.routes, "sftp_session", side_effect=OSError("boom")):
+            resp = self._list()
+        self.assertEqual(resp.status_code, 500)
+        self.assertNotIn("ETag", resp.headers)
+
+
+class TestImagesConditional(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("image_routes")
+        self.conditional = sys.modules["conditional"]
+        self.sample = {"cpu_percent": 10.0, "sampled_at": 1700000000.0, "source": "sampler"}
+        self.collected = 0
+
+        def fake_collect(ip, user, pw):
+            self.collected += 1
+            return {"qemu": ["vios"]}, [], ("eve-ng", "raw", "profile"), dict(self.sample)
+
+        patch.object(self.conditional, "run_ssh_command",
+                     return_value=(0, "/opt/unetlab/addons/qemu|1.0|1.0\n__NCF_VALIDATOR__\n", "")).start()
+        patch.object(self.routes, "cached_profile", return_value={"platform": {"name": "eve-ng"}}).start()
+        patch.object(self.routes.resource_sampler, "latest", lambda ip, user, pw: dict(self.sample)).start()
+        patch.object(self.routes, "collect_images", fake_collect).start()
+        self.addCleanup(patch.stopall)
+
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.images_bp)
+        self.client = app.test_client()
+        self.form = {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x"}
+
+    def test_new_resource_sample_keeps_etag_and_rides_on_304(self):
+        first = self.client.post("/images", data=self.form)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+
+        self.sample.update(cpu_percent=55.0, sampled_at=1700000005.0)
+        again = self.client.post("/images", data=self.form, headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.collected, 1)
+        fields = json.loads(again.headers["X-Volatile-Fields"])
+        self.assertEqual(fields["resources"]["cpu_percent"], 55.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -75,6 +75,12 @@ class TestContainerLabsOps(unittest.TestCase):
         self.assertIn("podman logs --tail 50 clab-bgp-spine1", cmd)
         self.assertIn("__NO_RUNTIME__", cmd)
 
+    def test_runtime_cmd_uses_resolved_runtime(self):
+        r = _import_routes()
+        cmd = r._runtime_logs_cmd("clab-bgp-spine1", 50, runtime="podman")
+        self.assertEqual(cmd, "podman logs --tail 50 clab-bgp-spine1 2>&1")
+        self.assertNotIn("command -v", cmd)
+
     def test_exec_cmd_quotes_command(self):
         r = _import_routes()
         cmd = r._runtime_exec_cmd("clab-bgp-spine1", "ip route; echo hi")
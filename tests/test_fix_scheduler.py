@@ -0,0 +1,222 @@
+import grp
+import importlib.util
+import os
+import pwd
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class TestFixScheduler(unittest.TestCase):
+    def setUp(self):
+        self.sched = _import("fix_scheduler")
+        patch.object(self.sched, "WINDOW", 0.2).start()
+        self.addCleanup(patch.stopall)
+        self.runs = []
+
+    def _runner(self, tag, duration=0.05, rc=0):
+        def run():
+            self.runs.append(tag)
+            time.sleep(duration)
+            return rc, f"ran {tag}", ""
+        return run
+
+    def _parallel(self, key, count, stagger=0.0, duration=0.05):
+        results = [None] * count
+
+        def worker(i):
+            results[i] = self.sched.run(key, self._runner(i, duration))
+
+        threads = []
+        for i in range(count):
+            t = threading.Thread(target=worker, args=(i,))
+            t.start()
+            threads.append(t)
+            time.sleep(stagger)
+        for t in threads:
+            t.join(5)
+        return results
+
+    def test_requests_within_window_share_one_run(self):
+        results = self._parallel(("10.0.0.1", "root"), 5)
+        self.assertEqual(len(self.runs), 1)
+        self.assertEqual(sum(r["leader"] for r in results), 1)
+        self.assertTrue(all(r["merged"] == 5 and r["rc"] == 0 for r in results))
+        self.assertEqual({r["stdout"] for r in results}, {f"ran {self.runs[0]}"})
+
+    def test_request_during_run_goes_to_next_batch(self):
+        key = ("10.0.0.2", "root")
+        first = threading.Thread(target=self.sched.run, args=(key, self._runner("a", duration=0.4)))
+        first.start()
+        time.sleep(0.35)  # "a" já está rodando
+        results = self._parallel(key, 2, duration=0.01)
+        first.join(5)
+        self.assertEqual(len(self.runs), 2)
+        self.assertEqual([r["merged"] for r in results], [2, 2])
+
+    def test_hosts_are_independent(self):
+        a = threading.Thread(target=self._parallel, args=(("10.0.0.3", "root"), 2))
+        a.start()
+        self._parallel(("10.0.0.4", "root"), 2)
+        a.join(5)
+        self.assertEqual(len(self.runs), 2)
+
+    def test_waits_are_bounded_and_report_rc_none(self):
+        key = ("10.0.0.6", "root")
+        release = threading.Event()
+
+        def hung():
+            release.wait(5)
+            return 0, "", ""
+
+        leader = threading.Thread(target=self.sched.run, args=(key, hung))
+        leader.start()
+        self.addCleanup(leader.join, 5)
+        self.addCleanup(release.set)
+        time.sleep(0.05)
+        follower = self.sched.run(key, self._runner("f"), timeout=0.3)
+        self.assertIsNone(follower["rc"])
+        self.assertIn("timeout", follower["stderr"])
+        self.assertLess(follower["waited_ms"], 2000)
+
+        # Próximo lote: o líder desiste de esperar a execução travada.
+        nxt = self.sched.run(key, self._runner("n"), timeout=0.5)
+        self.assertIsNone(nxt["rc"])
+        self.assertNotIn("n", self.runs)
+
+        ssh = MagicMock()
+        ssh.get_transport.return_value.getpeername.return_value = key[0], 22
+        ssh.get_transport.return_value.get_username.return_value = key[1]
+        errors = []
+        with patch.object(self.sched, "WAIT_TIMEOUT", 0.3):
+            self.assertFalse(self.sched.fix_with_ssh(ssh, errors))
+        self.assertEqual(errors[0]["step"], "fixpermissions")
+        self.assertIn("timeout", errors[0]["stderr"])
+
+    def test_fix_with_ssh_keeps_route_error_format(self):
+        ssh = MagicMock()
+        ssh.get_transport.return_value.getpeername.return_value = ("10.0.0.5", 22)
+        ssh.get_transport.return_value.get_username.return_value = "root"
+        stdout = MagicMock()
+        stdout.channel.recv_exit_status.return_value = 2
+        stdout.read.return_value = b""
+        stderr = MagicMock()
+        stderr.read.return_value = b"denied"
+        ssh.exec_command.return_value = (None, stdout, stderr)
+        errors = []
+        self.assertFalse(self.sched.fix_with_ssh(ssh, errors))
+        self.assertEqual(errors, [{"step": "fixpermissions", "stdout": "", "stderr": "denied"}])
+        ssh.exec_command.assert_called_once_with(self.sched.FIX_CMD, timeout=self.sched.WAIT_TIMEOUT)
+        self.assertEqual(self.sched.ssh_host_key(ssh), ("10.0.0.5", "root"))
+
+    def test_form_and_session_keys_match(self):
+        ssh = MagicMock()
+        ssh.get_transport.return_value.getpeername.return_value = ("::ffff:127.0.0.1", 22, 0, 0)
+        ssh.get_transport.return_value.get_username.return_value = "root"
+        resolved = [(2, 1, 6, "", ("127.0.0.1", 22))]
+        with patch.object(self.sched.socket, "getaddrinfo", return_value=resolved):
+            self.assertEqual(self.sched.host_key(" EVE-Lab ", "root"), ("127.0.0.1", "root"))
+            self.assertEqual(self.sched.ssh_host_key(ssh), self.sched.host_key("eve-lab", "root"))
+        self.assertEqual(self.sched.host_key("nao-resolve.invalid", "root"), ("nao-resolve.invalid", "root"))
+
+
+class TestTargetedFix(unittest.TestCase):
+    def setUp(self):
+        self.sched = _import("fix_scheduler")
+        patch.object(self.sched, "MODE", "targeted").start()
+        self.addCleanup(patch.stopall)
+
+    def _ssh(self, rc=0):
+        ssh = MagicMock()
+        stdout = MagicMock()
+        stdout.channel.recv_exit_status.return_value = rc
+        stdout.read.return_value = b""
+        stderr = MagicMock()
+        stderr.read.return_value = b"" if rc == 0 else b"chown: not permitted"
+        ssh.exec_command.return_value = (None, stdout, stderr)
+        ssh.get_transport.return_value.getpeername.return_value = ("10.0.1.1", 22)
+        ssh.get_transport.return_value.get_username.return_value = "root"
+        return ssh
+
+    def test_only_template_dirs_under_known_bases_are_targeted(self):
+        cmd = self.sched.targeted_cmd(["/opt/unetlab/addons/qemu/vios-15"])
+        self.assertIn("chown -R root:root /opt/unetlab/addons/qemu/vios-15", cmd)
+        self.assertIn("-type f -exec chmod 644", cmd)
+        self.assertIn("-type f -exec chmod 755", self.sched.targeted_cmd(["/opt/unetlab/addons/iol/bin/l2"]))
+        for path in ("/opt/unetlab/addons/qemu", "/opt/unetlab/addons/qemu/../../etc", "/srv/images/x", ""):
+            self.assertIsNone(self.sched.targeted_cmd([path]), path)
+        self.assertIsNone(self.sched.targeted_cmd(["/opt/unetlab/addons/qemu/a", "/tmp/b"]))
+
+    def test_targeted_commands_per_image_type(self):
+        expected = {
+            "/opt/unetlab/addons/qemu/vios-15": ("root:root", "755", "644"),
+            "/opt/unetlab/addons/iol/bin/l2-adv": ("root:root", "755", "755"),
+            "/opt/unetlab/addons/dynamips/c7200": ("root:root", "755", "644"),
+        }
+        for path, (owner, dir_mode, file_mode) in expected.items():
+            self.assertEqual(
+                self.sched.targeted_cmd([path]),
+                f"chown -R {owner} {path} && "
+                f"find {path} -type d -exec chmod {dir_mode} {{}} + && "
+                f"find {path} -type f -exec chmod {file_mode} {{}} +",
+            )
+
+    def test_global_wrapper_is_the_default_mode(self):
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("FIXPERMISSIONS_MODE", None)
+            fresh = importlib.util.module_from_spec(importlib.util.find_spec("fix_scheduler"))
+            fresh.__spec__.loader.exec_module(fresh)
+        self.assertEqual(fresh.MODE, "global")
+
+    def test_targeted_skips_the_global_wrapper(self):
+        ssh = self._ssh()
+        errors = []
+        self.assertTrue(self.sched.fix_with_ssh(ssh, errors, ["/opt/unetlab/addons/dynamips/c7200"]))
+        self.assertEqual(errors, [])
+        ssh.exec_command.assert_called_once()
+        self.assertNotIn("unl_wrapper", ssh.exec_command.call_args[0][0])
+
+    def test_failure_or_global_mode_uses_the_wrapper(self):
+        patch.object(self.sched, "WINDOW", 0).start()
+        ssh = self._ssh(rc=1)
+        self.sched.fix_with_ssh(ssh, [], ["/opt/unetlab/addons/qemu/a"])
+        self.assertEqual(ssh.exec_command.call_args_list[-1][0][0], self.sched.FIX_CMD)
+        self.assertEqual(ssh.exec_command.call_count, 2)
+
+        with patch.object(self.sched, "MODE", "global"):
+            ssh = self._ssh()
+            self.assertTrue(self.sched.fix_with_ssh(ssh, [], ["/opt/unetlab/addons/qemu/a"]))
+            ssh.exec_command.assert_called_once_with(self.sched.FIX_CMD, timeout=self.sched.WAIT_TIMEOUT)
+
+    def test_targeted_command_applies_modes(self):
+        with tempfile.TemporaryDirectory() as base:
+            owner = f"{pwd.getpwuid(os.getuid()).pw_name}:{grp.getgrgid(os.getgid()).gr_name}"
+            rules = ((base, owner, "755", "644"),)
+            template = os.path.join(base, "vios")
+            os.makedirs(os.path.join(template, "sub"))
+            image = os.path.join(template, "sub", "hda.qcow2")
+            open(image, "w").close()
+            os.chmod(image, 0o600)
+            os.chmod(os.path.join(template, "sub"), 0o700)
+            with patch.object(self.sched, "TARGET_RULES", rules):
+                cmd = self.sched.targeted_cmd([template])
+            subprocess.run(["bash", "-c", cmd], check=True)
+            self.assertEqual(stat.S_IMODE(os.stat(image).st_mode), 0o644)
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(template, "sub")).st_mode), 0o755)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import_fleet():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import fleet_routes  # noqa: E402
+
+    return fleet_routes
+
+
+def _hosts(*ips):
+    return [{"eve_ip": ip, "eve_user": "root", "eve_pass": "x", "name": ip} for ip in ips]
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        self.fleet = _import_fleet()
+
+    def _fan_out(self, fn, hosts, **kwargs):
+        with patch.dict(self.fleet.QUERIES, {"fake": fn}):
+            return list(self.fleet.fan_out("fake", hosts, **kwargs))
+
+    def test_results_stream_in_completion_order_with_errors_isolated(self):
+        delays = {"10.0.0.1": 0.2, "10.0.0.2": 0.0, "10.0.0.3": 0.05}
+
+        def fake(ip, user, pw):
+            time.sleep(delays[ip])
+            if ip == "10.0.0.3":
+                raise self.fleet.FleetError("containerlab não encontrado")
+            return {"ip": ip}
+
+        items = self._fan_out(fake, _hosts(*delays), workers=3)
+        self.assertEqual([i.get("host") for i in items[:-1]], ["10.0.0.2", "10.0.0.3", "10.0.0.1"])
+        self.assertEqual(items[1]["error"], "containerlab não encontrado")
+        self.assertFalse(items[1]["ok"])
+        self.assertEqual(items[2]["data"], {"ip": "10.0.0.1"})
+        self.assertTrue(all("elapsed_ms" in i for i in items))
+        summary = items[-1]
+        self.assertTrue(summary["done"])
+        self.assertEqual((summary["total"], summary["ok"], summary["failed"]), (3, 2, 1))
+
+    def test_pool_is_bounded(self):
+        lock = threading.Lock()
+        peak = {"now": 0, "max": 0}
+
+        def fake(ip, user, pw):
+            with lock:
+                peak["now"] += 1
+                peak["max"] = max(peak["max"], peak["now"])
+            time.sleep(0.02)
+            with lock:
+                peak["now"] -= 1
+            return {}
+
+        items = self._fan_out(fake, _hosts(*(f"10.0.0.{i}" for i in range(10))), workers=3)
+        self.assertEqual(items[-1]["ok"], 10)
+        self.assertEqual(peak["max"], 3)
+
+    def test_dead_host_does_not_stall_others(self):
+        release = threading.Event()
+
+        def fake(ip, user, pw):
+            if ip == "dead":
+                release.wait(5)
+            return {}
+
+        started = time.monotonic()
+        try:
+            items = self._fan_out(fake, _hosts("ok1", "dead", "ok2"), timeout=0.3, workers=3)
+        finally:
+            release.set()
+        self.assertLess(time.monotonic() - started, 2)
+        by_host = {i["host"]: i for i in items[:-1]}
+        self.assertTrue(by_host["ok1"]["ok"])
+        self.assertTrue(by_host["ok2"]["ok"])
+        self.assertEqual(by_host["dead"]["error"], "timeout")
+        self.assertEqual(items[-1]["failed"], 1)
+
+    def test_parse_hosts(self):
+        hosts = self.fleet.parse_hosts(
+            '[{"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x"},'
+            ' {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x"}]'
+        )
+        self.assertEqual(len(hosts), 1)
+        self.assertEqual(hosts[0]["name"], "10.0.0.1")
+        self.assertIsNone(self.fleet.parse_hosts([{"eve_ip": "10.0.0.1"}]))
+        self.assertIsNone(self.fleet.parse_hosts([]))
+        self.assertIsNone(self.fleet.parse_hosts("não é json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
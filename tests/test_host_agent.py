@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import_agent():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import host_agent  # noqa: E402
+
+    return host_agent
+
+
+def _framed(doc):
+    return "banner\n__NCF_AGENT__ " + json.dumps(doc) + "\n"
+
+
+class TestHostAgent(unittest.TestCase):
+    def setUp(self):
+        self.agent = _import_agent()
+        self.agent._UNSUPPORTED.clear()
+
+    def test_parse_takes_framed_line(self):
+        self.assertEqual(self.agent._parse(_framed({"labs": ["a"]})), {"labs": ["a"]})
+        self.assertIsNone(self.agent._parse("sem frame"))
+        self.assertIsNone(self.agent._parse("__NCF_AGENT__ {quebrado"))
+
+    def test_launch_cmd_quotes_arguments(self):
+        cmd = self.agent._launch_cmd("read-file", ["/opt/labs/a b/x'; rm -rf /.yml"])
+        self.assertIn(self.agent.AGENT_PATH, cmd)
+        self.assertIn("'/opt/labs/a b/x'\"'\"'; rm -rf /.yml'", cmd)
+
+    def test_installs_on_missing_agent_and_retries(self):
+        calls = []
+
+        def fake_run(ip, user, pw, cmd, timeout=None):
+            calls.append(cmd)
+            if len(calls) == 1:
+                return self.agent._RC_MISSING, "", ""
+            if len(calls) == 2:
+                return 0, "", ""
+            return 0, _framed({"exists": True, "labs": ["lab1"]}), ""
+
+        with patch.object(self.agent, "run_ssh_command", side_effect=fake_run):
+            doc = self.agent.run_agent("h", "u", "p", "list-labs", "/opt/containerlab/labs")
+        self.assertEqual(doc["labs"], ["lab1"])
+        self.assertEqual(len(calls), 3)
+        self.assertIn("base64 -d", calls[1])
+
+    def test_host_without_python_is_remembered(self):
+        with patch.object(self.agent, "run_ssh_command", return_value=(self.agent._RC_NO_PYTHON, "", "")) as run:
+            self.assertIsNone(self.agent.run_agent("h", "u", "p", "list-labs", "/x"))
+            self.assertIsNone(self.agent.run_agent("h", "u", "p", "list-labs", "/x"))
+        self.assertEqual(run.call_count, 1)
+
+    def test_launcher_refuses_tampered_or_loose_agent(self):
+        with tempfile.TemporaryDirectory() as home:
+            env = {"HOME": home, "PATH": os.environ.get("PATH", "")}
+            sh = lambda cmd: subprocess.run(["bash", "-c", cmd], env=env, capture_output=True, text=True, timeout=30)
+            labs = Path(home) / "labs"
+            labs.mkdir()
+            launch = self.agent._launch_cmd("list-labs", [str(labs)])
+            self.assertEqual(sh(launch).returncode, self.agent._RC_MISSING)
+
+            self.assertEqual(sh(self.agent._install_cmd()).returncode, 0)
+            ok = sh(launch)
+            self.assertEqual(ok.returncode, 0, ok.stderr)
+            self.assertEqual(self.agent._parse(ok.stdout), {"exists": True, "labs": []})
+
+            agent = next((Path(home) / ".cache" / "ncf-agent").glob("agent-*.py"))
+            os.chmod(agent, 0o644)
+            self.assertEqual(sh(launch).returncode, self.agent._RC_MISSING)
+            os.chmod(agent, 0o600)
+            with open(agent, "a", encoding="utf-8") as fh:
+                fh.write("import os; os.system('id')\n")
+            self.assertEqual(sh(launch).returncode, self.agent._RC_MISSING)
+
+    def test_agent_source_runs_locally(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            script = Path(tmp) / "agent.py"
+            script.write_text(self.agent.AGENT_SOURCE, encoding="utf-8")
+            lab = Path(tmp) / "labs" / "lab1"
+            lab.mkdir(parents=True)
+            (lab / "lab1.clab.yml").write_text("name: lab1\n", encoding="utf-8")
+            (Path(tmp) / "labs" / "vazio").mkdir()
+            proc = subprocess.run(
+                [sys.executable, str(script), "list-labs", str(Path(tmp) / "labs")],
+                capture_output=True,
+                text=True,
+                timeout=30,
+            )
+        doc = self.agent._parse(proc.stdout)
+        self.assertEqual(doc, {"exists": True, "labs": ["lab1"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import_profile():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import host_profile  # noqa: E402
+
+    return host_profile
+
+
+_OUT = (
+    "Welcome banner\n"
+    "RUNTIME=docker\n"
+    "CLAB_PATH=/usr/bin/containerlab\n"
+    "CLAB_VERSION=0.54.2\n"
+    "DIR:qemu=0\nDIR:iol=0\nDIR:dynamips=0\nDIR:containerlab_labs=1\nDIR:vrnetlab=1\n"
+    "---NCF-PLATFORM---\n"
+    "---BIN:containerlab---\n/usr/bin/containerlab\n"
+)
+
+
+class TestHostProfile(unittest.TestCase):
+    def setUp(self):
+        self.hp = _import_profile()
+        self.hp._PROFILES.clear()
+        self.hp._FAILURES.clear()
+
+    def test_parse_profile(self):
+        profile = self.hp._parse_profile(_OUT)
+        self.assertEqual(profile["runtime"], "docker")
+        self.assertEqual(profile["containerlab"], {"path": "/usr/bin/containerlab", "version": "0.54.2"})
+        self.assertTrue(profile["vrnetlab_present"])
+        self.assertTrue(profile["dirs"]["containerlab_labs"]["present"])
+        self.assertFalse(profile["dirs"]["qemu"]["present"])
+        self.assertEqual(profile["platform"]["name"], "containerlab")
+        self.assertIsNone(self.hp._parse_profile("sem marcador"))
+
+    def test_profile_is_cached_until_refresh(self):
+        with patch.object(self.hp, "run_ssh_command", return_value=(0, _OUT, "")) as run:
+            self.assertEqual(self.hp.runtime_for("10.0.0.1", "root", "pw"), "docker")
+            self.assertEqual(self.hp.runtime_for("10.0.0.1", "root", "pw"), "docker")
+            self.assertEqual(run.call_count, 1)
+            self.hp.get_profile("10.0.0.1", "root", "pw", refresh=True)
+            self.assertEqual(run.call_count, 2)
+
+    def test_profile_expires_after_ttl(self):
+        with patch.object(self.hp, "run_ssh_command", return_value=(0, _OUT, "")) as run:
+            self.hp.get_profile("h", "u", "p")
+            with patch.object(self.hp, "PROFILE_TTL", 0):
+                self.assertIsNone(self.hp.cached_profile("h", "u", "p"))
+                self.hp.get_profile("h", "u", "p")
+        self.assertEqual(run.call_count, 2)
+
+    def test_failed_detection_keeps_shell_fallback(self):
+        with patch.object(self.hp, "run_ssh_command", return_value=(255, "", "Connection refused")) as run:
+            self.assertIsNone(self.hp.runtime_for("h", "u", "p"))
+            self.assertIsNone(self.hp.runtime_for("h", "u", "p"))
+            self.assertEqual(run.call_count, 1)
+            with patch.object(self.hp, "FAILURE_TTL", 0):
+                self.assertIsNone(self.hp.runtime_for("h", "u", "p"))
+            self.assertEqual(run.call_count, 2)
+        self.assertIsNone(self.hp.cached_profile("h", "u", "p"))
+
+    def test_profile_is_not_shared_across_passwords(self):
+        with patch.object(self.hp, "run_ssh_command", return_value=(0, _OUT, "")) as run:
+            self.hp.get_profile("h", "u", "p")
+            self.assertIsNone(self.hp.cached_profile("h", "u", "errada"))
+            self.hp.get_profile("h", "u", "errada")
+        self.assertEqual(run.call_count, 2)
+        self.hp.invalidate("h", "u")
+        self.assertEqual(self.hp._PROFILES, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import sys
+import tarfile
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+class _Stdin(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.channel = MagicMock()
+
+    def close(self):  # o tar não deve fechar o canal
+        pass
+
+
+class _Stdout:
+    """`tar -xv` falso: lista os membros recebidos no stdin."""
+
+    def __init__(self, stdin, skip=()):
+        self.stdin = stdin
+        self.skip = set(skip)
+        self.channel = MagicMock()
+        self.channel.recv_exit_status.return_value = 0
+
+    def read(self):
+        with tarfile.open(fileobj=io.BytesIO(self.stdin.getvalue()), mode="r|") as tar:
+            self.members = {m.name: tar.extractfile(m).read() for m in tar}
+        return "".join(f"{n}\n" for n in self.members if n not in self.skip).encode()
+
+
+class TestIconBatchUpload(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("icons_routes")
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.icons_bp)
+        self.client = app.test_client()
+        self.client_ssh = MagicMock()
+        self.sftp = MagicMock()
+        self.commands = []
+
+        def exec_command(cmd):
+            self.commands.append(cmd)
+            self.stdin = _Stdin()
+            self.stdout = _Stdout(self.stdin, self.skip)
+            return self.stdin, self.stdout, io.BytesIO(b"")
+
+        self.skip = ()
+        self.client_ssh.exec_command.side_effect = exec_command
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            yield self.client_ssh, self.sftp
+
+        p = patch.object(self.routes, "sftp_session", fake_session)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _post(self, files, **extra):
+        data = {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x", **extra}
+        data["icons"] = [(io.BytesIO(content), name) for name, content in files]
+        return self.client.post("/icons/upload", data=data, content_type="multipart/form-data")
+
+    def test_icons_go_in_one_tar_with_per_file_results(self):
+        icons = [(f"router{i}.png", PNG + bytes([i])) for i in range(30)]
+        resp = self._post(icons + [("bad.jpg", PNG), ("fake.png", b"GIF89a")])
+        data = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(self.commands), 1)
+        self.assertIn("tar -C '/opt/unetlab/html/images/icons' -xvf -", self.commands[0])
+        self.assertEqual(self.stdout.members["router7.png"], PNG + bytes([7]))
+        self.assertEqual(len(data["uploaded"]), 30)
+        self.sftp.putfo.assert_not_called()
+        self.assertEqual({e["filename"] for e in data["errors"]}, {"bad.jpg", "fake.png"})
+
+    def test_files_missing_from_extract_fall_back_to_sftp(self):
+        self.skip = ("b.png",)
+        resp = self._post([("a.png", PNG), ("b.png", PNG)])
+        self.assertEqual(sorted(resp.get_json()["uploaded"]), ["a.png", "b.png"])
+        self.assertEqual(self.sftp.putfo.call_count, 1)
+        self.assertEqual(self.sftp.putfo.call_args[0][1], "/opt/unetlab/html/images/icons/b.png")
+
+    def test_single_icon_uses_sftp(self):
+        resp = self._post([("a.png", PNG)])
+        self.assertTrue(resp.get_json()["success"])
+        self.assertEqual(self.commands, [])
+        self.sftp.putfo.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
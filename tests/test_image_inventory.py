@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class TestImageInventory(unittest.TestCase):
+    """O "host" é um diretório local; os comandos rodam num bash de verdade."""
+
+    def setUp(self):
+        self.inv = _import("image_inventory")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.base_dirs = {
+            "qemu": os.path.join(tmp.name, "qemu"),
+            "dynamips": os.path.join(tmp.name, "dynamips"),
+        }
+        os.makedirs(self.base_dirs["qemu"])
+        self.commands = []
+
+        def fake_ssh(ip, user, pw, cmd, timeout=None, priority=None):
+            self.commands.append(cmd)
+            if pw != "x":
+                return 5, "", "Permission denied, please try again."
+            proc = subprocess.run(["bash", "-c", cmd], capture_output=True, text=True)
+            return proc.returncode, proc.stdout, proc.stderr
+
+        patch.object(self.inv, "DB_PATH", os.path.join(tmp.name, "inv.sqlite3")).start()
+        patch.object(self.inv, "run_ssh_command", fake_ssh).start()
+        patch.object(sys.modules["upload_dedupe"], "MANIFEST_DIR", os.path.join(tmp.name, "manifests")).start()
+        self.addCleanup(patch.stopall)
+
+    def _image(self, name, files):
+        path = os.path.join(self.base_dirs["qemu"], name)
+        os.makedirs(path, exist_ok=True)
+        for fname, data in files.items():
+            with open(os.path.join(path, fname), "wb") as fh:
+                fh.write(data)
+        return path
+
+    def _refresh(self, **kw):
+        return self.inv.refresh("10.0.0.1", "root", "x", self.base_dirs, max_age=0, **kw)
+
+    def test_only_changed_dirs_are_rescanned(self):
+        self._image("vios-15", {"virtioa.qcow2": b"a" * 100})
+        self._image("csr-17", {"virtioa.qcow2": b"b" * 300, "notes.txt": b"x"})
+        first = self._refresh()
+        self.assertEqual((first["dirs_total"], first["dirs_scanned"]), (2, 2))
+
+        result = self.inv.query("10.0.0.1", "root", sort="size", order="desc")
+        self.assertEqual(result["total"], 2)
+        self.assertEqual([(i["name"], i["size"], i["files"]) for i in result["items"]],
+                         [("csr-17", 301, 2), ("vios-15", 100, 1)])
+
+        self.commands.clear()
+        unchanged = self._refresh()
+        self.assertEqual(unchanged["dirs_scanned"], 0)
+        self.assertEqual(len(self.commands), 1)  # só a listagem
+
+        path = self._image("asav-9", {"virtioa.qcow2": b"c" * 50})
+        os.utime(path, (1, 1))
+        os.rename(os.path.join(self.base_dirs["qemu"], "vios-15"), os.path.join(self.base_dirs["qemu"], "x"))
+        again = self._refresh()
+        self.assertEqual((again["dirs_scanned"], again["dirs_removed"]), (2, 1))
+        self.assertNotIn("'./csr-17'", self.commands[-1])
+        self.assertEqual(self.inv.query("10.0.0.1", "root", search="asa")["items"][0]["mtime"], 1.0)
+
+    def test_filter_and_pagination(self):
+        for i in range(5):
+            self._image(f"img-{i}", {"a.qcow2": b"z" * (i + 1)})
+        self._refresh()
+        page = self.inv.query("10.0.0.1", "root", search="img", sort="name", page=2, per_page=2)
+        self.assertEqual(page["total"], 5)
+        self.assertEqual([i["name"] for i in page["items"]], ["img-2", "img-3"])
+        self.assertEqual(self.inv.query("10.0.0.1", "root", kinds=["dynamips"])["total"], 0)
+        self.assertEqual(self.inv.query("10.0.0.1", "root", search="%")["total"], 0)
+
+    def test_checksums_are_kept_until_file_changes(self):
+        path = self._image("vios", {"a.qcow2": b"hello"})
+        self._refresh()
+        key = (self.inv._host_key("10.0.0.1", "root"), "qemu", "vios")
+        job = {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x", "base_dir": self.base_dirs["qemu"]}
+        self.assertEqual(self.inv.hash_dir(key, job), 1)
+        self.assertIn("nice -n 19 sha256sum", self.commands[-1])
+        item = self.inv.query("10.0.0.1", "root", with_files=True)["items"][0]
+        self.assertEqual(item["checksums"], "complete")
+        self.assertEqual(item["file_list"][0]["sha256"],
+                         "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824")
+        manifest = sys.modules["upload_dedupe"].load_manifest("10.0.0.1")
+        self.assertIn(os.path.join(path, "a.qcow2"), manifest)
+
+        # Arquivo novo no diretório: o hash do antigo é mantido.
+        self._image("vios", {"b.qcow2": b"new"})
+        os.utime(path, (5, 5))
+        self._refresh()
+        files = {f["path"]: f["sha256"] for f in self.inv.query("10.0.0.1", "root", with_files=True)["items"][0]["file_list"]}
+        self.assertIsNotNone(files["a.qcow2"])
+        self.assertIsNone(files["b.qcow2"])
+
+    def test_cached_listing_still_checks_the_password(self):
+        self._image("vios", {"a.qcow2": b"x"})
+        self._refresh()
+        self.commands.clear()
+        self.assertTrue(self.inv.refresh("10.0.0.1", "root", "x", self.base_dirs)["skipped"])
+        self.assertEqual(self.commands, ["true"])
+        with self.assertRaises(RuntimeError):
+            self.inv.refresh("10.0.0.1", "root", "errada", self.base_dirs)
+        self.assertEqual(self.inv.query("10.0.0.1", "admin")["total"], 0)
+
+    def test_checksum_queue_takes_latest_credentials(self):
+        self._image("vios", {"a.qcow2": b"x"})
+        self._refresh()
+        key = (self.inv._host_key("10.0.0.1", "root"), "qemu", "vios")
+        self.addCleanup(self.inv._HASH_QUEUE.clear)
+        with patch.object(self.inv, "_ensure_hash_thread"):
+            self.assertEqual(self.inv.schedule_checksums("10.0.0.1", "root", "errada", self.base_dirs), 1)
+            self.assertEqual(self.inv.schedule_checksums("10.0.0.1", "root", "x", self.base_dirs), 0)
+        self.assertEqual(self.inv._HASH_QUEUE[key]["eve_pass"], "x")
+        self.assertEqual(self.inv.pending_checksums("10.0.0.1", "root"), 1)
+
+    def test_inventory_route(self):
+        routes = _import("image_routes")
+        self._image("vios", {"a.qcow2": b"x"})
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(routes.images_bp)
+        with patch.object(routes, "BASE_DIRS", self.base_dirs):
+            client = app.test_client()
+            resp = client.post("/images/inventory", data={
+                "eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x", "kind": "qemu", "refresh": "1",
+            })
+            data = resp.get_json()
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(data["items"][0]["name"], "vios")
+            self.assertEqual(data["scan"]["dirs_scanned"], 1)
+            bad = client.post("/images/inventory", data={
+                "eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x", "kind": "nope",
+            })
+            self.assertEqual(bad.status_code, 400)
+            denied = client.post("/images/inventory", data={
+                "eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "errada", "kind": "qemu",
+            })
+            self.assertEqual(denied.status_code, 500)
+            self.assertNotIn("items", denied.get_json())
+
+
+if __name__ == "__main__":
+    unittest.main()
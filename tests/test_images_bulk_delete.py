@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class TestBulkDelete(unittest.TestCase):
+    """O script remoto roda num bash local, sobre diretórios temporários."""
+
+    def setUp(self):
+        self.routes = _import("image_routes")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.base_dirs = {kind: os.path.join(tmp.name, kind) for kind in ("qemu", "iol", "dynamips")}
+        for path in self.base_dirs.values():
+            os.makedirs(path)
+        self.sessions = []
+        self.timeouts = []
+
+        def fake_ssh(ip, user, pw, cmd, timeout=None, priority=None):
+            self.sessions.append(cmd)
+            self.timeouts.append(timeout)
+            proc = subprocess.run(["bash", "-c", cmd], capture_output=True, text=True)
+            return proc.returncode, proc.stdout, proc.stderr
+
+        patch.object(self.routes, "BASE_DIRS", self.base_dirs).start()
+        patch.object(self.routes, "run_ssh_command", fake_ssh).start()
+        patch.object(sys.modules["image_inventory"], "DB_PATH", os.path.join(tmp.name, "inv.sqlite3")).start()
+        self.addCleanup(patch.stopall)
+
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.images_bp)
+        self.client = app.test_client()
+
+    def _post(self, items, **extra):
+        data = {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x", "items": json.dumps(items), **extra}
+        return self.client.post("/images/delete/bulk", data=data)
+
+    def test_removes_all_in_one_session_with_per_item_status(self):
+        for name in ("vios", "csr"):
+            os.makedirs(os.path.join(self.base_dirs["qemu"], name))
+        open(os.path.join(self.base_dirs["iol"], "l2.bin"), "w").close()
+
+        resp = self._post([
+            {"type": "qemu", "name": "vios"},
+            ["qemu", "csr"],
+            {"type": "iol", "name": "l2.bin"},
+            {"type": "qemu", "name": "gone"},
+            {"type": "qemu", "name": "../etc"},
+            {"type": "docker", "name": "x"},
+        ])
+        data = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(self.sessions), 1)
+        self.assertNotIn("fixpermissions", self.sessions[0])
+        self.assertEqual([i["status"] for i in data["items"]],
+                         ["deleted", "deleted", "deleted", "not_found", "invalid", "invalid"])
+        self.assertEqual(data["deleted"], 3)
+        self.assertFalse(data["success"])
+        self.assertEqual(os.listdir(self.base_dirs["qemu"]), [])
+        self.assertEqual(os.listdir(self.base_dirs["iol"]), [])
+
+    def test_fixpermissions_runs_once_at_the_end(self):
+        for name in ("a", "b", "c"):
+            os.makedirs(os.path.join(self.base_dirs["dynamips"], name))
+        with patch.object(self.routes, "FIXPERMISSIONS_CMD", "echo fixing; exit 3"):
+            resp = self._post([["dynamips", n] for n in ("a", "b", "c")], fixpermissions="1")
+        data = resp.get_json()
+        self.assertTrue(data["success"])
+        self.assertEqual(len(self.sessions), 2)
+        self.assertNotIn("fixing", self.sessions[0])
+        self.assertEqual(self.sessions[1], "echo fixing; exit 3")
+        self.assertEqual(self.timeouts, [self.routes.BULK_DELETE_TIMEOUT, self.routes.fix_scheduler.WAIT_TIMEOUT])
+        self.assertEqual(data["warnings"][0]["rc"], 3)
+        self.assertEqual(data["warnings"][0]["stdout"], "fixing")
+        self.assertEqual(data["fixpermissions_merged"], 1)
+
+    def test_fixpermissions_skipped_when_nothing_was_deleted(self):
+        resp = self._post([["dynamips", "gone"]], fixpermissions="1")
+        self.assertEqual(resp.get_json()["items"][0]["status"], "not_found")
+        self.assertEqual(len(self.sessions), 1)
+
+    def test_rejects_bad_payload(self):
+        self.assertEqual(self._post({"type": "qemu"}).status_code, 400)
+        self.assertEqual(self._post([]).status_code, 400)
+        with patch.object(self.routes, "BULK_DELETE_MAX", 1):
+            self.assertEqual(self._post([["qemu", "a"], ["qemu", "b"]]).status_code, 400)
+        self.assertEqual(self.sessions, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
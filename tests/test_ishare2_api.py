@@ -1,6 +1,9 @@
 import importlib.util
 import io
+import os
 import sys
+import tempfile
+import threading
 import types
 import unittest
 from pathlib import Path
@@ -845,5 +848,35 @@ class TestIshare2Api(unittest.TestCase):
         self.assertEqual(kwargs["latency_ms"], {})
 
 
+
+class TestCompressedCopy(unittest.TestCase):
+    def test_chatty_remote_stderr_does_not_stall_and_progress_counts_raw_bytes(self):
+        ishare2_api = _import_ishare2_api()
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as dst:
+            with open(os.path.join(src, "disk.img"), "wb") as f:
+                f.write(b"\0" * (4 * 1024 * 1024))  # comprime muito: razão >> 3
+            # "ssh" local que despeja 300 KiB no stderr antes de ler o stdin.
+            base_ssh = ["sh", "-c", 'head -c 307200 /dev/zero | tr "\\0" w >&2; eval "$2"', "sh"]
+            progress = []
+            result = {}
+            worker = threading.Thread(
+                target=lambda: result.update(
+                    r=ishare2_api._compressed_copy(src, dst, base_ssh, "eve", "gzip", on_progress=progress.append)
+                ),
+                daemon=True,
+            )
+            worker.start()
+            worker.join(60)
+            self.assertFalse(worker.is_alive(), "cópia comprimida travou")
+
+            ok, stats, err = result["r"]
+            self.assertTrue(ok, err)
+            with open(os.path.join(dst, "disk.img"), "rb") as f:
+                self.assertEqual(len(f.read()), 4 * 1024 * 1024)
+            self.assertGreater(stats["ratio"], 3)
+            self.assertGreaterEqual(max(progress), 90)
+            self.assertIn("www", err)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,96 @@
+import sys
+import time
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import_sampler():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import resource_sampler  # noqa: E402
+
+    return resource_sampler
+
+
+def _sample_out(busy, idle):
+    return (
+        f"STAT={busy} 0 0 {idle} 0 0 0 0\n"
+        "MEM=2000 500 1500\n"
+        "DISK=1000 250 750 25\n"
+    )
+
+
+class TestResourceSampler(unittest.TestCase):
+    def setUp(self):
+        self.rs = _import_sampler()
+        self.rs._HOSTS.clear()
+
+    def test_ring_wraps_and_keeps_order(self):
+        ring = self.rs._Ring(size=3)
+        for t in range(5):
+            ring.append({"t": t, "cpu_percent": t * 10})
+        series = ring.series()
+        self.assertEqual([p["t"] for p in series], [2, 3, 4])
+        self.assertEqual(ring.latest()["cpu_percent"], 40)
+        self.assertIsNone(ring.latest()["mem_total_mb"])
+
+    def test_series_downsamples_by_bucket_average(self):
+        ring = self.rs._Ring(size=10)
+        for t in range(8):
+            ring.append({"t": t, "cpu_percent": t})
+        points = ring.series(max_points=4)
+        self.assertEqual(len(points), 4)
+        self.assertEqual([p["cpu_percent"] for p in points], [0.5, 2.5, 4.5, 6.5])
+        self.assertEqual([p["t"] for p in points], [1, 3, 5, 7])
+
+    def test_cpu_comes_from_consecutive_samples(self):
+        host = self.rs._Host("h", "u", "p")
+        self.assertTrue(self.rs._record(host, _sample_out(100, 900), time.time()))
+        self.assertIsNone(host.ring.latest()["cpu_percent"])
+        self.assertTrue(self.rs._record(host, _sample_out(130, 970), time.time()))
+        sample = host.ring.latest()
+        self.assertEqual(sample["cpu_percent"], 30)
+        self.assertEqual(sample["mem_percent"], 25)
+        self.assertEqual(sample["disk_percent"], 25)
+        self.assertFalse(self.rs._record(host, "lixo", time.time()))
+
+    def test_latest_requires_recent_full_sample(self):
+        self.rs._HOSTS[self.rs._key("h", "u", "p")] = host = self.rs._Host("h", "u", "p")
+        self.rs._record(host, _sample_out(100, 900), time.time())
+        self.assertIsNone(self.rs.latest("h", "u", "p"))
+        self.rs._record(host, _sample_out(150, 950), time.time())
+        latest = self.rs.latest("h", "u", "p")
+        self.assertEqual(latest["cpu_percent"], 50)
+        self.assertEqual(latest["source"], "sampler")
+        self.assertIsNone(self.rs.latest("h", "u", "p", max_age=-1))
+
+    def test_wrong_password_neither_replaces_nor_reads(self):
+        with patch.object(self.rs, "_ensure_thread"):
+            self.rs.register("h", "u", "p")
+            host = self.rs._HOSTS[self.rs._key("h", "u", "p")]
+            self.rs._record(host, _sample_out(100, 900), time.time())
+            self.rs._record(host, _sample_out(150, 950), time.time())
+            self.rs.register("h", "u", "errada")
+        self.assertEqual(host.eve_pass, "p")
+        self.assertEqual(len(self.rs._HOSTS), 2)
+        self.assertIsNone(self.rs.latest("h", "u", "errada"))
+        self.assertEqual(self.rs.history("h", "u", "errada")["points"], [])
+        self.assertEqual(self.rs.latest("h", "u", "p")["cpu_percent"], 50)
+
+    def test_failed_sample_backs_off(self):
+        host = self.rs._Host("h", "u", "p")
+        host.inflight = True
+        fut = Future()
+        fut.set_result((255, "", "Connection refused", False))
+        self.rs._on_done(host, fut)
+        self.assertFalse(host.inflight)
+        self.assertEqual(host.failures, 1)
+        self.assertEqual(host.last_error, "Connection refused")
+        self.assertGreater(host.next_due, time.monotonic() + self.rs.SAMPLE_INTERVAL)
+
+
+if __name__ == "__main__":
+    unittest.main()
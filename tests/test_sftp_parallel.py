@@ -0,0 +1,170 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import_parallel():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import sftp_parallel  # noqa: E402
+
+    return sftp_parallel
+
+
+class _SlowFile:
+    def __init__(self, sftp, path, mode):
+        self.sftp = sftp
+        self.fh = open(path, mode)
+
+    def set_pipelined(self, flag):
+        pass
+
+    def write(self, data):
+        if self.sftp.fail_on and self.sftp.fail_on in self.fh.name:
+            raise IOError("disco cheio")
+        with self.sftp.lock:
+            self.sftp.active += 1
+            self.sftp.peak = max(self.sftp.peak, self.sftp.active)
+        time.sleep(self.sftp.delay)
+        self.fh.write(data)
+        with self.sftp.lock:
+            self.sftp.active -= 1
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+
+class _LocalSftp:
+    """SFTP falso compartilhado pelos canais, com latência por write."""
+
+    def __init__(self, root, delay=0.01):
+        self.root = root
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.fail_on = None
+
+    def open(self, path, mode):
+        return _SlowFile(self, os.path.join(self.root, path.lstrip("/")), mode)
+
+    def remove(self, path):
+        os.remove(os.path.join(self.root, path.lstrip("/")))
+
+    def truncate(self, path, size):
+        os.truncate(os.path.join(self.root, path.lstrip("/")), size)
+
+
+class TestParallelUpload(unittest.TestCase):
+    def setUp(self):
+        self.sp = _import_parallel()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.sftp = _LocalSftp(self.root)
+        self.sessions = 0
+
+        @contextmanager
+        def factory(ip, user, pw):
+            self.sessions += 1
+            yield None, self.sftp
+
+        self.factory = factory
+        p = patch.object(self.sp, "BLOCK_SIZE", 64 * 1024)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _read(self, name):
+        with open(os.path.join(self.root, name), "rb") as fh:
+            return fh.read()
+
+    def test_ranged_writes_rebuild_files_across_channels(self):
+        big = os.urandom(64 * 1024 * 10 + 123)
+        small = os.urandom(1000)
+        src = os.path.join(self.root, "src.bin")
+        with open(src, "wb") as fh:
+            fh.write(big)
+        with self.sp.ParallelUpload("h", "u", "p", channels=4, min_channels=4, session_factory=self.factory) as up:
+            t1 = up.put_file(src, "/big.qcow2")
+            t2 = up.open("/small.qcow2")
+            for i in range(0, len(small), 100):
+                up.feed(t2, small[i:i + 100])
+            up.finish(t2)
+            stats = up.close()
+        self.assertEqual(self._read("big.qcow2"), big)
+        self.assertEqual(self._read("small.qcow2"), small)
+        self.assertIsNone(t1.error)
+        self.assertEqual(t1.written, len(big))
+        self.assertEqual(stats["bytes"], len(big) + len(small))
+        self.assertEqual(stats["channels"], 4)
+        self.assertGreater(self.sftp.peak, 1)
+        self.assertEqual(self.sessions, 5)  # controle + 4 canais
+
+    def test_error_isolated_per_file(self):
+        self.sftp.fail_on = "bad"
+        with self.sp.ParallelUpload("h", "u", "p", channels=2, min_channels=2, session_factory=self.factory) as up:
+            bad = up.open("/bad.qcow2")
+            good = up.open("/good.qcow2")
+            up.feed(bad, b"x" * 200000)
+            up.feed(good, b"y" * 200000)
+            up.finish(bad)
+            up.finish(good)
+        self.assertEqual(bad.error, "disco cheio")
+        self.assertIsNone(good.error)
+        self.assertEqual(self._read("good.qcow2"), b"y" * 200000)
+
+    def test_data_extents_skip_zero_blocks(self):
+        data = b"a" * 10 + bytes(64 * 1024 * 2) + b"b" * 5
+        extents = self.sp.data_extents(data, 64 * 1024)
+        self.assertEqual([(o, len(d)) for o, d in extents], [(0, 64 * 1024), (2 * 64 * 1024, 15)])
+        self.assertEqual(self.sp.data_extents(bytes(1000), 64 * 1024), [])
+
+    def test_zero_regions_are_not_sent(self):
+        block = self.sp.SPARSE_BLOCK
+        streamed = os.urandom(block) + bytes(block * 6) + os.urandom(100) + bytes(block * 3)
+        src = os.path.join(self.root, "src.img")
+        with open(src, "wb") as fh:
+            fh.write(b"x" * 1000)
+            fh.seek(block * 20)  # buraco de verdade no arquivo local
+            fh.write(b"y" * 1000)
+            fh.truncate(block * 30)
+        with self.sp.ParallelUpload("h", "u", "p", channels=2, min_channels=2, session_factory=self.factory) as up:
+            t1 = up.open("/stream.img")
+            up.feed(t1, streamed)
+            up.finish(t1)
+            t2 = up.put_file(src, "/local.img")
+            stats = up.close()
+        self.assertEqual(self._read("stream.img"), streamed)
+        with open(src, "rb") as fh:
+            self.assertEqual(self._read("local.img"), fh.read())
+        self.assertEqual(t1.written, 2 * block)  # granularidade de bloco
+        self.assertLess(t2.written, block * 2)
+        self.assertEqual(stats["bytes"], t1.written + t2.written)
+        self.assertEqual(stats["sparse_bytes"], len(streamed) + block * 30 - stats["bytes"])
+
+    def test_adapts_channel_count_to_throughput(self):
+        up = self.sp.ParallelUpload("h", "u", "p", channels=4, min_channels=1, session_factory=self.factory)
+        with patch.object(self.sp, "_ADAPT_WINDOW", 0.0), up:
+            t = up.open("/a.qcow2")
+            # Primeira janela: abre um canal; vazão igual na segunda: para de crescer.
+            up._bytes = 100
+            up._adapt()
+            self.assertEqual(len(up._workers), 2)
+            up._win_start -= 1
+            up._bytes = 200
+            up._last_rate = 1e12
+            up._adapt()
+            self.assertEqual(len(up._workers), 2)
+            self.assertFalse(up._growing)
+            up.finish(t)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import_pool():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import sftp_pool  # noqa: E402
+
+    return sftp_pool
+
+
+def _fake_client(active=True):
+    client = MagicMock()
+    client.get_transport.return_value.is_active.return_value = active
+    sftp = MagicMock()
+    sftp.get_channel.return_value.closed = False
+    client.open_sftp.return_value = sftp
+    return client
+
+
+class TestSftpPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = _import_pool()
+        self.pool.close_all()
+        for key in self.pool._STATS:
+            self.pool._STATS[key] = 0
+        patcher = patch.object(self.pool, "_ensure_reaper")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_client_and_sftp_channel(self):
+        client = _fake_client()
+        with patch.object(self.pool, "_connect", return_value=client) as connect:
+            for _ in range(5):
+                with self.pool.sftp_session("10.0.0.1", "root", "pw") as (ssh, sftp):
+                    self.assertIs(ssh, client)
+        connect.assert_called_once()
+        client.open_sftp.assert_called_once()
+        stats = self.pool.pool_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 4)
+
+    def test_dead_transport_reconnects(self):
+        dead, fresh = _fake_client(active=True), _fake_client()
+        with patch.object(self.pool, "_connect", side_effect=[dead, fresh]):
+            with self.pool.ssh_session("h", "u", "p"):
+                pass
+            dead.get_transport.return_value.is_active.return_value = False
+            with self.pool.ssh_session("h", "u", "p") as ssh:
+                self.assertIs(ssh, fresh)
+        dead.close.assert_called_once()
+        self.assertEqual(self.pool.pool_stats()["health_failures"], 1)
+
+    def test_failed_operation_discards_sftp_channel(self):
+        client = _fake_client()
+        with patch.object(self.pool, "_connect", return_value=client):
+            with self.assertRaises(IOError):
+                with self.pool.sftp_session("h", "u", "p"):
+                    raise IOError("boom")
+        client.open_sftp.return_value.close.assert_called_once()
+        self.assertEqual(self.pool.pool_stats()["connections"][0]["idle_sftp"], 0)
+
+    def test_idle_clients_are_evicted(self):
+        client = _fake_client()
+        with patch.object(self.pool, "_connect", return_value=client):
+            with self.pool.ssh_session("h", "u", "p"):
+                pass
+        entry = next(iter(self.pool._ENTRIES.values()))
+        self.assertEqual(self.pool.evict_idle(now=entry.last_used + self.pool.IDLE_TTL + 1), 1)
+        client.close.assert_called_once()
+        self.assertEqual(self.pool.pool_stats()["connections"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import sys
+import time
+import unittest
+from pathlib import Path
+
+
+def _import_engine():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import ssh_engine  # noqa: E402
+
+    return ssh_engine
+
+
+class TestSshEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = _import_engine()
+
+    def test_run_returns_rc_and_separate_streams(self):
+        rc, out, err = self.engine.run(["sh", "-c", "echo out; echo err >&2; exit 3"], timeout=10)
+        self.assertEqual(rc, 3)
+        self.assertEqual(out, b"out\n")
+        self.assertEqual(err, b"err\n")
+
+    def test_run_timeout_kills_process(self):
+        started = time.monotonic()
+        rc, _out, _err = self.engine.run(["sleep", "5"], timeout=0.3)
+        self.assertEqual(rc, self.engine.RC_TIMEOUT)
+        self.assertLess(time.monotonic() - started, 4)
+
+    def test_capture_caps_bytes_and_keeps_draining(self):
+        cap = self.engine.capture(
+            ["sh", "-c", "head -c 300000 /dev/zero | tr '\\0' 'a'; echo done >&2"],
+            timeout=10,
+            max_bytes=1000,
+            encoding="utf-8",
+        )
+        self.assertEqual(cap.rc, 0)
+        self.assertEqual(cap.stdout, "a" * 1000)
+        self.assertEqual(cap.stderr, "done\n")
+        self.assertTrue(cap.truncated)
+
+    def test_capture_decodes_multibyte_across_chunks(self):
+        sink = self.engine._Sink(None, "utf-8")
+        data = "ação".encode("utf-8")
+        for i in range(len(data)):
+            sink.feed(data[i:i + 1])
+        self.assertEqual(sink.value(), "ação")
+
+    def test_stream_delivers_lines_including_stderr(self):
+        lines = []
+        rc = self.engine.stream(["sh", "-c", "echo a; echo b >&2; printf c"], lines.append, timeout=10)
+        self.assertEqual(rc, 0)
+        self.assertEqual(sorted(lines), ["a", "b", "c"])
+
+    def test_start_runs_many_jobs_concurrently(self):
+        started = time.monotonic()
+        done = []
+        futs = [
+            self.engine.start(["sh", "-c", "sleep 0.2; echo ok"], lambda _ln: None, done.append, timeout=10)
+            for _ in range(30)
+        ]
+        for fut in futs:
+            self.engine.wait(fut, timeout=10)
+        self.assertEqual(done, [0] * 30)
+        self.assertLess(time.monotonic() - started, 3)
+
+    def test_cancel_by_key(self):
+        lines, done = [], []
+        fut = self.engine.start(["sleep", "5"], lines.append, done.append, timeout=30, key="job-x")
+        time.sleep(0.2)
+        self.assertTrue(self.engine.cancel("job-x"))
+        self.assertEqual(self.engine.wait(fut, timeout=5), self.engine.RC_CANCELLED)
+        deadline = time.monotonic() + 5
+        while not done and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(done, [self.engine.RC_CANCELLED])
+        self.assertIn("[cancelado]", lines)
+        self.assertFalse(self.engine.cancel("job-x"))
+
+
+if __name__ == "__main__":
+    unittest.main()
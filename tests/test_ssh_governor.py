@@ -0,0 +1,99 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import_governor():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import ssh_governor  # noqa: E402
+
+    return ssh_governor
+
+
+class TestSshGovernor(unittest.TestCase):
+    def setUp(self):
+        self.gov = _import_governor()
+        self.gov._GATES.clear()
+
+    def _run(self, coro):
+        return asyncio.run(coro)
+
+    def test_limits_concurrency_per_host(self):
+        peak = {"now": 0, "max": 0}
+
+        async def worker(host):
+            async with self.gov.slot(host):
+                peak["now"] += 1
+                peak["max"] = max(peak["max"], peak["now"])
+                await asyncio.sleep(0.01)
+                peak["now"] -= 1
+
+        async def main():
+            await asyncio.gather(*(worker("h1") for _ in range(10)))
+
+        with patch.object(self.gov, "MAX_PER_HOST", 2), patch.object(self.gov, "BULK_MAX", 1):
+            self._run(main())
+        self.assertEqual(peak["max"], 2)
+        stats = self.gov.governor_stats()["hosts"][0]
+        self.assertEqual(stats["acquired"], 10)
+        self.assertEqual(stats["queued"], 0)
+        self.assertGreater(stats["max_queue_depth"], 0)
+
+    def test_interactive_jumps_ahead_of_bulk(self):
+        order = []
+
+        async def worker(name, priority):
+            async with self.gov.slot("h", priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            holder = asyncio.create_task(worker("first", self.gov.PRIORITY_INTERACTIVE))
+            await asyncio.sleep(0)
+            bulk = [asyncio.create_task(worker(f"bulk{i}", self.gov.PRIORITY_BULK)) for i in range(2)]
+            await asyncio.sleep(0)
+            read = asyncio.create_task(worker("read", self.gov.PRIORITY_INTERACTIVE))
+            await asyncio.gather(holder, read, *bulk)
+
+        with patch.object(self.gov, "MAX_PER_HOST", 1), patch.object(self.gov, "BULK_MAX", 1):
+            self._run(main())
+        self.assertEqual(order, ["first", "read", "bulk0", "bulk1"])
+
+    def test_bulk_cannot_take_reserved_slots(self):
+        async def main():
+            gate = self.gov._gate("h")
+            async with self.gov.slot("h", self.gov.PRIORITY_BULK):
+                self.assertFalse(gate.can_admit(True))
+                self.assertTrue(gate.can_admit(False))
+
+        with patch.object(self.gov, "MAX_PER_HOST", 3), patch.object(self.gov, "BULK_MAX", 1):
+            self._run(main())
+
+    def test_cancelled_waiter_frees_queue(self):
+        async def main():
+            async with self.gov.slot("h"):
+                waiter = asyncio.create_task(self._hold("h"))
+                await asyncio.sleep(0)
+                waiter.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiter
+            async with self.gov.slot("h"):
+                pass
+
+        with patch.object(self.gov, "MAX_PER_HOST", 1), patch.object(self.gov, "BULK_MAX", 1):
+            self._run(main())
+        stats = self.gov.governor_stats()["hosts"][0]
+        self.assertEqual(stats["active"], 0)
+        self.assertEqual(stats["queued"], 0)
+
+    async def _hold(self, host):
+        async with self.gov.slot(host):
+            await asyncio.sleep(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
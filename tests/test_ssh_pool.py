@@ -0,0 +1,63 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _import_pool():
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    import ssh_pool  # noqa: E402
+
+    return ssh_pool
+
+
+class TestSshPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = _import_pool()
+        self.pool._ENTRIES.clear()
+        for key in self.pool._STATS:
+            self.pool._STATS[key] = 0
+
+    def test_mux_options_point_to_control_socket(self):
+        opts = self.pool.mux_options("10.0.0.1", "root", "pw")
+        self.assertIn("ControlMaster=auto", opts)
+        path = self.pool.control_path("10.0.0.1", "root", "pw")
+        self.assertIn(f"ControlPath={path}", opts)
+        self.assertIn(f"ControlPersist={self.pool.IDLE_TTL}", opts)
+        # Senhas diferentes nunca compartilham a mesma sessão autenticada.
+        self.assertNotEqual(path, self.pool.control_path("10.0.0.1", "root", "other"))
+
+    def test_hit_requires_live_socket(self):
+        with patch.object(self.pool.os.path, "exists", return_value=False):
+            self.pool.mux_options("h", "u", "p")
+        with patch.object(self.pool.os.path, "exists", return_value=True):
+            self.pool.mux_options("h", "u", "p")
+            self.pool.mux_options("H", "u", "p")
+        stats = self.pool.pool_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(len(stats["connections"]), 1)
+        self.assertEqual(stats["connections"][0]["uses"], 3)
+
+    def test_password_change_retires_old_master(self):
+        with patch.object(self.pool.os.path, "exists", return_value=True), patch.object(
+            self.pool, "_stop_master"
+        ) as stop:
+            self.pool.mux_options("h", "u", "old")
+            self.pool.mux_options("h", "u", "new")
+        stop.assert_called_once_with(self.pool.control_path("h", "u", "old"))
+        self.assertEqual(self.pool.pool_stats()["misses"], 2)
+
+    def test_idle_entries_are_evicted(self):
+        with patch.object(self.pool.time, "monotonic", return_value=1000.0):
+            self.pool.mux_options("h", "u", "p")
+        with patch.object(self.pool.time, "monotonic", return_value=1000.0 + self.pool.IDLE_TTL + 1):
+            stats = self.pool.pool_stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["connections"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
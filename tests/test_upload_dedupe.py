@@ -0,0 +1,160 @@
+import hashlib
+import io
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class _Out(io.BytesIO):
+    def __init__(self, data, rc=0):
+        super().__init__(data.encode())
+        self.channel = MagicMock()
+        self.channel.recv_exit_status.return_value = rc
+
+
+class _FakeSsh:
+    """exec_command com respostas por prefixo de comando."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.commands = []
+
+    def exec_command(self, cmd):
+        self.commands.append(cmd)
+        for prefix, out in self.responses.items():
+            if cmd.startswith(prefix):
+                return None, _Out(out), _Out("")
+        return None, _Out(""), _Out("")
+
+
+SHA = hashlib.sha256(b"vendor image").hexdigest()
+SRC = "/opt/unetlab/addons/qemu/old/virtioa.qcow2"
+
+
+class TestUploadDedupe(unittest.TestCase):
+    def setUp(self):
+        self.dd = _import("upload_dedupe")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        p = patch.object(self.dd, "MANIFEST_DIR", tmp.name)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def test_parse_declared(self):
+        declared = self.dd.parse_declared(
+            '{"a.qcow2": "%s", "b.qcow2": {"sha256": "%s", "size": "12"}, "c.qcow2": "xyz"}' % (SHA.upper(), SHA)
+        )
+        self.assertEqual(declared["a.qcow2"], {"sha256": SHA, "size": None})
+        self.assertEqual(declared["b.qcow2"], {"sha256": SHA, "size": 12})
+        self.assertNotIn("c.qcow2", declared)
+        self.assertEqual(self.dd.parse_declared("lixo"), {})
+
+    def test_find_match_hashes_only_same_size_candidates_and_caches(self):
+        ssh = _FakeSsh({
+            "find ": f"12 1700000000.5 {SRC}\n12 1700000001.0 /opt/unetlab/addons/qemu/x/other.qcow2\n",
+            "sha256sum": f"{SHA}  {SRC}\n{'0' * 64}  /opt/unetlab/addons/qemu/x/other.qcow2\n",
+        })
+        self.assertEqual(self.dd.find_match(ssh, "10.0.0.1", SHA, 12), SRC)
+        self.assertIn("-size 12c", ssh.commands[0])
+        self.assertEqual(self.dd.load_manifest("10.0.0.1")[SRC]["sha256"], SHA)
+
+        # Segunda busca: hash vem do manifesto (mtime igual), sem sha256sum.
+        ssh.commands.clear()
+        self.assertEqual(self.dd.find_match(ssh, "10.0.0.1", SHA), SRC)
+        self.assertFalse(any(c.startswith("sha256sum") for c in ssh.commands))
+
+    def test_exec_reads_output_before_exit_status(self):
+        # Como no paramiko: o status só sai depois que a saída foi consumida.
+        out = _Out("x" * 300000)
+        read = []
+        out.channel.recv_exit_status.side_effect = lambda: 0 if read else self.fail("status antes da leitura")
+        original = out.read
+        out.read = lambda *a: read.append(1) or original(*a)
+        ssh = MagicMock()
+        ssh.exec_command.return_value = (None, out, _Out("aviso"))
+        rc, stdout, stderr = self.dd._exec(ssh, "find /")
+        self.assertEqual((rc, len(stdout), stderr), (0, 300000, "aviso"))
+
+    def test_find_match_without_size_needs_manifest(self):
+        ssh = _FakeSsh({})
+        self.assertIsNone(self.dd.find_match(ssh, "10.0.0.1", SHA))
+        self.assertEqual(ssh.commands, [])
+
+    def test_link_remote(self):
+        ssh = _FakeSsh({"mkdir": "link\n"})
+        self.assertEqual(self.dd.link_remote(ssh, SRC, "/opt/x/y.qcow2"), (True, "link"))
+        self.assertIn("cp --reflink=auto", ssh.commands[0])
+        self.assertEqual(self.dd.link_remote(ssh, SRC, SRC), (True, "same"))
+
+
+class TestUploadRouteDedupe(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("upload_routes")
+        self.dd = sys.modules["upload_dedupe"]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patch.object(self.dd, "MANIFEST_DIR", tmp.name).start()
+        patch.object(self.routes, "_run_fixpermissions", return_value=True).start()
+        self.addCleanup(patch.stopall)
+
+        self.ssh = _FakeSsh({
+            "find ": f"12 1700000000.5 {SRC}\n",
+            "sha256sum": f"{SHA}  {SRC}\n",
+            "mkdir -p '": "",
+            "mkdir -p ": "link\n",
+        })
+        self.sftp = MagicMock()
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            yield self.ssh, self.sftp
+
+        patch.object(sys.modules["sftp_parallel"], "sftp_session", fake_session).start()
+
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.upload_bp)
+        self.client = app.test_client()
+
+    def _post(self, content, declared_sha):
+        b = "----b"
+        fields = {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x",
+                  "template_name": "new", "sha256": '{"virtioa.qcow2": {"sha256": "%s", "size": 12}}' % declared_sha}
+        body = b"".join(
+            f'--{b}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode() for k, v in fields.items()
+        )
+        body += (f'--{b}\r\nContent-Disposition: form-data; name="image"; filename="virtioa.qcow2"\r\n\r\n'.encode()
+                 + content + f"\r\n--{b}--\r\n".encode())
+        return self.client.post("/upload", data=body, content_type=f"multipart/form-data; boundary={b}")
+
+    def test_known_content_is_linked_not_sent(self):
+        resp = self._post(b"vendor image", SHA)
+        data = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(data["success"])
+        self.assertEqual(data["deduplicated"][0]["source"], SRC)
+        self.assertEqual(data["bytes_saved"], 12)
+        # Só o canal de controle tocou o SFTP (nenhum arquivo aberto para escrita).
+        self.sftp.open.assert_not_called()
+
+    def test_mismatched_content_is_undone(self):
+        resp = self._post(b"other bytes!", SHA)
+        data = resp.get_json()
+        self.assertFalse(data["success"])
+        self.assertEqual(data["deduplicated"], [])
+        self.sftp.remove.assert_called_with("/opt/unetlab/addons/qemu/new/virtioa.qcow2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+_BOUNDARY = "----ncffan"
+
+
+def _body(fields, files):
+    parts = [
+        f'--{_BOUNDARY}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode()
+        for k, v in fields
+    ]
+    for filename, data in files:
+        parts.append(
+            f'--{_BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n\r\n'.encode()
+            + data + b"\r\n"
+        )
+    return b"".join(parts) + f"--{_BOUNDARY}--\r\n".encode()
+
+
+class _LocalFile:
+    def __init__(self, path, mode, delay):
+        self.fh = open(path, mode)
+        self.delay = delay
+
+    def set_pipelined(self, flag):
+        pass
+
+    def write(self, data):
+        time.sleep(self.delay)
+        self.fh.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+
+class _LocalSftp:
+    def __init__(self, root, delay=0.0):
+        self.root = root
+        self.delay = delay
+
+    def _p(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def open(self, path, mode):
+        os.makedirs(os.path.dirname(self._p(path)), exist_ok=True)
+        return _LocalFile(self._p(path), mode, self.delay)
+
+    def remove(self, path):
+        os.remove(self._p(path))
+
+    def truncate(self, path, size):
+        os.truncate(self._p(path), size)
+
+
+class TestSpillQueue(unittest.TestCase):
+    def test_order_preserved_across_spill(self):
+        fanout = _import("upload_fanout")
+        with tempfile.TemporaryDirectory() as tmp:
+            q = fanout.SpillQueue(mem_limit=10, spill_dir=tmp)
+            items = [(b"d", bytes([i]) * 6) for i in range(5)]
+            for kind, payload in items[:3]:
+                q.put(kind, payload)
+            self.assertGreater(q.spilled_bytes, 0)
+            self.assertEqual([q.get() for _ in range(3)], items[:3])
+            # Consumidor alcançou o disco: volta a usar a memória.
+            for kind, payload in items[3:]:
+                q.put(kind, payload)
+            self.assertEqual([q.get() for _ in range(2)], items[3:])
+            self.assertEqual(q.spilled_bytes, 18)  # itens 1, 2 e 4
+            q.close()
+
+
+class TestFanoutUpload(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("upload_routes")
+        self.fanout = sys.modules["upload_fanout"]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        patch.object(self.fanout, "SPILL_DIR", os.path.join(tmp.name, "spill")).start()
+        patch.object(self.fanout, "MEM_BUFFER", 64 * 1024).start()
+        self.fix_calls = []
+        patch.object(self.routes, "_run_fixpermissions",
+                     side_effect=lambda ssh, errors, paths=None: self.fix_calls.append(ssh) or True).start()
+        self.addCleanup(patch.stopall)
+
+        self.mkdir_fail = set()
+        sftps = {
+            "10.0.0.1": _LocalSftp(os.path.join(tmp.name, "h1")),
+            "10.0.0.2": _LocalSftp(os.path.join(tmp.name, "h2"), delay=0.01),  # host lento
+        }
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            if ip not in sftps:
+                raise OSError("sem rota")
+            failed = ip in self.mkdir_fail
+            out, err = MagicMock(), MagicMock()
+            out.read.return_value = b""
+            out.channel.recv_exit_status.return_value = 1 if failed else 0
+            err.read.return_value = b"Permission denied" if failed else b""
+            ssh = MagicMock()
+            ssh.exec_command.return_value = (None, out, err)
+            yield ssh, sftps[ip]
+
+        patch.object(sys.modules["sftp_parallel"], "sftp_session", fake_session).start()
+
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.upload_bp)
+        self.client = app.test_client()
+
+    def test_tees_stream_to_each_host_with_per_host_results(self):
+        payload = os.urandom(600000)
+        hosts = [
+            {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x", "name": "rapido"},
+            {"eve_ip": "10.0.0.2", "eve_user": "root", "eve_pass": "x"},
+            {"eve_ip": "10.0.0.3", "eve_user": "root", "eve_pass": "x"},
+        ]
+        fields = [("hosts", json.dumps(hosts)), ("template_name", "vios")]
+        resp = self.client.post("/upload", data=_body(fields, [("vios.qcow2", payload)]),
+                                content_type=f"multipart/form-data; boundary={_BOUNDARY}")
+        data = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(data["success"])
+        by_host = {h["host"]: h for h in data["hosts"]}
+        self.assertTrue(by_host["10.0.0.1"]["ok"])
+        self.assertEqual(by_host["10.0.0.1"]["name"], "rapido")
+        self.assertTrue(by_host["10.0.0.2"]["ok"])
+        self.assertGreater(by_host["10.0.0.2"]["spilled_bytes"], 0)
+        self.assertFalse(by_host["10.0.0.3"]["ok"])
+        self.assertIn("sem rota", by_host["10.0.0.3"]["errors"][0]["stderr"])
+        for root in ("h1", "h2"):
+            with open(os.path.join(self.tmp, root, "opt/unetlab/addons/qemu/vios/vios.qcow2"), "rb") as fh:
+                self.assertEqual(fh.read(), payload)
+        self.assertEqual(len(self.fix_calls), 2)
+
+    def test_mkdir_failure_fails_only_that_host(self):
+        self.mkdir_fail.add("10.0.0.2")
+        hosts = [
+            {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x"},
+            {"eve_ip": "10.0.0.2", "eve_user": "root", "eve_pass": "x"},
+        ]
+        fields = [("hosts", json.dumps(hosts)), ("template_name", "vios")]
+        resp = self.client.post("/upload", data=_body(fields, [("vios.qcow2", b"qcow" * 1000)]),
+                                content_type=f"multipart/form-data; boundary={_BOUNDARY}")
+        by_host = {h["host"]: h for h in resp.get_json()["hosts"]}
+        self.assertTrue(by_host["10.0.0.1"]["ok"])
+        self.assertFalse(by_host["10.0.0.2"]["ok"])
+        self.assertIn("Permission denied", by_host["10.0.0.2"]["errors"][0]["stderr"])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "h2", "opt/unetlab/addons/qemu/vios/vios.qcow2")))
+
+    def test_bad_hosts(self):
+        resp = self.client.post("/upload", data=_body([("hosts", "[1]"), ("template_name", "v")], [("a.qcow2", b"x")]),
+                                content_type=f"multipart/form-data; boundary={_BOUNDARY}")
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
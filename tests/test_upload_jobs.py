@@ -0,0 +1,181 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+_BOUNDARY = "----ncfjob"
+_CT = f"multipart/form-data; boundary={_BOUNDARY}"
+
+
+def _body(fields, files):
+    parts = [
+        f'--{_BOUNDARY}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode()
+        for k, v in fields
+    ]
+    for filename, data in files:
+        parts.append(
+            f'--{_BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n\r\n'.encode()
+            + data + b"\r\n"
+        )
+    return b"".join(parts) + f"--{_BOUNDARY}--\r\n".encode()
+
+
+class _LocalFile:
+    def __init__(self, path, mode):
+        self.fh = open(path, mode)
+
+    def set_pipelined(self, flag):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+
+class _LocalSftp:
+    def __init__(self, root):
+        self.root = root
+
+    def _p(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def open(self, path, mode):
+        os.makedirs(os.path.dirname(self._p(path)), exist_ok=True)
+        return _LocalFile(self._p(path), mode)
+
+    def remove(self, path):
+        os.remove(self._p(path))
+
+    def truncate(self, path, size):
+        os.truncate(self._p(path), size)
+
+
+class TestUploadJobs(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("upload_routes")
+        self.jobs = sys.modules["upload_jobs"]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.remote = os.path.join(tmp.name, "remote")
+        patch.object(self.jobs, "JOB_DIR", os.path.join(tmp.name, "jobs")).start()
+        patch.object(sys.modules["upload_dedupe"], "MANIFEST_DIR", os.path.join(tmp.name, "manifests")).start()
+        self.fix = patch.object(self.routes, "_run_fixpermissions", return_value=True).start()
+        self.addCleanup(patch.stopall)
+
+        sftp = _LocalSftp(self.remote)
+        ssh = MagicMock()
+        out = MagicMock()
+        out.read.return_value = b""
+        out.channel.recv_exit_status.return_value = 0
+        ssh.exec_command.return_value = (None, out, MagicMock())
+        self.out = out
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            yield ssh, sftp
+
+        patch.object(sys.modules["sftp_parallel"], "sftp_session", fake_session).start()
+
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.upload_bp)
+        self.client = app.test_client()
+
+    def _wait(self, job_id):
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            snap = self.jobs.snapshot(job_id)
+            if snap["done"]:
+                return snap
+            time.sleep(0.02)
+        self.fail("job não terminou")
+
+    def test_job_returns_immediately_and_reports_progress(self):
+        payload = os.urandom(300000)
+        fields = [("eve_ip", "10.0.0.1"), ("eve_user", "root"), ("eve_pass", "x"), ("template_name", "vios")]
+        resp = self.client.post("/upload/job", data=_body(fields, [("vios.qcow2", payload), ("bad.exe", b"x")]),
+                                content_type=_CT)
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.get_json()["job_id"]
+        self.assertEqual(resp.get_json()["ws"], f"/ws/upload/{job_id}")
+
+        snap = self._wait(job_id)
+        self.assertEqual(snap["status"], "success")
+        self.assertEqual(snap["bytes_sent"], len(payload))
+        self.assertEqual(snap["percent"], 100.0)
+        self.assertEqual(snap["files"][0]["status"], "done")
+        self.assertNotIn("path", snap["files"][0])
+        self.assertEqual(snap["errors"][0]["filename"], "bad.exe")
+        with open(os.path.join(self.remote, "opt/unetlab/addons/qemu/vios/vios.qcow2"), "rb") as fh:
+            self.assertEqual(fh.read(), payload)
+        # Arquivos locais do job são apagados ao terminar.
+        self.assertFalse(os.path.exists(self.jobs.staging_dir(job_id)))
+        self.assertEqual(self.jobs.get(job_id)["params"], {})
+
+        status = self.client.get(f"/upload/job/{job_id}")
+        self.assertEqual(status.status_code, 200)
+        self.assertTrue(status.get_json()["success"])
+
+    def test_mkdir_failure_fails_the_job_without_sending(self):
+        self.out.channel.recv_exit_status.return_value = 1
+        fields = [("eve_ip", "10.0.0.1"), ("eve_user", "root"), ("eve_pass", "x"), ("template_name", "vios")]
+        resp = self.client.post("/upload/job", data=_body(fields, [("vios.qcow2", b"qcow")]), content_type=_CT)
+        snap = self._wait(resp.get_json()["job_id"])
+        self.assertEqual(snap["status"], "error")
+        self.assertEqual(snap["errors"][-1]["step"], "mkdir")
+        self.assertEqual(snap["files"][0]["status"], "pending")
+        self.assertFalse(os.path.exists(os.path.join(self.remote, "opt/unetlab/addons/qemu/vios/vios.qcow2")))
+        self.fix.assert_not_called()
+
+    def test_rejects_job_without_local_room(self):
+        fields = [("eve_ip", "10.0.0.1"), ("eve_user", "root"), ("eve_pass", "x"), ("template_name", "vios")]
+        with patch.object(self.jobs, "MIN_FREE", 1 << 62):
+            resp = self.client.post("/upload/job", data=_body(fields, [("vios.qcow2", b"x")]), content_type=_CT)
+        self.assertEqual(resp.status_code, 507)
+        self.assertEqual(os.listdir(self.jobs.JOB_DIR), [])
+
+    def test_space_is_rechecked_while_spooling(self):
+        fields = [("eve_ip", "10.0.0.1"), ("eve_user", "root"), ("eve_pass", "x"), ("template_name", "vios")]
+        checks = []
+        patch.object(self.jobs, "SPACE_CHECK_EVERY", 1024).start()
+        patch.object(self.jobs, "has_room", lambda incoming=0: checks.append(incoming) or len(checks) < 2).start()
+        resp = self.client.post("/upload/job", data=_body(fields, [("vios.qcow2", os.urandom(300000))]),
+                                content_type=_CT)
+        self.assertEqual(resp.status_code, 507)
+        self.assertEqual(len(checks), 2)
+        self.assertFalse(os.path.exists(self.jobs.JOB_DIR) and any(os.scandir(self.jobs.JOB_DIR)))
+
+    def test_missing_credentials_rejected_before_spooling(self):
+        resp = self.client.post("/upload/job", data=_body([("template_name", "vios")], [("vios.qcow2", b"x")]),
+                                content_type=_CT)
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(os.path.exists(self.jobs.JOB_DIR) and os.listdir(self.jobs.JOB_DIR))
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get("/upload/job/nope").status_code, 404)
+
+    def test_snapshot_eta(self):
+        self.jobs.create("j1", {}, [{"filename": "a.qcow2", "path": "/x", "size": 1000}])
+        self.jobs.update("j1", phase="transfer")
+        self.jobs.get("j1")["started_at"] -= 2
+        self.jobs.track("j1", 0, lambda: 500)
+        snap = self.jobs.snapshot("j1")
+        self.assertEqual(snap["bytes_sent"], 500)
+        self.assertAlmostEqual(snap["eta_s"], 2.0, delta=0.2)
+        self.assertEqual(snap["files"][0]["status"], "sending")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class _LocalFile:
+    """Arquivo local com a interface usada do paramiko.SFTPFile."""
+
+    def __init__(self, path, mode):
+        self.fh = open(path, mode)
+
+    def set_pipelined(self, flag):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+
+class _LocalSftp:
+    """SFTP falso que grava num diretório local (o "host remoto")."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _p(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def open(self, path, mode):
+        os.makedirs(os.path.dirname(self._p(path)), exist_ok=True)
+        return _LocalFile(self._p(path), mode)
+
+    def stat(self, path):
+        return os.stat(self._p(path))
+
+    def posix_rename(self, src, dst):
+        os.replace(self._p(src), self._p(dst))
+
+    def remove(self, path):
+        os.remove(self._p(path))
+
+
+def _exec_result(rc, err=b""):
+    stdout, stderr = MagicMock(), MagicMock()
+    stdout.channel.recv_exit_status.return_value = rc
+    stdout.read.return_value = b""
+    stderr.read.return_value = err
+    return None, stdout, stderr
+
+
+class TestUploadSessions(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("upload_routes")
+        self.sessions = sys.modules["upload_sessions"]
+        from flask import Flask
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.remote = os.path.join(tmp.name, "remote")
+        p = patch.object(self.sessions, "SESSION_DIR", os.path.join(tmp.name, "sessions"))
+        p.start()
+        self.addCleanup(p.stop)
+
+        sftp = _LocalSftp(self.remote)
+        ssh = MagicMock()
+        ssh.exec_command.side_effect = lambda cmd: _exec_result(0)
+        self.ssh = ssh
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            yield ssh, sftp
+
+        p = patch.object(self.routes, "sftp_session", fake_session)
+        p.start()
+        self.addCleanup(p.stop)
+        self.fix = patch.object(self.routes, "_run_fixpermissions", return_value=True).start()
+        self.addCleanup(patch.stopall)
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.upload_bp)
+        self.client = app.test_client()
+
+    def _create(self, size):
+        resp = self.client.post(
+            "/upload/session",
+            data={"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x",
+                  "template_name": "vios", "filename": "vios.qcow2", "size": str(size)},
+        )
+        self.assertEqual(resp.status_code, 200)
+        return resp.get_json()["session_id"]
+
+    def _put(self, sid, offset, data):
+        return self.client.put(
+            f"/upload/session/{sid}?offset={offset}", data=data,
+            headers={"X-Eve-Pass": "x", "Content-Type": "application/octet-stream"},
+        )
+
+    def test_create_quotes_remote_dir_and_reports_mkdir_failure(self):
+        self.ssh.exec_command.side_effect = lambda cmd: _exec_result(1, b"read-only file system")
+        resp = self.client.post(
+            "/upload/session",
+            data={"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x",
+                  "template_name": "it's", "filename": "vios.qcow2", "size": "10"},
+        )
+        self.assertEqual(resp.status_code, 500)
+        self.assertEqual(resp.get_json()["errors"][0]["stderr"], "read-only file system")
+        self.assertIn("'/opt/unetlab/addons/qemu/it'\"'\"'s'", self.ssh.exec_command.call_args[0][0])
+
+    def test_resume_after_restart_and_finalize(self):
+        payload = os.urandom(300000)
+        sid = self._create(len(payload))
+        self.assertEqual(self._put(sid, 0, payload[:100000]).get_json()["committed"], 100000)
+
+        # Restart da API: só o estado em disco sobrevive.
+        self.sessions._SESSION_LOCKS.clear()
+        status = self.client.get(f"/upload/session/{sid}").get_json()
+        self.assertEqual(status["committed"], 100000)
+
+        gap = self._put(sid, 200000, payload[200000:])
+        self.assertEqual(gap.status_code, 409)
+        self.assertEqual(gap.get_json()["committed"], 100000)
+
+        # Reenvio parcial sobreposto é aceito.
+        self.assertEqual(self._put(sid, 50000, payload[50000:250000]).get_json()["committed"], 250000)
+        early = self.client.post(f"/upload/session/{sid}/finalize", data={"eve_pass": "x"})
+        self.assertEqual(early.status_code, 409)
+        self._put(sid, 250000, payload[250000:])
+
+        done = self.client.post(f"/upload/session/{sid}/finalize", data={"eve_pass": "x"})
+        self.assertEqual(done.status_code, 200)
+        self.assertTrue(done.get_json()["success"])
+        with open(os.path.join(self.remote, "opt/unetlab/addons/qemu/vios/vios.qcow2"), "rb") as fh:
+            self.assertEqual(fh.read(), payload)
+        self.assertEqual(self.fix.call_count, 1)
+        self.assertEqual(self.client.get(f"/upload/session/{sid}").status_code, 404)
+
+    def test_trailing_zero_chunk_keeps_size(self):
+        payload = os.urandom(1000) + bytes(300000)
+        sid = self._create(len(payload))
+        self.assertEqual(self._put(sid, 0, payload).get_json()["committed"], len(payload))
+        done = self.client.post(f"/upload/session/{sid}/finalize", data={"eve_pass": "x"})
+        self.assertEqual(done.status_code, 200)
+        with open(os.path.join(self.remote, "opt/unetlab/addons/qemu/vios/vios.qcow2"), "rb") as fh:
+            self.assertEqual(fh.read(), payload)
+
+    def test_chunk_past_size_is_rejected(self):
+        sid = self._create(10)
+        self.assertEqual(self._put(sid, 0, b"x" * 11).status_code, 400)
+        self.assertEqual(self.client.get(f"/upload/session/{sid}").get_json()["committed"], 0)
+
+    def test_abort_removes_partial(self):
+        sid = self._create(10)
+        self._put(sid, 0, b"x" * 5)
+        part = os.path.join(self.remote, "opt/unetlab/addons/qemu/vios/.vios.qcow2.part")
+        self.assertTrue(os.path.exists(part))
+        self.client.delete(f"/upload/session/{sid}", headers={"X-Eve-Pass": "x"})
+        self.assertFalse(os.path.exists(part))
+        self.assertIsNone(self.sessions.load(sid))
+
+    def test_purge_expired(self):
+        state = self.sessions.create("h", "u", "/d", "a.qcow2", 1)
+        self.assertEqual(self.sessions.purge_expired(now=state["updated_at"] + self.sessions.SESSION_TTL + 1), 1)
+        self.assertIsNone(self.sessions.load(state["id"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
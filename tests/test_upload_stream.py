@@ -0,0 +1,177 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+_BOUNDARY = "----ncfboundary"
+
+
+def _body(fields, files):
+    parts = []
+    for name, value in fields:
+        parts.append(
+            f"--{_BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n".encode()
+            + value.encode()
+            + b"\r\n"
+        )
+    for name, filename, data in files:
+        parts.append(
+            f"--{_BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n".encode()
+            + data
+            + b"\r\n"
+        )
+    return b"".join(parts) + f"--{_BOUNDARY}--\r\n".encode()
+
+
+_CT = f"multipart/form-data; boundary={_BOUNDARY}"
+
+
+class TestIterMultipart(unittest.TestCase):
+    def setUp(self):
+        self.us = _import("upload_stream")
+
+    def test_events_in_body_order_with_small_chunks(self):
+        payload = bytes(range(256)) * 400  # inclui \r\n e "--" no meio
+        body = _body([("eve_ip", "10.0.0.1"), ("template_name", "vios-15")], [("image", "a.qcow2", payload)])
+        events = list(self.us.iter_multipart(io.BytesIO(body), _CT, chunk_size=1000))
+        self.assertEqual(events[0], ("field", "eve_ip", "10.0.0.1"))
+        self.assertEqual(events[1], ("field", "template_name", "vios-15"))
+        self.assertEqual(events[2], ("file", "image", "a.qcow2"))
+        self.assertEqual(events[-1], ("end", "image", "a.qcow2"))
+        data = b"".join(e[1] for e in events if e[0] == "data")
+        self.assertEqual(data, payload)
+        self.assertGreater(sum(1 for e in events if e[0] == "data"), 1)
+
+    def test_truncated_body_raises(self):
+        body = _body([], [("image", "a.qcow2", b"x" * 5000)])[:-200]
+        with self.assertRaises(self.us.MultipartError):
+            list(self.us.iter_multipart(io.BytesIO(body), _CT, chunk_size=1024))
+
+    def test_rejects_non_multipart(self):
+        with self.assertRaises(self.us.MultipartError):
+            list(self.us.iter_multipart(io.BytesIO(b"a=1"), "application/x-www-form-urlencoded"))
+
+
+class _LocalFile:
+    def __init__(self, path, mode):
+        self.fh = open(path, mode)
+
+    def set_pipelined(self, flag):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+
+class _LocalSftp:
+    """SFTP falso que grava num diretório local (o "host remoto")."""
+
+    def __init__(self, root):
+        self.root = root
+        self.opened = []
+
+    def _p(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def open(self, path, mode):
+        self.opened.append((path, mode))
+        os.makedirs(os.path.dirname(self._p(path)), exist_ok=True)
+        return _LocalFile(self._p(path), mode)
+
+    def remove(self, path):
+        os.remove(self._p(path))
+
+
+def _exec_result(rc, err=b""):
+    stdout, stderr = MagicMock(), MagicMock()
+    stdout.channel.recv_exit_status.return_value = rc
+    stdout.read.return_value = b""
+    stderr.read.return_value = err
+    return None, stdout, stderr
+
+
+class TestStreamingUpload(unittest.TestCase):
+    def setUp(self):
+        _import("upload_routes")
+        from flask import Flask
+
+        self.routes = sys.modules["upload_routes"]
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.upload_bp)
+        self.client = app.test_client()
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.remote = tmp.name
+        sftp = _LocalSftp(self.remote)
+        ssh = MagicMock()
+        ssh.exec_command.side_effect = lambda cmd: _exec_result(0)
+        self.ssh, self.sftp = ssh, sftp
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            self.session_args = (ip, user, pw)
+            yield ssh, sftp
+
+        self.patcher = patch.object(sys.modules["sftp_parallel"], "sftp_session", fake_session)
+        self.patcher.start()
+        self.addCleanup(self.patcher.stop)
+
+    def _read_remote(self, path):
+        with open(os.path.join(self.remote, path.lstrip("/")), "rb") as fh:
+            return fh.read()
+
+    def _post(self, body):
+        return self.client.post("/upload", data=body, content_type=_CT)
+
+    def test_streams_file_to_sftp_without_local_copy(self):
+        payload = b"qcow" * 300000
+        fields = [("eve_ip", "10.0.0.1"), ("eve_user", "root"), ("eve_pass", "x"), ("template_name", "vios")]
+        with patch.object(self.routes, "_run_fixpermissions", return_value=True), \
+                patch("werkzeug.formparser.MultiPartParser.parse") as parse:
+            resp = self._post(_body(fields, [("image", "vios.qcow2", payload), ("image", "bad.exe", b"x")]))
+        parse.assert_not_called()
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+        self.assertTrue(data["success"])
+        self.assertEqual(self._read_remote("/opt/unetlab/addons/qemu/vios/vios.qcow2"), payload)
+        self.assertEqual(data["transfer"]["bytes"], len(payload))
+        self.assertEqual(data["errors"][0]["filename"], "bad.exe")
+        self.assertEqual(self.session_args, ("10.0.0.1", "root", "x"))
+
+    def test_remote_dir_is_quoted_and_mkdir_failure_stops_the_upload(self):
+        self.ssh.exec_command.side_effect = lambda cmd: _exec_result(1, b"mkdir: Permission denied")
+        fields = [("eve_ip", "10.0.0.1"), ("eve_user", "root"), ("eve_pass", "x"), ("template_name", "a'; touch /x; '")]
+        resp = self._post(_body(fields, [("image", "vios.qcow2", b"qcow")]))
+        self.assertEqual(resp.status_code, 500)
+        self.assertEqual(resp.get_json()["errors"][0]["stderr"], "mkdir: Permission denied")
+        self.assertEqual(self.sftp.opened, [])
+        cmd = self.ssh.exec_command.call_args[0][0]
+        self.assertEqual(cmd, "mkdir -p -- '/opt/unetlab/addons/qemu/a'\"'\"'; touch /x; '\"'\"''")
+
+    def test_missing_credentials_before_file(self):
+        resp = self._post(_body([("template_name", "vios")], [("image", "vios.qcow2", b"x")]))
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.sftp.opened, [])
+
+    def test_no_images(self):
+        fields = [("eve_ip", "10.0.0.1"), ("eve_user", "root"), ("eve_pass", "x"), ("template_name", "vios")]
+        resp = self._post(_body(fields, []))
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+
+def _import(name):
+    api_dir = Path(__file__).resolve().parent.parent / "api"
+    if str(api_dir) not in sys.path:
+        sys.path.insert(0, str(api_dir))
+    return __import__(name)
+
+
+class _Resp:
+    def __init__(self, status, body, headers, fail_after=None):
+        self.status_code = status
+        self.body = body
+        self.headers = headers
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        import requests
+
+        for i in range(0, len(self.body), size):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise requests.ConnectionError("conexão caiu")
+            yield self.body[i:i + size]
+
+
+class _Server:
+    """Servidor HTTP falso: a primeira resposta cai no meio; as seguintes respeitam Range."""
+
+    def __init__(self, data, ranges=True, fail_after=None):
+        self.data = data
+        self.ranges = ranges
+        self.fail_after = fail_after
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        headers = headers or {}
+        self.requests.append(dict(headers))
+        fail = self.fail_after if len(self.requests) == 1 else None
+        rng = headers.get("Range")
+        if rng and self.ranges:
+            start = int(rng.split("=")[1].rstrip("-"))
+            return _Resp(206, self.data[start:], {"Content-Range": f"bytes {start}-{len(self.data) - 1}/{len(self.data)}"})
+        return _Resp(200, self.data, {"Content-Length": str(len(self.data))}, fail)
+
+
+class TestUrlStream(unittest.TestCase):
+    def setUp(self):
+        self.uf = _import("url_fetch")
+        patch.object(self.uf.time, "sleep").start()
+        self.addCleanup(patch.stopall)
+
+    def _read(self, server):
+        with patch.object(self.uf.requests, "get", server.get):
+            stream = self.uf.UrlStream("http://mirror/a.qcow2", chunk_size=1000)
+            return b"".join(stream), stream
+
+    def test_resumes_with_range(self):
+        data = os.urandom(10000)
+        server = _Server(data, fail_after=4000)
+        got, stream = self._read(server)
+        self.assertEqual(got, data)
+        self.assertEqual(stream.resumes, 1)
+        self.assertEqual(server.requests[1]["Range"], "bytes=4000-")
+
+    def test_server_without_range_is_skipped_forward(self):
+        data = os.urandom(10000)
+        got, stream = self._read(_Server(data, ranges=False, fail_after=3000))
+        self.assertEqual(got, data)
+        self.assertEqual(stream.total, 10000)
+
+    def test_gives_up_after_retries(self):
+        server = _Server(b"x" * 100)
+        server.get = MagicMock(side_effect=self.uf.requests.ConnectionError("recusada"))
+        with patch.object(self.uf.requests, "get", server.get), self.assertRaises(self.uf.FetchError):
+            list(self.uf.UrlStream("http://mirror/a.qcow2", retries=2))
+        self.assertEqual(server.get.call_count, 3)
+
+    def test_validate_url(self):
+        self.assertTrue(self.uf.validate_url("https://mirror.local/x/vios.qcow2"))
+        self.assertFalse(self.uf.validate_url("file:///etc/passwd"))
+        self.assertEqual(self.uf.filename_from_url("http://m/a%20b/vios%2D1.qcow2?x=1"), "vios-1.qcow2")
+
+
+class _LocalFile:
+    def __init__(self, path, mode):
+        self.fh = open(path, mode)
+
+    def set_pipelined(self, flag):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+
+class _LocalSftp:
+    def __init__(self, root):
+        self.root = root
+
+    def _p(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def open(self, path, mode):
+        os.makedirs(os.path.dirname(self._p(path)), exist_ok=True)
+        return _LocalFile(self._p(path), mode)
+
+    def remove(self, path):
+        os.remove(self._p(path))
+
+    def truncate(self, path, size):
+        os.truncate(self._p(path), size)
+
+
+class TestUploadUrlRoute(unittest.TestCase):
+    def setUp(self):
+        self.routes = _import("upload_routes")
+        self.jobs = sys.modules["upload_jobs"]
+        self.uf = sys.modules["url_fetch"]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.remote = tmp.name
+        patch.object(sys.modules["upload_dedupe"], "MANIFEST_DIR", os.path.join(tmp.name, "manifests")).start()
+        patch.object(self.routes, "_run_fixpermissions", return_value=True).start()
+        patch.object(self.uf.time, "sleep").start()
+        self.addCleanup(patch.stopall)
+
+        sftp = _LocalSftp(self.remote)
+        ssh = MagicMock()
+        out = MagicMock()
+        out.read.return_value = b""
+        out.channel.recv_exit_status.return_value = 0
+        ssh.exec_command.return_value = (None, out, MagicMock())
+        self.out = out
+
+        @contextmanager
+        def fake_session(ip, user, pw):
+            yield ssh, sftp
+
+        patch.object(sys.modules["sftp_parallel"], "sftp_session", fake_session).start()
+
+        from flask import Flask
+
+        app = Flask(__name__)
+        app.register_blueprint(self.routes.upload_bp)
+        self.client = app.test_client()
+
+    def _run(self, data, **extra):
+        server = self.server = _Server(data, fail_after=len(data) // 2)
+        patch.object(self.uf.requests, "get", server.get).start()
+        body = {"eve_ip": "10.0.0.1", "eve_user": "root", "eve_pass": "x", "template_name": "vios",
+                "url": "http://mirror/images/vios.qcow2", **extra}
+        resp = self.client.post("/upload/url", json=body)
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.get_json()["job_id"]
+        deadline = time.time() + 10
+        while not self.jobs.snapshot(job_id)["done"]:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.02)
+        return self.jobs.snapshot(job_id)
+
+    def test_fetches_into_template_dir_with_resume_and_checksum(self):
+        data = os.urandom(3 * 1024 * 1024 + 7)
+        snap = self._run(data, sha256=hashlib.sha256(data).hexdigest())
+        self.assertEqual(snap["status"], "success")
+        self.assertEqual(snap["bytes_sent"], len(data))
+        self.assertEqual(snap["transfer"]["resumes"], 1)
+        with open(os.path.join(self.remote, "opt/unetlab/addons/qemu/vios/vios.qcow2"), "rb") as fh:
+            self.assertEqual(fh.read(), data)
+
+    def test_checksum_mismatch_discards_file(self):
+        snap = self._run(os.urandom(5000), sha256="0" * 64)
+        self.assertEqual(snap["status"], "error")
+        self.assertEqual(snap["files"][0]["status"], "error")
+        self.assertFalse(os.path.exists(os.path.join(self.remote, "opt/unetlab/addons/qemu/vios/vios.qcow2")))
+
+    def test_mkdir_failure_fails_before_download(self):
+        self.out.channel.recv_exit_status.return_value = 1
+        snap = self._run(b"x" * 100)
+        self.assertEqual(snap["status"], "error")
+        self.assertEqual(snap["errors"][0]["step"], "mkdir")
+        self.assertEqual(self.server.requests, [])
+
+    def test_rejects_non_http_url(self):
+        resp = self.client.post("/upload/url", json={"eve_ip": "h", "eve_user": "u", "eve_pass": "p",
+                                                     "template_name": "t", "url": "ftp://x/a.qcow2"})
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 
 class TestUtils(unittest.TestCase):
@@ -17,20 +17,16 @@ class TestUtils(unittest.TestCase):
     def test_run_ssh_command_builds_expected_command(self):
         utils = self._import_utils()
 
-        mock_proc = MagicMock()
-        mock_proc.communicate.return_value = ("ok", "")
-        mock_proc.returncode = 0
-
-        with patch.object(utils.subprocess, "Popen", return_value=mock_proc) as popen, patch(
+        with patch.object(utils.ssh_engine, "capture", return_value=utils.ssh_engine.Capture(0, "ok", "", False)) as engine_run, patch(
             "builtins.print"
         ):
-            rc, out, err = utils.run_ssh_command("10.0.0.1", "user", "pass", "echo hi")
+            rc, out, err = utils.run_ssh_command("10.0.0.1", "user", "pass", "echo hi", timeout=5)
 
         self.assertEqual(rc, 0)
         self.assertEqual(out, "ok")
         self.assertEqual(err, "")
 
-        args, kwargs = popen.call_args
+        args, kwargs = engine_run.call_args
         cmd = args[0]
         self.assertIn("sshpass", cmd[0])
         self.assertIn("-p", cmd)
@@ -40,8 +36,31 @@ class TestUtils(unittest.TestCase):
         self.assertIn("PreferredAuthentications=password", cmd)
         self.assertIn("PubkeyAuthentication=no", cmd)
         self.assertIn("user@10.0.0.1", cmd)
+        self.assertIn("ControlMaster=auto", cmd)
         self.assertEqual(cmd[-1], "echo hi")
-        self.assertTrue(kwargs.get("text"))
+        self.assertEqual(kwargs.get("timeout"), 5)
+        self.assertEqual(kwargs.get("max_bytes"), utils.OUTPUT_MAX_BYTES)
+
+    def test_run_ssh_command_reports_truncation_and_hides_password(self):
+        utils = self._import_utils()
+        capture = utils.ssh_engine.Capture(0, "x" * 10, "", True)
+        with patch.object(utils.ssh_engine, "capture", return_value=capture), patch("builtins.print") as printed:
+            rc, out, err = utils.run_ssh_command("10.0.0.1", "user", "s3cret", "cat big", max_bytes=10)
+
+        self.assertEqual(rc, 0)
+        self.assertEqual(out, "x" * 10)
+        self.assertIn("truncada em 10 bytes", err)
+        logged = " ".join(str(call.args[0]) for call in printed.call_args_list)
+        self.assertNotIn("s3cret", logged)
+
+    def test_run_ssh_capture_timeout_keeps_partial_stderr(self):
+        utils = self._import_utils()
+        capture = utils.ssh_engine.Capture(utils.ssh_engine.RC_TIMEOUT, "meio", "aviso parcial", False)
+        with patch.object(utils.ssh_engine, "capture", return_value=capture), patch("builtins.print"):
+            cap = utils.run_ssh_capture("10.0.0.1", "user", "pass", "sleep 99", timeout=3)
+
+        self.assertEqual(cap.stdout, "meio")
+        self.assertEqual(cap.stderr, "aviso parcial\nSSH timeout após 3s.")
 
     def test_detect_platform_eve_ng(self):
         utils = self._import_utils()
@@ -107,14 +126,54 @@ class TestUtils(unittest.TestCase):
         self.assertAlmostEqual(result["mem_percent"], 25.0)
         self.assertEqual(result["disk_percent"], 10.0)
 
-    def test_scp_upload_builds_expected_command(self):
+    def test_probe_images_host_parses_framed_document(self):
         utils = self._import_utils()
 
-        mock_proc = MagicMock()
-        mock_proc.communicate.return_value = ("", "warn")
-        mock_proc.returncode = 0
+        ssh_out = "\n".join(
+            [
+                "Welcome banner",
+                "__NCF_PROBE__",
+                '{"dirs":{"qemu":["vios-15","a\\"b"],"iol":[]},"platform_raw":"EVE-NG\n5.0",'
+                '"resources":{"cpu_percent":7,"mem_total_mb":1000,"mem_used_mb":500,"mem_free_mb":500,'
+                '"disk_total_kb":null,"disk_used_kb":null,"disk_free_kb":null,"disk_percent":null}}',
+                "__NCF_PROBE__",
+            ]
+        )
+        base_dirs = {"qemu": "/q", "iol": "/i", "dynamips": "/d"}
+
+        with patch.object(utils, "run_ssh_command", return_value=(0, ssh_out, "")) as run:
+            result = utils.probe_images_host("ip", "u", "p", base_dirs)
+
+        run.assert_called_once()
+        self.assertEqual(result["images"], {"qemu": ["vios-15", 'a"b'], "iol": [], "dynamips": []})
+        self.assertEqual(result["platform"][0], "eve-ng")
+        self.assertEqual(result["resources"]["cpu_percent"], 7.0)
+        self.assertAlmostEqual(result["resources"]["mem_percent"], 50.0)
+        self.assertIsNone(result["resources"]["disk_percent"])
+
+    def test_probe_images_host_without_frame_returns_none(self):
+        utils = self._import_utils()
+
+        with patch.object(utils, "run_ssh_command", return_value=(127, "", "sh: not found")):
+            self.assertIsNone(utils.probe_images_host("ip", "u", "p", {"qemu": "/q"}))
+
+    def test_probe_skips_known_parts(self):
+        utils = self._import_utils()
+        cmd = utils._host_probe_cmd({"qemu": "/q"}, with_platform=False, with_resources=False)
+        self.assertNotIn("sleep 1", cmd)
+        self.assertNotIn("/etc/issue", cmd)
+        known = {"cpu_percent": 5.0, "source": "sampler"}
+        out = '__NCF_PROBE__\n{"dirs":{"qemu":["a"]}}\n__NCF_PROBE__\n'
+        with patch.object(utils, "run_ssh_command", return_value=(0, out, "")):
+            probe = utils.probe_images_host("ip", "u", "p", {"qemu": "/q"}, platform=("eve-ng", "", ""), resources=known)
+        self.assertEqual(probe["images"], {"qemu": ["a"]})
+        self.assertIs(probe["resources"], known)
+        self.assertEqual(probe["platform"][0], "eve-ng")
+
+    def test_scp_upload_builds_expected_command(self):
+        utils = self._import_utils()
 
-        with patch.object(utils.subprocess, "Popen", return_value=mock_proc) as popen, patch(
+        with patch.object(utils.ssh_engine, "capture", return_value=utils.ssh_engine.Capture(0, "", "warn", False)) as engine_run, patch(
             "builtins.print"
         ):
             rc, out, err = utils.scp_upload("10.0.0.2", "user", "pass", "/tmp/a", "/remote/b")
@@ -123,7 +182,7 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(out, "")
         self.assertEqual(err, "warn")
 
-        args, _kwargs = popen.call_args
+        args, _kwargs = engine_run.call_args
         cmd = args[0]
         self.assertIn("sshpass", cmd[0])
         self.assertIn("scp", cmd)
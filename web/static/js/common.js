@@ -274,7 +274,7 @@ document.addEventListener('DOMContentLoaded', function () {
     return proto + '//' + window.location.host + path;
   };
   // Faz streaming das linhas de um job via WS. Retorna o socket (ou null se indisponível).
-  // cb: { onLine(line), onDone(status), onError() }
+  // cb: { onLine(line), onDone(status), onError(), onData(msg) } — onData recebe a mensagem inteira.
   window.NetConfigApp.wsStreamJob = function (wsPath, cb) {
     cb = cb || {};
     if (typeof WebSocket === 'undefined') { if (cb.onError) cb.onError(); return null; }
@@ -286,12 +286,39 @@ document.addEventListener('DOMContentLoaded', function () {
       var m = null; try { m = JSON.parse(ev.data); } catch (e) { return; }
       if (!m) return;
       if (m.error) { if (cb.onError) cb.onError(); try { ws.close(); } catch (e) {} return; }
+      if (cb.onData) cb.onData(m);
       if (m.line != null && cb.onLine) cb.onLine(m.line);
       if (m.done) { got = true; if (cb.onDone) cb.onDone(m.status); try { ws.close(); } catch (e) {} }
     };
     ws.onerror = function () { if (!got && cb.onError) cb.onError(); };
     return ws;
   };
+  // Listagens com ETag: guarda o último corpo por chave e manda If-None-Match;
+  // num 304 o corpo guardado é reaproveitado. Chamar após xhr.open(); o
+  // retorno body() substitui xhr.responseText quando a resposta chegar.
+  var etagCache = {};
+  window.NetConfigApp.conditionalXhr = function (xhr, key) {
+    var cached = etagCache[key];
+    if (cached) {
+      try { xhr.setRequestHeader('If-None-Match', cached.etag); } catch (e) {}
+    }
+    return function body() {
+      if (xhr.status === 304 && cached) {
+        // Campos voláteis (fora do ETag) chegam no cabeçalho do 304.
+        var volatile = xhr.getResponseHeader('X-Volatile-Fields');
+        if (!volatile) return cached.body;
+        try {
+          return JSON.stringify(Object.assign(JSON.parse(cached.body), JSON.parse(volatile)));
+        } catch (e) {
+          return cached.body;
+        }
+      }
+      var etag = xhr.getResponseHeader('ETag');
+      if (xhr.status === 200 && etag) etagCache[key] = { etag: etag, body: xhr.responseText };
+      else if (xhr.status !== 304) delete etagCache[key];
+      return xhr.responseText;
+    };
+  };
   window.NetConfigApp.csrfToken = '';
   window.NetConfigApp.setLanguageHeader = function (xhr) {
     if (xhr && xhr.setRequestHeader) {
@@ -353,6 +353,8 @@ document.addEventListener('DOMContentLoaded', function () {
       xhr.open('POST', '/api/container-labs/files', true);
       xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
       setLangHeader(xhr);
+      const readBody = window.NetConfigApp.conditionalXhr(xhr,
+        'clab-files|' + creds.eve_ip + '|' + creds.eve_user + '|' + (fd.get('labs_dir') || '') + '|' + labName);
 
       xhr.onreadystatechange = function () {
         if (xhr.readyState !== 4) return;
@@ -360,7 +362,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
         let resp = null;
         try {
-          resp = JSON.parse(xhr.responseText || '{}');
+          resp = JSON.parse(readBody() || '{}');
         } catch (err) {
           showMessage('error', t('msg.parseError'));
           reject(err);
@@ -1859,6 +1861,8 @@ document.addEventListener('DOMContentLoaded', function () {
       xhr.open('POST', '/api/container-labs/list', true);
       xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
       setLangHeader(xhr);
+      const readBody = window.NetConfigApp.conditionalXhr(xhr,
+        'clab-list|' + creds.eve_ip + '|' + creds.eve_user + '|' + (formData.get('labs_dir') || ''));
 
       xhr.onreadystatechange = function () {
         if (xhr.readyState !== 4) return;
@@ -1870,7 +1874,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
         let resp = null;
         try {
-          resp = JSON.parse(xhr.responseText || '{}');
+          resp = JSON.parse(readBody() || '{}');
         } catch (err) {
           if (!options.skipMessage) showMessage('error', t('msg.parseError'));
           return reject(err);
@@ -471,6 +471,8 @@
       'upload.progress': 'Enviando arquivos... {percent}% ({loaded} MB de {total} MB)',
       'upload.progress.indeterminate': 'Enviando arquivos...',
       'upload.processing': 'Processando no servidor...',
+      'upload.remote': 'Enviando ao EVE... {percent}% ({sent} MB de {total} MB, {rate} MB/s, restam {eta})',
+      'upload.fixing': 'Aplicando fixpermissions no EVE...',
       'upload.success': 'Upload concluído com sucesso.',
       'upload.error': 'Erro ao processar upload.',
       'labels.context': 'Contexto:',
@@ -1042,6 +1044,8 @@
       'upload.progress': 'Uploading files... {percent}% ({loaded} MB of {total} MB)',
       'upload.progress.indeterminate': 'Uploading files...',
       'upload.processing': 'Processing on the server...',
+      'upload.remote': 'Sending to EVE... {percent}% ({sent} MB of {total} MB, {rate} MB/s, {eta} left)',
+      'upload.fixing': 'Running fixpermissions on EVE...',
       'upload.success': 'Upload completed successfully.',
       'upload.error': 'Error while processing upload.',
       'labels.context': 'Context:',
@@ -1613,6 +1617,8 @@
       'upload.progress': 'Enviando archivos... {percent}% ({loaded} MB de {total} MB)',
       'upload.progress.indeterminate': 'Enviando archivos...',
       'upload.processing': 'Procesando en el servidor...',
+      'upload.remote': 'Enviando a EVE... {percent}% ({sent} MB de {total} MB, {rate} MB/s, faltan {eta})',
+      'upload.fixing': 'Aplicando fixpermissions en EVE...',
       'upload.success': 'Carga finalizada con éxito.',
       'upload.error': 'Error al procesar la carga.',
       'labels.context': 'Contexto:',
@@ -103,12 +103,13 @@ document.addEventListener('DOMContentLoaded', function () {
       xhr.open('POST', '/api/icons/list', true);
       xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
       setLangHeader(xhr);
+      const readBody = window.NetConfigApp.conditionalXhr(xhr, 'icons|' + eve_ip + '|' + eve_user);
 
       xhr.onreadystatechange = function () {
         if (xhr.readyState === 4) {
           let resp = null;
           try {
-            resp = JSON.parse(xhr.responseText || '{}');
+            resp = JSON.parse(readBody() || '{}');
           } catch (err) {
             if (!options.silent) {
               showMessage('error', t('icons.parseError') + '<br><pre>' +
@@ -131,12 +131,13 @@ document.addEventListener('DOMContentLoaded', function () {
       xhr.open('POST', '/api/images', true);
       xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
       setLangHeader(xhr);
+      const readBody = window.NetConfigApp.conditionalXhr(xhr, 'images|' + eve_ip + '|' + eve_user);
 
       xhr.onreadystatechange = function () {
         if (xhr.readyState === 4) {
           let resp = null;
           try {
-            resp = JSON.parse(xhr.responseText || '{}');
+            resp = JSON.parse(readBody() || '{}');
           } catch (err) {
             renderImages(null);
             if (imagesEmpty) imagesEmpty.style.display = 'flex';
@@ -107,12 +107,13 @@ document.addEventListener('DOMContentLoaded', function () {
       xhr.open('POST', '/api/templates/list', true);
       xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
       setLangHeader(xhr);
+      const readBody = window.NetConfigApp.conditionalXhr(xhr, 'templates|' + eve_ip + '|' + eve_user);
 
       xhr.onreadystatechange = function () {
         if (xhr.readyState === 4) {
           let resp = null;
           try {
-            resp = JSON.parse(xhr.responseText || '{}');
+            resp = JSON.parse(readBody() || '{}');
           } catch (err) {
             if (!options.silent) {
               showMessage('error', t('templates.parseError') + '<br><pre>' +
@@ -53,7 +53,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     const formData = new FormData(form);
     const xhr = new XMLHttpRequest();
-    xhr.open('POST', '/api/upload', true);
+    xhr.open('POST', '/api/upload/job', true);
     xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
     setLangHeader(xhr);
 
@@ -94,29 +94,98 @@ document.addEventListener('DOMContentLoaded', function () {
           return;
         }
 
-        if (xhr.status === 200 && resp && resp.success) {
+        if (xhr.status === 202 && resp && resp.job_id) {
+          // Corpo recebido pela API: o envio ao EVE segue como job.
           if (progressBar && progressText) {
-            progressBar.style.width = '100%';
+            progressBar.style.width = '0%';
             progressText.textContent = t('upload.processing');
           }
-          showMessage('success', resp.message || t('upload.success'));
-        } else {
-          showMessage('error', (resp && resp.message) || t('upload.error'));
-          if (resp && resp.errors && resp.errors.length) {
-            resp.errors.forEach(function (err) {
-              const detail = [];
-              if (err.filename) detail.push('<b>' + err.filename + '</b>');
-              if (err.context) detail.push('<b>' + t('labels.context') + '</b> ' + err.context);
-              if (err.stdout) detail.push('<pre>' + err.stdout + '</pre>');
-              if (err.stderr) detail.push('<pre>' + err.stderr + '</pre>');
-              showMessage('error', detail.join('<br>'));
-            });
-          }
+          watchJob(resp.job_id);
+          return;
         }
-        resetProgress();
+        showResult(resp);
       }
     };
 
+    function showResult(resp) {
+      if (resp && (resp.success === true || resp.status === 'success')) {
+        if (progressBar && progressText) {
+          progressBar.style.width = '100%';
+          progressText.textContent = t('upload.processing');
+        }
+        showMessage('success', resp.message || t('upload.success'));
+      } else {
+        showMessage('error', (resp && resp.message) || t('upload.error'));
+        if (resp && resp.errors && resp.errors.length) {
+          resp.errors.forEach(function (err) {
+            const detail = [];
+            if (err.filename) detail.push('<b>' + err.filename + '</b>');
+            if (err.context) detail.push('<b>' + t('labels.context') + '</b> ' + err.context);
+            if (err.stdout) detail.push('<pre>' + err.stdout + '</pre>');
+            if (err.stderr) detail.push('<pre>' + err.stderr + '</pre>');
+            showMessage('error', detail.join('<br>'));
+          });
+        }
+      }
+      resetProgress();
+    }
+
+    function formatEta(seconds) {
+      if (seconds == null) return '--';
+      const s = Math.max(0, Math.round(seconds));
+      const m = Math.floor(s / 60);
+      return m ? (m + 'm' + String(s % 60).padStart(2, '0') + 's') : (s + 's');
+    }
+
+    function showJobProgress(p) {
+      if (!p || !progressBar || !progressText) return;
+      progressContainer.style.display = 'block';
+      progressText.style.display = 'block';
+      progressBar.style.width = p.percent + '%';
+      if (p.phase === 'fix') {
+        progressText.textContent = t('upload.fixing');
+        return;
+      }
+      progressText.textContent = t('upload.remote', {
+        percent: Math.round(p.percent),
+        sent: (p.bytes_sent / (1024 * 1024)).toFixed(1),
+        total: (p.bytes_total / (1024 * 1024)).toFixed(1),
+        rate: (p.bytes_per_s / (1024 * 1024)).toFixed(1),
+        eta: formatEta(p.eta_s)
+      });
+    }
+
+    // WS-first com fallback para polling, como os jobs do ContainerLab.
+    function watchJob(jobId) {
+      let last = null;
+      const ws = app.wsStreamJob ? app.wsStreamJob('/ws/upload/' + encodeURIComponent(jobId), {
+        onData: function (m) {
+          if (m.progress) { last = m.progress; showJobProgress(m.progress); }
+        },
+        onDone: function () { showResult(last); },
+        onError: function () { pollJob(jobId); }
+      }) : null;
+      if (!ws) pollJob(jobId);
+    }
+
+    function pollJob(jobId) {
+      const px = new XMLHttpRequest();
+      px.open('GET', '/api/upload/job/' + encodeURIComponent(jobId), true);
+      px.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
+      setLangHeader(px);
+      px.onreadystatechange = function () {
+        if (px.readyState !== 4) return;
+        let p = null;
+        try { p = JSON.parse(px.responseText || '{}'); } catch (e) { setTimeout(function () { pollJob(jobId); }, 1500); return; }
+        if (px.status === 404) { showResult(p); return; }
+        showJobProgress(p);
+        if (!p.done) { setTimeout(function () { pollJob(jobId); }, 1500); return; }
+        showResult(p);
+      };
+      px.onerror = function () { setTimeout(function () { pollJob(jobId); }, 2000); };
+      px.send(null);
+    }
+
     xhr.onerror = function () {
       showMessage('error', t('msg.networkError'));
       resetProgress();